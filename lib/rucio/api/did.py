@@ -253,6 +253,19 @@ def get_metadata(scope, name):
     return did.get_metadata(scope=scope, name=name)
 
 
+def get_metadata_bulk(dids):
+    """
+    Get the metadata of a list of data identifiers.
+
+    :param dids: A list of dictionaries with the keys scope and name.
+    :returns: A generator of metadata dictionaries. Unknown DIDs are skipped.
+    """
+    if not dids:
+        raise rucio.common.exception.InvalidObject('No data identifier given')
+    validate_schema(name='r_dids', obj=dids)
+    return did.get_metadata_bulk(dids=dids)
+
+
 def set_status(scope, name, issuer, **kwargs):
     """
     Set data identifier status
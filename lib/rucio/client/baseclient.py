@@ -15,10 +15,14 @@ Client class for callers of the Rucio system
 """
 import random
 import sys
+import threading
+
+from collections import deque
+from itertools import islice
 
 from rucio.common import exception
 from rucio.common.config import config_get
-from rucio.common.exception import CannotAuthenticate, ClientProtocolNotSupported, NoAuthInformation, MissingClientParameter
+from rucio.common.exception import BulkOperationFailure, CannotAuthenticate, ClientProtocolNotSupported, NoAuthInformation, MissingClientParameter
 from rucio.common.utils import build_url, get_tmp_dir, my_key_generator, parse_response
 from rucio import version
 
@@ -29,10 +33,12 @@ from tempfile import mkstemp
 from urlparse import urlparse
 
 from ConfigParser import NoOptionError, NoSectionError
+from concurrent.futures import ThreadPoolExecutor
 from dogpile.cache import make_region
 from requests import session
+from requests.adapters import HTTPAdapter
 from requests.status_codes import codes, _codes
-from requests.exceptions import SSLError
+from requests.exceptions import RequestException, SSLError
 from requests_kerberos import HTTPKerberosAuth
 # See https://github.com/kennethreitz/requests/issues/2214
 from requests.packages.urllib3 import disable_warnings
@@ -62,6 +68,46 @@ def choice(hosts):
     return random.choice(hosts)
 
 
+# Maximum number of connections kept alive per host by the clients of the process
+POOL_MAXSIZE = 16
+
+# Size of the blocks read from the streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Content codings accepted for the responses
+ACCEPT_ENCODING = 'gzip, deflate'
+
+# Maximum number of items sent per request by the bulk methods, lowered to the limit advertised by the server
+BULK_CHUNK_SIZE = 1000
+
+# Number of chunks of a bulk method sent at the same time
+BULK_THREADS = 4
+
+# HTTP sessions shared by the clients of the process, per CA certificate and client certificate
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(ca_cert=None, cert=None):
+    """
+    Returns the HTTP session shared by the clients of the process using the same credentials, so that they reuse the same kept-alive connections.
+    The connections of a session are only ever opened with its own CA and client certificates.
+
+    :param ca_cert: The path to the CA certificate(s) verifying the servers.
+    :param cert: The path to the client certificate or proxy, or a tuple (certificate, key), None if no client certificate is used.
+    :return: The requests.Session.
+    """
+    key = (ca_cert, cert)
+    with _SESSIONS_LOCK:
+        if key not in _SESSIONS:
+            _SESSIONS[key] = session()
+            _SESSIONS[key].verify = ca_cert
+            _SESSIONS[key].cert = cert
+            for prefix in ('http://', 'https://'):
+                _SESSIONS[key].mount(prefix, HTTPAdapter(pool_maxsize=POOL_MAXSIZE))
+        return _SESSIONS[key]
+
+
 class BaseClient(object):
 
     """Main client class for accessing Rucio resources. Handles the authentication."""
@@ -70,6 +116,13 @@ class BaseClient(object):
     TOKEN_PATH_PREFIX = get_tmp_dir() + '/.rucio_'
     TOKEN_PREFIX = 'auth_token_'
 
+    # Tokens shared by the clients of the process, per auth_host, account, auth_type and credentials, to read the token file and to authenticate only once
+    TOKENS = {}
+    TOKENS_LOCK = threading.RLock()
+
+    # Bulk limits advertised by the servers, per host, None if the server does not advertise one
+    BULK_LIMITS = {}
+
     def __init__(self, rucio_host=None, auth_host=None, account=None, ca_cert=None, auth_type=None, creds=None, timeout=None, user_agent='rucio-clients'):
         """
         Constructor of the BaseClient.
@@ -88,7 +141,7 @@ class BaseClient(object):
         self.host = rucio_host
         self.list_hosts = []
         self.auth_host = auth_host
-        self.session = session()
+        self.session = None
         self.user_agent = "%s/%s" % (user_agent, version.version_string())  # e.g. "rucio-clients/0.2.13"
         sys.argv[0] = sys.argv[0].split('/')[-1]
         self.script_id = '::'.join(sys.argv[0:2])
@@ -157,6 +210,13 @@ class BaseClient(object):
 
         self.list_hosts = [self.host]
 
+        client_cert = None
+        if self.auth_type == 'x509':
+            client_cert = (self.creds['client_cert'], self.creds['client_key']) if 'client_key' in self.creds else self.creds['client_cert']
+        elif self.auth_type == 'x509_proxy':
+            client_cert = self.creds['client_proxy']
+        self.session = get_session(ca_cert=self.ca_cert, cert=client_cert)
+
         if account is None:
             LOG.debug('no account passed. Trying to get it from the config file.')
             try:
@@ -169,6 +229,7 @@ class BaseClient(object):
 
         token_path = self.TOKEN_PATH_PREFIX + self.account
         self.token_file = token_path + '/' + self.TOKEN_PREFIX + self.account
+        self.token_key = (self.auth_host, self.account, self.auth_type, tuple(sorted(self.creds.items())))
         self.__authenticate()
 
         try:
@@ -178,6 +239,15 @@ class BaseClient(object):
         except ValueError:
             LOG.debug('request_retries must be an integer. Taking default.')
 
+        self.bulk_chunk_size, self.bulk_threads = BULK_CHUNK_SIZE, BULK_THREADS
+        for option in ('bulk_chunk_size', 'bulk_threads'):
+            try:
+                setattr(self, option, int(config_get('client', option)))
+            except (NoOptionError, NoSectionError):
+                LOG.debug('%s not specified in config file. Taking default.' % option)
+            except ValueError:
+                LOG.debug('%s must be an integer. Taking default.' % option)
+
     def _get_exception(self, headers, status_code=None, data=None):
         """
         Helper method to parse an error string send by the server and transform it into the corresponding rucio exception.
@@ -210,11 +280,12 @@ class BaseClient(object):
         :param response: the response received from the server.
         """
         if 'content-type' in response.headers and response.headers['content-type'] == 'application/x-json-stream':
-            for line in response.iter_lines():
+            # Decoded line by line as the response is received, the listings do not have to fit in memory
+            for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
                 if line:
                     yield parse_response(line)
         elif 'content-type' in response.headers and response.headers['content-type'] == 'application/json':
-            yield parse_response(response.text)
+            yield parse_response(response.content)
         else:  # Exception ?
             yield response.text
 
@@ -230,9 +301,10 @@ class BaseClient(object):
         :return: the HTTP return body.
         """
         result, retry = None, 0
+        # The streamed responses are compressed when accepted, and decompressed by requests as they are read
         hds = {'X-Rucio-Auth-Token': self.auth_token, 'X-Rucio-Account': self.account,
                'Connection': 'Keep-Alive', 'User-Agent': self.user_agent,
-               'X-Rucio-Script': self.script_id}
+               'X-Rucio-Script': self.script_id, 'Accept-Encoding': ACCEPT_ENCODING}
 
         if headers is not None:
             hds.update(headers)
@@ -264,13 +336,103 @@ class BaseClient(object):
                 continue
 
             if result is not None and result.status_code == codes.unauthorized:  # pylint: disable-msg=E1101
-                self.__get_token()
+                self.__refresh_token(hds['X-Rucio-Auth-Token'])
                 hds['X-Rucio-Auth-Token'] = self.auth_token
                 retry += 1
             else:
                 break
         return result
 
+    def _get_bulk_chunk_size(self):
+        """
+        Returns the number of items sent per request by the bulk methods: the configured chunk size, lowered to the bulk limit
+        advertised by the server in its ping. The limit is asked once per host.
+
+        :return: The chunk size.
+        """
+        if self.host not in self.BULK_LIMITS:
+            limit = None
+            try:
+                result = self.session.get(build_url(self.host, path='ping'), verify=self.ca_cert, timeout=self.timeout)
+                if result.status_code == codes.ok:
+                    limit = parse_response(result.content).get('bulk_limit')
+            except (RequestException, ValueError, AttributeError) as error:
+                LOG.debug('cannot get the bulk limit of %s: %s' % (self.host, str(error)))
+            self.BULK_LIMITS[self.host] = limit
+        limit = self.BULK_LIMITS[self.host]
+        if limit:
+            return max(1, min(self.bulk_chunk_size, int(limit)))
+        return self.bulk_chunk_size
+
+    def _send_chunks(self, function, chunks):
+        """
+        Helper method calling a function for each chunk of a bulk method, bulk_threads chunks at a time.
+
+        :param function: the function sending one chunk.
+        :param chunks: the list of chunks.
+        :return: the list of the results of the chunks, in the order of the chunks.
+        :raises BulkOperationFailure: if some chunks failed, with the results of the other chunks. A single chunk raises its own exception.
+        """
+        if len(chunks) == 1:
+            return [function(chunks[0])]
+        with ThreadPoolExecutor(max_workers=min(self.bulk_threads, len(chunks))) as executor:
+            futures = [executor.submit(function, chunk) for chunk in chunks]
+        results, failures = [], []
+        for index, future in enumerate(futures):
+            if future.exception() is not None:
+                failures.append((index, chunks[index], future.exception()))
+                results.append(None)
+            else:
+                results.append(future.result())
+        if failures:
+            raise self._bulk_failure(len(chunks), results, failures)
+        return results
+
+    def _stream_chunks(self, function, chunks):
+        """
+        Helper method yielding the items listed for each chunk of a bulk method. The requests of the next bulk_threads chunks are
+        sent while the items of the current chunk are read.
+
+        :param function: the function sending one chunk and returning the generator of its items.
+        :param chunks: the list of chunks.
+        :return: a generator of the items, in the order of the chunks.
+        :raises BulkOperationFailure: once the other chunks are read, if some chunks failed. A single chunk raises its own exception.
+        """
+        if len(chunks) == 1:
+            for item in function(chunks[0]):
+                yield item
+            return
+        failures = []
+        with ThreadPoolExecutor(max_workers=min(self.bulk_threads, len(chunks))) as executor:
+            remaining = iter(enumerate(chunks))
+            pending = deque((index, executor.submit(function, chunk)) for index, chunk in islice(remaining, self.bulk_threads))
+            while pending:
+                index, future = pending.popleft()
+                try:
+                    for item in future.result():
+                        yield item
+                except Exception as error:
+                    failures.append((index, chunks[index], error))
+                for index, chunk in islice(remaining, 1):
+                    pending.append((index, executor.submit(function, chunk)))
+        if failures:
+            raise self._bulk_failure(len(chunks), None, failures)
+
+    @staticmethod
+    def _bulk_failure(nb_chunks, results, failures):
+        """
+        Helper method building the exception raised when some chunks of a bulk method failed.
+
+        :param nb_chunks: the number of chunks.
+        :param results: the results of the chunks, None for the failed ones.
+        :param failures: the list of (index, chunk, exception) of the failed chunks.
+        :return: the BulkOperationFailure.
+        """
+        details = '; '.join('chunk %i: %s: %s' % (index, error.__class__.__name__, str(error)) for index, _, error in failures)
+        error = BulkOperationFailure('%i of %i chunks failed: %s' % (len(failures), nb_chunks, details))
+        error.results, error.failures = results, failures
+        return error
+
     def __get_token_userpass(self):
         """
         Sends a request to get an auth token from the server and stores it as a class attribute. Uses username/password.
@@ -432,6 +594,8 @@ class BaseClient(object):
             if self.auth_token is not None:
                 self.__write_token()
                 self.headers['X-Rucio-Auth-Token'] = self.auth_token
+                with self.TOKENS_LOCK:
+                    self.TOKENS[self.token_key] = self.auth_token
                 break
 
             retry += 1
@@ -439,12 +603,35 @@ class BaseClient(object):
         if self.auth_token is None:
             raise CannotAuthenticate('cannot get an auth token from server')
 
+    def __refresh_token(self, expired_token):
+        """
+        Gets a new token after an unauthorized error, unless another client or thread of the process already got one.
+        The clients refreshing the same token at the same time wait for the first one.
+
+        :param expired_token: the token refused by the server.
+        """
+        with self.TOKENS_LOCK:
+            token = self.TOKENS.get(self.token_key)
+            if token is not None and token != expired_token:
+                self.auth_token = token
+                self.headers['X-Rucio-Auth-Token'] = self.auth_token
+                LOG.debug('use token \'%s\' refreshed by another client' % self.auth_token)
+                return
+            self.__get_token()
+
     def __read_token(self):
         """
-        Checks if a local token file exists and reads the token from it.
+        Checks if a token was already read or received by a client of the process. Otherwise, checks if a local token file exists and reads the token from it.
 
         :return: True if a token could be read. False if no file exists.
         """
+        with self.TOKENS_LOCK:
+            token = self.TOKENS.get(self.token_key)
+        if token is not None:
+            self.auth_token = token
+            self.headers['X-Rucio-Auth-Token'] = self.auth_token
+            return True
+
         if not path.exists(self.token_file):
             return False
 
@@ -452,6 +639,8 @@ class BaseClient(object):
             token_file_handler = open(self.token_file, 'r')
             self.auth_token = token_file_handler.readline()
             self.headers['X-Rucio-Auth-Token'] = self.auth_token
+            with self.TOKENS_LOCK:
+                self.TOKENS[self.token_key] = self.auth_token
         except IOError as (errno, strerror):  # NOQA
             print("I/O error({0}): {1}".format(errno, strerror))
         except Exception:
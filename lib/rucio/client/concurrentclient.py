@@ -0,0 +1,193 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+Client running many calls of the Rucio client concurrently, for the tools driving tens of thousands of calls.
+
+The methods of DIDClient, ReplicaClient, RuleClient and RSEClient are mirrored: they take the same
+arguments but return a future (concurrent.futures.Future) instead of blocking. At most
+`concurrency` calls run at the same time and as many wait to be run: further calls block until a
+call completes, so that the producer of the calls does not queue them all in memory.
+
+All the calls share the kept-alive connections and the token of the process. An expired token is
+refreshed once for all the calls (see BaseClient).
+'''
+
+import Queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from rucio.client.client import Client
+from rucio.client.didclient import DIDClient
+from rucio.client.replicaclient import ReplicaClient
+from rucio.client.rseclient import RSEClient
+from rucio.client.ruleclient import RuleClient
+
+# Number of calls run at the same time by default
+CONCURRENCY = 16
+
+# Number of items of the streamed results buffered between the threads and the caller
+STREAM_BUFFER = 10000
+
+# Names of the mirrored methods
+MIRRORED_METHODS = frozenset(name for cls in (DIDClient, ReplicaClient, RuleClient, RSEClient)
+                             for name in cls.__dict__ if not name.startswith('_') and callable(cls.__dict__[name]))
+
+
+class ConcurrentClient(object):
+
+    """Runs calls of the Rucio client concurrently, with a bounded number of calls in flight."""
+
+    def __init__(self, concurrency=CONCURRENCY, client=None, **kwargs):
+        """
+        Constructor of the ConcurrentClient.
+
+        :param concurrency: the number of calls run at the same time.
+        :param client: the Client to use, if None one is created with the remaining arguments.
+        :param kwargs: the arguments of the Client, e.g. account or auth_type.
+        """
+        self.client = client or Client(**kwargs)
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._slots = threading.BoundedSemaphore(2 * concurrency)
+
+    def __getattr__(self, name):
+        """
+        Returns the mirrored method of the Rucio client, returning a future.
+        """
+        if name not in MIRRORED_METHODS:
+            raise AttributeError('\'%s\' object has no attribute \'%s\'' % (self.__class__.__name__, name))
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            return self.submit(method, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Schedules a call, waiting for a free slot if too many calls are in flight.
+
+        :param function: the function to call, e.g. a method of the Rucio client.
+        :param args: the positional arguments of the function.
+        :param kwargs: the keyword arguments of the function.
+        :return: the concurrent.futures.Future of the call.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(function, *args, **kwargs)
+        except:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def map(self, name, calls):
+        """
+        Runs a mirrored method for many arguments, yielding the results as they complete.
+
+        :param name: the name of the method, e.g. 'get_metadata'.
+        :param calls: an iterable of argument tuples, or of dictionaries of keyword arguments.
+        :return: a generator of (arguments, result) tuples, the result being the exception if the call failed.
+        """
+        method = getattr(self, name)
+        pending = {}
+        done = Queue.Queue()
+
+        def submit(arguments):
+            if isinstance(arguments, dict):
+                future = method(**arguments)
+            else:
+                future = method(*arguments)
+            pending[future] = arguments
+            future.add_done_callback(done.put)
+
+        for arguments in calls:
+            submit(arguments)
+            while not done.empty():
+                future = done.get()
+                yield self._result(pending.pop(future), future)
+        while pending:
+            future = done.get()
+            yield self._result(pending.pop(future), future)
+
+    def stream(self, name, calls):
+        """
+        Runs a mirrored method returning a stream, e.g. list_files or list_replicas, for many arguments,
+        yielding the items of all the streams as they are received.
+
+        :param name: the name of the method, e.g. 'list_replicas'.
+        :param calls: an iterable of argument tuples, or of dictionaries of keyword arguments.
+        :return: a generator of the items. The first failure is raised once the other streams are read.
+        """
+        method = getattr(self.client, name)
+        items = Queue.Queue(maxsize=STREAM_BUFFER)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        def drain(arguments):
+            try:
+                for item in (method(**arguments) if isinstance(arguments, dict) else method(*arguments)):
+                    if not put(item):
+                        return
+            finally:
+                put(end)
+
+        futures, running = [], [0]
+
+        def receive():
+            item = items.get()
+            if item is end:
+                running[0] -= 1
+            return item
+
+        try:
+            for arguments in calls:
+                # The streams are read by at most `concurrency` threads, the caller reading their items meanwhile
+                while running[0] >= self.concurrency:
+                    item = receive()
+                    if item is not end:
+                        yield item
+                futures.append(self._executor.submit(drain, arguments))
+                running[0] += 1
+            while running[0]:
+                item = receive()
+                if item is not end:
+                    yield item
+        finally:
+            stop.set()
+        for future in futures:
+            if future.exception() is not None:
+                raise future.exception()
+
+    def close(self):
+        """
+        Waits for the calls in flight and releases the threads.
+        """
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _result(arguments, future):
+        if future.exception() is not None:
+            return arguments, future.exception()
+        return arguments, future.result()
@@ -20,7 +20,31 @@ from requests.status_codes import codes
 
 from rucio.client.baseclient import BaseClient
 from rucio.client.baseclient import choice
-from rucio.common.utils import build_url, render_json, render_json_list, date_to_str
+from rucio.common.utils import build_url, chunks, render_json, render_json_list, date_to_str
+
+
+def chunk_attachments(attachments, chunk_size):
+    """
+    Splits attachments into chunks of at most chunk_size DIDs to attach.
+
+    :param attachments: The attachments, [{'scope': scope, 'name': name, 'dids': dids}, ...].
+    :param chunk_size: The maximum number of DIDs to attach per chunk.
+    :returns: A generator of lists of attachments.
+    """
+    chunk, size = [], 0
+    for attachment in attachments:
+        dids, offset = attachment['dids'], 0
+        while offset < len(dids) or (not dids and offset == 0):
+            if size == chunk_size:
+                yield chunk
+                chunk, size = [], 0
+            part = dict(attachment)
+            part['dids'] = dids[offset:offset + chunk_size - size]
+            chunk.append(part)
+            size += max(len(part['dids']), 1)
+            offset += max(len(part['dids']), 1)
+    if chunk:
+        yield chunk
 
 
 class DIDClient(BaseClient):
@@ -210,16 +234,22 @@ class DIDClient(BaseClient):
             attachment is: {'scope': scope, 'name': name, 'dids': dids}
             dids is: [{'scope': scope, 'name': name}, ...]
             :param ignore_duplicate: If True, ignore duplicate entries.
+
+        Long lists are sent by chunks of DIDs to attach, the DIDs of one attachment being split across chunks if needed.
+        :raises BulkOperationFailure: if some chunks failed.
         """
         path = '/'.join([self.DIDS_BASEURL, 'attachments'])
         url = build_url(choice(self.list_hosts), path=path)
-        data = {'ignore_duplicate': ignore_duplicate, 'attachments': attachments}
-        r = self._send_request(url, type='POST', data=dumps(data))
-        if r.status_code in (codes.ok, codes.no_content, codes.created):
-            return True
 
-        exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
-        raise exc_cls(exc_msg)
+        def attach(chunk):
+            data = {'ignore_duplicate': ignore_duplicate, 'attachments': chunk}
+            r = self._send_request(url, type='POST', data=dumps(data))
+            if r.status_code in (codes.ok, codes.no_content, codes.created):
+                return True
+            exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
+            raise exc_cls(exc_msg)
+
+        return all(self._send_chunks(attach, list(chunk_attachments(attachments, self._get_bulk_chunk_size())) or [attachments]))
 
     def add_files_to_datasets(self, attachments, ignore_duplicate=False):
         """
@@ -385,6 +415,31 @@ class DIDClient(BaseClient):
             exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
             raise exc_cls(exc_msg)
 
+    def get_metadata_bulk(self, dids):
+        """
+        Get the metadata of a list of data identifiers. Long lists are sent by chunks.
+
+        :param dids: The list of data identifiers, [{'scope': scope, 'name': name}, ...].
+        :returns: A generator of metadata dictionaries. Unknown data identifiers are skipped.
+        :raises BulkOperationFailure: once the other chunks are listed, if some chunks failed.
+        """
+        url = build_url(choice(self.list_hosts), path='/'.join([self.DIDS_BASEURL, 'bulkmeta']))
+
+        def get(chunk):
+            r = self._send_request(url, type='POST', data=dumps({'dids': chunk}))
+            if r.status_code == codes.ok:
+                return self._load_json_data(r)
+            exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
+            raise exc_cls(exc_msg)
+
+        dids = list(dids)
+        if not dids:
+            return iter([])
+        dids_chunks = list(chunks(dids, self._get_bulk_chunk_size()))
+        if len(dids_chunks) == 1:
+            return get(dids)
+        return self._stream_chunks(get, dids_chunks)
+
     def set_metadata(self, scope, name, key, value, recursive=False):
         """
         Set data identifier metadata
@@ -16,7 +16,7 @@ from requests.status_codes import codes
 
 from rucio.client.baseclient import BaseClient
 from rucio.client.baseclient import choice
-from rucio.common.utils import build_url, render_json
+from rucio.common.utils import build_url, chunks, render_json
 
 
 class ReplicaClient(BaseClient):
@@ -29,19 +29,28 @@ class ReplicaClient(BaseClient):
 
     def declare_bad_file_replicas(self, pfns, reason):
         """
-        Declare a list of bad replicas.
+        Declare a list of bad replicas. Long lists are sent by chunks.
 
         :param pfns: The list of PFNs.
         :param reason: The reason of the loss.
+        :return: The PFNs which could not be declared, per RSE.
+        :raises BulkOperationFailure: if some chunks failed.
         """
-        data = {'reason': reason, 'pfns': pfns}
         url = build_url(self.host, path='/'.join([self.REPLICAS_BASEURL, 'bad']))
-        headers = {}
-        r = self._send_request(url, headers=headers, type='POST', data=dumps(data))
-        if r.status_code == codes.created:
-            return loads(r.text)
-        exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
-        raise exc_cls(exc_msg)
+
+        def declare(chunk):
+            data = {'reason': reason, 'pfns': chunk}
+            r = self._send_request(url, headers={}, type='POST', data=dumps(data))
+            if r.status_code == codes.created:
+                return loads(r.text)
+            exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
+            raise exc_cls(exc_msg)
+
+        not_declared = {}
+        for result in self._send_chunks(declare, list(chunks(pfns, self._get_bulk_chunk_size())) or [pfns]):
+            for rse in result:
+                not_declared.setdefault(rse, []).extend(result[rse])
+        return not_declared
 
     def declare_suspicious_file_replicas(self, pfns, reason):
         """
@@ -89,6 +98,19 @@ class ReplicaClient(BaseClient):
                          ``3`` retrieves as metalink+xml,
                          ``4`` retrieves as metalink4+xml
         :param rse_expression: The RSE expression to restrict replicas on a set of RSEs.
+
+        Long lists of DIDs are sent by chunks when listing as JSON, the replicas being yielded in the order of the chunks.
+        :raises BulkOperationFailure: once the other chunks are listed, if some chunks failed.
+        """
+        if not metalink:
+            dids_chunks = list(chunks(list(dids), self._get_bulk_chunk_size()))
+            if len(dids_chunks) > 1:
+                return self._stream_chunks(lambda chunk: self.__list_replicas(chunk, schemes, unavailable, all_states, metalink, rse_expression), dids_chunks)
+        return self.__list_replicas(dids, schemes, unavailable, all_states, metalink, rse_expression)
+
+    def __list_replicas(self, dids, schemes, unavailable, all_states, metalink, rse_expression):
+        """
+        Sends one request listing file replicas, see list_replicas.
         """
         data = {'dids': dids}
 
@@ -153,14 +175,19 @@ class ReplicaClient(BaseClient):
         :param ignore_availability: Ignore the RSE blacklisting.
 
         :return: True if files were created successfully.
+        :raises BulkOperationFailure: if some chunks failed, long lists of files being sent by chunks.
         """
         url = build_url(choice(self.list_hosts), path=self.REPLICAS_BASEURL)
-        data = {'rse': rse, 'files': files, 'ignore_availability': ignore_availability}
-        r = self._send_request(url, type='POST', data=render_json(**data))
-        if r.status_code == codes.created:
-            return True
-        exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
-        raise exc_cls(exc_msg)
+
+        def add(chunk):
+            data = {'rse': rse, 'files': chunk, 'ignore_availability': ignore_availability}
+            r = self._send_request(url, type='POST', data=render_json(**data))
+            if r.status_code == codes.created:
+                return True
+            exc_cls, exc_msg = self._get_exception(headers=r.headers, status_code=r.status_code, data=r.content)
+            raise exc_cls(exc_msg)
+
+        return all(self._send_chunks(add, list(chunks(files, self._get_bulk_chunk_size())) or [files]))
 
     def delete_replicas(self, rse, files, ignore_availability=True):
         """
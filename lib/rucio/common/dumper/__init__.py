@@ -142,7 +142,8 @@ def smart_open(filename):
         elif file_type.find('bzip2') > -1:
             f = bz2file.open(filename, 'rt')
         else:
-            pass  # Not supported format
+            # Other text types, e.g. text/csv for dumps of short paths
+            f = open(filename, 'rt')
     return f
 
 
@@ -0,0 +1,241 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+Compact binary format for the sorted (path, status) records of the dumps,
+read through a memory map.
+
+Layout of a file:
+    - Header: magic, version, records per block, number of records and
+      offset of the index (see `HEADER`).
+    - Blocks of `block_records` records sorted by path. Each record is
+      front-coded against the previous record of its block: length of the
+      prefix shared with the previous path, length of the rest of the path,
+      status byte (`NO_STATUS` for the storage dumps) and rest of the path.
+      The first record of a block is stored in full so that each block can
+      be decoded alone.
+    - Sparse index: number of blocks, then for each block its offset, the
+      length of its first path and its first path.
+'''
+from bisect import bisect_right
+from rucio.common import dumper
+from rucio.common.dumper import DUMPS_CACHE_DIR
+import mmap
+import os
+import struct
+
+
+MAGIC = 'RUCIODMP'
+VERSION = 1
+HEADER = struct.Struct('<8sB3xIQQ')
+RECORD = struct.Struct('<HHc')
+INDEX_ENTRY = struct.Struct('<QH')
+BLOCK_RECORDS = 512
+NO_STATUS = '\x00'
+MAX_PATH_LENGTH = 65535
+
+
+def _shared_prefix_length(previous, path):
+    '''
+    Length of the prefix shared by both strings, found by bisection on
+    slices so that the characters are compared in C.
+    '''
+    low, high = 0, min(len(previous), len(path))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if previous[:middle] == path[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def write(output, records, block_records=BLOCK_RECORDS):
+    '''
+    Writes `records` in the compact format to the file object `output`,
+    which must be seekable.
+
+    :param output: File object opened for writing.
+    :param records: Iterable of (path, status) tuples sorted by path, the
+    status is a single character or None.
+    :param block_records: Number of records per block of the index.
+    :returns: The number of records written.
+    '''
+    start = output.tell()
+    output.write(HEADER.pack(MAGIC, VERSION, block_records, 0, 0))
+    offset = HEADER.size
+    index = []
+    count = 0
+    previous = ''
+    pack = RECORD.pack
+    for path, status in records:
+        if len(path) > MAX_PATH_LENGTH:
+            raise ValueError('Path longer than {0} bytes: {1}'.format(MAX_PATH_LENGTH, path[:100]))
+        if status is None:
+            status = NO_STATUS
+        elif len(status) != 1:
+            raise ValueError('Status must be a single character, got "{0}" for {1}'.format(status, path))
+
+        if count % block_records == 0:
+            index.append((offset, path))
+            shared = 0
+        else:
+            shared = _shared_prefix_length(previous, path)
+        suffix = path[shared:]
+        output.write(pack(shared, len(suffix), status))
+        output.write(suffix)
+        offset += RECORD.size + len(suffix)
+        previous = path
+        count += 1
+
+    index_offset = offset
+    output.write(struct.pack('<Q', len(index)))
+    for block_offset, first_path in index:
+        output.write(INDEX_ENTRY.pack(block_offset, len(first_path)))
+        output.write(first_path)
+
+    output.seek(start)
+    output.write(HEADER.pack(MAGIC, VERSION, block_records, count, index_offset))
+    output.seek(0, os.SEEK_END)
+    return count
+
+
+class CompactDump(object):
+    '''
+    Read-only view of a dump in the compact format, memory mapped.
+
+    Iterating yields the (path, status) records in order, the status being
+    None for the records without status.
+    '''
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as dump:
+            self._map = mmap.mmap(dump.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.block_records, self.count, self._index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError('{0} is not a compact dump (version {1})'.format(filepath, VERSION))
+        self._offsets = None
+        self._first_paths = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self._records(HEADER.size, self._index_offset)
+
+    def close(self):
+        self._map.close()
+
+    def _records(self, offset, end):
+        buf = self._map
+        unpack_from = RECORD.unpack_from
+        size = RECORD.size
+        path = ''
+        while offset < end:
+            shared, length, status = unpack_from(buf, offset)
+            offset += size
+            path = path[:shared] + buf[offset:offset + length]
+            offset += length
+            yield path, (None if status == NO_STATUS else status)
+
+    def _load_index(self):
+        if self._offsets is not None:
+            return
+        buf = self._map
+        offset = self._index_offset
+        blocks, = struct.unpack_from('<Q', buf, offset)
+        offset += 8
+        offsets, first_paths = [], []
+        for _ in xrange(blocks):
+            block_offset, length = INDEX_ENTRY.unpack_from(buf, offset)
+            offset += INDEX_ENTRY.size
+            offsets.append(block_offset)
+            first_paths.append(buf[offset:offset + length])
+            offset += length
+        self._offsets, self._first_paths = offsets, first_paths
+
+    def _block_from(self, path):
+        '''
+        Index of the block which may contain `path` or the first path
+        greater than `path`.
+        '''
+        self._load_index()
+        return max(bisect_right(self._first_paths, path) - 1, 0)
+
+    def lines(self, sep='\t'):
+        '''
+        Generator of the records as strings, the path and the status
+        separated by `sep`, or the path alone for the records without
+        status.
+        '''
+        for path, status in self:
+            yield path if status is None else path + sep + status
+
+    def lookup(self, path):
+        '''
+        :returns: A tuple (found, status), status being None if the record
+        has no status.
+        '''
+        for record_path, status in self.iter_from(path):
+            if record_path == path:
+                return True, status
+            break
+        return False, None
+
+    def iter_from(self, path):
+        '''
+        Generator of the records from the first one whose path is greater
+        than or equal to `path`.
+        '''
+        if not self.count:
+            return
+        block = self._block_from(path)
+        for record in self._records(self._offsets[block], self._index_offset):
+            if record[0] >= path:
+                yield record
+
+    def iter_prefix(self, prefix):
+        '''
+        Generator of the records whose path starts with `prefix`.
+        '''
+        for record in self.iter_from(prefix):
+            if not record[0].startswith(prefix):
+                return
+            yield record
+
+
+def is_compact(filepath):
+    '''
+    :returns: True if the file in `filepath` is in the compact format.
+    '''
+    with open(filepath, 'rb') as dump:
+        return dump.read(len(MAGIC)) == MAGIC
+
+
+def cached(filepath, records, cache_dir=DUMPS_CACHE_DIR, prefix=None, postfix='compact'):
+    '''
+    Returns the CompactDump of the dump in `filepath`, stored in `cache_dir`
+    as <prefix>_<postfix>, the prefix being the basename of `filepath` if
+    not given. If it is not cached yet it is written from `records`, a
+    function returning the sorted records of the dump, so that the dump is
+    only parsed and sorted once. A dump already in the compact format (e.g.
+    a replica snapshot) is used as is.
+    '''
+    prefix = os.path.basename(filepath) if prefix is None else prefix
+    name = '_'.join((prefix, postfix))
+    path = os.path.join(cache_dir, name)
+    if not os.path.exists(path):
+        if is_compact(filepath):
+            return CompactDump(filepath)
+        with dumper.temp_file(cache_dir, final_name=name) as (output, _):
+            write(output, records())
+    return CompactDump(path)
@@ -6,16 +6,21 @@
 #
 # Authors:
 # - Fernando Lopez, <felopez@cern.ch>, 2015
+from contextlib import contextmanager
 from rucio.common import dumper
 from rucio.common.dumper import error, DUMPS_CACHE_DIR
+import compact
 import data_models
 import datetime
+import functools
 import logging
 import os
 import path_parsing
 import re
+import sorting
 import subprocess
 import tempfile
+import time
 
 
 subcommands = ['consistency', 'consistency-manual']
@@ -30,13 +35,23 @@ class Consistency(data_models.DataModel):
     @classmethod
     def dump(cls, subcommand, ddm_endpoint, storage_dump, prev_date_fname=None, next_date_fname=None,
              prev_date=None, next_date=None, sort_rucio_replica_dumps=False, date=None,
-             cache_dir=DUMPS_CACHE_DIR):
+             cache_dir=DUMPS_CACHE_DIR, sort_run_size=sorting.RUN_SIZE, sort_processes=None, timings=None):
+        '''
+        Generator of the LOST and DARK files found comparing the storage
+        dump with the Rucio replica dumps.
+
+        If `timings` is a dict, the seconds spent parsing (or sorting) the
+        Rucio replica dumps, sorting the storage dump and comparing them are
+        added to it under the keys 'parse' (or 'sort'), 'sort' and 'compare'.
+        '''
         logger = logging.getLogger('auditor.consistency')
+        if timings is None:
+            timings = {}
         if subcommand == 'consistency':
             prev_date_fname = data_models.Replica.download(
-                ddm_endpoint, prev_date)
+                ddm_endpoint, prev_date, cache_dir=cache_dir)
             next_date_fname = data_models.Replica.download(
-                ddm_endpoint, next_date)
+                ddm_endpoint, next_date, cache_dir=cache_dir)
             assert prev_date_fname is not None
             assert next_date_fname is not None
         else:
@@ -48,59 +63,26 @@ class Consistency(data_models.DataModel):
         )
         prefix_components = path_parsing.components(prefix)
 
-        def parser(line):
-            '''
-            Simple parser for Rucio replica dumps.
-
-            :param line: String with one line of a dump.
-            :returns: A tuple with the path and status of the replica.
-            '''
-            fields = line.split('\t')
-            path = fields[6].strip().lstrip('/')
-            status = fields[8].strip()
-
-            return ','.join((path, status))
-
-        def strip_storage_dump(line):
-            '''
-            Parser to have consistent paths in storage dumps.
-
-            :param line: String with one line of a dump.
-            :returns: Path formated as in the Rucio Replica Dumps.
-            '''
-            relative = path_parsing.remove_prefix(
-                prefix_components,
-                path_parsing.components(line),
-            )
-            if relative[0] == 'rucio':
-                relative = relative[1:]
-            return '/'.join(relative)
-
-        if sort_rucio_replica_dumps:
-            prev_date_fname_sorted = gnu_sort(
-                parse_and_filter_file(prev_date_fname, parser=parser, cache_dir=cache_dir),
-                delimiter=',',
-                fieldspec='1',
-                cache_dir=cache_dir,
-            )
-
-            next_date_fname_sorted = gnu_sort(
-                parse_and_filter_file(next_date_fname, parser=parser, cache_dir=cache_dir),
-                delimiter=',',
-                fieldspec='1',
-                cache_dir=cache_dir,
-            )
-        else:
-            prev_date_fname_sorted = parse_and_filter_file(
-                prev_date_fname,
-                parser=parser,
-                cache_dir=cache_dir,
-            )
-            next_date_fname_sorted = parse_and_filter_file(
-                next_date_fname,
-                parser=parser,
+        # The dumps are parsed, sorted and kept in the compact format in
+        # `cache_dir`, so that each dump is parsed and sorted only once when
+        # it is compared several times. The paths are separated from the
+        # status by a tab, which sorts before any character of a path.
+        def replica_records(fname):
+            if sort_rucio_replica_dumps:
+                lines = sorting.sort_lines(fname, parser=parse_replica_line, run_size=sort_run_size, processes=sort_processes, cache_dir=cache_dir)
+            else:
+                lines = sorting.parse_lines(fname, parser=parse_replica_line)
+            return (line.split('\t', 1) for line in lines)
+
+        def storage_records():
+            paths = sorting.sort_lines(
+                storage_dump,
+                parser=StorageDumpParser(prefix_components),
+                run_size=sort_run_size,
+                processes=sort_processes,
                 cache_dir=cache_dir,
             )
+            return ((path, None) for path in paths)
 
         standard_name_re = r'(ddmendpoint_{0}_\d{{2}}-\d{{2}}-\d{{4}}_[0-9a-f]{{40}})$'.format(ddm_endpoint)
         standard_name_match = re.search(standard_name_re, storage_dump)
@@ -128,29 +110,90 @@ class Consistency(data_models.DataModel):
                 sd_prefix,
             )
 
-        storage_dump_fname_sorted = gnu_sort(
-            parse_and_filter_file(
-                storage_dump,
-                parser=strip_storage_dump,
-                prefix=sd_prefix,
-                cache_dir=cache_dir,
-            ),
-            prefix=sd_prefix,
-            cache_dir=cache_dir,
-        )
+        with timed(timings, 'sort' if sort_rucio_replica_dumps else 'parse'):
+            prev_date_replicas, next_date_replicas = (
+                compact.cached(fname, functools.partial(replica_records, fname), cache_dir=cache_dir)
+                for fname in (prev_date_fname, next_date_fname)
+            )
+        with timed(timings, 'sort'):
+            storage_paths = compact.cached(storage_dump, storage_records, cache_dir=cache_dir, prefix=sd_prefix, postfix='paths_compact')
+
+        start = time.time()
+        try:
+            compared = compare3(prev_date_replicas.lines(), storage_paths.lines(), next_date_replicas.lines(), sep='\t')
+            for path, where, status in compared:
+                prevstatus, nextstatus = status
+
+                if where[0] and not where[1] and where[2]:
+                    if prevstatus == 'A' and nextstatus == 'A':
+                        yield cls('LOST', path)
 
-        with open(prev_date_fname_sorted) as prevf:
-            with open(next_date_fname_sorted) as nextf:
-                with open(storage_dump_fname_sorted) as sdump:
-                    for path, where, status in compare3(prevf, sdump, nextf):
-                        prevstatus, nextstatus = status
+                if not where[0] and where[1] and not where[2]:
+                    yield cls('DARK', path)
+        finally:
+            for dump in (prev_date_replicas, storage_paths, next_date_replicas):
+                dump.close()
+            timings['compare'] = timings.get('compare', 0) + time.time() - start
 
-                        if where[0] and not where[1] and where[2]:
-                            if prevstatus == 'A' and nextstatus == 'A':
-                                yield cls('LOST', path)
 
-                        if not where[0] and where[1] and not where[2]:
-                            yield cls('DARK', path)
+@contextmanager
+def timed(timings, phase):
+    '''
+    Adds the seconds spent in the block to `timings[phase]`.
+    '''
+    start = time.time()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0) + time.time() - start
+
+
+def parse_replica_line(line):
+    '''
+    Simple parser for Rucio replica dumps.
+
+    :param line: String with one line of a dump.
+    :returns: The path and the status of the replica separated by a tab.
+    '''
+    fields = line.split('\t')
+    return fields[6].strip().lstrip('/') + '\t' + fields[8].strip()
+
+
+def strip_storage_dump_line(prefix_components, line):
+    '''
+    Parser to have consistent paths in storage dumps.
+
+    :param prefix_components: Components of the path of the DDM endpoint.
+    :param line: String with one line of a dump.
+    :returns: Path formated as in the Rucio Replica Dumps.
+    '''
+    relative = path_parsing.remove_prefix(
+        prefix_components,
+        path_parsing.components(line),
+    )
+    if relative[0] == 'rucio':
+        relative = relative[1:]
+    return '/'.join(relative)
+
+
+class StorageDumpParser(object):
+    '''
+    Picklable version of `strip_storage_dump_line` for a DDM endpoint. The
+    lines starting with the path of the endpoint and without empty path
+    components are stripped without splitting them in components.
+    '''
+    def __init__(self, prefix_components):
+        self.prefix_components = prefix_components
+        self.prefix = '/' + '/'.join(prefix_components) + '/'
+        self.rucio_prefix = self.prefix + 'rucio/'
+
+    def __call__(self, line):
+        line = line.strip()
+        if line.startswith(self.prefix) and '//' not in line and not line.endswith('/') and line != self.rucio_prefix[:-1]:
+            if line.startswith(self.rucio_prefix):
+                return line[len(self.rucio_prefix):]
+            return line[len(self.prefix):]
+        return strip_storage_dump_line(self.prefix_components, line)
 
 
 def _try_to_advance(it, default=None):
@@ -174,7 +217,7 @@ def split_if_not_none(value, sep=',', fields=2):
     return value.split(sep) if value is not None else ([None] * fields)
 
 
-def compare3(it0, it1, it2):
+def compare3(it0, it1, it2, sep=','):
     '''
     Generator to compare 3 sorted iterables, in each
     iteration it yields a tuple of the form (current, (bool, bool, bool))
@@ -183,6 +226,9 @@ def compare3(it0, it1, it2):
     a true value if current is contained in the it0, it1 or it2
     respectively.
 
+    The elements of it0 and it2 are made of a path and a status separated
+    by `sep`, they are split once when they are read.
+
     This function can't compare the iterators properly if None is
     a valid value.
     '''
@@ -190,51 +236,39 @@ def compare3(it0, it1, it2):
     it0 = iter(it0)
     it1 = iter(it1)
     it2 = iter(it2)
-    v0 = _try_to_advance(it0)
-    v1 = _try_to_advance(it1)
-    v2 = _try_to_advance(it2)
 
-    while v0 is not None or v1 is not None or v2 is not None:
-        path0, status0 = split_if_not_none(v0)
-        path2, status2 = split_if_not_none(v2)
+    def advance_split(it):
+        return split_if_not_none(_try_to_advance(it), sep)
+
+    path0, status0 = advance_split(it0)
+    v1 = _try_to_advance(it1)
+    path2, status2 = advance_split(it2)
 
+    while path0 is not None or v1 is not None or path2 is not None:
         vmin = min3(path0, v1, path2)
-        in0 = in1 = in2 = False
-        in0_status = in2_status = None
 
         # Detect in which iterables the value is present
         #   inN is True if the value is present on the N iterable.
-        #   sN  is the status of the path in the rucio replica
-        #       dumps (N is either 0 or 2).
-        if path0 is not None and path0 == vmin:
-            in0 = True
-            in0_status = status0
-
-        if v1 is not None and v1 == vmin:
-            in1 = True
-
-        if path2 is not None and path2 == vmin:
-            in2 = True
-            in2_status = status2
+        in0 = path0 == vmin
+        in1 = v1 == vmin
+        in2 = path2 == vmin
 
         # yield the value, in which iterables is present, and the status
         # in each rucio replica dumps (if it is present there, else None).
-        yield (vmin, (in0, in1, in2), (in0_status, in2_status))
+        yield (vmin, (in0, in1, in2), (status0 if in0 else None, status2 if in2 else None))
 
         # Discard duplicate entries (it shouldn't be duplicate entries
         # anyways) and
-        # advance the iterators, if the iterator N is depleted vN is set
-        # to None.
-        while v0 is not None and path0 == vmin:
-            v0 = _try_to_advance(it0)
-            path0, status0 = split_if_not_none(v0)
+        # advance the iterators, if the iterator N is depleted its value is
+        # set to None.
+        while in0 and path0 == vmin:
+            path0, status0 = advance_split(it0)
 
-        while v1 is not None and v1 == vmin:
+        while in1 and v1 == vmin:
             v1 = _try_to_advance(it1)
 
-        while v2 is not None and path2 == vmin:
-            v2 = _try_to_advance(it2)
-            path2, status2 = split_if_not_none(v2)
+        while in2 and path2 == vmin:
+            path2, status2 = advance_split(it2)
 
 
 def parse_and_filter_file(filepath, parser=lambda s: s, filter_=lambda s: s, prefix=None, postfix='parsed', cache_dir=DUMPS_CACHE_DIR):
@@ -0,0 +1,130 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+Snapshot of the file replicas of an RSE taken from the database, in the
+compact dump format, to be used instead of the Rucio replica dumps
+produced in HDFS.
+
+The replicas are read by pages ordered by (scope, name), each page in its
+own short read transaction. The records are sorted by path in runs of
+`RUN_RECORDS` records, each run written in the work directory of the
+snapshot together with the last (scope, name) read, so an interrupted
+snapshot resumes from the last run written. The runs are finally merged
+in the snapshot.
+
+As the pages are read at different times the snapshot is not taken at a
+single point in time, the same as the dumps produced in HDFS.
+'''
+from datetime import datetime
+from rucio.common.dumper import compact
+from rucio.common.dumper import DUMPS_CACHE_DIR
+from rucio.common.dumper import temp_file
+from rucio.core.replica import list_rse_replicas_page
+from rucio.core.rse import get_rse
+from rucio.rse.protocols.protocol import deterministic_path
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+
+PAGE_SIZE = 10000
+RUN_RECORDS = 1000000
+
+
+def snapshot_name(rse, date):
+    return re.sub(r'\W', '-', 'replicasnapshot_{0}_{1}'.format(rse, date.strftime('%d-%m-%Y')))
+
+
+def _read_state(work_dir):
+    try:
+        with open(os.path.join(work_dir, 'state')) as state:
+            return json.load(state)
+    except IOError:
+        return {'after': None, 'runs': 0}
+
+
+def _write_state(work_dir, state):
+    fd, path = tempfile.mkstemp(dir=work_dir)
+    with os.fdopen(fd, 'w') as output:
+        json.dump(state, output)
+    os.rename(path, os.path.join(work_dir, 'state'))
+
+
+def _write_run(work_dir, index, records):
+    records.sort()
+    fd, path = tempfile.mkstemp(dir=work_dir)
+    with os.fdopen(fd, 'wb') as output:
+        compact.write(output, records)
+    os.rename(path, os.path.join(work_dir, 'run_{0:05d}'.format(index)))
+
+
+def replica_snapshot(rse, date=None, cache_dir=DUMPS_CACHE_DIR, page_size=PAGE_SIZE, run_records=RUN_RECORDS):
+    '''
+    Writes the snapshot of the replicas of `rse` in `cache_dir`, the paths
+    relative to the RSE (as in the Rucio replica dumps) with the state of
+    the replicas, sorted by path. The snapshot of a given date is taken
+    only once: when it is already written it is returned as is, when it was
+    interrupted it is resumed.
+
+    :param rse: Name of the RSE.
+    :param date: Date of the snapshot, by default today.
+    :param cache_dir: Directory of the snapshot.
+    :param page_size: Number of replicas read by query.
+    :param run_records: Number of records sorted in memory.
+    :returns: The path of the snapshot.
+    '''
+    logger = logging.getLogger('dumper.snapshot')
+    if date is None:
+        date = datetime.utcnow()
+    name = snapshot_name(rse, date)
+    path = os.path.join(cache_dir, name)
+    if os.path.exists(path):
+        logger.debug('Taking the replica snapshot %s for %s from cache', path, rse)
+        return path
+
+    rse_info = get_rse(rse)
+    work_dir = os.path.join(cache_dir, name + '.work')
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    state = _read_state(work_dir)
+    if state['runs']:
+        logger.info('Resuming the replica snapshot of %s after %d runs', rse, state['runs'])
+
+    after = tuple(state['after']) if state['after'] is not None else None
+    records = []
+    while True:
+        page = list_rse_replicas_page(rse_info.id, after=after, limit=page_size)
+        for scope, lfn, replica_path, replica_state in page:
+            if replica_path is None and rse_info.deterministic:
+                replica_path = deterministic_path(scope, lfn)
+            if replica_path is None:
+                logger.warning('Missing path of replica %s:%s on non-deterministic RSE %s', scope, lfn, rse)
+                continue
+            records.append((replica_path.strip().lstrip('/'), replica_state.value))
+        if page:
+            after = page[-1][0:2]
+        if len(records) >= run_records or (len(page) < page_size and records):
+            _write_run(work_dir, state['runs'], records)
+            records = []
+            state = {'after': after, 'runs': state['runs'] + 1}
+            _write_state(work_dir, state)
+        if len(page) < page_size:
+            break
+
+    runs = [compact.CompactDump(os.path.join(work_dir, 'run_{0:05d}'.format(index))) for index in xrange(state['runs'])]
+    try:
+        with temp_file(cache_dir, final_name=name) as (output, _):
+            count = compact.write(output, heapq.merge(*runs))
+    finally:
+        for run in runs:
+            run.close()
+    shutil.rmtree(work_dir)
+    logger.info('Replica snapshot of %s written in %s: %d replicas', rse, path, count)
+    return path
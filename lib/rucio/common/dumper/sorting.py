@@ -0,0 +1,168 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+from collections import deque
+from itertools import chain
+from rucio.common import dumper
+from rucio.common.dumper import DUMPS_CACHE_DIR
+import heapq
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+# Bytes of the dump parsed and sorted in memory by each process. The memory
+# used while sorting is a few times `RUN_SIZE` per process.
+RUN_SIZE = 64 * 1024 * 1024  # 64MiB
+# Bytes read and parsed at once when the lines are only parsed.
+BLOCK_SIZE = dumper.CHUNK_SIZE
+# Buffer size of each sorted run read during the merge.
+MERGE_BUFFER = 1024 * 1024  # 1MiB
+
+
+def _read_blocks(input_, size):
+    '''
+    Yields blocks of about `size` bytes of `input_`, ending at the end of a line.
+    '''
+    while True:
+        block = input_.read(size)
+        if not block:
+            return
+        if not block.endswith('\n'):
+            block += input_.readline()
+        yield block
+
+
+def _parse_block(block, parser, filter_):
+    '''
+    Splits `block` in lines (without the trailing newline) and returns the
+    list of the lines for which `filter_` returns True, parsed with `parser`.
+    '''
+    lines = block.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    if filter_ is not None:
+        lines = [line for line in lines if filter_(line)]
+    if parser is not None:
+        lines = map(parser, lines)
+    return lines
+
+
+def parse_lines(filepath, parser=None, filter_=None, block_size=BLOCK_SIZE):
+    '''
+    Generator of the lines of the dump in `filepath` (plain text, gzip or
+    bzip2), without the trailing newline, for which the `filter_` function
+    returns True, parsed with the `parser` function.
+
+    The dump is read and parsed in blocks of `block_size` bytes, no
+    intermediate file is written.
+    '''
+    input_ = dumper.smart_open(filepath)
+    try:
+        for block in _read_blocks(input_, block_size):
+            for line in _parse_block(block, parser, filter_):
+                yield line
+    finally:
+        input_.close()
+
+
+def _sort_run(args):
+    '''
+    Parses, filters and sorts a block and writes it as a run in `directory`.
+    Run in the worker processes.
+    '''
+    block, parser, filter_, directory = args
+    lines = _parse_block(block, parser, filter_)
+    del block
+    lines.sort()
+    fd, path = tempfile.mkstemp(dir=directory, prefix='run_')
+    with os.fdopen(fd, 'wb') as run:
+        for line in lines:
+            run.write(line)
+            run.write('\n')
+    return path
+
+
+def _read_run(path):
+    with open(path, 'rb', MERGE_BUFFER) as run:
+        for line in run:
+            yield line[:-1]
+
+
+def _sort_runs(blocks, parser, filter_, directory, processes):
+    '''
+    Sorts the blocks as runs with `processes` processes, at most `processes`
+    blocks waiting to be sorted. Returns the paths of the runs.
+    '''
+    if processes <= 1:
+        return [_sort_run((block, parser, filter_, directory)) for block in blocks]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        runs, pending = [], deque()
+        for block in blocks:
+            if len(pending) >= processes:
+                runs.append(pending.popleft().get())
+            pending.append(pool.apply_async(_sort_run, ((block, parser, filter_, directory),)))
+        runs.extend(result.get() for result in pending)
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+    return runs
+
+
+def sort_lines(filepath, parser=None, filter_=None, run_size=RUN_SIZE, processes=None, cache_dir=DUMPS_CACHE_DIR):
+    '''
+    Generator of the lines of the dump in `filepath`, parsed and filtered as
+    in `parse_lines`, sorted by byte value (as GNU sort with LC_ALL=C).
+
+    The dump is split in runs of `run_size` bytes which are parsed and sorted
+    in parallel by `processes` processes (by default one per core) and
+    written in a temporary directory in `cache_dir`. The runs are then
+    merged while the lines are consumed, the directory is removed when the
+    generator is exhausted or closed. A dump smaller than `run_size` is
+    sorted in memory.
+
+    When more than one process is used `parser` and `filter_` must be
+    picklable (e.g. functions defined at module level or
+    `functools.partial` of them).
+    '''
+    logger = logging.getLogger('dumper.sorting')
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if multiprocessing.current_process().daemon:
+        # Daemonic processes are not allowed to have children
+        processes = 1
+
+    input_ = dumper.smart_open(filepath)
+    try:
+        blocks = _read_blocks(input_, run_size)
+        first = next(blocks, '')
+        second = next(blocks, None)
+        if second is None:
+            lines = _parse_block(first, parser, filter_)
+            lines.sort()
+            for line in lines:
+                yield line
+            return
+
+        directory = tempfile.mkdtemp(dir=cache_dir, prefix='sort_')
+        try:
+            runs = _sort_runs(chain((first, second), blocks), parser, filter_, directory, processes)
+            del first, second
+            input_.close()
+            logger.debug('Merging %d sorted runs of "%s"', len(runs), filepath)
+            for line in heapq.merge(*[_read_run(run) for run in runs]):
+                yield line
+        finally:
+            shutil.rmtree(directory)
+    finally:
+        input_.close()
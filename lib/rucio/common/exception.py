@@ -75,6 +75,17 @@ class AccountNotFound(RucioException):
         self._message = "Account does not exist."
 
 
+class BulkOperationFailure(RucioException):
+    """
+    BulkOperationFailure
+    """
+    def __init__(self, *args, **kwargs):
+        super(BulkOperationFailure, self).__init__(args, kwargs)
+        self._message = "Some chunks of the bulk operation failed."
+        self.results = []
+        self.failures = []
+
+
 class CannotAuthenticate(RucioException):
     """
     CannotAuthenticate
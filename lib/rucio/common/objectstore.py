@@ -16,14 +16,23 @@ methods of objectstore
 import boto
 import boto.s3.connection
 import logging
+import os
+import Queue
+import sys
+import threading
 import traceback
 import urlparse
 
+from ConfigParser import NoOptionError, NoSectionError
+from cStringIO import StringIO
+
+from boto.s3.key import Key
 from dogpile.cache import make_region
 from dogpile.cache.api import NoValue
 
 from rucio.common import config
 from rucio.common import exception
+from rucio.common import utils
 
 logging.getLogger("boto").setLevel(logging.WARNING)
 logging.getLogger("boto.s3.connection").setLevel(logging.WARNING)
@@ -36,6 +45,19 @@ REGION = make_region().configure('dogpile.cache.memcached',
 REGION = make_region().configure('dogpile.cache.memory',
                                  expiration_time=3600)
 
+# Objects from this size on are uploaded and downloaded by parts, in parallel
+MULTIPART_THRESHOLD = 64 * 1024 * 1024
+
+# Size of the parts, S3 requires at least 5MB for all of them except the last one
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+MULTIPART_MIN_CHUNKSIZE = 5 * 1024 * 1024
+
+# Number of parts transferred in parallel
+MULTIPART_THREADS = 4
+
+# Maximum number of keys deleted with one multi-object delete request, as allowed by S3
+DELETE_BATCH_SIZE = 1000
+
 
 def _get_credentials(rse, endpoint):
     """
@@ -257,33 +279,66 @@ def get_metadata(urls, rse):
     return result
 
 
-def _delete_keys(bucket, keys):
+def delete_keys(bucket, keys, batch_size=DELETE_BATCH_SIZE):
     """
-    Delete objects in the same bucket.
+    Delete objects in the same bucket, with one multi-object delete request per batch of keys.
 
     :param bucket:        Bucket object.
-    :param keys:          List of keys.
+    :param keys:          List of key names.
+    :param batch_size:    Number of keys per request.
     :returns:             Dictonary of {'status': status, 'output': output}.
     """
     result = {}
-    status = -1
-    output = None
-    try:
-        deleted_result = bucket.delete_keys(keys)
-        for deleted in deleted_result.deleted:
-            result[deleted.key] = {'status': 0, 'output': None}
-        for error in deleted_result.errors:
-            result[error.key] = {'status': -1, 'output': error.message}
-    except:
+    keys = list(keys)
+    for i in xrange(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
         status = -1
-        output = "Failed to delete keys, error: %s" % (traceback.format_exc())
+        output = None
+        try:
+            deleted_result = bucket.delete_keys(batch, quiet=True)
+            for deleted in deleted_result.deleted:
+                result[deleted.key] = {'status': 0, 'output': None}
+            for error in deleted_result.errors:
+                result[error.key] = {'status': -1, 'output': error.message}
+            # In quiet mode the response only lists the errors
+            status = 0
+        except:
+            output = "Failed to delete keys, error: %s" % (traceback.format_exc())
 
-    for key in keys:
-        if key not in result:
-            result[key] = {'status': status, 'output': output}
+        for key in batch:
+            if key not in result:
+                result[key] = {'status': status, 'output': output}
     return result
 
 
+def existing_keys(bucket, keys, threads=MULTIPART_THREADS):
+    """
+    Find the objects which exist among keys of the same bucket, with HEAD requests sent in parallel.
+
+    :param bucket:        Bucket object.
+    :param keys:          List of key names.
+    :param threads:       Number of threads.
+    :returns:             Set of the names of the existing keys.
+    """
+    existing = set()
+    names = Queue.Queue()
+
+    def head(name):
+        if bucket.get_key(name) is not None:
+            existing.add(name)
+
+    workers, errors = _run_parallel(head, names, threads)
+    for name in keys:
+        names.put(name)
+    for _ in workers:
+        names.put(None)
+    for thread in workers:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return existing
+
+
 def delete(urls, rse):
     """
     Delete objects.
@@ -308,11 +363,11 @@ def delete(urls, rse):
         try:
             endpoint, bucket_name = bucket_key.split('+')
             bucket = _get_bucket(rse, endpoint, bucket_name)
-            ret = _delete_keys(bucket, bucket_keys[bucket_key].keys())
+            ret = delete_keys(bucket, bucket_keys[bucket_key].keys())
             for key in ret:
                 result[bucket_keys[bucket_key][key]] = ret[key]
         except:
-            ret = {'status': -1, 'output': "Failed to delete url: %s, error: %s" % (url, traceback.format_exc())}
+            ret = {'status': -1, 'output': "Failed to delete bucket: %s, error: %s" % (bucket_key, traceback.format_exc())}
             for key in bucket_keys[bucket_key].keys():
                 url = bucket_keys[bucket_key][key]
                 if url not in result:
@@ -332,20 +387,17 @@ def delete_dir(url_prefix, rse):
     try:
         endpoint, bucket_name, key_name = _get_endpoint_bucket_key(url_prefix)
         bucket = _get_bucket(rse, endpoint, bucket_name)
-        i = 0
         keys = []
         for key in bucket.list(prefix=key_name):
             keys.append(key.name)
-            i += 1
-            if i == 1000:
-                ret = _delete_keys(bucket, keys)
+            if len(keys) == DELETE_BATCH_SIZE:
+                ret = delete_keys(bucket, keys)
                 for ret_key in ret:
                     if ret[ret_key]['status'] != 0:
                         return ret[ret_key]['status'], ret[ret_key]['output']
-                i = 0
                 keys = []
         if len(keys):
-            ret = _delete_keys(bucket, keys)
+            ret = delete_keys(bucket, keys)
             for ret_key in ret:
                 if ret[ret_key]['status'] != 0:
                     return ret[ret_key]['status'], ret[ret_key]['output']
@@ -384,3 +436,197 @@ def rename(url, new_url, rse):
         raise e
     except:
         raise exception.RucioException("Failed to get metadata for %s, error: %s" % (endpoint, traceback.format_exc()))
+
+
+def get_transfer_settings(attributes=None):
+    """
+    Return the multipart transfer settings of an RSE protocol, from the multipart_threshold,
+    multipart_chunksize and multipart_threads extended attributes of the protocol, else from
+    the same options of the [s3] section of the configuration.
+
+    :param attributes:    Dictionary of protocol attributes.
+    :returns:             Dictionary of {'threshold': bytes, 'chunksize': bytes, 'threads': threads}.
+    """
+    extended_attributes = (attributes or {}).get('extended_attributes') or {}
+    settings = {}
+    for name, default in (('threshold', MULTIPART_THRESHOLD), ('chunksize', MULTIPART_CHUNKSIZE), ('threads', MULTIPART_THREADS)):
+        value = extended_attributes.get('multipart_%s' % name)
+        if value is None:
+            try:
+                value = config.config_get('s3', 'multipart_%s' % name)
+            except (NoOptionError, NoSectionError):
+                value = default
+        settings[name] = int(value)
+    settings['chunksize'] = max(settings['chunksize'], MULTIPART_MIN_CHUNKSIZE)
+    settings['threads'] = max(settings['threads'], 1)
+    return settings
+
+
+class ChecksumFile(object):
+    """
+    Wraps a file object to update a StreamingChecksum with the data read from or written to it.
+    Seeking back to the start of the file restarts the checksum, as boto does before retrying.
+    """
+
+    def __init__(self, fp, checksum):
+        self._fp = fp
+        self._checksum = checksum
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        self._checksum.update(data)
+        return data
+
+    def write(self, data):
+        self._checksum.update(data)
+        self._fp.write(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._fp.seek(offset, whence)
+        if self._fp.tell() == 0:
+            self._checksum.reset()
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+
+def _run_parallel(function, items, threads):
+    """
+    Call a function on each item of a queue with several threads, stopping at the first error.
+
+    :param function:      Function called with an item.
+    :param items:         Queue of items, None marking the end of the work for one thread.
+    :param threads:       Number of threads.
+    :returns:             Tuple of the list of threads, to be joined once the items are queued, and of the list of errors filled in by the threads.
+    """
+    errors = []
+
+    def worker():
+        while True:
+            item = items.get()
+            if item is None:
+                return
+            if errors:
+                continue  # Drain the queue
+            try:
+                function(item)
+            except Exception, error:
+                errors.append(error)
+
+    workers = [threading.Thread(target=worker) for _ in xrange(threads)]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+    return workers, errors
+
+
+def upload_file(bucket, key_name, filename, settings=None, checksum=None):
+    """
+    Upload a file, by parts in parallel if it is larger than the multipart threshold.
+
+    The file is read once, in order: the parts are queued to the threads and the checksum is
+    updated on the fly. At most twice as many parts as threads are kept in memory.
+
+    :param bucket:        Bucket object.
+    :param key_name:      Key name.
+    :param filename:      Path of the local file.
+    :param settings:      Dictionary of transfer settings, as returned by get_transfer_settings.
+    :param checksum:      StreamingChecksum updated with the data sent, or None.
+    """
+    settings = settings or get_transfer_settings()
+    with open(filename, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size < settings['threshold']:
+            Key(bucket, key_name).set_contents_from_file(ChecksumFile(fp, checksum) if checksum is not None else fp)
+            return
+
+        if checksum is not None:
+            checksum.reset()
+        upload = bucket.initiate_multipart_upload(key_name)
+        parts = Queue.Queue(maxsize=settings['threads'])
+        etags = {}
+
+        def upload_part((number, data)):
+            etags[number] = upload.upload_part_from_file(StringIO(data), number).etag
+
+        try:
+            workers, errors = _run_parallel(upload_part, parts, settings['threads'])
+            try:
+                number = 0
+                while not errors:
+                    data = fp.read(settings['chunksize'])
+                    if not data:
+                        break
+                    if checksum is not None:
+                        checksum.update(data)
+                    number += 1
+                    parts.put((number, data))
+            finally:
+                for _ in workers:
+                    parts.put(None)
+                for thread in workers:
+                    thread.join()
+
+            if errors:
+                raise errors[0]
+            # The parts are listed from their ETags rather than with a ListParts request, as upload.complete_upload does
+            xml = ''.join('<Part><PartNumber>%i</PartNumber><ETag>%s</ETag></Part>' % (number, etags[number]) for number in sorted(etags))
+            bucket.complete_multipart_upload(key_name, upload.id, '<CompleteMultipartUpload>%s</CompleteMultipartUpload>' % xml)
+        except:
+            # The parts already uploaded are kept, and billed, until the upload is aborted
+            exc_info = sys.exc_info()
+            try:
+                upload.cancel_upload()
+            except:
+                logging.warning('Failed to abort the multipart upload of %s: %s' % (key_name, traceback.format_exc()))
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+
+def download_file(key, filename, settings=None, checksum=None):
+    """
+    Download an object, by ranges in parallel if it is larger than the multipart threshold.
+
+    The ranges are written in place into the preallocated file. Their Adler-32 checksums are
+    computed on the fly and combined, so a checksum computing MD5 cannot be used for them.
+
+    :param key:           Key object, with its size.
+    :param filename:      Path of the local file.
+    :param settings:      Dictionary of transfer settings, as returned by get_transfer_settings.
+    :param checksum:      StreamingChecksum updated with the data received, or None.
+    """
+    settings = settings or get_transfer_settings()
+    size = int(key.size)
+    if size < settings['threshold']:
+        with open(filename, 'wb') as fp:
+            key.get_contents_to_file(ChecksumFile(fp, checksum) if checksum is not None else fp)
+        return
+
+    with open(filename, 'wb') as fp:
+        fp.truncate(size)
+    ranges = [(start, min(start + settings['chunksize'], size) - 1) for start in xrange(0, size, settings['chunksize'])]
+    checksums = {}
+
+    def download_range((start, end)):
+        part_checksum = utils.StreamingChecksum(md5=False) if checksum is not None else None
+        with open(filename, 'r+b') as fp:
+            fp.seek(start)
+            Key(key.bucket, key.name).get_contents_to_file(ChecksumFile(fp, part_checksum) if part_checksum is not None else fp,
+                                                           headers={'Range': 'bytes=%i-%i' % (start, end)})
+            if fp.tell() != end + 1:
+                raise exception.RucioException('Incomplete range %i-%i of %s, received %i bytes' % (start, end, key.name, fp.tell() - start))
+        checksums[start] = part_checksum
+
+    items = Queue.Queue()
+    workers, errors = _run_parallel(download_range, items, settings['threads'])
+    for item in ranges:
+        items.put(item)
+    for _ in workers:
+        items.put(None)
+    for thread in workers:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    if checksum is not None:
+        checksum.reset()
+        for start, end in ranges:
+            checksum.combine(int(checksums[start].adler32, 16), end + 1 - start)
@@ -20,6 +20,7 @@ import socket
 import time
 
 from math import asin, cos, radians, sin, sqrt
+from operator import itemgetter
 
 from dogpile.cache import make_region
 
@@ -27,6 +28,8 @@ import requests
 import pygeoip
 import geoip2.database
 
+from geoip2.errors import AddressNotFoundError
+
 from rucio.common import utils
 from rucio.common.exception import InvalidRSEExpression
 from rucio.core.rse_expression_parser import parse_expression
@@ -96,26 +99,39 @@ def get_lat_long(se, gi, gi2):
             return None, None
 
 
-@REGION.cache_on_arguments(namespace='site_distance')
-def getDistance(se1, se2):
+@REGION.cache_on_arguments(namespace='geoip_readers')
+def get_geoip_readers():
     """
-    Get the distance between 2 host using the GeoLite DB
-    :param se1 : A first hostname or IP.
-    :param se2 : A second hostname or IP.
+    Get the readers of the GeoLite DBs, downloading them if needed.
     """
     directory = '/tmp'
     filename = 'GeoLiteCity.dat'
     getGeoIPDB(directory, filename)
 
-    directory = '/tmp'
     ipv6_filename = 'GeoLite2-City.mmdb'
     getGeoIPDB(directory, ipv6_filename)
 
-    gi = pygeoip.GeoIP('%s/%s' % (directory, filename))
-    gi2 = geoip2.database.Reader('%s/%s' % (directory, ipv6_filename))
+    return pygeoip.GeoIP('%s/%s' % (directory, filename)), geoip2.database.Reader('%s/%s' % (directory, ipv6_filename))
 
-    lat1, long1 = get_lat_long(se1, gi, gi2)
-    lat2, long2 = get_lat_long(se2, gi, gi2)
+
+@REGION.cache_on_arguments(namespace='site_location')
+def get_location(se):
+    """
+    Get the latitude and longitude of one host using the GeoLite DB
+    :param se : A hostname or IP.
+    """
+    gi, gi2 = get_geoip_readers()
+    return get_lat_long(se, gi, gi2)
+
+
+def distance(location1, location2):
+    """
+    Get the distance between 2 locations
+    :param location1 : The latitude and longitude of the first location.
+    :param location2 : The latitude and longitude of the second location.
+    """
+    lat1, long1 = location1
+    lat2, long2 = location2
 
     if lat1 and lat2:
         long1, lat1, long2, lat2 = map(radians, [long1, lat1, long2, lat2])
@@ -129,6 +145,16 @@ def getDistance(se1, se2):
         return 360000
 
 
+@REGION.cache_on_arguments(namespace='site_distance')
+def getDistance(se1, se2):
+    """
+    Get the distance between 2 host using the GeoLite DB
+    :param se1 : A first hostname or IP.
+    :param se2 : A second hostname or IP.
+    """
+    return distance(get_location(se1), get_location(se2))
+
+
 def random_order(replicas, IPclient):
     """
     Return a list of replicas in a random order.
@@ -156,6 +182,51 @@ def geoIP_order(replicas, IPclient):
     return map(lambda x: x[0], sorted(distances.items(), key=lambda x: x[1]))
 
 
+def geoIP_sorter(IPclient):
+    """
+    Return a function sorting replicas as geoIP_order, for all the files of a request:
+    the location of the IPclient is resolved once, and the distance of each host computed once.
+    :param IPclient: The IP of the client.
+    """
+    client, hosts = [], {}
+
+    def order(replicas):
+        if not client:
+            client.append(get_location(IPclient))
+        distances = {}
+        for replica in replicas:
+            se = replica.split('/')[2].split(':')[0]
+            if se not in hosts:
+                hosts[se] = distance(get_location(se), client[0])
+            distances[replica] = hosts[se]
+        return [replica for replica, _ in sorted(distances.items(), key=itemgetter(1))]
+    return order
+
+
+def replica_sorter(select, IPclient, ignore_unknown_client=False):
+    """
+    Return a function sorting the replicas of the files of a request, as geoIP_order if select
+    is geoip, otherwise as random_order. The function takes the replicas in their listing order
+    and a dict with replicas as keys and RSEs as values.
+    :param select: The sorting algorithm, geoip or None.
+    :param IPclient: The IP of the client.
+    :param ignore_unknown_client: If True, the replicas keep their listing order when the IPclient is not in the GeoLite DB.
+    """
+    if select != 'geoip':
+        return lambda replicas, dictreplica: random_order(dictreplica, IPclient)
+
+    geo_order = geoIP_sorter(IPclient)
+
+    def order(replicas, dictreplica):
+        try:
+            return geo_order(dictreplica)
+        except AddressNotFoundError:
+            if not ignore_unknown_client:
+                raise
+            return replicas
+    return order
+
+
 def site_selector(replicas, site):
     """
     Return a list of replicas located on one site.
@@ -15,7 +15,9 @@ Rucio utilities.
 
 import datetime
 import errno
+import hashlib
 import json
+import mmap
 import os
 import pwd
 import re
@@ -27,6 +29,7 @@ from getpass import getuser
 from itertools import izip_longest
 from logging import getLogger, Formatter
 from logging.handlers import RotatingFileHandler
+from operator import attrgetter
 from urllib import urlencode, quote
 from uuid import uuid4 as uuid
 
@@ -104,28 +107,152 @@ def clean_headers(msg):
     return msg
 
 
+# Size of the blocks read to compute the checksums of a file
+CHECKSUM_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def checksum_file(file, adler32=True, md5=True, block_size=CHECKSUM_BLOCK_SIZE, use_mmap=False):
+    """
+    Computes the Adler-32 and MD5 checksums and the size of a file in a single pass,
+    reading it by blocks of fixed size or through a memory map.
+
+    :param file: The path of the file.
+    :param adler32: Compute the Adler-32 checksum.
+    :param md5: Compute the MD5 checksum.
+    :param block_size: The size of the blocks.
+    :param use_mmap: Map the file in memory instead of reading it.
+
+    :returns: Dictionary {adler32, md5, bytes}, the checksums being hexified strings or None if not computed.
+    """
+    checksum = StreamingChecksum(adler32=adler32, md5=md5)
+    with open(file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and size:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(0, size, block_size):
+                    checksum.update(buffer(mapped, offset, block_size))
+            finally:
+                mapped.close()
+        else:
+            for block in iter(lambda: f.read(block_size), ''):
+                checksum.update(block)
+    return {'adler32': checksum.adler32, 'md5': checksum.md5, 'bytes': checksum.bytes}
+
+
 def adler32(file):
     """
     An Adler-32 checksum is obtained by calculating two 16-bit checksums A and B and concatenating their bits into a 32-bit integer. A is the sum of all bytes in the stream plus one, and B is the sum of the individual values of A from each step.
 
     :returns: Hexified string, padded to 8 values.
     """
-
-    # adler starting value is _not_ 0
-    adler = 1L
-
     try:
-        openFile = open(file, 'rb')
-        for line in openFile:
-            adler = zlib.adler32(line, adler)
+        return checksum_file(file, md5=False)['adler32']
     except:
         raise Exception('FATAL - could not get checksum of file %s' % file)
 
-    # backflip on 32bit
-    if adler < 0:
-        adler = adler + 2 ** 32
 
-    return str('%08x' % adler)
+def md5(file):
+    """
+    Runs the MD5 algorithm (RFC-1321) on the binary content of the file named file and returns the hexadecimal digest
+
+    :param file: file name
+    :returns: string of 32 hexadecimal digits
+    """
+    try:
+        return checksum_file(file, adler32=False)['md5']
+    except:
+        raise Exception('FATAL - could not get MD5 checksum of file %s' % file)
+
+
+# Modulo of the Adler-32 sums
+ADLER32_BASE = 65521
+
+
+def adler32_combine(adler1, adler2, length2):
+    """
+    Combines the Adler-32 checksums of two consecutive blocks of data, like zlib adler32_combine.
+
+    :param adler1: The Adler-32 checksum of the first block, as an integer.
+    :param adler2: The Adler-32 checksum of the second block, as an integer.
+    :param length2: The length of the second block.
+
+    :returns: The Adler-32 checksum of the concatenation of the blocks, as an integer.
+    """
+    adler1, adler2 = adler1 & 0xffffffff, adler2 & 0xffffffff
+    remainder = length2 % ADLER32_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % ADLER32_BASE
+    sum1 += (adler2 & 0xffff) + ADLER32_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + ADLER32_BASE - remainder
+    sum1 %= ADLER32_BASE
+    sum2 %= ADLER32_BASE
+    return sum1 | (sum2 << 16)
+
+
+class StreamingChecksum(object):
+    """
+    Computes the Adler-32 and MD5 checksums of a stream of data, block after block,
+    e.g. while the data is written to or read from the network.
+    """
+
+    def __init__(self, adler32=True, md5=True):
+        """
+        :param adler32: Compute the Adler-32 checksum.
+        :param md5: Compute the MD5 checksum.
+        """
+        self._with_adler32, self._with_md5 = adler32, md5
+        self.reset()
+
+    def reset(self):
+        """
+        Restarts the checksums from an empty stream, e.g. when a transfer is retried.
+        """
+        self._adler32 = 1L if self._with_adler32 else None
+        self._md5 = hashlib.md5() if self._with_md5 else None
+        self.bytes = 0
+
+    def update(self, data):
+        """
+        Adds a block of data to the checksums.
+
+        :param data: The block of data.
+        """
+        if self._adler32 is not None:
+            self._adler32 = zlib.adler32(data, self._adler32)
+        if self._md5 is not None:
+            self._md5.update(data)
+        self.bytes += len(data)
+
+    def combine(self, adler32, length):
+        """
+        Adds a block of data known by its Adler-32 checksum only, e.g. a part downloaded separately.
+
+        :param adler32: The Adler-32 checksum of the block, as an integer.
+        :param length: The length of the block.
+        """
+        if self._md5 is not None:
+            raise ValueError('MD5 checksums cannot be combined')
+        self._adler32 = adler32_combine(self._adler32, adler32, length)
+        self.bytes += length
+
+    @property
+    def adler32(self):
+        """
+        The Adler-32 checksum as a hexified string padded to 8 values, None if not computed.
+        """
+        if self._adler32 is None:
+            return None
+        return str('%08x' % (self._adler32 & 0xffffffff))
+
+    @property
+    def md5(self):
+        """
+        The MD5 checksum as a hexified string, None if not computed.
+        """
+        if self._md5 is None:
+            return None
+        return self._md5.hexdigest()
 
 
 def str_to_date(string):
@@ -136,12 +263,28 @@ def str_to_date(string):
     return datetime.datetime.strptime(string, DATE_FORMAT) if string else None
 
 
+# RFC-1123 prefix (day of the week and date) of the days already formatted, by ordinal
+DATE_PREFIXES = {}
+
+
 def date_to_str(date):
     """ Converts a datetime value to the corresponding RFC-1123 string.
 
+    Only the time is formatted for each value, the date part is formatted
+    once per day.
+
     :param date: the datetime value to convert.
     """
-    return datetime.datetime.strftime(date, DATE_FORMAT) if date else None
+    if not date:
+        return None
+    ordinal = date.toordinal()
+    try:
+        prefix = DATE_PREFIXES[ordinal]
+    except KeyError:
+        if len(DATE_PREFIXES) > 100000:
+            DATE_PREFIXES.clear()
+        prefix = DATE_PREFIXES[ordinal] = datetime.datetime.strftime(date, '%a, %d %b %Y ')
+    return '%s%02d:%02d:%02d UTC' % (prefix, date.hour, date.minute, date.second)
 
 
 class APIEncoder(json.JSONEncoder):
@@ -163,6 +306,55 @@ class APIEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+class RowEncoder(object):
+    """ JSON encoder of the rows of a listing, which all have the same shape.
+
+    The keys whose values are not JSON types (dates, enums...) are found on
+    the first row, and their values are converted in Python before encoding
+    each row with the C encoder. Values of other keys or types (e.g. a date
+    which was None in the first row) go through APIEncoder.default as before.
+    """
+    JSON_TYPES = (basestring, int, long, float, bool, type(None), list, tuple, dict)
+
+    def __init__(self):
+        self.encoder = APIEncoder(check_circular=False)
+        self.converters = None
+
+    def learn(self, row):
+        """ Finds the converters of the values of the row which are not JSON types.
+
+        :param row: the first row of the listing.
+        """
+        self.converters = []
+        for key, value in row.iteritems():
+            if not isinstance(value, self.JSON_TYPES):
+                if isinstance(value, datetime.datetime):
+                    convert = date_to_str
+                elif isinstance(value, EnumSymbol):
+                    convert = attrgetter('description')
+                else:
+                    convert = self.encoder.default
+                self.converters.append((key, type(value), convert))
+
+    def encode(self, row):
+        """ Encodes a row.
+
+        :param row: the row, a dictionary or any object supported by APIEncoder.
+        :returns: the JSON string of the row.
+        """
+        if not isinstance(row, dict):
+            return self.encoder.encode(row)
+        if self.converters is None:
+            self.learn(row)
+        if self.converters:
+            row = row.copy()
+            for key, value_type, convert in self.converters:
+                value = row.get(key)
+                if type(value) is value_type:
+                    row[key] = convert(value)
+        return self.encoder.encode(row)
+
+
 def render_json(**data):
     """ JSON render function
     """
@@ -179,7 +371,7 @@ def datetime_parser(dct):
     """ datetime parser
     """
     for k, v in dct.items():
-        if isinstance(v, basestring) and re.search(" UTC", v):
+        if isinstance(v, basestring) and " UTC" in v:
             try:
                 dct[k] = datetime.datetime.strptime(v, DATE_FORMAT)
             except:
@@ -187,10 +379,14 @@ def datetime_parser(dct):
     return dct
 
 
+# Created once, json.loads creates a decoder per call when given an object_hook
+JSON_DECODER = json.JSONDecoder(object_hook=datetime_parser)
+
+
 def parse_response(data):
     """ JSON render function
     """
-    return json.loads(data, object_hook=datetime_parser)
+    return JSON_DECODER.decode(data)
 
 
 def generate_http_error(status_code, exc_cls, exc_msg):
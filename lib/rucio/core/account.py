@@ -14,21 +14,49 @@
 # - Cedric Serfon, <cedric.serfon@cern.ch>, 2014-2015
 # - Joaquin Bogado, <joaquin.bogado@cern.ch>, 2015
 
+from ConfigParser import NoOptionError, NoSectionError
 from datetime import datetime
 from re import match
 from traceback import format_exc
 
+from dogpile.cache import make_region
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import exc
+from sqlalchemy.orm import Session, exc
 
 import rucio.core.account_counter
 
 from rucio.common import exception
+from rucio.common.config import config_get_int
 from rucio.db.sqla import models
 from rucio.db.sqla.constants import AccountStatus, AccountType
 from rucio.db.sqla.enum import EnumSymbol
 from rucio.db.sqla.session import read_session, transactional_session, stream_session
 
+try:
+    PERMISSION_CONTEXT_TTL = config_get_int('permission', 'context_ttl')
+except (NoOptionError, NoSectionError):
+    PERMISSION_CONTEXT_TTL = 10
+
+# Permission contexts of the issuers (see rucio.core.permission.context), kept
+# in the memory of the process. A process drops the context of an account once
+# it commits a change of its status or attributes, the other processes see the change
+# after at most PERMISSION_CONTEXT_TTL seconds.
+PERMISSION_CONTEXT_REGION = make_region().configure('dogpile.cache.memory',
+                                                    expiration_time=PERMISSION_CONTEXT_TTL)
+
+
+@event.listens_for(Session, 'after_commit')
+def __drop_permission_contexts(session):
+    """
+    Drops the permission contexts of the accounts whose status or attributes were changed by the committed transaction,
+    so that they are not reloaded from the state before the commit.
+
+    :param session: The committed session.
+    """
+    for account in session.info.pop('permission_contexts', ()):
+        PERMISSION_CONTEXT_REGION.delete(account)
+
 
 @transactional_session
 def add_account(account, type, email, session=None):
@@ -96,6 +124,7 @@ def del_account(account, session=None):
         raise exception.AccountNotFound('Account with ID \'%s\' cannot be found' % account)
 
     account.update({'status': AccountStatus.DELETED, 'deleted_at': datetime.utcnow()})
+    session.info.setdefault('permission_contexts', set()).add(account.account)
 
 
 @read_session
@@ -132,6 +161,7 @@ def set_account_status(account, status, session=None):
         query.update({'status': status, 'suspended_at': datetime.utcnow()})
     elif status == AccountStatus.ACTIVE:
         query.update({'status': status, 'suspended_at': None})
+    session.info.setdefault('permission_contexts', set()).add(account.account)
 
 
 @stream_session
@@ -252,6 +282,7 @@ def add_account_attribute(account, key, value, session=None):
             raise exception.Duplicate('Key {0} already exist for account {1}!'.format(key, account))
     except:
         raise exception.RucioException(str(format_exc()))
+    session.info.setdefault('permission_contexts', set()).add(account)
 
 
 @transactional_session
@@ -267,3 +298,4 @@ def del_account_attribute(account, key, session=None):
     if aid is None:
         raise exception.AccountNotFound('Attribute ({0}) does not exist for the account {0}!'.format(key, account))
     aid.delete(session=session)
+    session.info.setdefault('permission_contexts', set()).add(account)
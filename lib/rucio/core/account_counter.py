@@ -16,6 +16,7 @@ from sqlalchemy.sql.expression import bindparam, text
 import rucio.core.account
 import rucio.core.rse
 
+from rucio.core.heartbeat import get_partition_clause
 from rucio.db.sqla import models
 from rucio.db.sqla.session import read_session, transactional_session
 
@@ -123,19 +124,24 @@ def get_counter(rse_id, account, session=None):
 
 
 @read_session
-def get_updated_account_counters(total_workers, worker_number, session=None):
+def get_updated_account_counters(total_workers, worker_number, partition=None, session=None):
     """
     Get updated rse_counters.
 
     :param total_workers:      Number of total workers.
     :param worker_number:      id of the executing worker.
+    :param partition:          Partition returned by rucio.core.heartbeat.live_partition, used instead of total_workers and worker_number.
     :param session:            Database session in use.
     :returns:                  List of rse_ids whose rse_counters need to be updated.
     """
     query = session.query(models.UpdatedAccountCounter.account, models.UpdatedAccountCounter.rse_id).\
         distinct(models.UpdatedAccountCounter.account, models.UpdatedAccountCounter.rse_id)
 
-    if total_workers > 0:
+    if partition is not None:
+        clause = get_partition_clause('CONCAT(account, rse_id)', partition, session.bind.dialect.name)
+        if clause is not None:
+            query = query.filter(clause)
+    elif total_workers > 0:
         if session.bind.dialect.name == 'oracle':
             bindparams = [bindparam('worker_number', worker_number),
                           bindparam('total_workers', total_workers)]
@@ -13,15 +13,29 @@
 
 """
 Core authentication
+
+When the `token_signing_key` option of the [authentication] section is set,
+the tokens are signed with HMAC-SHA256 and carry their account and
+expiration date, so that they are validated by the servers without any
+database or cache lookup. They are still stored in the database, where they
+can be revoked: the revoked tokens are taken from the database every
+`deny_list_refresh` seconds by each server.
 """
 
+import calendar
 import datetime
 import hashlib
+import hmac
+import threading
+import time
+
+from ConfigParser import NoOptionError, NoSectionError
 
 # Create cache region used for token validation
 from dogpile.cache import make_region
 from dogpile.cache.api import NO_VALUE
 
+from rucio.common.config import config_get, config_get_int
 from rucio.common.utils import generate_uuid
 from rucio.core.account import account_exists
 from rucio.db.sqla import models
@@ -43,6 +57,22 @@ TOKENREGION = make_region(
     expiration_time=3600
 )
 
+TOKEN_LIFETIME = datetime.timedelta(hours=1)
+SIGNED_TOKEN_VERSION = 'S1'
+
+try:
+    TOKEN_SIGNING_KEY = config_get('authentication', 'token_signing_key')
+except (NoOptionError, NoSectionError):
+    TOKEN_SIGNING_KEY = None
+
+try:
+    DENY_LIST_REFRESH = config_get_int('authentication', 'deny_list_refresh')
+except (NoOptionError, NoSectionError):
+    DENY_LIST_REFRESH = 60
+
+DENY_LIST = {'tokens': frozenset(), 'refreshed_at': None}
+DENY_LIST_LOCK = threading.Lock()
+
 
 @read_session
 def exist_identity_account(identity, type, account, session=None):
@@ -92,15 +122,10 @@ def get_auth_token_user_pass(account, username, password, appid, ip=None, sessio
     db_account = result['account']
 
     # remove expired tokens
-    session.query(models.Token).filter(models.Token.expired_at < datetime.datetime.utcnow(), models.Token.account == account).delete()
+    delete_expired_tokens(account, session=session)
 
     # create new rucio-auth-token for account
-    tuid = generate_uuid()  # NOQA
-    token = '%(account)s-%(username)s-%(appid)s-%(tuid)s' % locals()
-    new_token = models.Token(account=db_account, token=token, ip=ip)
-    new_token.save(session=session)
-
-    return token
+    return new_token(account=db_account, identity=username, appid=appid, ip=ip, session=session)
 
 
 @transactional_session
@@ -124,15 +149,10 @@ def get_auth_token_x509(account, dn, appid, ip=None, session=None):
         return None
 
     # remove expired tokens
-    session.query(models.Token).filter(models.Token.expired_at < datetime.datetime.utcnow(), models.Token.account == account).delete()
+    delete_expired_tokens(account, session=session)
 
     # create new rucio-auth-token for account
-    tuid = generate_uuid()  # NOQA
-    token = '%(account)s-%(dn)s-%(appid)s-%(tuid)s' % locals()
-    new_token = models.Token(account=account, token=token, ip=ip)
-    new_token.save(session=session)
-
-    return token
+    return new_token(account=account, identity=dn, appid=appid, ip=ip, session=session)
 
 
 @transactional_session
@@ -156,17 +176,142 @@ def get_auth_token_gss(account, gsstoken, appid, ip=None, session=None):
         return None
 
     # remove expired tokens
-    session.query(models.Token).filter(models.Token.expired_at < datetime.datetime.utcnow(), models.Token.account == account).delete()
+    delete_expired_tokens(account, session=session)
 
     # create new rucio-auth-token for account
-    tuid = generate_uuid()  # NOQA
-    token = '%(account)s-%(gsstoken)s-%(appid)s-%(tuid)s' % locals()
-    new_token = models.Token(account=account, token=token, ip=ip)
-    new_token.save(session=session)
+    return new_token(account=account, identity=gsstoken, appid=appid, ip=ip, session=session)
+
+
+def sign_token(account, expiry, tuid):
+    """
+    HMAC-SHA256 signature of the content of a signed token.
+
+    :param account: Account identifier as a string.
+    :param expiry: Expiration date of the token in seconds since the epoch.
+    :param tuid: Unique identifier of the token as a string.
+
+    :returns: The hexadecimal signature as a string.
+    """
+    message = '%s:%s:%d:%s' % (SIGNED_TOKEN_VERSION, account, expiry, tuid)
+    return hmac.new(TOKEN_SIGNING_KEY, message, hashlib.sha256).hexdigest()
+
 
+@transactional_session
+def new_token(account, identity, appid, ip=None, session=None):
+    """
+    Create and store a new token for an account, signed if a signing key is configured.
+
+    The identity is only part of the unsigned tokens: a signed token only
+    carries what is needed to validate it.
+
+    :param account: Account identifier as a string.
+    :param identity: The identity used to authenticate as a string.
+    :param appid: The application identifier as a string.
+    :param ip: IP address of the client as a string.
+    :param session: The database session in use.
+
+    :returns: Authentication token as a variable-length string.
+    """
+    tuid = generate_uuid()
+    # Whole seconds, the same as the expiration date of the signed token
+    expired_at = (datetime.datetime.utcnow() + TOKEN_LIFETIME).replace(microsecond=0)
+    if TOKEN_SIGNING_KEY:
+        expiry = calendar.timegm(expired_at.utctimetuple())
+        token = '%s:%s:%d:%s:%s' % (SIGNED_TOKEN_VERSION, account, expiry, tuid, sign_token(account, expiry, tuid))
+    else:
+        token = '%s-%s-%s-%s' % (account, identity, appid, tuid)
+    models.Token(account=account, token=token, ip=ip, expired_at=expired_at).save(session=session)
     return token
 
 
+@transactional_session
+def delete_expired_tokens(account, session=None):
+    """
+    Delete the expired tokens of an account.
+
+    With signed tokens, the revoked tokens are kept until they expire, as
+    long as they are needed in the deny list.
+
+    :param account: Account identifier as a string.
+    :param session: The database session in use.
+    """
+    expired_before = datetime.datetime.utcnow()
+    if TOKEN_SIGNING_KEY:
+        expired_before -= TOKEN_LIFETIME
+    session.query(models.Token).filter(models.Token.expired_at < expired_before, models.Token.account == account).delete()
+
+
+@transactional_session
+def revoke_token(token, session=None):
+    """
+    Revoke an authentication token. A signed token is refused by each
+    server once its deny list is refreshed.
+
+    :param token: Authentication token as a variable-length string.
+    :param session: The database session in use.
+    """
+    token = token.strip()
+    now = datetime.datetime.utcnow()
+    session.query(models.Token).filter(models.Token.token == token, models.Token.expired_at > now).update({'expired_at': now}, synchronize_session=False)
+    TOKENREGION.delete(token)
+
+
+@read_session
+def list_revoked_tokens(session=None):
+    """
+    List the signed tokens which are expired in the database but may still
+    be valid by their signature, i.e. the revoked signed tokens.
+
+    :param session: The database session in use.
+
+    :returns: The set of revoked signed tokens.
+    """
+    now = datetime.datetime.utcnow()
+    query = session.query(models.Token.token).filter(models.Token.expired_at <= now,
+                                                     models.Token.expired_at > now - TOKEN_LIFETIME,
+                                                     models.Token.token.like(SIGNED_TOKEN_VERSION + ':%'))
+    return frozenset(token for token, in query)
+
+
+def get_deny_list():
+    """
+    The revoked signed tokens, taken from the database at most every
+    DENY_LIST_REFRESH seconds.
+
+    :returns: The set of revoked signed tokens.
+    """
+    refreshed_at = DENY_LIST['refreshed_at']
+    if refreshed_at is None or time.time() - refreshed_at > DENY_LIST_REFRESH:
+        with DENY_LIST_LOCK:
+            # Refreshed by another thread while waiting for the lock
+            if DENY_LIST['refreshed_at'] == refreshed_at:
+                DENY_LIST['tokens'] = list_revoked_tokens()
+                DENY_LIST['refreshed_at'] = time.time()
+    return DENY_LIST['tokens']
+
+
+def validate_signed_token(token):
+    """
+    Validate a signed authentication token by its signature, its expiration
+    date and the deny list.
+
+    :param token: Signed authentication token as a string.
+
+    :returns: Dictionary with the account identifier and the token lifetime if successful, None otherwise.
+    """
+    try:
+        # Only ASCII characters in a signed token
+        version, account, expiry, tuid, signature = str(token).split(':')
+        expiry = int(expiry)
+    except ValueError:
+        return None
+    if version != SIGNED_TOKEN_VERSION or not hmac.compare_digest(signature, sign_token(account, expiry, tuid)):
+        return None
+    if expiry <= time.time() or token in get_deny_list():
+        return None
+    return {'account': account, 'lifetime': datetime.datetime.utcfromtimestamp(expiry)}
+
+
 def validate_auth_token(token):
     """
     Validate an authentication token.
@@ -182,6 +327,9 @@ def validate_auth_token(token):
     # Be gentle with bash variables, there can be whitespace
     token = token.strip()
 
+    if TOKEN_SIGNING_KEY and token.startswith(SIGNED_TOKEN_VERSION + ':'):
+        return validate_signed_token(token)
+
     # Check if token ca be found in cache region
     value = TOKENREGION.get(token)
     if value is NO_VALUE:  # no cached entry found
@@ -37,9 +37,10 @@ import rucio.core.replica  # import add_replicas
 
 from rucio.common import exception
 from rucio.common.config import config_get
-from rucio.common.utils import str_to_date, is_archive
+from rucio.common.utils import str_to_date, is_archive, chunks
 from rucio.common.policy import archive_localgroupdisk_datasets
 from rucio.core import account_counter, rse_counter
+from rucio.core.heartbeat import get_partition_clause
 from rucio.core.message import add_message
 from rucio.core.monitor import record_timer_block, record_counter
 from rucio.core.naming_convention import validate_name
@@ -702,7 +703,7 @@ def detach_dids(scope, name, dids, session=None):
 
 
 @stream_session
-def list_new_dids(did_type, thread=None, total_threads=None, chunk_size=1000, session=None):
+def list_new_dids(did_type, thread=None, total_threads=None, chunk_size=1000, partition=None, session=None):
     """
     List recent identifiers.
 
@@ -710,6 +711,7 @@ def list_new_dids(did_type, thread=None, total_threads=None, chunk_size=1000, se
     :param thread: The assigned thread for this necromancer.
     :param total_threads: The total number of threads of all necromancers.
     :param chunk_size: Number of requests to return per yield.
+    :param partition: Partition returned by rucio.core.heartbeat.live_partition, used instead of thread and total_threads.
     :param session: The database session in use.
     """
 
@@ -731,7 +733,11 @@ def list_new_dids(did_type, thread=None, total_threads=None, chunk_size=1000, se
         elif isinstance(did_type, EnumSymbol):
             query = query.filter_by(did_type=did_type)
 
-    if total_threads and (total_threads - 1) > 0:
+    if partition is not None:
+        clause = get_partition_clause('name', partition, session.bind.dialect.name)
+        if clause is not None:
+            query = query.filter(clause)
+    elif total_threads and (total_threads - 1) > 0:
         if session.bind.dialect.name == 'oracle':
             bindparams = [bindparam('thread_number', thread), bindparam('total_threads', total_threads - 1)]
             query = query.filter(text('ORA_HASH(name, :total_threads) = :thread_number', bindparams=bindparams))
@@ -758,15 +764,20 @@ def set_new_dids(dids, new_flag, session=None):
     :param new_flag: A boolean to flag new DIDs.
     :param session: The database session in use.
     """
-    for did in dids:
+    # The flags are updated with one statement per chunk of DIDs
+    for chunk in chunks(list(set([(did['scope'], did['name']) for did in dids])), 100):
+        condition = [and_(models.DataIdentifier.scope == scope, models.DataIdentifier.name == name) for scope, name in chunk]
         try:
-            # session.query(models.DataIdentifier).filter_by(scope=did['scope'], name=did['name']).with_for_update(nowait=True).first()
-            # session.query(models.DataIdentifier).filter_by(scope=did['scope'], name=did['name']).first()
-            rowcount = session.query(models.DataIdentifier).filter_by(scope=did['scope'], name=did['name']).update({'is_new': new_flag}, synchronize_session=False)
-            if not rowcount:
-                raise exception.DataIdentifierNotFound("Data identifier '%s:%s' not found" % (did['scope'], did['name']))
+            rowcount = session.query(models.DataIdentifier).\
+                filter(or_(*condition)).\
+                update({'is_new': new_flag}, synchronize_session=False)
         except DatabaseError as error:
-            raise exception.DatabaseException('%s : Cannot update %s:%s' % (error.args[0], did['scope'], did['name']))
+            raise exception.DatabaseException('%s : Cannot update %s' % (error.args[0], ', '.join(['%s:%s' % (scope, name) for scope, name in chunk])))
+        if rowcount != len(chunk):
+            found = set(session.query(models.DataIdentifier.scope, models.DataIdentifier.name).filter(or_(*condition)).all())
+            for scope, name in chunk:
+                if (scope, name) not in found:
+                    raise exception.DataIdentifierNotFound("Data identifier '%s:%s' not found" % (scope, name))
     try:
         session.flush()
     except IntegrityError as error:
@@ -1207,6 +1218,28 @@ def get_metadata(scope, name, session=None):
         raise exception.DataIdentifierNotFound("Data identifier '%(scope)s:%(name)s' not found" % locals())
 
 
+@stream_session
+def get_metadata_bulk(dids, chunk_size=100, session=None):
+    """
+    Get the metadata of a list of data identifiers. The DIDs are resolved
+    by primary key in chunks, so a list of N DIDs costs N/chunk_size queries.
+    Unknown DIDs are silently skipped.
+
+    :param dids: A list of dictionaries with the keys scope and name.
+    :param chunk_size: The number of DIDs resolved per query.
+    :param session: The database session in use.
+    :returns: A generator of metadata dictionaries, as returned by get_metadata.
+    """
+    columns = models.DataIdentifier.__table__.columns
+    for chunk in chunks(dids, chunk_size):
+        condition = [and_(models.DataIdentifier.scope == did['scope'], models.DataIdentifier.name == did['name']) for did in chunk]
+        query = session.query(models.DataIdentifier).\
+            with_hint(models.DataIdentifier, "INDEX(DIDS DIDS_PK)", 'oracle').\
+            filter(or_(*condition))
+        for row in query.yield_per(chunk_size):
+            yield dict((column.name, getattr(row, column.name)) for column in columns)
+
+
 @transactional_session
 def set_status(scope, name, session=None, **kwargs):
     """
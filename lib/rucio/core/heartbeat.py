@@ -12,13 +12,21 @@
 import datetime
 import hashlib
 
-from sqlalchemy.sql import distinct
+from bisect import bisect_left
+
+from sqlalchemy.sql import distinct, text
 
 from rucio.db.sqla.models import Heartbeats
 from rucio.db.sqla.session import read_session, transactional_session
 from rucio.common.exception import DatabaseException
 from rucio.common.utils import pid_exists
 
+# Number of slots of the partition ring, the keys are hashed by the database into one of them
+PARTITION_SLOTS = 1024
+
+# Number of virtual nodes of each worker on the partition ring
+PARTITION_VNODES = 64
+
 
 @transactional_session
 def sanity_check(executable, hostname, hash_executable=None, pid=None, thread=None,
@@ -84,6 +92,60 @@ def live(executable, hostname, pid, thread, older_than=600, hash_executable=None
 
     :returns heartbeats: Dictionary {assign_thread, nr_threads}
     """
+    result = _live(executable=executable, hostname=hostname, pid=pid, thread=thread,
+                   older_than=older_than, hash_executable=hash_executable, session=session)
+
+    # there is no universally applicable rownumber in SQLAlchemy
+    # so we have to do it in Python
+    assign_thread = 0
+    for r in xrange(len(result)):
+        if result[r][0] == hostname and result[r][1] == pid and result[r][2] == thread.ident:
+            assign_thread = r
+            break
+
+    return {'assign_thread': assign_thread,
+            'nr_threads': len(result)}
+
+
+@transactional_session
+def live_partition(executable, hostname, pid, thread, older_than=600, hash_executable=None, vnodes=PARTITION_VNODES, session=None):
+    """
+    Register a heartbeat like live and return the part of the partition ring assigned to the thread.
+
+    Contrary to the modulo of the worker number, the ring only moves about 1/N of the keys
+    when a thread joins or leaves, so the other threads keep most of their work.
+
+    :param executable: Executable name as a string, e.g., conveyor-submitter.
+    :param hostname: Hostname as a string, e.g., rucio-daemon-prod-01.cern.ch.
+    :param pid: UNIX Process ID as a number, e.g., 1234.
+    :param thread: Python Thread Object.
+    :param older_than: Ignore specified heartbeats older than specified nr of seconds.
+    :param hash_executable: Hash of the executable.
+    :param vnodes: Number of virtual nodes of each thread on the ring.
+
+    :returns heartbeats: Dictionary {assign_thread, nr_threads, slots, ranges}, ranges being the list of
+                         the (first, last) slots assigned to the thread, to be used with get_partition_clause.
+    """
+    result = _live(executable=executable, hostname=hostname, pid=pid, thread=thread,
+                   older_than=older_than, hash_executable=hash_executable, session=session)
+
+    members = ['%s/%s/%s' % (r[0], r[1], r[2]) for r in result]
+    member = '%s/%s/%s' % (hostname, pid, thread.ident)
+    if member not in members:
+        members.append(member)
+
+    return {'assign_thread': members.index(member),
+            'nr_threads': len(members),
+            'slots': PARTITION_SLOTS,
+            'ranges': PartitionRing(members, vnodes=vnodes).ranges(member)}
+
+
+def _live(executable, hostname, pid, thread, older_than, hash_executable, session):
+    """
+    Upserts the heartbeat and lists the live threads of the executable.
+
+    :returns: List of tuples (hostname, pid, thread_id) ordered by hostname, pid and thread_id.
+    """
     if not hash_executable:
         hash_executable = hashlib.sha256(executable).hexdigest()
 
@@ -102,7 +164,7 @@ def live(executable, hostname, pid, thread, older_than=600, hash_executable=None
                    thread_id=thread.ident,
                    thread_name=thread.name).save(session=session)
 
-    # assign thread identifier
+    # list the live threads
     query = session.query(Heartbeats.hostname,
                           Heartbeats.pid,
                           Heartbeats.thread_id)\
@@ -115,18 +177,90 @@ def live(executable, hostname, pid, thread, older_than=600, hash_executable=None
                    .order_by(Heartbeats.hostname,
                              Heartbeats.pid,
                              Heartbeats.thread_id)
-    result = query.all()
+    return query.all()
 
-    # there is no universally applicable rownumber in SQLAlchemy
-    # so we have to do it in Python
-    assign_thread = 0
-    for r in xrange(len(result)):
-        if result[r][0] == hostname and result[r][1] == pid and result[r][2] == thread.ident:
-            assign_thread = r
-            break
 
-    return {'assign_thread': assign_thread,
-            'nr_threads': len(result)}
+class PartitionRing(object):
+    """
+    Consistent hashing ring distributing the slots of the keyspace between members.
+
+    Every member is placed at several points of the ring, its virtual nodes, and owns the slots
+    preceding them. Adding or removing a member therefore only moves the slots of its own
+    virtual nodes, about 1/N of the keyspace, instead of reshuffling all of them.
+    """
+
+    def __init__(self, members, vnodes=PARTITION_VNODES, slots=PARTITION_SLOTS):
+        """
+        :param members: List of member names, e.g. hostname/pid/thread_id.
+        :param vnodes: Number of virtual nodes of each member.
+        :param slots: Number of slots of the keyspace.
+        """
+        self.slots = slots
+        points = sorted((int(hashlib.md5('%s#%d' % (member, vnode)).hexdigest()[:8], 16), member)
+                        for member in members for vnode in xrange(vnodes))
+        self.positions = [position for position, _ in points]
+        self.members = [member for _, member in points]
+
+    def owner(self, slot):
+        """
+        Returns the member owning a slot.
+
+        :param slot: The slot number, from 0 to slots - 1.
+        :returns: The member name.
+        """
+        index = bisect_left(self.positions, slot * 2 ** 32 / self.slots)
+        return self.members[index % len(self.members)]
+
+    def ranges(self, member):
+        """
+        Returns the slots owned by a member.
+
+        :param member: The member name.
+        :returns: List of tuples (first slot, last slot) of the contiguous ranges owned by the member.
+        """
+        ranges = []
+        for slot in xrange(self.slots):
+            if self.owner(slot) == member:
+                if ranges and ranges[-1][1] == slot - 1:
+                    ranges[-1] = (ranges[-1][0], slot)
+                else:
+                    ranges.append((slot, slot))
+        return ranges
+
+
+def get_partition_clause(expression, partition, dialect):
+    """
+    Builds the filter selecting the keys of a partition returned by live_partition.
+
+    The expression is hashed by the database into one of the slots of the ring, the same way
+    on every worker. A single slot range is compared with BETWEEN. Several ranges are looked up
+    in the map of the slots of the partition, a bound string with a '1' for each owned slot,
+    so that the key is hashed once whatever the number of ranges.
+
+    :param expression: The SQL expression of the key, e.g. name or CONCAT(account, rse_id).
+    :param partition: The dictionary returned by live_partition.
+    :param dialect: The name of the database dialect.
+    :returns: A text clause, or None if no filter is needed or the dialect is not supported.
+    """
+    slots, ranges = partition['slots'], partition['ranges']
+    if ranges == [(0, slots - 1)]:
+        return None
+    if dialect == 'oracle':
+        bucket = 'ORA_HASH(%s, %d)' % (expression, slots - 1)
+    elif dialect == 'mysql':
+        bucket = 'mod(conv(substring(md5(%s), 1, 8), 16, 10), %d)' % (expression, slots)
+    elif dialect == 'postgresql':
+        bucket = 'mod(abs((\'x\'||md5(%s))::bit(32)::int), %d)' % (expression, slots)
+    else:
+        return None
+    if not ranges:
+        return text('1 = 0')
+    if len(ranges) == 1:
+        return text('%s BETWEEN %d AND %d' % (bucket, ranges[0][0], ranges[0][1]))
+    slot_map = ['0'] * slots
+    for first, last in ranges:
+        slot_map[first:last + 1] = ['1'] * (last + 1 - first)
+    return text('SUBSTR(:partition_map, %s + 1, 1) = \'1\'' % bucket).bindparams(partition_map=''.join(slot_map))
 
 
 @transactional_session
@@ -17,6 +17,7 @@ from sqlalchemy.exc import DatabaseError, IntegrityError
 from sqlalchemy.sql.expression import bindparam, text
 
 from rucio.common.exception import InvalidObject, RucioException
+from rucio.core.heartbeat import get_partition_clause
 from rucio.db.sqla.models import Message, MessageHistory
 from rucio.db.sqla.session import transactional_session
 
@@ -44,7 +45,7 @@ def add_message(event_type, payload, session=None):
 
 
 @transactional_session
-def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=None, session=None):
+def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=None, partition=None, session=None):
     """
     Retrieve up to $bulk messages.
 
@@ -52,6 +53,7 @@ def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=Non
     :param thread: Identifier of the caller thread as an integer.
     :param total_threads: Maximum number of threads as an integer.
     :param event_type: Return only specified event_type. If None, returns everything except email.
+    :param partition: Partition returned by rucio.core.heartbeat.live_partition, used instead of thread and total_threads.
     :param session: The database session to use.
 
     :returns messages: List of dictionaries {id, created_at, event_type, payload}
@@ -59,7 +61,11 @@ def retrieve_messages(bulk=1000, thread=None, total_threads=None, event_type=Non
     messages = []
     try:
         subquery = session.query(Message.id)
-        if total_threads and (total_threads - 1) > 0:
+        if partition is not None:
+            clause = get_partition_clause('id', partition, session.bind.dialect.name)
+            if clause is not None:
+                subquery = subquery.filter(clause)
+        elif total_threads and (total_threads - 1) > 0:
             if session.bind.dialect.name == 'oracle':
                 bindparams = [bindparam('thread_number', thread), bindparam('total_threads', total_threads - 1)]
                 subquery = subquery.filter(text('ORA_HASH(id, :total_threads) = :thread_number', bindparams=bindparams))
@@ -0,0 +1,116 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Permission context of the issuers: the status and the attributes of their
+account and the scopes they own, loaded in one go and kept PERMISSION_CONTEXT_TTL seconds, so
+that the permission checks of a request, and of the next requests of the same
+issuer, do not query them each time.
+
+The contexts are dropped when a change of the status or of the attributes
+of the account is committed, by the process committing it; the other processes see the change
+within PERMISSION_CONTEXT_TTL seconds. The owned scopes are only cached when
+found, so a new scope is never refused.
+"""
+
+from rucio.common import exception
+from rucio.core.account import PERMISSION_CONTEXT_REGION
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import AccountStatus
+from rucio.db.sqla.session import read_session
+
+
+class PermissionContext(object):
+    """
+    Status, attributes and owned scopes of an issuer.
+    """
+    def __init__(self, issuer, active, attributes, scopes):
+        self.issuer = issuer
+        self.active = active
+        self.attributes = attributes
+        self.keys = set(attribute['key'] for attribute in attributes)
+        self.scopes = set(scopes)
+
+
+@read_session
+def load_context(issuer, session=None):
+    """
+    Load the permission context of an issuer from the database.
+
+    :param issuer: Account identifier which issues the command.
+    :param session: The database session in use.
+    :returns: The PermissionContext of the issuer.
+    """
+    active = session.query(models.Account.account).filter_by(account=issuer, status=AccountStatus.ACTIVE).first() is not None
+    query = session.query(models.AccountAttrAssociation.key, models.AccountAttrAssociation.value).filter_by(account=issuer)
+    attributes = [{'key': key, 'value': value} for key, value in query]
+    scopes = [scope for scope, in session.query(models.Scope.scope).filter_by(account=issuer)]
+    return PermissionContext(issuer, active, attributes, scopes)
+
+
+def get_context(issuer):
+    """
+    :param issuer: Account identifier which issues the command.
+    :returns: The cached PermissionContext of the issuer.
+    """
+    return PERMISSION_CONTEXT_REGION.get_or_create(issuer, lambda: load_context(issuer))
+
+
+def is_admin(issuer):
+    """
+    :param issuer: Account identifier which issues the command.
+    :returns: True if the account of the issuer has the admin attribute, otherwise False
+    """
+    return 'admin' in get_context(issuer).keys
+
+
+def account_attributes(issuer):
+    """
+    :param issuer: Account identifier which issues the command.
+    :returns: The list of the key, value pairs of the attributes of the account of the issuer.
+    :raises AccountNotFound: if the account of the issuer is not active.
+    """
+    context = get_context(issuer)
+    if not context.active:
+        raise exception.AccountNotFound("Account ID '{0}' does not exist".format(issuer))
+    return context.attributes
+
+
+@read_session
+def list_owned_scopes(issuer, scopes, session=None):
+    """
+    :param issuer: Account identifier which issues the command.
+    :param scopes: Collection of scopes.
+    :param session: The database session in use.
+    :returns: The list of the given scopes owned by the issuer.
+    """
+    query = session.query(models.Scope.scope).filter(models.Scope.account == issuer, models.Scope.scope.in_(list(scopes)))
+    return [scope for scope, in query]
+
+
+def owns_scopes(issuer, scopes):
+    """
+    Check in one pass if an issuer owns all the given scopes.
+
+    :param issuer: Account identifier which issues the command.
+    :param scopes: Iterable of scopes.
+    :returns: True if the issuer owns all the scopes, otherwise False
+    """
+    context = get_context(issuer)
+    missing = set(scopes) - context.scopes
+    if missing:
+        context.scopes.update(list_owned_scopes(issuer, missing))
+    return context.scopes.issuperset(missing)
+
+
+def owns_scope(issuer, scope):
+    """
+    :param issuer: Account identifier which issues the command.
+    :param scope: The scope to check.
+    :returns: True if the issuer owns the scope, otherwise False
+    """
+    return owns_scopes(issuer, [scope])
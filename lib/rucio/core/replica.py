@@ -32,6 +32,7 @@ import rucio.core.lock
 
 from rucio.common import exception
 from rucio.common.utils import chunks, clean_surls, str_to_date
+from rucio.core.heartbeat import get_partition_clause
 from rucio.core.rse import get_rse, get_rse_id, get_rse_name
 from rucio.core.rse_counter import decrease, increase
 from rucio.core.rse_expression_parser import parse_expression
@@ -1269,6 +1270,29 @@ def list_unlocked_replicas(rse, limit, bytes=None, rse_id=None, worker_number=No
     return rows
 
 
+@read_session
+def list_rse_replicas_page(rse_id, after=None, limit=10000, session=None):
+    """
+    List a page of the file replicas of an RSE ordered by scope and name,
+    to go through all the replicas with keyset pagination.
+
+    :param rse_id: The RSE id.
+    :param after: Tuple (scope, name) of the last replica of the previous page, None for the first page.
+    :param limit: The maximum number of replicas of the page.
+    :param session: The database session in use.
+
+    :returns: A list of tuples (scope, name, path, state).
+    """
+    query = session.query(models.RSEFileAssociation.scope, models.RSEFileAssociation.name, models.RSEFileAssociation.path, models.RSEFileAssociation.state).\
+        with_hint(models.RSEFileAssociation, "INDEX_RS_ASC(replicas REPLICAS_PK)", 'oracle').\
+        filter(models.RSEFileAssociation.rse_id == rse_id)
+    if after is not None:
+        scope, name = after
+        query = query.filter(or_(models.RSEFileAssociation.scope > scope,
+                                 and_(models.RSEFileAssociation.scope == scope, models.RSEFileAssociation.name > name)))
+    return query.order_by(models.RSEFileAssociation.scope, models.RSEFileAssociation.name).limit(limit).all()
+
+
 @read_session
 def get_sum_count_being_deleted(rse_id, session=None):
     """
@@ -1809,3 +1833,139 @@ def list_datasets_per_rse(rse, filters=None, limit=None, session=None):
 
     for row in query:
         yield row._asdict()
+
+
+@read_session
+def get_updated_collection_replicas(total_workers, worker_number, limit=None, partition=None, session=None):
+    """
+    Get the collection replicas with pending updates, each one only once whatever its number of updates.
+
+    :param total_workers:      Number of total workers.
+    :param worker_number:      id of the executing worker.
+    :param limit:              Maximum number of collection replicas to return.
+    :param partition:          Partition returned by rucio.core.heartbeat.live_partition, used instead of total_workers and worker_number.
+    :param session:            Database session in use.
+    :returns:                  List of (scope, name, rse_id) tuples, the oldest updates first. A rse_id of None stands for all the replicas of the collection.
+    """
+    query = session.query(models.UpdatedCollectionReplica.scope,
+                          models.UpdatedCollectionReplica.name,
+                          models.UpdatedCollectionReplica.rse_id).\
+        group_by(models.UpdatedCollectionReplica.scope,
+                 models.UpdatedCollectionReplica.name,
+                 models.UpdatedCollectionReplica.rse_id)
+
+    if partition is not None:
+        clause = get_partition_clause('name', partition, session.bind.dialect.name)
+        if clause is not None:
+            query = query.filter(clause)
+    elif total_workers > 0:
+        if session.bind.dialect.name == 'oracle':
+            bindparams = [bindparam('worker_number', worker_number),
+                          bindparam('total_workers', total_workers)]
+            query = query.filter(text('ORA_HASH(name, :total_workers) = :worker_number', bindparams=bindparams))
+        elif session.bind.dialect.name == 'mysql':
+            query = query.filter('mod(md5(name), %s) = %s' % (total_workers + 1, worker_number))
+        elif session.bind.dialect.name == 'postgresql':
+            query = query.filter('mod(abs((\'x\'||md5(name))::bit(32)::int), %s) = %s' % (total_workers + 1, worker_number))
+
+    query = query.order_by(func.min(models.UpdatedCollectionReplica.created_at))
+    if limit:
+        query = query.limit(limit)
+    return [tuple(row) for row in query]
+
+
+@transactional_session
+def update_collection_replicas(collection_replicas, session=None):
+    """
+    Recompute the size and the availability of collection replicas with pending updates, and drain their updates.
+
+    Only the given collection replicas are recomputed, from the contents of their
+    collections, with one aggregation for the whole batch. A collection replica
+    whose last available file replica is gone is removed.
+
+    :param collection_replicas: List of (scope, name, rse_id) tuples, as returned by get_updated_collection_replicas.
+    :param session:             Database session in use.
+    :returns:                   The number of collection replicas updated.
+    """
+    update_condition, replica_condition = [], []
+    for scope, name, rse_id in collection_replicas:
+        if rse_id is None:
+            update_condition.append(and_(models.UpdatedCollectionReplica.scope == scope,
+                                         models.UpdatedCollectionReplica.name == name,
+                                         models.UpdatedCollectionReplica.rse_id == None))  # NOQA
+            replica_condition.append(and_(models.CollectionReplica.scope == scope, models.CollectionReplica.name == name))
+        else:
+            update_condition.append(and_(models.UpdatedCollectionReplica.scope == scope,
+                                         models.UpdatedCollectionReplica.name == name,
+                                         models.UpdatedCollectionReplica.rse_id == rse_id))
+            replica_condition.append(and_(models.CollectionReplica.scope == scope,
+                                          models.CollectionReplica.name == name,
+                                          models.CollectionReplica.rse_id == rse_id))
+
+    # The updates drained, selected first so that the updates queued meanwhile are kept for the next pass
+    update_ids = []
+    for chunk in chunks(update_condition, 100):
+        update_ids.extend(update_id for update_id, in session.query(models.UpdatedCollectionReplica.id).filter(or_(*chunk)))
+
+    # The collection replicas recomputed, locked until the end of the transaction
+    collection_replicas_rows = []
+    for chunk in chunks(replica_condition, 100):
+        collection_replicas_rows.extend(session.query(models.CollectionReplica).filter(or_(*chunk)).with_for_update(nowait=False))
+
+    # Size of the collections, and their availability on the RSEs of the updates, or on all RSEs for the updates without RSE
+    sizes, available = {}, {}
+    collections = set((scope, name) for scope, name, _ in collection_replicas)
+    all_rses = set((scope, name) for scope, name, rse_id in collection_replicas if rse_id is None)
+    collection_condition = [and_(models.DataIdentifierAssociation.scope == scope, models.DataIdentifierAssociation.name == name)
+                            for scope, name in collections]
+    available_condition = [and_(models.DataIdentifierAssociation.scope == scope, models.DataIdentifierAssociation.name == name)
+                           for scope, name in all_rses]
+    available_condition.extend(and_(models.DataIdentifierAssociation.scope == scope,
+                                    models.DataIdentifierAssociation.name == name,
+                                    models.RSEFileAssociation.rse_id == rse_id)
+                               for scope, name, rse_id in set(collection_replicas) if rse_id is not None and (scope, name) not in all_rses)
+    for chunk in chunks(collection_condition, 100):
+        query = session.query(models.DataIdentifierAssociation.scope,
+                              models.DataIdentifierAssociation.name,
+                              func.count().label('length'),
+                              func.sum(models.DataIdentifierAssociation.bytes).label('bytes')).\
+            filter(or_(*chunk)).\
+            group_by(models.DataIdentifierAssociation.scope, models.DataIdentifierAssociation.name)
+        for scope, name, length, bytes in query:
+            sizes[(scope, name)] = (length, bytes or 0)
+
+    for chunk in chunks(available_condition, 100):
+        query = session.query(models.DataIdentifierAssociation.scope,
+                              models.DataIdentifierAssociation.name,
+                              models.RSEFileAssociation.rse_id,
+                              func.count().label('available_replicas_cnt'),
+                              func.sum(models.RSEFileAssociation.bytes).label('available_bytes')).\
+            with_hint(models.DataIdentifierAssociation, "INDEX_RS_ASC(CONTENTS CONTENTS_PK) INDEX_RS_ASC(REPLICAS REPLICAS_PK) NO_INDEX_FFS(CONTENTS CONTENTS_PK)", 'oracle').\
+            filter(models.DataIdentifierAssociation.child_scope == models.RSEFileAssociation.scope,
+                   models.DataIdentifierAssociation.child_name == models.RSEFileAssociation.name,
+                   models.RSEFileAssociation.state == ReplicaState.AVAILABLE).\
+            filter(or_(*chunk)).\
+            group_by(models.DataIdentifierAssociation.scope, models.DataIdentifierAssociation.name, models.RSEFileAssociation.rse_id)
+        for scope, name, rse_id, available_replicas_cnt, available_bytes in query:
+            available[(scope, name, rse_id)] = (available_replicas_cnt, available_bytes or 0)
+
+    updated = 0
+    for collection_replica in collection_replicas_rows:
+        length, bytes = sizes.get((collection_replica.scope, collection_replica.name), (0, 0))
+        available_replicas_cnt, available_bytes = available.get((collection_replica.scope, collection_replica.name, collection_replica.rse_id), (0, 0))
+        if collection_replica.available_replicas_cnt > 0 and available_replicas_cnt == 0:
+            collection_replica.delete(flush=False, session=session)
+        else:
+            collection_replica.length, collection_replica.bytes = length, bytes
+            collection_replica.available_replicas_cnt, collection_replica.available_bytes = available_replicas_cnt, available_bytes
+            if available_replicas_cnt >= length:
+                collection_replica.state = ReplicaState.AVAILABLE
+            else:
+                collection_replica.state = ReplicaState.UNAVAILABLE
+        updated += 1
+
+    for chunk in chunks(update_ids, 100):
+        session.query(models.UpdatedCollectionReplica).\
+            filter(models.UpdatedCollectionReplica.id.in_(chunk)).\
+            delete(synchronize_session=False)
+    return updated
@@ -41,6 +41,7 @@ from rucio.common.utils import str_to_date, sizefmt
 from rucio.common.policy import get_scratch_policy, define_eol
 from rucio.core import account_counter, rse_counter
 from rucio.core.account import get_account
+from rucio.core.heartbeat import get_partition_clause
 from rucio.core.message import add_message
 from rucio.core.monitor import record_timer_block
 from rucio.core.rse import get_rse_name, list_rse_attributes, get_rse
@@ -424,9 +425,11 @@ def add_rules(dids, rules, session=None):
                         try:
                             new_rule.save(session=session)
                         except IntegrityError as error:
-                            if match('.*ORA-00001.*', str(error.args[0])):
-                                raise DuplicateRule()
-                            elif '(IntegrityError) UNIQUE constraint failed: rules.scope, rules.name, rules.account, rules.rse_expression, rules.copies' == str(error.args[0]):
+                            if match('.*ORA-00001.*', str(error.args[0]))\
+                               or match('.*IntegrityError.*UNIQUE constraint failed.*', str(error.args[0]))\
+                               or match('.*1062.*Duplicate entry.*for key.*', str(error.args[0]))\
+                               or match('.*IntegrityError.*duplicate key value violates unique constraint.*', str(error.args[0]))\
+                               or match('.*sqlite3.IntegrityError.*are not unique.*', str(error.args[0])):
                                 raise DuplicateRule()
                             raise InvalidReplicationRule(error.args[0])
 
@@ -457,7 +460,13 @@ def add_rules(dids, rules, session=None):
                         __create_rule_approval_email(rule=new_rule, session=session)
                         continue
 
-                    if rule.get('asynchronous', False):
+                    # Force ASYNC mode for large rules
+                    asynchronous = rule.get('asynchronous', False)
+                    if did.length >= 10000:
+                        asynchronous = True
+                        logging.debug("Forced injection of rule %s" % str(new_rule.id))
+
+                    if asynchronous:
                         new_rule.state = RuleState.INJECT
                         logging.debug("Created rule %s for injection" % str(new_rule.id))
                         continue
@@ -1337,7 +1346,7 @@ def re_evaluate_did(scope, name, rule_evaluation_action, session=None):
 
 
 @read_session
-def get_updated_dids(total_workers, worker_number, limit=100, blacklisted_dids=[], session=None):
+def get_updated_dids(total_workers, worker_number, limit=100, blacklisted_dids=[], partition=None, session=None):
     """
     Get updated dids.
 
@@ -1345,6 +1354,7 @@ def get_updated_dids(total_workers, worker_number, limit=100, blacklisted_dids=[
     :param worker_number:      id of the executing worker.
     :param limit:              Maximum number of dids to return.
     :param blacklisted_dids:   Blacklisted dids to filter.
+    :param partition:          Partition returned by rucio.core.heartbeat.live_partition, used instead of total_workers and worker_number.
     :param session:            Database session in use.
     """
     query = session.query(models.UpdatedDID.id,
@@ -1352,7 +1362,11 @@ def get_updated_dids(total_workers, worker_number, limit=100, blacklisted_dids=[
                           models.UpdatedDID.name,
                           models.UpdatedDID.rule_evaluation_action)
 
-    if total_workers > 0:
+    if partition is not None:
+        clause = get_partition_clause('name', partition, session.bind.dialect.name)
+        if clause is not None:
+            query = query.filter(clause)
+    elif total_workers > 0:
         if session.bind.dialect.name == 'oracle':
             bindparams = [bindparam('worker_number', worker_number),
                           bindparam('total_workers', total_workers)]
@@ -1370,6 +1384,7 @@ def get_updated_dids(total_workers, worker_number, limit=100, blacklisted_dids=[
                                     worker_number=worker_number,
                                     limit=None,
                                     blacklisted_dids=blacklisted_dids,
+                                    partition=partition,
                                     session=session)
         else:
             return filtered_dids
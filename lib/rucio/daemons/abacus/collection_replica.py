@@ -0,0 +1,83 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Abacus-Collection-Replica is a daemon to update the collection replicas.
+"""
+
+import logging
+import socket
+import sys
+import threading
+import time
+
+from rucio.common.config import config_get
+from rucio.common.utils import chunks
+from rucio.core.heartbeat import sanity_check
+from rucio.core.replica import get_updated_collection_replicas, update_collection_replicas
+from rucio.daemons.common import AdaptiveSleep, run_daemon
+
+graceful_stop = threading.Event()
+
+logging.basicConfig(stream=sys.stdout,
+                    level=getattr(logging, config_get('common', 'loglevel').upper()),
+                    format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
+
+
+def collection_replica_update(once=False, bulk=10, chunk_size=100):
+    """
+    Main loop to check and update the collection replicas.
+
+    :param once: Run only one iteration.
+    :param bulk: The maximum number of chunks of collection replicas to fetch per iteration.
+    :param chunk_size: The number of collection replicas updated per transaction.
+    """
+
+    logging.info('collection_replica_update: starting')
+
+    def fetch(worker_number, total_workers, bulk, partition):
+        collection_replicas = get_updated_collection_replicas(total_workers=total_workers, worker_number=worker_number,
+                                                              limit=bulk * chunk_size, partition=partition)
+        return list(chunks(collection_replicas, chunk_size))
+
+    def process(collection_replicas):
+        start_time = time.time()
+        update_collection_replicas(collection_replicas=collection_replicas)
+        logging.debug('collection_replica_update: update of %i collection replicas took %f' % (len(collection_replicas), time.time() - start_time))
+
+    run_daemon(executable='rucio-abacus-collection-replica', fetch=fetch, process=process, graceful_stop=graceful_stop,
+               once=once, bulk=bulk, sleep=AdaptiveSleep(min_sleep=1, max_sleep=10),
+               metrics_prefix='abacus.collection_replica', consistent_hashing=True)
+
+    logging.info('collection_replica_update: graceful stop done')
+
+
+def stop(signum=None, frame=None):
+    """
+    Graceful exit.
+    """
+
+    graceful_stop.set()
+
+
+def run(once=False, threads=1, bulk=10, chunk_size=100):
+    """
+    Starts up the Abacus-Collection-Replica threads.
+    """
+    sanity_check(executable='rucio-abacus-collection-replica', hostname=socket.gethostname())
+
+    kwargs = {'once': once, 'bulk': bulk, 'chunk_size': chunk_size}
+    if once:
+        logging.info('main: executing one iteration only')
+        collection_replica_update(**kwargs)
+    else:
+        logging.info('main: starting threads')
+        threads = [threading.Thread(target=collection_replica_update, kwargs=kwargs) for i in xrange(0, threads)]
+        [t.start() for t in threads]
+        logging.info('main: waiting for interrupts')
+        # Interruptible joins require a timeout.
+        while threads[0].is_alive():
+            [t.join(timeout=3.14) for t in threads]
@@ -12,13 +12,15 @@ Abacus-RSE is a daemon to update RSE counters.
 """
 
 import logging
+import socket
 import sys
 import threading
 import time
-import traceback
 
 from rucio.common.config import config_get
+from rucio.core.heartbeat import sanity_check
 from rucio.core.rse_counter import get_updated_rse_counters, update_rse_counter
+from rucio.daemons.common import AdaptiveSleep, run_daemon
 
 graceful_stop = threading.Event()
 
@@ -27,40 +29,24 @@ logging.basicConfig(stream=sys.stdout,
                     format='%(asctime)s\t%(process)d\t%(levelname)s\t%(message)s')
 
 
-def rse_update(once=False, process=0, total_processes=1, thread=0, threads_per_process=1):
+def rse_update(once=False):
     """
     Main loop to check and update the RSE Counters.
     """
 
     logging.info('rse_update: starting')
 
-    logging.info('rse_update: started')
-
-    while not graceful_stop.is_set():
-        try:
-            # Select a bunch of rses for to update for this worker
-            start = time.time()  # NOQA
-            rse_ids = get_updated_rse_counters(total_workers=total_processes * threads_per_process - 1,
-                                               worker_number=process * threads_per_process + thread)
-            logging.debug('Index query time %f size=%d' % (time.time() - start, len(rse_ids)))
-
-            # If the list is empty, sent the worker to sleep
-            if not rse_ids and not once:
-                logging.info('rse_update[%s/%s] did not get any work' % (process * threads_per_process + thread, total_processes * threads_per_process - 1))
-                time.sleep(10)
-            else:
-                for rse_id in rse_ids:
-                    if graceful_stop.is_set():
-                        break
-                    start_time = time.time()
-                    update_rse_counter(rse_id=rse_id)
-                    logging.debug('rse_update[%s/%s]: update of rse "%s" took %f' % (process * threads_per_process + thread, total_processes * threads_per_process - 1, rse_id, time.time() - start_time))
-        except Exception:
-            logging.error(traceback.format_exc())
-        if once:
-            break
-
-    logging.info('rse_update: graceful stop requested')
+    def fetch(worker_number, total_workers, bulk):
+        return get_updated_rse_counters(total_workers=total_workers, worker_number=worker_number)
+
+    def process(rse_id):
+        start_time = time.time()
+        update_rse_counter(rse_id=rse_id)
+        logging.debug('rse_update: update of rse "%s" took %f' % (rse_id, time.time() - start_time))
+
+    run_daemon(executable='rucio-abacus-rse', fetch=fetch, process=process, graceful_stop=graceful_stop,
+               once=once, bulk=None, sleep=AdaptiveSleep(min_sleep=1, max_sleep=10),
+               metrics_prefix='abacus.rse')
 
     logging.info('rse_update: graceful stop done')
 
@@ -73,16 +59,18 @@ def stop(signum=None, frame=None):
     graceful_stop.set()
 
 
-def run(once=False, process=0, total_processes=1, threads_per_process=11):
+def run(once=False, threads=1):
     """
     Starts up the Abacus-RSE threads.
     """
+    sanity_check(executable='rucio-abacus-rse', hostname=socket.gethostname())
+
     if once:
         logging.info('main: executing one iteration only')
         rse_update(once)
     else:
         logging.info('main: starting threads')
-        threads = [threading.Thread(target=rse_update, kwargs={'process': process, 'total_processes': total_processes, 'once': once, 'thread': i, 'threads_per_process': threads_per_process}) for i in xrange(0, threads_per_process)]
+        threads = [threading.Thread(target=rse_update, kwargs={'once': once}) for i in xrange(0, threads)]
         [t.start() for t in threads]
         logging.info('main: waiting for interrupts')
         # Interruptible joins require a timeout.
@@ -15,32 +15,79 @@ import select
 import sys
 
 from datetime import datetime
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from rucio.common import config
 from rucio.common.dumper import LogPipeHandler
 from rucio.common.dumper import mkdir
 from rucio.common.dumper import temp_file
 from rucio.common.dumper.consistency import Consistency
+from rucio.common.dumper.consistency import timed
+from rucio.daemons.auditor import cache
 from rucio.daemons.auditor.hdfs import ReplicaFromHDFS
 from rucio.daemons.auditor import srmdumps
 
 
+PHASES = ('download', 'parse', 'sort', 'compare')
+
+
 def total_seconds(td):
     '''timedelta.total_seconds() for Python < 2.7'''
     return (td.microseconds + (td.seconds + td.days * 24 * 3600) * (10 ** 6)) / float(10 ** 6)
 
 
-def consistency(rse, delta, configuration, cache_dir, results_dir):
+def dump_prefixes(rse):
+    '''
+    Prefixes of the names of the dumps of `rse` (and of the files derived
+    from them) in the cache.
+    '''
+    return ('replicafromhdfs_{0}_'.format(rse), 'ddmendpoint_{0}_'.format(rse))
+
+
+def download_dumps(rse, delta, configuration, cache_dir, results_dir):
+    '''
+    Downloads to `cache_dir` the latest storage dump of `rse` and the Rucio
+    replica dumps `delta` before and after it, unless they are cached or
+    the check of the storage dump is already done.
+
+    :returns: A tuple with the path of the storage dump, its date and the
+    paths of the Rucio replica dumps (the paths are None if the check is
+    already done).
+    '''
+    url, rsedate = srmdumps.get_dump_url(rse, configuration, destdir=cache_dir)
+    if os.path.exists(results_path(results_dir, rse, rsedate)):
+        return None, rsedate, None, None
+
+    rsedump = srmdumps.download_dump(rse, url, rsedate, destdir=cache_dir)
+
+    rrdump_prev = ReplicaFromHDFS.download(rse, rsedate - delta, cache_dir=cache_dir)
+    rrdump_next = ReplicaFromHDFS.download(rse, rsedate + delta, cache_dir=cache_dir)
+    return rsedump, rsedate, rrdump_prev, rrdump_next
+
+
+def results_path(results_dir, rse, rsedate):
+    return '{0}/{1}_{2}'.format(results_dir, rse, rsedate.strftime('%Y%m%d'))  # pylint: disable=no-member
+
+
+def consistency(rse, delta, configuration, cache_dir, results_dir, timings=None):
+    '''
+    Checks the consistency of `rse`, the seconds spent in each phase
+    (download, parse, sort and compare) are added to the `timings` dict.
+    '''
     logger = logging.getLogger('auditor-worker')
-    rsedump, rsedate = srmdumps.download_rse_dump(rse, configuration, destdir=cache_dir)
-    results_path = '{0}/{1}_{2}'.format(results_dir, rse, rsedate.strftime('%Y%m%d'))  # pylint: disable=no-member
+    if timings is None:
+        timings = {}
+
+    with timed(timings, 'download'):
+        rsedump, rsedate, rrdump_prev, rrdump_next = download_dumps(rse, delta, configuration, cache_dir, results_dir)
 
-    if os.path.exists(results_path):
+    if rrdump_prev is None:
         logger.warn('Consistency check for "%s" (dump dated %s) already done, skipping check', rse, rsedate.strftime('%Y%m%d'))  # pylint: disable=no-member
         return
 
-    rrdump_prev = ReplicaFromHDFS.download(rse, rsedate - delta, cache_dir=cache_dir)
-    rrdump_next = ReplicaFromHDFS.download(rse, rsedate + delta, cache_dir=cache_dir)
+    # The RSEs are checked in parallel by the workers, each dump is sorted
+    # by one process.
     results = Consistency.dump(
         'consistency-manual',
         rse,
@@ -49,14 +96,39 @@ def consistency(rse, delta, configuration, cache_dir, results_dir):
         rrdump_next,
         date=rsedate,
         cache_dir=cache_dir,
+        sort_processes=1,
+        timings=timings,
     )
     mkdir(results_dir)
-    with temp_file(results_dir, results_path) as (output, _):
+    with temp_file(results_dir, results_path(results_dir, rse, rsedate)) as (output, _):
         for result in results:
             output.write('{0}\n'.format(result.csv()))
 
 
-def check(queue, retry, terminate, logpipe, cache_dir, results_dir, keep_dumps, delta_in_days):
+def prefetch(executor, queue, delta, configuration, cache_dir, results_dir):
+    '''
+    Takes the next RSE from `queue`, if any, and downloads its dumps with
+    `executor`.
+
+    :returns: A tuple (RSE, attemps, future of the download) or None.
+    '''
+    try:
+        rse, attemps = queue.get_nowait()
+    except Queue.Empty:
+        return None
+    return rse, attemps, executor.submit(download_dumps, rse, delta, configuration, cache_dir, results_dir)
+
+
+def check(queue, retry, terminate, logpipe, cache_dir, results_dir, keep_dumps, delta_in_days, cache_size=None):
+    '''
+    Worker checking the RSEs taken from `queue`. The dumps of the next RSE
+    are downloaded while the current one is checked.
+
+    If `cache_size` (in bytes) is given the dumps are kept in `cache_dir`,
+    to be used by the other checks, and the least recently used ones are
+    removed when the cache is larger than `cache_size`. Otherwise the dumps
+    are removed after each check, unless `keep_dumps` is True.
+    '''
     logger = logging.getLogger('auditor-worker')
     lib_logger = logging.getLogger('dumper')
 
@@ -77,37 +149,65 @@ def check(queue, retry, terminate, logpipe, cache_dir, results_dir, keep_dumps,
 
     configuration = srmdumps.parse_configuration()
 
-    while not terminate.is_set():
-        try:
-            rse, attemps = queue.get(timeout=30)
-        except Queue.Empty:
-            continue
-
-        start = datetime.now()
-        try:
-            logger.debug('Checking "%s"', rse)
-            consistency(rse, delta, configuration, cache_dir, results_dir)
-        except:
-            success = False
-        else:
-            success = True
-        finally:
-            elapsed = total_seconds(datetime.now() - start) / 60
-            if success:
-                logger.info('SUCCESS checking "%s" in %d minutes', rse, elapsed)
+    executor = ThreadPoolExecutor(max_workers=1)
+    next_ = None
+    try:
+        while not terminate.is_set():
+            if next_ is None:
+                try:
+                    rse, attemps = queue.get(timeout=30)
+                except Queue.Empty:
+                    continue
+                download = None
+            else:
+                rse, attemps, download = next_
+
+            next_ = prefetch(executor, queue, delta, configuration, cache_dir, results_dir)
+
+            timings = {}
+            start = datetime.now()
+            try:
+                logger.debug('Checking "%s"', rse)
+                with cache.in_use(cache_dir, dump_prefixes(rse)):
+                    if download is not None:
+                        # The errors of the prefetch are raised by the download
+                        # done again by the check.
+                        with timed(timings, 'download'):
+                            futures.wait([download])
+                    consistency(rse, delta, configuration, cache_dir, results_dir, timings)
+            except:
+                success = False
             else:
-                class_, desc = sys.exc_info()[0:2]
-                logger.error('Check of "%s" failed in %d minutes, %d remaining attemps: (%s: %s)', rse, elapsed, attemps, class_.__name__, desc)
-
-        if not keep_dumps:
-            remove = glob.glob(os.path.join(cache_dir, 'replicafromhdfs_{0}_*'.format(rse)))
-            remove.extend(glob.glob(os.path.join(cache_dir, 'ddmendpoint_{0}_*'.format(rse))))
-            logger.debug('Removing: %s', remove)
-            for fil in remove:
-                os.remove(fil)
-
-        if not success and attemps > 0:
-            retry.put((rse, attemps - 1))
+                success = True
+            finally:
+                elapsed = total_seconds(datetime.now() - start) / 60
+                if success:
+                    logger.info('SUCCESS checking "%s" in %d minutes', rse, elapsed)
+                else:
+                    class_, desc = sys.exc_info()[0:2]
+                    logger.error('Check of "%s" failed in %d minutes, %d remaining attemps: (%s: %s)', rse, elapsed, attemps, class_.__name__, desc)
+                logger.info('Timings of "%s": %s', rse, ', '.join(
+                    '{0} {1:.1f}s'.format(phase, timings[phase]) for phase in PHASES if phase in timings))
+
+            if cache_size is not None:
+                cache.touch(cache_dir, dump_prefixes(rse))
+                keep = dump_prefixes(next_[0]) if next_ is not None else ()
+                cache.evict(cache_dir, cache_size, keep=keep)
+            elif not keep_dumps:
+                remove = []
+                for prefix in dump_prefixes(rse):
+                    # The partial downloads are kept to be resumed
+                    remove.extend(fil for fil in glob.glob(os.path.join(cache_dir, prefix + '*')) if not fil.endswith('.part'))
+                logger.debug('Removing: %s', remove)
+                for fil in remove:
+                    os.remove(fil)
+
+            if not success and attemps > 0:
+                retry.put((rse, attemps - 1))
+    finally:
+        if next_ is not None:
+            queue.put(next_[0:2])
+        executor.shutdown(wait=True)
 
 
 def activity_logger(logpipes, logfilename, terminate):
@@ -0,0 +1,148 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+Least recently used eviction of the dumps cached by the auditor.
+
+The dumps are stored in the cache under names derived from the URL they
+were downloaded from (and the files derived from them, e.g. the compact
+dumps, under names starting with the name of the dump), so a dump is only
+downloaded once while it is cached, whatever the RSE check that needs it.
+
+The auditor processes sharing the cache mark the dumps they are checking
+as in use with marker files, so that the other processes do not evict them.
+'''
+from contextlib import contextmanager
+
+import errno
+import logging
+import os
+import stat
+import tempfile
+import time
+
+# Prefix of the names of the marker files of the dumps in use
+IN_USE = '.inuse_'
+
+
+@contextmanager
+def in_use(cache_dir, prefixes):
+    '''
+    Marks the files of `cache_dir` whose name starts with one of `prefixes`
+    (e.g. a dump and the files derived from it) as in use by this process
+    until the block exits, so that no process evicts them.
+    '''
+    markers = []
+    try:
+        for prefix in prefixes:
+            marker = os.path.join(cache_dir, '{0}{1}_{2}'.format(IN_USE, os.getpid(), prefix))
+            open(marker, 'w').close()
+            markers.append(marker)
+        yield
+    finally:
+        for marker in markers:
+            try:
+                os.remove(marker)
+            except OSError, error:
+                if error.errno != errno.ENOENT:
+                    raise
+
+
+def used_prefixes(cache_dir):
+    '''
+    :returns: The tuple of the prefixes marked as in use by the running
+    processes. The markers left by the processes that died are removed.
+    '''
+    prefixes = []
+    for name in os.listdir(cache_dir):
+        if not name.startswith(IN_USE):
+            continue
+        pid, _, prefix = name[len(IN_USE):].partition('_')
+        try:
+            os.kill(int(pid), 0)
+        except ValueError:
+            continue
+        except OSError, error:
+            if error.errno != errno.EPERM:
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError, error:
+                    if error.errno != errno.ENOENT:
+                        raise
+                continue
+        prefixes.append(prefix)
+    return tuple(prefixes)
+
+
+def touch(cache_dir, prefixes):
+    '''
+    Marks the files of `cache_dir` whose name starts with one of `prefixes`
+    (e.g. a dump and the files derived from it) as used now.
+    '''
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        if name.startswith(tuple(prefixes)):
+            try:
+                os.utime(os.path.join(cache_dir, name), (now, now))
+            except OSError, error:
+                if error.errno != errno.ENOENT:
+                    raise
+
+
+def usage(cache_dir):
+    '''
+    :returns: The list of (last use, size, path) of the files in `cache_dir`,
+    least recently used first.
+    '''
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith(IN_USE):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            info = os.stat(path)
+        except OSError, error:
+            if error.errno != errno.ENOENT:
+                raise
+            continue
+        if stat.S_ISREG(info.st_mode):
+            entries.append((info.st_mtime, info.st_size, path))
+    entries.sort()
+    return entries
+
+
+def evict(cache_dir, budget, keep=()):
+    '''
+    Removes the least recently used files of `cache_dir` until their total
+    size is below `budget` bytes. The files whose name starts with one of
+    the prefixes in `keep` or marked as in use by a process (i.e. the dumps
+    in use and the files derived from them) and the temporary files are not
+    removed.
+
+    :returns: The list of the removed files.
+    '''
+    logger = logging.getLogger('auditor.cache')
+    keep = tuple(keep) + used_prefixes(cache_dir) + (tempfile.template,)
+    entries = usage(cache_dir)
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in entries:
+        if total <= budget:
+            break
+        if os.path.basename(path).startswith(keep):
+            # In use or being written
+            continue
+        try:
+            os.remove(path)
+        except OSError, error:
+            # Already evicted by another worker
+            if error.errno != errno.ENOENT:
+                raise
+        total -= size
+        removed.append(path)
+
+    if removed:
+        logger.debug('Evicted %d files from %s, %d bytes used', len(removed), cache_dir, total)
+    return removed
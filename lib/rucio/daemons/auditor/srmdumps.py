@@ -1,16 +1,19 @@
 from rucio.common.config import __CONFIGFILES as __RUCIOCONFIGFILES
 from rucio.common.dumper import DUMPS_CACHE_DIR
+from rucio.common.dumper import HTTPDownloadFailed
 from rucio.common.dumper import http_download_to_file, srm_download_to_file, ddmendpoint_url, temp_file
 import ConfigParser
 import HTMLParser
 import datetime
 import glob
 import hashlib
+import json
 import logging
 import operator
 import os
 import re
 import requests
+import tempfile
 
 try:
     import gfal2
@@ -93,7 +96,7 @@ def get_newest(base_url, url_pattern, links):
     return max(times, key=operator.itemgetter(1))
 
 
-def srm_links(base_url):
+def srm_links(base_url, index=None):
     '''
     Returns a list of the urls contained in `base_url`.
     '''
@@ -113,11 +116,30 @@ class _LinkCollector(HTMLParser.HTMLParser, object):
             )
 
 
-def http_links(base_url):
+def http_links(base_url, index=None):
     '''
     Returns a list of the urls contained in `base_url`.
+
+    If given, the links are kept in `index` (see `load_index`) together with
+    the ETag and the Last-Modified date of the listing, which is then only
+    downloaded again if it changed.
     '''
-    html = requests.get(base_url).text
+    logger = logging.getLogger('auditor.srmdumps')
+    listings = index['listings'] if index is not None else {}
+    headers = {}
+    cached = listings.get(base_url)
+    if cached is not None:
+        if cached['etag'] is not None:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified'] is not None:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    response = requests.get(base_url, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        logger.debug('Listing of %s not modified', base_url)
+        return cached['links']
+
+    html = response.text
     link_collector = _LinkCollector()
 
     link_collector.feed(html)
@@ -127,9 +149,91 @@ def http_links(base_url):
             links.append('{0}/{1}'.format(base_url, link))
         else:
             links.append(link)
+
+    etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    if etag is not None or last_modified is not None:
+        listings[base_url] = {'etag': etag, 'last_modified': last_modified, 'links': links}
     return links
 
 
+def http_download_resumable(url, path, index):
+    '''
+    Downloads the file in `url` to `path`. The file is downloaded to
+    `path`.part first, if the download is interrupted it is resumed with a
+    range request the next time, provided that the file did not change
+    (according to the ETag or the Last-Modified date kept in `index`).
+    '''
+    logger = logging.getLogger('auditor.srmdumps')
+    partial = path + '.part'
+    downloads = index['downloads']
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+
+    # The content is not encoded by the server, so that the ranges are
+    # offsets of the file.
+    headers = {'Accept-Encoding': 'identity'}
+    validator = downloads.get(url)
+    if offset > 0 and validator is not None:
+        headers['Range'] = 'bytes={0}-'.format(offset)
+        headers['If-Range'] = validator
+
+    response = requests.get(url, headers=headers, stream=True)
+    if response.status_code == 206:
+        logger.debug('Resuming the download of %s from byte %d', url, offset)
+        mode = 'ab'
+        size = response.headers.get('Content-Range', '').split('/')[-1]
+    elif response.status_code == 200:
+        mode = 'wb'
+        offset = 0
+        size = response.headers.get('Content-Length', '')
+    else:
+        logger.error('Retrieving %s returned %d status code', url, response.status_code)
+        raise HTTPDownloadFailed('Error downloading ' + url, response.status_code)
+
+    validator = response.headers.get('ETag', response.headers.get('Last-Modified'))
+    if validator is not None and downloads.get(url) != validator:
+        downloads[url] = validator
+        save_index(index)
+
+    with open(partial, mode) as output:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            output.write(chunk)
+            offset += len(chunk)
+
+    if size.isdigit() and offset != int(size):
+        raise HTTPDownloadFailed('Incomplete download of {0}: {1} of {2} bytes'.format(url, offset, size))
+    os.rename(partial, path)
+    downloads.pop(url, None)
+
+
+def index_path(destdir, rse):
+    return os.path.join(destdir, 'srmdumps_{0}.index'.format(re.sub(r'\W', '-', rse)))
+
+
+def load_index(destdir, rse):
+    '''
+    Returns the index of the dumps of `rse` fetched to `destdir`: the links
+    listed in the directories of the dumps, with their ETag and Last-Modified
+    date, and the ETag or Last-Modified date of the dumps partially
+    downloaded.
+    '''
+    path = index_path(destdir, rse)
+    try:
+        with open(path) as index_file:
+            index = json.load(index_file)
+    except (IOError, ValueError):
+        index = {'listings': {}, 'downloads': {}}
+    index['path'] = path
+    return index
+
+
+def save_index(index):
+    directory = os.path.dirname(index['path'])
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w') as index_file:
+        json.dump(dict((key, value) for key, value in index.items() if key != 'path'), index_file)
+    os.rename(tmp_path, index['path'])
+
+
 protocol_funcs = {
     'srm': {
         'links': srm_links,
@@ -153,11 +257,11 @@ def protocol(url):
     return proto
 
 
-def get_links(base_url):
+def get_links(base_url, index=None):
     '''
     Given the URL `base_url` returns the URLs linked or contained in it.
     '''
-    return protocol_funcs[protocol(base_url)]['links'](base_url)
+    return protocol_funcs[protocol(base_url)]['links'](base_url, index)
 
 
 def download(url, filename):
@@ -205,14 +309,38 @@ def download_rse_dump(rse, configuration, date='latest', destdir=DUMPS_CACHE_DIR
     Return value: a tuple with the filename and a datetime instance with
     the date of the dump.
     '''
-    logger = logging.getLogger('auditor.srmdumps')
+    url, date = get_dump_url(rse, configuration, date, destdir)
+    return download_dump(rse, url, date, destdir), date
+
+
+def get_dump_url(rse, configuration, date='latest', destdir=DUMPS_CACHE_DIR):
+    '''
+    Returns a tuple with the URL of the dump of `rse` of the given `date`
+    (or the latest one) and a datetime instance with the date of the dump.
+    The HTTP listings are kept in the index of the dumps of `rse` in
+    `destdir`.
+    '''
     base_url, url_pattern = generate_url(rse, configuration)
     if date == 'latest':
-        links = get_links(base_url)
+        if not os.path.isdir(destdir):
+            os.mkdir(destdir)
+        index = load_index(destdir, rse)
+        links = get_links(base_url, index)
+        save_index(index)
         url, date = get_newest(base_url, url_pattern, links)
     else:
         url = '{0}/{1}'.format(base_url, date.strftime(url_pattern))
+    return url, date
+
+
+def download_dump(rse, url, date, destdir=DUMPS_CACHE_DIR):
+    '''
+    Downloads the dump of `rse` in `url` to `destdir`, unless it is already
+    there. The interrupted HTTP downloads are resumed.
 
+    Return value: the filename of the dump.
+    '''
+    logger = logging.getLogger('auditor.srmdumps')
     if not os.path.isdir(destdir):
         os.mkdir(destdir)
 
@@ -225,12 +353,24 @@ def download_rse_dump(rse, configuration, date='latest', destdir=DUMPS_CACHE_DIR
     filename = re.sub(r'\W', '-', filename)
     path = os.path.join(destdir, filename)
 
+    # Partial downloads of previous dumps
+    for partial in glob.glob(os.path.join(destdir, 'ddmendpoint_{0}_*.part'.format(re.sub(r'\W', '-', rse)))):
+        if partial != path + '.part':
+            os.remove(partial)
+
     if not os.path.exists(path):
         logger.debug('Trying to download: "%s"', url)
-        with temp_file(destdir, final_name=filename) as (f, _):
-            download(url, f)
+        if protocol(url) == 'http':
+            index = load_index(destdir, rse)
+            try:
+                http_download_resumable(url, path, index)
+            finally:
+                save_index(index)
+        else:
+            with temp_file(destdir, final_name=filename) as (f, _):
+                download(url, f)
 
-    return (path, date)
+    return path
 
 
 def generate_url(rse, config):
@@ -0,0 +1,303 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+"""
+Common runtime of the daemons.
+
+A daemon worker is described by a fetch function, returning the work of the
+partition assigned to the worker, and a process function, handling one item
+of that work. run_daemon runs them in a loop and takes care of the heartbeats,
+of the partitioning, of the sleep between the iterations, of the executor and
+of the per iteration metrics.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+
+from multiprocessing.pool import Pool, ThreadPool
+from re import match
+
+from sqlalchemy.exc import DatabaseError
+
+from rucio.common.exception import DatabaseException
+from rucio.core import heartbeat
+from rucio.core.monitor import record_counter, record_gauge, record_timer
+
+
+# Database errors that are expected from time to time and are only logged as warnings
+TRANSIENT_DATABASE_ERRORS = ['.*QueuePool.*', '.*ORA-03135.*']
+
+# Database error raised when a row is locked by another session with NOWAIT
+LOCKS_DETECTED = '.*ORA-00054.*'
+
+
+def is_transient_database_error(error):
+    """
+    Tells if a database error is expected to go away by itself.
+
+    :param error: The exception.
+    :return: True/False
+    """
+    if not isinstance(error, (DatabaseException, DatabaseError)) or not error.args:
+        return False
+    return any(match(regex, str(error.args[0])) for regex in TRANSIENT_DATABASE_ERRORS)
+
+
+def is_locks_detected(error):
+    """
+    Tells if a database error was raised because of a row locked by another session.
+
+    :param error: The exception.
+    :return: True/False
+    """
+    if not isinstance(error, (DatabaseException, DatabaseError)) or not error.args:
+        return False
+    return match(LOCKS_DETECTED, str(error.args[0])) is not None
+
+
+def handle_exception(error, prepend_str='', counter_prefix=None):
+    """
+    Logs an exception caught in a daemon loop: transient database errors as warnings,
+    everything else as critical. The exception is counted by class name.
+
+    :param error: The exception.
+    :param prepend_str: The prefix of the log messages.
+    :param counter_prefix: The prefix of the exception counter, e.g. rule.judge.exceptions.
+    """
+    if is_transient_database_error(error):
+        logging.warning(prepend_str + traceback.format_exc())
+    else:
+        logging.critical(prepend_str + traceback.format_exc())
+    if counter_prefix:
+        record_counter('%s.%s' % (counter_prefix, error.__class__.__name__))
+
+
+class HeartbeatHandler(object):
+    """
+    Sends the heartbeats of a daemon worker thread and keeps the partition
+    of the work assigned to it by rucio.core.heartbeat.live, or by
+    rucio.core.heartbeat.live_partition with consistent hashing.
+    """
+
+    def __init__(self, executable, older_than=600, consistent_hashing=False):
+        """
+        :param executable: The executable name used in the heartbeats table, e.g. rucio-judge-cleaner.
+        :param older_than: Ignore the heartbeats older than this number of seconds.
+        :param consistent_hashing: Use the partition ring of rucio.core.heartbeat.live_partition.
+        """
+        self.executable = executable
+        self.older_than = older_than
+        self.consistent_hashing = consistent_hashing
+        self.hostname = socket.gethostname()
+        self.pid = os.getpid()
+        self.thread = threading.current_thread()
+        self.assign_thread = 0
+        self.nr_threads = 1
+        self.partition = None
+
+    def live(self):
+        """
+        Sends a heartbeat and refreshes the partition.
+
+        :return: The dictionary returned by rucio.core.heartbeat.live or rucio.core.heartbeat.live_partition.
+        """
+        if self.consistent_hashing:
+            result = heartbeat.live_partition(executable=self.executable, hostname=self.hostname, pid=self.pid,
+                                              thread=self.thread, older_than=self.older_than)
+            self.partition = result
+        else:
+            result = heartbeat.live(executable=self.executable, hostname=self.hostname, pid=self.pid,
+                                    thread=self.thread, older_than=self.older_than)
+        self.assign_thread, self.nr_threads = result['assign_thread'], result['nr_threads']
+        return result
+
+    def die(self):
+        """
+        Removes the heartbeat of the worker.
+        """
+        heartbeat.die(executable=self.executable, hostname=self.hostname, pid=self.pid, thread=self.thread)
+
+    @property
+    def worker_number(self):
+        """
+        The worker number, as expected by the partitioned core queries.
+        """
+        return self.assign_thread
+
+    @property
+    def total_workers(self):
+        """
+        The total number of workers, as expected by the partitioned core queries,
+        i.e. the highest worker number.
+        """
+        return self.nr_threads - 1
+
+    @property
+    def prepend_str(self):
+        """
+        The prefix of the log messages of the worker.
+        """
+        return '%s[%i/%i] ' % (self.executable, self.worker_number, self.total_workers)
+
+
+class AdaptiveSleep(object):
+    """
+    Decides how long a worker waits before its next iteration, from the size of its last fetch.
+
+    A worker which fetched a full bulk of work does not sleep at all, as more work is likely
+    waiting. A worker which fetched nothing sleeps longer and longer, from min_sleep up to
+    max_sleep. In between, the sleep is proportional to the part of the bulk left unused.
+    """
+
+    def __init__(self, min_sleep=1, max_sleep=60, factor=2):
+        """
+        :param min_sleep: The sleep, in seconds, after the first empty fetch.
+        :param max_sleep: The maximum sleep, in seconds.
+        :param factor: The factor applied to the sleep after each consecutive empty fetch.
+        """
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.factor = factor
+        self.backoff = 0
+
+    def next_interval(self, fetched, bulk=None):
+        """
+        Computes the sleep before the next iteration.
+
+        :param fetched: The number of items fetched by the last iteration.
+        :param bulk: The maximum number of items a fetch can return, None if unbounded.
+        :return: The number of seconds to sleep.
+        """
+        if not fetched:
+            self.backoff = min(self.max_sleep, max(self.min_sleep, self.backoff * self.factor))
+            return self.backoff
+        self.backoff = 0
+        if not bulk or fetched >= bulk:
+            return 0
+        return self.min_sleep * (1 - float(fetched) / bulk)
+
+
+def get_executor(executor=None, workers=1):
+    """
+    Creates the pool processing the items of a daemon worker.
+
+    With a process pool, the process function given to run_daemon has to be a module level function.
+
+    :param executor: 'thread' for a thread pool, 'process' for a process pool, None to process in the worker thread.
+    :param workers: The number of threads or processes of the pool.
+    :return: A multiprocessing pool or None.
+    """
+    if executor is None:
+        return None
+    elif executor == 'thread':
+        return ThreadPool(workers)
+    elif executor == 'process':
+        return Pool(workers)
+    raise ValueError('Unknown executor %s' % executor)
+
+
+def _process_item(args):
+    """
+    Processes one item, logging the exception if any, so that one item cannot abort the whole fetch.
+
+    :param args: A tuple (process function, item, prefix of the log messages, prefix of the exception counters).
+    :return: True if the item was processed, False otherwise.
+    """
+    process, item, prepend_str, counter_prefix = args
+    try:
+        process(item)
+        return True
+    except Exception, error:
+        handle_exception(error, prepend_str=prepend_str, counter_prefix=counter_prefix)
+        return False
+
+
+def run_daemon(executable, fetch, process, graceful_stop, once=False, bulk=100, sleep=None,
+               executor=None, older_than=600, metrics_prefix=None, counter_prefix=None, consistent_hashing=False):
+    """
+    Runs the loop of a daemon worker thread.
+
+    At each iteration, the worker sends its heartbeat, fetches the work of its partition with
+    fetch(worker_number, total_workers, bulk) and calls process(item) on every fetched item, in
+    the worker thread or in the executor pool. The items are handed out to the pool one at a time,
+    so that idle pool workers take over the items left by the busy ones. The worker then sleeps
+    for the time decided by the AdaptiveSleep.
+
+    With consistent_hashing, the partition returned by rucio.core.heartbeat.live_partition is
+    given to fetch as the partition keyword argument, to be passed on to the core query.
+
+    The metrics daemons.<metrics_prefix>.fetch_size, .fetch_time, .processing_time and .idle_time
+    are recorded at each iteration.
+
+    :param executable: The executable name used in the heartbeats table.
+    :param fetch: The function fetching the work.
+    :param process: The function processing one item.
+    :param graceful_stop: The threading.Event stopping the daemon.
+    :param once: Run only one iteration.
+    :param bulk: The maximum number of items to fetch per iteration.
+    :param sleep: The AdaptiveSleep to use, a default one if None.
+    :param executor: A pool returned by get_executor, None to process in the worker thread.
+    :param older_than: Ignore the heartbeats older than this number of seconds.
+    :param metrics_prefix: The prefix of the metrics, the executable name if None.
+    :param counter_prefix: The prefix of the exception counters.
+    :param consistent_hashing: Partition the work with the partition ring instead of the worker number.
+    """
+    metrics_prefix = 'daemons.%s' % (metrics_prefix or executable)
+    sleep = sleep or AdaptiveSleep()
+    heart_beat = HeartbeatHandler(executable, older_than=older_than, consistent_hashing=consistent_hashing)
+
+    # Make an initial heartbeat so that all the workers have the correct worker number on the next try
+    heart_beat.live()
+    if not once:
+        graceful_stop.wait(1)
+
+    while not graceful_stop.is_set():
+        fetched = 0
+        try:
+            heart_beat.live()
+            prepend_str = heart_beat.prepend_str
+
+            start = time.time()
+            if consistent_hashing:
+                items = fetch(heart_beat.worker_number, heart_beat.total_workers, bulk, partition=heart_beat.partition)
+            else:
+                items = fetch(heart_beat.worker_number, heart_beat.total_workers, bulk)
+            fetched = len(items)
+            fetch_time = time.time() - start
+            logging.debug(prepend_str + 'index query time %f fetch size is %d' % (fetch_time, fetched))
+
+            start = time.time()
+            arguments = [(process, item, prepend_str, counter_prefix) for item in items]
+            if executor is None:
+                for argument in arguments:
+                    if graceful_stop.is_set():
+                        break
+                    _process_item(argument)
+            else:
+                for _ in executor.imap_unordered(_process_item, arguments, chunksize=1):
+                    pass
+            processing_time = time.time() - start
+
+            record_gauge('%s.fetch_size' % metrics_prefix, fetched)
+            record_timer('%s.fetch_time' % metrics_prefix, fetch_time * 1000)
+            record_timer('%s.processing_time' % metrics_prefix, processing_time * 1000)
+        except Exception, error:
+            handle_exception(error, prepend_str=heart_beat.prepend_str, counter_prefix=counter_prefix)
+
+        if once:
+            break
+
+        idle_time = sleep.next_interval(fetched, bulk)
+        record_timer('%s.idle_time' % metrics_prefix, idle_time * 1000)
+        if idle_time:
+            logging.debug(heart_beat.prepend_str + 'fetched %i items, sleeping %f seconds' % (fetched, idle_time))
+            graceful_stop.wait(idle_time)
+
+    heart_beat.die()
@@ -15,26 +15,22 @@ Judge-Cleaner is a daemon to clean expired replication rules.
 """
 
 import logging
-import os
 import socket
 import sys
 import threading
 import time
-import traceback
 
-
-from copy import deepcopy
 from datetime import datetime, timedelta
-from re import match
 from random import randint
 
 from sqlalchemy.exc import DatabaseError
 
 from rucio.common.config import config_get
 from rucio.common.exception import DatabaseException, UnsupportedOperation, RuleNotFound
-from rucio.core.heartbeat import live, die, sanity_check
+from rucio.core.heartbeat import sanity_check
 from rucio.core.rule import delete_rule, get_expired_rules
 from rucio.core.monitor import record_counter
+from rucio.daemons.common import AdaptiveSleep, is_locks_detected, run_daemon
 from rucio.db.sqla.util import get_db_time
 
 graceful_stop = threading.Event()
@@ -49,82 +45,38 @@ def rule_cleaner(once=False):
     Main loop to check for expired replication rules
     """
 
-    hostname = socket.gethostname()
-    pid = os.getpid()
-    current_thread = threading.current_thread()
-
     paused_rules = {}  # {rule_id: datetime}
 
-    # Make an initial heartbeat so that all judge-cleaners have the correct worker number on the next try
-    live(executable='rucio-judge-cleaner', hostname=hostname, pid=pid, thread=current_thread)
-    graceful_stop.wait(1)
+    def fetch(worker_number, total_workers, bulk):
+        # Refresh paused rules
+        for key in paused_rules.keys():
+            if datetime.utcnow() > paused_rules[key]:
+                del paused_rules[key]
 
-    while not graceful_stop.is_set():
-        try:
-            # heartbeat
-            heartbeat = live(executable='rucio-judge-cleaner', hostname=hostname, pid=pid, thread=current_thread)
+        return get_expired_rules(total_workers=total_workers,
+                                 worker_number=worker_number,
+                                 limit=bulk,
+                                 blacklisted_rules=[key for key in paused_rules])
 
+    def process(rule):
+        rule_id, rule_expression = rule[0], rule[1]
+        logging.info('rule_cleaner: Deleting rule %s with expression %s' % (rule_id, rule_expression))
+        try:
             start = time.time()
-
-            # Refresh paused rules
-            iter_paused_rules = deepcopy(paused_rules)
-            for key in iter_paused_rules:
-                if datetime.utcnow() > paused_rules[key]:
-                    del paused_rules[key]
-
-            rules = get_expired_rules(total_workers=heartbeat['nr_threads'] - 1,
-                                      worker_number=heartbeat['assign_thread'],
-                                      limit=200,
-                                      blacklisted_rules=[key for key in paused_rules])
-            logging.debug('rule_cleaner[%s/%s] index query time %f fetch size is %d' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, time.time() - start, len(rules)))
-
-            if not rules and not once:
-                logging.debug('rule_cleaner[%s/%s] did not get any work (paused_rules=%s)' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, str(len(paused_rules))))
-                graceful_stop.wait(60)
-            else:
-                for rule in rules:
-                    rule_id = rule[0]
-                    rule_expression = rule[1]
-                    logging.info('rule_cleaner[%s/%s]: Deleting rule %s with expression %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id, rule_expression))
-                    if graceful_stop.is_set():
-                        break
-                    try:
-                        start = time.time()
-                        delete_rule(rule_id=rule_id, nowait=True)
-                        logging.debug('rule_cleaner[%s/%s]: deletion of %s took %f' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id, time.time() - start))
-                    except (DatabaseException, DatabaseError, UnsupportedOperation), e:
-                        if match('.*ORA-00054.*', str(e.args[0])):
-                            paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(600, 2400))
-                            record_counter('rule.judge.exceptions.LocksDetected')
-                            logging.warning('rule_cleaner[%s/%s]: Locks detected for %s' % (heartbeat['assign_thread'], heartbeat['nr_threads'] - 1, rule_id))
-                        elif match('.*QueuePool.*', str(e.args[0])):
-                            logging.warning(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        elif match('.*ORA-03135.*', str(e.args[0])):
-                            logging.warning(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                        else:
-                            logging.error(traceback.format_exc())
-                            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-                    except RuleNotFound, e:
-                        pass
-        except (DatabaseException, DatabaseError), e:
-            if match('.*QueuePool.*', str(e.args[0])):
-                logging.warning(traceback.format_exc())
-                record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-            elif match('.*ORA-03135.*', str(e.args[0])):
-                logging.warning(traceback.format_exc())
-                record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-            else:
-                logging.critical(traceback.format_exc())
-                record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-        except Exception, e:
-            logging.critical(traceback.format_exc())
-            record_counter('rule.judge.exceptions.%s' % e.__class__.__name__)
-        if once:
-            break
-
-    die(executable='rucio-judge-cleaner', hostname=hostname, pid=pid, thread=current_thread)
+            delete_rule(rule_id=rule_id, nowait=True)
+            logging.debug('rule_cleaner: deletion of %s took %f' % (rule_id, time.time() - start))
+        except (DatabaseException, DatabaseError, UnsupportedOperation), e:
+            if not is_locks_detected(e):
+                raise
+            paused_rules[rule_id] = datetime.utcnow() + timedelta(seconds=randint(600, 2400))
+            record_counter('rule.judge.exceptions.LocksDetected')
+            logging.warning('rule_cleaner: Locks detected for %s' % rule_id)
+        except RuleNotFound:
+            pass
+
+    run_daemon(executable='rucio-judge-cleaner', fetch=fetch, process=process, graceful_stop=graceful_stop,
+               once=once, bulk=200, sleep=AdaptiveSleep(min_sleep=5, max_sleep=60),
+               metrics_prefix='judge.cleaner', counter_prefix='rule.judge.exceptions')
 
 
 def stop(signum=None, frame=None):
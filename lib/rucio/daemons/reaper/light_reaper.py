@@ -75,10 +75,11 @@ def reaper(rses=[], worker_number=1, total_workers=1, chunk_size=100, once=False
 
                 rse_info = rsemgr.get_rse_info(rse)
                 rse_protocol = rse_core.get_rse_protocols(rse)
-                prot = rsemgr.create_protocol(rse_info, 'delete', scheme=scheme)
+                prot = rsemgr.acquire_protocol(rse_info, 'delete', scheme=scheme)
                 deleted_replicas = []
+                # The connection is not kept for reuse after a failure
+                discard = False
                 try:
-                    prot.connect()
                     for replica in replicas:
                         nothing_to_do = False
                         try:
@@ -104,6 +105,7 @@ def reaper(rses=[], worker_number=1, total_workers=1, chunk_size=100, once=False
                             logging.warning(err_msg)
                             deleted_replicas.append(replica)
                         except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+                            discard = True
                             err_msg = 'Light Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s' % (worker_number, total_workers, replica['scope'], replica['name'], pfn, rse, str(error))
                             logging.warning(err_msg)
                             add_message('deletion-failed', {'scope': replica['scope'],
@@ -115,9 +117,10 @@ def reaper(rses=[], worker_number=1, total_workers=1, chunk_size=100, once=False
                                                             'reason': str(error)})
 
                         except:
+                            discard = True
                             logging.critical(traceback.format_exc())
                 finally:
-                    prot.close()
+                    rsemgr.release_protocol(prot, discard=discard)
 
                 delete_temporary_dids(dids=deleted_replicas)
 
@@ -202,7 +202,6 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                      nothing_to_do[rse['id']])
                         continue
 
-                    prot = rsemgr.create_protocol(rse_info, 'delete', scheme=scheme)
                     for files in chunks(replicas, chunk_size):
                         logging.debug('Reaper %s-%s: Running on : %s', worker_number, child_number, str(files))
                         try:
@@ -226,9 +225,12 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
 
                             monitor.record_counter(counters='reaper.deletion.being_deleted', delta=len(files))
 
+                            prot = None
+                            # The connection is not kept for reuse after a failure
+                            discard = False
                             try:
                                 deleted_files = []
-                                prot.connect()
+                                prot = rsemgr.acquire_protocol(rse_info, 'delete', scheme=scheme)
                                 for replica in files:
                                     try:
                                         logging.info('Reaper %s-%s: Deletion ATTEMPT of %s:%s as %s on %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'])
@@ -267,6 +269,7 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                                                             'url': replica['pfn'],
                                                                             'reason': str(err_msg)})
                                     except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+                                        discard = True
                                         logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
                                         add_message('deletion-failed', {'scope': replica['scope'],
                                                                         'name': replica['name'],
@@ -276,6 +279,7 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                                                         'url': replica['pfn'],
                                                                         'reason': str(error)})
                                     except Exception as error:
+                                        discard = True
                                         logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
                                         add_message('deletion-failed', {'scope': replica['scope'],
                                                                         'name': replica['name'],
@@ -285,8 +289,10 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                                                         'url': replica['pfn'],
                                                                         'reason': str(error)})
                                     except:
+                                        discard = True
                                         logging.critical('Reaper %s-%s: Deletion CRITICAL of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(traceback.format_exc()))
                             except (ServiceUnavailable, RSEAccessDenied, ResourceTemporaryUnavailable) as error:
+                                discard = True
                                 for replica in files:
                                     logging.warning('Reaper %s-%s: Deletion NOACCESS of %s:%s as %s on %s: %s', worker_number, child_number, replica['scope'], replica['name'], replica['pfn'], rse['rse'], str(error))
                                     add_message('deletion-failed', {'scope': replica['scope'],
@@ -298,7 +304,8 @@ def reaper(rses, worker_number=1, child_number=1, total_children=1, chunk_size=1
                                                                     'reason': str(error)})
                                     break
                             finally:
-                                prot.close()
+                                if prot:
+                                    rsemgr.release_protocol(prot, discard=discard)
                             start = time.time()
                             with monitor.record_timer_block('reaper.delete_replicas'):
                                 delete_replicas(rse=rse['rse'], files=deleted_files)
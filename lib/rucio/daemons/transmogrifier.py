@@ -23,21 +23,23 @@ from math import exp
 from sys import exc_info, stdout, argv
 from traceback import format_exception
 
+from threadpool import ThreadPool, makeRequests
 
-from rucio.api.did import list_new_dids, set_new_dids, get_metadata
+from rucio.api.did import list_new_dids, set_new_dids
 from rucio.api.subscription import list_subscriptions, update_subscription
 from rucio.db.sqla.constants import DIDType, SubscriptionState
 from rucio.common.exception import (DatabaseException, DataIdentifierNotFound, InvalidReplicationRule, DuplicateRule, RSEBlacklisted,
                                     InvalidRSEExpression, InsufficientTargetRSEs, InsufficientAccountLimit, InputValidationError,
-                                    ReplicationRuleCreationTemporaryFailed, InvalidRuleWeight, StagingAreaRuleRequiresLifetime, SubscriptionNotFound)
+                                    InvalidObject, ReplicationRuleCreationTemporaryFailed, InvalidRuleWeight, StagingAreaRuleRequiresLifetime, SubscriptionNotFound)
 from rucio.common.config import config_get
 from rucio.common.schema import validate_schema
 from rucio.common.utils import chunks
 from rucio.core import monitor, heartbeat
+from rucio.core.did import get_metadata_bulk
 from rucio.core.rse import list_rses
 from rucio.core.rse_expression_parser import parse_expression
 from rucio.core.rse_selector import RSESelector
-from rucio.core.rule import add_rule, list_rules
+from rucio.core.rule import add_rule, add_rules, list_rules
 
 
 logging.basicConfig(stream=stdout, level=getattr(logging, config_get('common', 'loglevel').upper()),
@@ -72,6 +74,195 @@ def _retrial(func, *args, **kwargs):
             raise
 
 
+def get_rule_parameters(subscription, rule):
+    """
+    Translates a replication rule of a subscription into the parameters of add_rule.
+
+    :param subscription: The subscription dictionnary.
+    :param rule: One of the replication rules of the subscription.
+    :return: A dictionary of add_rule keyword arguments.
+    :raises ValueError: If the copies or the lifetime are not integers.
+    """
+    activity = rule.get('activity', 'User Subscriptions')
+    try:
+        validate_schema(name='activity', obj=activity)
+    except (InputValidationError, InvalidObject), error:
+        logging.error('Error validating the activity %s' % (str(error)))
+        activity = 'User Subscriptions'
+    lifetime = rule.get('lifetime', None)
+    if lifetime:
+        lifetime = int(lifetime)
+    return {'account': subscription['account'],
+            'copies': int(rule['copies']),
+            'rse_expression': str(rule['rse_expression']),
+            'grouping': rule.get('grouping', 'DATASET'),
+            'weight': rule.get('weight', None),
+            'lifetime': lifetime,
+            'locked': rule.get('locked', None) == 'True',
+            'subscription_id': subscription['id'],
+            'source_replica_expression': rule.get('source_replica_expression', None),
+            'activity': activity,
+            'purge_replicas': rule.get('purge_replicas', False) == 'True',
+            'ignore_availability': rule.get('ignore_availability', None),
+            'comment': str(subscription['comments'])}
+
+
+# Characters that give a subscription filter value a regular expression meaning.
+REGEX_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _is_literal(pattern):
+    """
+    Tells if a filter value matches like a plain string prefix.
+
+    :param pattern: The filter value.
+    :return: True/False
+    """
+    return not REGEX_METACHARACTERS.intersection(pattern)
+
+
+class CompiledSubscription(object):
+    """
+    A subscription with its filter parsed and its patterns precompiled.
+    """
+
+    def __init__(self, subscription):
+        """
+        :param subscription: The subscription dictionnary.
+        :raises ValueError: If the filter or the replication rules cannot be parsed.
+        """
+        self.subscription = subscription
+        self.filter = loads(subscription['filter'])
+        self.rules = [get_rule_parameters(subscription, rule) for rule in loads(subscription['replication_rules'])]
+        split_rule = self.filter.get('split_rule', False)
+        self.split_rule = split_rule is True or split_rule == 'true'
+        self.pattern = None
+        self.excluded_pattern = None
+        self.scopes = None
+        self.metadata = []
+        try:
+            for key, values in self.filter.items():
+                if key == 'pattern':
+                    self.pattern = re.compile(values)
+                elif key == 'excluded_pattern':
+                    self.excluded_pattern = re.compile(values)
+                elif key == 'split_rule':
+                    pass
+                elif key == 'scope':
+                    self.scopes = [(scope, re.compile(scope)) for scope in values]
+                else:
+                    if type(values) is not list:
+                        values = [values, ]
+                    self.metadata.append((str(key), [(str(value), re.compile(str(value))) for value in values]))
+        except re.error, error:
+            raise ValueError('Invalid regular expression in filter : %s' % str(error))
+
+    def index_key(self):
+        """
+        Chooses the attribute on which this subscription can be bucketed: the scope
+        if all the scope patterns are plain strings, otherwise the first metadata key
+        whose values are all plain strings.
+
+        :return: A tuple (key, list of literal values) or None if nothing can be indexed.
+        """
+        if self.scopes and all(_is_literal(scope) for scope, _ in self.scopes):
+            return 'scope', [scope for scope, _ in self.scopes]
+        for key, values in sorted(self.metadata):
+            if values and all(_is_literal(value) for value, _ in values):
+                return key, [value for value, _ in values]
+        return None
+
+    def match(self, did, metadata):
+        """
+        Method to identify if a DID matches the subscription.
+
+        :param did: The DID dictionnary.
+        :param metadata: The metadata dictionnary for the DID.
+        :return: True/False
+        """
+        if metadata['hidden']:
+            return False
+        if self.pattern and not self.pattern.match(did['name']):
+            return False
+        if self.excluded_pattern and self.excluded_pattern.match(did['name']):
+            return False
+        if self.scopes is not None and not any(regex.match(did['scope']) for _, regex in self.scopes):
+            return False
+        for key, values in self.metadata:
+            if key not in metadata:
+                return False
+            value = str(metadata[key])
+            if not any(regex.match(value) for _, regex in values):
+                return False
+        return True
+
+
+class SubscriptionIndex(object):
+    """
+    Index of the active subscriptions, compiled once per transmogrifier cycle.
+
+    The subscriptions are bucketed by scope or by a metadata key whenever their filter
+    uses plain strings for it, so that each DID is only tested against the subscriptions
+    that can possibly match it. Since the filters match with re.match, a plain string
+    matches any value starting with it, so the buckets are looked up by value prefix.
+    """
+
+    def __init__(self, subscriptions):
+        """
+        :param subscriptions: The list of subscription dictionnaries, ordered by priority.
+        """
+        self.subscriptions = []
+        self.buckets = {}
+        self.unindexed = []
+        for subscription in subscriptions:
+            try:
+                compiled = CompiledSubscription(subscription)
+            except ValueError, error:
+                logging.error('%s : Subscription %s will be skipped' % (error, subscription['name']))
+                continue
+            position = len(self.subscriptions)
+            self.subscriptions.append(compiled)
+            index_key = compiled.index_key()
+            if index_key is None:
+                self.unindexed.append(position)
+                continue
+            key, values = index_key
+            bucket = self.buckets.setdefault(key, {'lengths': set(), 'values': {}})
+            for value in values:
+                bucket['lengths'].add(len(value))
+                bucket['values'].setdefault(value, set()).add(position)
+
+    def candidates(self, did, metadata):
+        """
+        Lists the subscriptions that can match a DID, in priority order.
+
+        :param did: The DID dictionnary.
+        :param metadata: The metadata dictionnary for the DID.
+        :return: A list of CompiledSubscription.
+        """
+        positions = set(self.unindexed)
+        for key, bucket in self.buckets.iteritems():
+            if key == 'scope':
+                value = did['scope']
+            elif key in metadata:
+                value = str(metadata[key])
+            else:
+                continue
+            for length in bucket['lengths']:
+                positions.update(bucket['values'].get(value[:length], ()))
+        return [self.subscriptions[position] for position in sorted(positions)]
+
+    def match(self, did, metadata):
+        """
+        Lists the subscriptions matching a DID, in priority order.
+
+        :param did: The DID dictionnary.
+        :param metadata: The metadata dictionnary for the DID.
+        :return: A list of CompiledSubscription.
+        """
+        return [compiled for compiled in self.candidates(did, metadata) if compiled.match(did, metadata)]
+
+
 def is_matching_subscription(subscription, did, metadata):
     """
     Method to identify if a DID matches a subscription.
@@ -81,59 +272,163 @@ def is_matching_subscription(subscription, did, metadata):
     param metadata: The metadata dictionnary for the DID
     return: True/False
     """
-    if metadata['hidden']:
-        return False
     try:
-        filter = loads(subscription['filter'])
+        compiled = CompiledSubscription(subscription)
     except ValueError, error:
         logging.error('%s : Subscription will be skipped' % error)
         return False
-    # Loop over the keys of filter for subscription
-    for key in filter:
-        values = filter[key]
-        if key == 'pattern':
-            if not re.match(values, did['name']):
-                return False
-        elif key == 'excluded_pattern':
-            if re.match(values, did['name']):
-                return False
-        elif key == 'split_rule':
-            pass
-        elif key == 'scope':
-            match_scope = False
-            for scope in values:
-                if re.match(scope, did['scope']):
-                    match_scope = True
-                    break
-            if not match_scope:
-                return False
-        else:
-            if type(values) is not list:
-                values = [values, ]
-            has_metadata = False
-            for meta in metadata:
-                if str(meta) == str(key):
-                    has_metadata = True
-                    match_meta = False
-                    for value in values:
-                        if re.match(str(value), str(metadata[meta])):
-                            match_meta = True
-                            break
-                    if not match_meta:
-                        return False
-            if not has_metadata:
-                return False
-    return True
+    return compiled.match(did, metadata)
+
+
+def _add_rule(dids, rule, nattempt=5, prepend_str=''):
+    """
+    Creates a replication rule with add_rule, retrying on temporary failures.
+
+    :param dids: The list of DIDs.
+    :param rule: The add_rule keyword arguments.
+    :param nattempt: The number of attempts.
+    :param prepend_str: The prefix of the log messages.
+    :return: A tuple (success, number of rules created). success is False if the rule should be retried at the next cycle.
+    """
+    str_activity = "".join(rule['activity'].split())
+    for attempt in xrange(0, nattempt):
+        try:
+            add_rule(dids=dids, **rule)
+            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=1)
+            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=1)
+            return True, 1
+        except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
+            # Errors that won't be retried
+            logging.error(prepend_str + '%s' % (str(error)))
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+            return True, 0
+        except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
+            # Errors to be retried
+            logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+        except Exception:
+            # Unexpected errors
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
+            exc_type, exc_value, exc_traceback = exc_info()
+            logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
+    logging.error(prepend_str + 'Rule for %s on %s cannot be inserted' % (', '.join(['%s:%s' % (did['scope'], did['name']) for did in dids]), rule['rse_expression']))
+    return False, 0
 
 
-def transmogrifier(bulk=5, once=False):
+def _add_split_rules(did, rule, blacklisted_rse_id, prepend_str=''):
+    """
+    Creates the rules of a split_rule subscription for one DID: one rule per selected RSE,
+    taking into account the RSEs already used by existing rules of the subscription.
+
+    :param did: The DID dictionnary.
+    :param rule: The add_rule keyword arguments.
+    :param blacklisted_rse_id: The list of RSE ids not available for writing.
+    :param prepend_str: The prefix of the log messages.
+    :return: A tuple (success, number of rules created).
+    """
+    account, copies, weight = rule['account'], rule['copies'], rule['weight']
+    rses = parse_expression(rule['rse_expression'])
+    list_of_rses = [rse['rse'] for rse in rses]
+    # Check that some rule doesn't already exist for this DID and subscription
+    preferred_rse_ids = []
+    for existing_rule in list_rules(filters={'subscription_id': rule['subscription_id'], 'scope': did['scope'], 'name': did['name']}):
+        already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(existing_rule['rse_expression'])]
+        for rse, rse_id in already_existing_rses:
+            if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
+                preferred_rse_ids.append(rse_id)
+    if len(preferred_rse_ids) >= copies:
+        return True, 0
+
+    rse_id_dict = {}
+    for rse in rses:
+        rse_id_dict[rse['id']] = rse['rse']
+    split_rule = dict(rule, copies=1)
+    try:
+        rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
+        selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
+    except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+        logging.warning(prepend_str + 'Problem getting RSEs for subscription %s for account %s : %s. Try including blacklisted sites' %
+                        (rule['subscription_id'], account, str(error)))
+        # Now including the blacklisted sites
+        try:
+            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
+            selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
+            split_rule['ignore_availability'] = True
+        except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
+            logging.error(prepend_str + 'Problem getting RSEs for subscription %s for account %s : %s. Skipping rule creation.' %
+                          (rule['subscription_id'], account, str(error)))
+            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
+            # The DID won't be reevaluated at the next cycle
+            return True, 0
+
+    success, nb_rule = True, 0
+    for rse in selected_rses[:copies]:
+        logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
+        split_rule['rse_expression'] = rse
+        rse_success, created = _add_rule([{'scope': did['scope'], 'name': did['name']}], split_rule, prepend_str=prepend_str)
+        success = success and rse_success
+        nb_rule += created
+    return success, nb_rule
+
+
+def _add_rules_batch(dids, rule, prepend_str=''):
+    """
+    Creates the same replication rule on a batch of DIDs with a single add_rules call.
+    As add_rules is transactional, one DID failing makes the whole batch fail: the batch
+    is then retried one DID at a time, so that the errors are handled per DID.
+
+    :param dids: The list of DIDs.
+    :param rule: The add_rule keyword arguments.
+    :param prepend_str: The prefix of the log messages.
+    :return: A tuple (dictionary (scope, name) -> success, number of rules created).
+    """
+    if len(dids) > 1:
+        try:
+            add_rules(dids=dids, rules=[dict(rule)])
+            str_activity = "".join(rule['activity'].split())
+            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=len(dids))
+            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=len(dids))
+            return dict(((did['scope'], did['name']), True) for did in dids), len(dids)
+        except DuplicateRule:
+            # Only the DIDs already having the rule are skipped by the fallback
+            logging.warning(prepend_str + 'Bulk creation of %i rules on %s failed on a duplicate rule, falling back to one rule per DID' % (len(dids), rule['rse_expression']))
+            monitor.record_counter(counters='transmogrifier.addnewrule.bulk_fallback', delta=1)
+        except Exception, error:
+            logging.warning(prepend_str + 'Bulk creation of %i rules on %s failed, falling back to one rule per DID : %s' % (len(dids), rule['rse_expression'], str(error)))
+            monitor.record_counter(counters='transmogrifier.addnewrule.bulk_fallback', delta=1)
+
+    results, nb_rule = {}, 0
+    for did in dids:
+        success, created = _add_rule([did], rule, prepend_str=prepend_str)
+        results[(did['scope'], did['name'])] = success
+        nb_rule += created
+    return results, nb_rule
+
+
+def _add_scope_rules(batches, prepend_str=''):
+    """
+    Creates the batches of rules of one scope, one after the other.
+
+    :param batches: A list of tuples (list of DIDs, add_rule keyword arguments).
+    :param prepend_str: The prefix of the log messages.
+    :return: The list of the results of _add_rules_batch.
+    """
+    return [_add_rules_batch(batch, rule, prepend_str=prepend_str) for batch, rule in batches]
+
+
+def transmogrifier(bulk=1000, rule_bulk=50, rule_threads=4, once=False):
     """
     Creates a Transmogrifier Worker that gets a list of new DIDs for a given hash,
     identifies the subscriptions matching the DIDs and
     submit a replication rule for each DID matching a subscription.
 
-    :param thread: Thread number at startup.
-    :param bulk: The number of requests to process.
+    The rules are created in two stages: the DIDs are first matched against the subscriptions,
+    then the matches are grouped per subscription rule and scope, and created in batches of
+    rule_bulk DIDs by a pool of rule_threads threads.
+
+    :param bulk: The number of DIDs to process per cycle.
+    :param rule_bulk: The maximum number of DIDs per add_rules call.
+    :param rule_threads: The number of threads creating the rules.
     :param once: Run only once.
     """
 
@@ -142,6 +437,7 @@ def transmogrifier(bulk=5, once=False):
     pid = os.getpid()
     hb_thread = threading.current_thread()
     heartbeat.sanity_check(executable=executable, hostname=hostname)
+    thread_pool = ThreadPool(rule_threads, poll_timeout=1)
 
     while not graceful_stop.is_set():
 
@@ -184,152 +480,67 @@ def transmogrifier(bulk=5, once=False):
                 continue
 
         try:
-            results = {}
             start_time = time.time()
             blacklisted_rse_id = [rse['id'] for rse in list_rses({'availability_write': False})]
             logging.debug(prepend_str + 'In transmogrifier worker')
+            subscription_index = SubscriptionIndex(subscriptions)
+            collections = [{'scope': did['scope'], 'name': did['name']} for did in dids if did['did_type'] in (str(DIDType.DATASET), str(DIDType.CONTAINER))]
+            metadatas = {}
+            for metadata in get_metadata_bulk(collections):
+                metadatas[(metadata['scope'], metadata['name'])] = metadata
+
+            # 1. Match the DIDs against the subscriptions and group the rules to create
+            did_success = dict(((did['scope'], did['name']), True) for did in dids)
+            batches = {}
+            nb_rule = 0
+            for did in dids:
+                if did['did_type'] not in (str(DIDType.DATASET), str(DIDType.CONTAINER)):
+                    continue
+                metadata = metadatas.get((did['scope'], did['name']))
+                if metadata is None:
+                    # The DID does not exist anymore, there is nothing to acknowledge
+                    logging.warning(prepend_str + "Data identifier '%s:%s' not found" % (did['scope'], did['name']))
+                    did_success[(did['scope'], did['name'])] = False
+                    continue
+                for compiled_subscription in subscription_index.match(did, metadata):
+                    subscription = compiled_subscription.subscription
+                    logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
+                    for rule_nr, rule in enumerate(compiled_subscription.rules):
+                        if compiled_subscription.split_rule:
+                            # The RSE selection depends on the rules already existing for the DID
+                            success, created = _add_split_rules(did, rule, blacklisted_rse_id, prepend_str=prepend_str)
+                            did_success[(did['scope'], did['name'])] &= success
+                            nb_rule += created
+                        else:
+                            key = (subscription['id'], rule_nr, did['scope'])
+                            if key not in batches:
+                                batches[key] = (rule, [])
+                            batches[key][1].append({'scope': did['scope'], 'name': did['name']})
+            match_time = time.time()
+
+            # 2. Create the rules in batches, the scopes being processed in parallel
+            scope_batches = {}
+            for (_, _, scope), (rule, batch_dids) in batches.iteritems():
+                scope_batches.setdefault(scope, []).extend([(batch, rule) for batch in chunks(batch_dids, rule_bulk)])
+            created = [nb_rule]
+
+            def _callback(request, result):
+                for results, nb_created in result:
+                    for did_key, success in results.iteritems():
+                        did_success[did_key] &= success
+                    created[0] += nb_created
+
+            for scope in scope_batches:
+                for request in makeRequests(_add_scope_rules, [((scope_batches[scope], ), {'prepend_str': prepend_str})], callback=_callback):
+                    thread_pool.putRequest(request)
+            thread_pool.wait()
+            nb_rule = created[0]
+            rule_time = time.time()
+
+            # 3. Acknowledge the processed DIDs
             identifiers = []
             for did in dids:
-                did_success = True
-                if did['did_type'] == str(DIDType.DATASET) or did['did_type'] == str(DIDType.CONTAINER):
-                    results['%s:%s' % (did['scope'], did['name'])] = []
-                    try:
-                        metadata = get_metadata(did['scope'], did['name'])
-                        for subscription in subscriptions:
-                            if is_matching_subscription(subscription, did, metadata) is True:
-                                filter = loads(subscription['filter'])
-                                split_rule = filter.get('split_rule', False)
-                                if split_rule == 'true':
-                                    split_rule = True
-                                elif split_rule == 'false':
-                                    split_rule = False
-                                stime = time.time()
-                                results['%s:%s' % (did['scope'], did['name'])].append(subscription['id'])
-                                logging.info(prepend_str + '%s:%s matches subscription %s' % (did['scope'], did['name'], subscription['name']))
-                                for rule in loads(subscription['replication_rules']):
-                                    # Get all the rule and subscription parameters
-                                    grouping = rule.get('grouping', 'DATASET')
-                                    lifetime = rule.get('lifetime', None)
-                                    ignore_availability = rule.get('ignore_availability', None)
-                                    weight = rule.get('weight', None)
-                                    source_replica_expression = rule.get('source_replica_expression', None)
-                                    locked = rule.get('locked', None)
-                                    if locked == 'True':
-                                        locked = True
-                                    else:
-                                        locked = False
-                                    purge_replicas = rule.get('purge_replicas', False)
-                                    if purge_replicas == 'True':
-                                        purge_replicas = True
-                                    else:
-                                        purge_replicas = False
-                                    rse_expression = str(rule['rse_expression'])
-                                    comment = str(subscription['comments'])
-                                    subscription_id = str(subscription['id'])
-                                    account = subscription['account']
-                                    copies = int(rule['copies'])
-                                    activity = rule.get('activity', 'User Subscriptions')
-                                    try:
-                                        validate_schema(name='activity', obj=activity)
-                                    except InputValidationError, error:
-                                        logging.error(prepend_str + 'Error validating the activity %s' % (str(error)))
-                                        activity = 'User Subscriptions'
-                                    if lifetime:
-                                        lifetime = int(lifetime)
-
-                                    str_activity = "".join(activity.split())
-                                    success = False
-                                    nattempt = 5
-                                    attemptnr = 0
-                                    skip_rule_creation = False
-
-                                    if split_rule:
-                                        rses = parse_expression(rse_expression)
-                                        list_of_rses = [rse['rse'] for rse in rses]
-                                        # Check that some rule doesn't already exist for this DID and subscription
-                                        preferred_rse_ids = []
-                                        for rule in list_rules(filters={'subscription_id': subscription_id, 'scope': did['scope'], 'name': did['name']}):
-                                            already_existing_rses = [(rse['rse'], rse['id']) for rse in parse_expression(rule['rse_expression'])]
-                                            for rse, rse_id in already_existing_rses:
-                                                if (rse in list_of_rses) and (rse_id not in preferred_rse_ids):
-                                                    preferred_rse_ids.append(rse_id)
-                                        if len(preferred_rse_ids) >= copies:
-                                            skip_rule_creation = True
-
-                                        rse_id_dict = {}
-                                        for rse in rses:
-                                            rse_id_dict[rse['id']] = rse['rse']
-                                        try:
-                                            rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                            selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=blacklisted_rse_id)]
-                                        except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                            logging.warning(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Try including blacklisted sites' %
-                                                            (subscription['name'], account, str(error)))
-                                            # Now including the blacklisted sites
-                                            try:
-                                                rseselector = RSESelector(account=account, rses=rses, weight=weight, copies=copies - len(preferred_rse_ids))
-                                                selected_rses = [rse_id_dict[rse_id] for rse_id, _ in rseselector.select_rse(0, preferred_rse_ids=preferred_rse_ids, copies=copies, blacklist=[])]
-                                                ignore_availability = True
-                                            except (InsufficientTargetRSEs, InsufficientAccountLimit, InvalidRuleWeight) as error:
-                                                logging.error(prepend_str + 'Problem getting RSEs for subscription "%s" for account %s : %s. Skipping rule creation.' %
-                                                              (subscription['name'], account, str(error)))
-                                                monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                                # The DID won't be reevaluated at the next cycle
-                                                did_success = did_success and True
-                                                continue
-
-                                    for attempt in xrange(0, nattempt):
-                                        attemptnr = attempt
-                                        nb_rule = 0
-                                        try:
-                                            if split_rule:
-                                                if not skip_rule_creation:
-                                                    for rse in selected_rses:
-                                                        logging.info(prepend_str + 'Will insert one rule for %s:%s on %s' % (did['scope'], did['name'], rse))
-                                                        add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=1,
-                                                                 rse_expression=rse, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                                 subscription_id=subscription_id, source_replica_expression=source_replica_expression, activity=activity,
-                                                                 purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-
-                                                        nb_rule += 1
-                                                        if nb_rule == copies:
-                                                            success = True
-                                                            break
-                                            else:
-                                                add_rule(dids=[{'scope': did['scope'], 'name': did['name']}], account=account, copies=copies,
-                                                         rse_expression=rse_expression, grouping=grouping, weight=weight, lifetime=lifetime, locked=locked,
-                                                         subscription_id=subscription['id'], source_replica_expression=source_replica_expression, activity=activity,
-                                                         purge_replicas=purge_replicas, ignore_availability=ignore_availability, comment=comment)
-                                                nb_rule += 1
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.done', delta=nb_rule)
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.activity.%s' % str_activity, delta=nb_rule)
-                                            success = True
-                                            break
-                                        except (InvalidReplicationRule, InvalidRuleWeight, InvalidRSEExpression, StagingAreaRuleRequiresLifetime, DuplicateRule) as error:
-                                            # Errors that won't be retried
-                                            success = True
-                                            logging.error(prepend_str + '%s' % (str(error)))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                            break
-                                        except (ReplicationRuleCreationTemporaryFailed, InsufficientTargetRSEs, InsufficientAccountLimit, DatabaseException, RSEBlacklisted) as error:
-                                            # Errors to be retried
-                                            logging.error(prepend_str + '%s Will perform an other attempt %i/%i' % (str(error), attempt + 1, nattempt))
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.%s' % (str(error.__class__.__name__)), delta=1)
-                                        except Exception, error:
-                                            # Unexpected errors
-                                            monitor.record_counter(counters='transmogrifier.addnewrule.errortype.unknown', delta=1)
-                                            exc_type, exc_value, exc_traceback = exc_info()
-                                            logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
-
-                                    did_success = (did_success and success)
-                                    if (attemptnr + 1) == nattempt and not success:
-                                        logging.error(prepend_str + 'Rule for %s:%s on %s cannot be inserted' % (did['scope'], did['name'], rse_expression))
-                                    else:
-                                        logging.info(prepend_str + '%s rule(s) inserted in %f seconds' % (str(nb_rule), time.time() - stime))
-                    except DataIdentifierNotFound, error:
-                        logging.warning(prepend_str + error)
-
-                if did_success:
+                if did_success[(did['scope'], did['name'])]:
                     if did['did_type'] == str(DIDType.FILE):
                         monitor.record_counter(counters='transmogrifier.did.file.processed', delta=1)
                     elif did['did_type'] == str(DIDType.DATASET):
@@ -339,17 +550,18 @@ def transmogrifier(bulk=5, once=False):
                     monitor.record_counter(counters='transmogrifier.did.processed', delta=1)
                     identifiers.append({'scope': did['scope'], 'name': did['name'], 'did_type': DIDType.from_sym(did['did_type'])})
 
-            time1 = time.time()
-
-            for identifier in chunks(identifiers, 100):
+            for identifier in chunks(identifiers, 1000):
                 _retrial(set_new_dids, identifier, None)
 
-            logging.info(prepend_str + 'Time to set the new flag : %f' % (time.time() - time1))
+            logging.info(prepend_str + 'Time to set the new flag : %f' % (time.time() - rule_time))
             tottime = time.time() - start_time
-            logging.info(prepend_str + 'It took %f seconds to process %i DIDs' % (tottime, len(dids)))
+            logging.info(prepend_str + 'It took %f seconds to process %i DIDs (matching %f, rules %f) and create %i rules' % (tottime, len(dids), match_time - start_time, rule_time - match_time, nb_rule))
             logging.debug(prepend_str + 'DIDs processed : %s' % (str(dids)))
             monitor.record_counter(counters='transmogrifier.job.done', delta=1)
             monitor.record_timer(stat='transmogrifier.job.duration', time=1000 * tottime)
+            if tottime > 0:
+                monitor.record_gauge(stat='transmogrifier.dids_per_second', value=int(len(dids) / tottime))
+                monitor.record_gauge(stat='transmogrifier.rules_per_second', value=int(nb_rule / tottime))
         except Exception:
             exc_type, exc_value, exc_traceback = exc_info()
             logging.critical(prepend_str + ''.join(format_exception(exc_type, exc_value, exc_traceback)).strip())
@@ -359,23 +571,26 @@ def transmogrifier(bulk=5, once=False):
             break
         if tottime < 10:
             time.sleep(10 - tottime)
+    thread_pool.dismissWorkers(rule_threads, do_join=True)
     heartbeat.die(executable, hostname, pid, hb_thread)
     logging.info(prepend_str + 'Graceful stop requested')
     logging.info(prepend_str + 'Graceful stop done')
 
 
-def run(threads=1, bulk=100, once=False):
+def run(threads=1, bulk=1000, rule_bulk=50, rule_threads=4, once=False):
     """
     Starts up the transmogrifier threads.
     """
 
     if once:
         logging.info('Will run only one iteration in a single threaded mode')
-        transmogrifier(bulk=bulk, once=once)
+        transmogrifier(bulk=bulk, rule_bulk=rule_bulk, rule_threads=rule_threads, once=once)
     else:
         logging.info('starting transmogrifier threads')
         thread_list = [threading.Thread(target=transmogrifier, kwargs={'once': once,
-                                                                       'bulk': bulk}) for _ in xrange(0, threads)]
+                                                                       'bulk': bulk,
+                                                                       'rule_bulk': rule_bulk,
+                                                                       'rule_threads': rule_threads}) for _ in xrange(0, threads)]
         [t.start() for t in thread_list]
         logging.info('waiting for interrupts')
         # Interruptible joins require a timeout.
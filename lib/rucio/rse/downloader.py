@@ -0,0 +1,363 @@
+'''
+ Copyright European Organization for Nuclear Research (CERN)
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+
+ Download engine of the rucio clients.
+
+ The files are downloaded in parallel by a pool of threads. The sources of a file are tried
+ in the order of the metalink returned by list_replicas, skipping the RSEs which already serve
+ their maximum number of concurrent downloads when another source is free. The checksums are
+ computed while the data is written, and large files served over HTTP are fetched with
+ parallel range requests.
+'''
+
+import logging
+import os
+import threading
+import time
+import zlib
+
+import xml.etree.ElementTree as ET
+
+from Queue import Queue, Empty
+
+import requests
+
+from rucio.common import exception
+from rucio.common.utils import StreamingChecksum
+from rucio.rse import rsemanager as rsemgr
+
+METALINK4_NS = '{urn:ietf:params:xml:ns:metalink}'
+
+
+def parse_metalink(metalink):
+    """
+    Parses the metalink4 document returned by list_replicas.
+
+    :param metalink: The metalink document as a string.
+
+    :returns: List of file dictionaries with the keys scope, name, bytes, adler32, md5 and sources,
+              sources being the list of the (rse, pfn) tuples ordered by priority.
+    """
+    files = []
+    root = ET.fromstring(metalink)
+    for element in root.findall(METALINK4_NS + 'file'):
+        scope, name = element.findtext(METALINK4_NS + 'identity').split(':', 1)
+        hashes = dict((h.get('type'), h.text) for h in element.findall(METALINK4_NS + 'hash'))
+        size = element.findtext(METALINK4_NS + 'size')
+        urls = sorted(element.findall(METALINK4_NS + 'url'), key=lambda url: int(url.get('priority', 0)))
+        files.append({'scope': scope,
+                      'name': name,
+                      'bytes': int(size) if size not in (None, 'None') else None,
+                      'adler32': hashes.get('adler32'),
+                      'md5': hashes.get('md5'),
+                      'sources': [(url.get('location'), url.text) for url in urls]})
+    return files
+
+
+class RangeNotSupported(Exception):
+    """
+    Raised when a server answers a range request with the whole file.
+    """
+    pass
+
+
+class Downloader(object):
+    """
+    Downloads files from their replicas with a pool of threads.
+    """
+
+    def __init__(self, threads=3, rse_concurrency=2, rse_limits=None, range_threshold=64 * 1024 * 1024,
+                 range_parts=4, chunk_size=1024 * 1024, retries=3, credentials=None, rse_settings=None, logger=None):
+        """
+        :param threads: The number of files downloaded in parallel.
+        :param rse_concurrency: The default maximum number of concurrent downloads from one RSE.
+        :param rse_limits: Dictionary {rse: maximum number of concurrent downloads} overriding rse_concurrency.
+        :param range_threshold: The size above which the files served over HTTP are downloaded with range requests.
+        :param range_parts: The number of parallel range requests per file.
+        :param chunk_size: The size of the blocks read from the network.
+        :param retries: The number of attempts per source.
+        :param credentials: The credentials given to the connect method of the protocols.
+        :param rse_settings: Dictionary {rse: settings} of RSE settings, completed with rsemanager.get_rse_info.
+        :param logger: The logger to use.
+        """
+        self.threads = threads
+        self.rse_concurrency = rse_concurrency
+        self.rse_limits = rse_limits or {}
+        self.range_threshold = range_threshold
+        self.range_parts = range_parts
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.credentials = credentials or {}
+        self.rse_settings = rse_settings if rse_settings is not None else {}
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def download(self, files):
+        """
+        Downloads files.
+
+        :param files: List of file dictionaries with the keys scope, name, dest_dir, sources and
+                      optionally bytes, adler32 and md5, e.g. as returned by parse_metalink.
+                      The checksums are verified only if given.
+
+        :returns: Dictionary {'scope:name': result}, result being a dictionary with the keys
+                  clientState (DONE, FAILED or FILE_NOT_FOUND), rse, pfn, protocol, transferStart,
+                  transferEnd, error and corrupted, the list of the PFNs which failed the validation.
+        """
+        results = {}
+        queue = Queue()
+        for f in files:
+            queue.put(f)
+
+        def worker():
+            while True:
+                try:
+                    f = queue.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results['%s:%s' % (f['scope'], f['name'])] = self.download_file(f)
+                except Exception, error:
+                    self.logger.error('Cannot download file %s:%s : %s' % (f['scope'], f['name'], error))
+                    results['%s:%s' % (f['scope'], f['name'])] = {'clientState': 'FAILED', 'rse': None, 'pfn': None, 'protocol': None,
+                                                                  'transferStart': None, 'transferEnd': None, 'error': error, 'corrupted': []}
+                finally:
+                    queue.task_done()
+
+        threads = [threading.Thread(target=worker) for _ in xrange(min(self.threads, len(files)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        # Interruptible joins require a timeout.
+        while any(thread.is_alive() for thread in threads):
+            [thread.join(timeout=3.14) for thread in threads]
+        return results
+
+    def download_file(self, f):
+        """
+        Downloads one file, trying its sources in order.
+
+        :param f: The file dictionary, see download.
+
+        :returns: The result dictionary, see download.
+        """
+        result = {'clientState': 'FILE_NOT_FOUND', 'rse': None, 'pfn': None, 'protocol': None,
+                  'transferStart': None, 'transferEnd': None, 'error': None, 'corrupted': []}
+        finalfile = os.path.join(f['dest_dir'], f['name'])
+        tempfile = '%s.part' % finalfile
+        if not os.path.isdir(f['dest_dir']):
+            os.makedirs(f['dest_dir'])
+
+        remaining = [(rse, pfn) for rse, pfn in f['sources'] if self._is_readable(rse)]
+        while remaining:
+            rse, pfn = self._acquire_source(remaining)
+            remaining.remove((rse, pfn))
+            result.update({'clientState': 'FAILED', 'rse': rse, 'pfn': pfn, 'protocol': pfn.split(':')[0], 'transferStart': time.time()})
+            try:
+                for attempt in xrange(self.retries):
+                    try:
+                        self.logger.info('File %s:%s trying from %s' % (f['scope'], f['name'], rse))
+                        checksum = self._transfer(rse, pfn, tempfile, f)
+                        self._validate(f, checksum, tempfile)
+                        os.rename(tempfile, finalfile)
+                        result.update({'clientState': 'DONE', 'error': None, 'transferEnd': time.time()})
+                        return result
+                    except exception.FileConsistencyMismatch, error:
+                        self.logger.warning('File %s:%s from %s: %s' % (f['scope'], f['name'], rse, error))
+                        result['corrupted'].append(pfn)
+                        result['error'] = error
+                        break
+                    except (exception.SourceNotFound, exception.RSEAccessDenied), error:
+                        self.logger.warning('File %s:%s from %s: %s' % (f['scope'], f['name'], rse, error))
+                        result['error'] = error
+                        break
+                    except Exception, error:
+                        self.logger.warning('File %s:%s from %s: %s' % (f['scope'], f['name'], rse, error))
+                        self.logger.debug('Failed attempt %s/%s' % (attempt + 1, self.retries))
+                        result['error'] = error
+            finally:
+                self._release_source(rse)
+                if os.path.isfile(tempfile):
+                    os.unlink(tempfile)
+            result['transferEnd'] = time.time()
+        return result
+
+    def _get_slots(self, rse):
+        """
+        Returns the semaphore limiting the concurrent downloads from an RSE.
+        """
+        with self._lock:
+            if rse not in self._slots:
+                self._slots[rse] = threading.BoundedSemaphore(self.rse_limits.get(rse, self.rse_concurrency))
+            return self._slots[rse]
+
+    def _acquire_source(self, sources):
+        """
+        Picks the first source, in metalink order, whose RSE has a free download slot.
+        If all of them are busy, waits for the first one.
+
+        :param sources: The list of (rse, pfn) tuples.
+
+        :returns: The (rse, pfn) tuple.
+        """
+        for rse, pfn in sources:
+            if self._get_slots(rse).acquire(False):
+                return rse, pfn
+        rse, pfn = sources[0]
+        self._get_slots(rse).acquire()
+        return rse, pfn
+
+    def _release_source(self, rse):
+        """
+        Frees the download slot of an RSE.
+        """
+        self._get_slots(rse).release()
+
+    def _get_rse_settings(self, rse):
+        """
+        Returns the settings of an RSE, from the cache or from rsemanager.get_rse_info.
+        """
+        with self._lock:
+            if rse not in self.rse_settings:
+                self.rse_settings[rse] = rsemgr.get_rse_info(rse)
+            return self.rse_settings[rse]
+
+    def _is_readable(self, rse):
+        """
+        Tells if an RSE is known and available for reading.
+        """
+        try:
+            if self._get_rse_settings(rse).get('availability_read', True):
+                return True
+            self.logger.info('%s is blacklisted for reading' % rse)
+        except Exception, error:
+            self.logger.warning('Cannot get the settings of %s : %s' % (rse, error))
+        return False
+
+    def _transfer(self, rse, pfn, tempfile, f):
+        """
+        Copies a replica into the temporary file.
+
+        :returns: The StreamingChecksum of the data written.
+        """
+        scheme = pfn.split(':')[0]
+        with rsemgr.pooled_protocol(self._get_rse_settings(rse), 'read', scheme=scheme, credentials=self.credentials) as protocol:
+            if os.path.isfile(tempfile):
+                os.unlink(tempfile)
+            if hasattr(protocol, 'session') and scheme in ('http', 'https', 'davs'):
+                url = 'https' + pfn[4:] if scheme == 'davs' else pfn
+                kwargs = {'verify': False, 'cert': protocol.cert, 'timeout': protocol.timeout}
+                if f.get('bytes') and f['bytes'] >= self.range_threshold and self.range_parts > 1:
+                    try:
+                        return self._get_ranges(protocol.session, url, kwargs, tempfile, f['bytes'])
+                    except RangeNotSupported:
+                        self.logger.debug('%s does not support range requests' % url)
+                return self._get_stream(protocol.session, url, kwargs, tempfile, md5=bool(f.get('md5')))
+            protocol.get(pfn, tempfile)
+            checksum = StreamingChecksum(adler32=bool(f.get('adler32')), md5=bool(f.get('md5')))
+            with open(tempfile, 'rb') as source:
+                for block in iter(lambda: source.read(self.chunk_size), ''):
+                    checksum.update(block)
+            return checksum
+
+    def _request(self, session, url, kwargs, headers=None):
+        """
+        Sends a streamed GET request and maps the HTTP errors to the rucio exceptions.
+        """
+        try:
+            response = session.get(url, stream=True, headers=headers or {}, **kwargs)
+        except requests.exceptions.ConnectionError, error:
+            raise exception.ServiceUnavailable(error)
+        if response.status_code in [200, 206]:
+            return response
+        elif response.status_code in [404, ]:
+            raise exception.SourceNotFound()
+        elif response.status_code in [401, 403]:
+            raise exception.RSEAccessDenied()
+        raise exception.RucioException(response.status_code, response.text)
+
+    def _get_stream(self, session, url, kwargs, tempfile, md5=False):
+        """
+        Downloads a file with one request, computing the checksums while writing.
+        """
+        checksum = StreamingChecksum(md5=md5)
+        response = self._request(session, url, kwargs)
+        with open(tempfile, 'wb') as destination:
+            for block in response.iter_content(self.chunk_size):
+                destination.write(block)
+                checksum.update(block)
+        return checksum
+
+    def _get_ranges(self, session, url, kwargs, tempfile, size):
+        """
+        Downloads a file with parallel range requests, each part written at its offset.
+        The Adler-32 checksums of the parts are combined, the MD5 is not computed.
+
+        :raises RangeNotSupported: if the server ignores the range requests.
+        """
+        with open(tempfile, 'wb') as destination:
+            destination.truncate(size)
+
+        part_size = (size + self.range_parts - 1) / self.range_parts
+        parts = [(first, min(first + part_size, size) - 1) for first in xrange(0, size, part_size)]
+        results = [None] * len(parts)
+
+        def get_part(index, first, last):
+            try:
+                response = self._request(session, url, kwargs, headers={'Range': 'bytes=%d-%d' % (first, last)})
+                if response.status_code != 206:
+                    response.close()
+                    raise RangeNotSupported()
+                adler, length = 1L, 0
+                with open(tempfile, 'r+b') as destination:
+                    destination.seek(first)
+                    for block in response.iter_content(self.chunk_size):
+                        destination.write(block)
+                        adler = zlib.adler32(block, adler)
+                        length += len(block)
+                if length != last - first + 1:
+                    raise exception.RucioException('Incomplete range %d-%d of %s: %d bytes' % (first, last, url, length))
+                results[index] = (adler, length)
+            except Exception, error:
+                results[index] = error
+
+        threads = [threading.Thread(target=get_part, args=(index, first, last)) for index, (first, last) in enumerate(parts)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+
+        for part in results:
+            if isinstance(part, Exception):
+                raise part
+
+        checksum = StreamingChecksum(md5=False)
+        for adler, length in results:
+            checksum.combine(adler, length)
+        return checksum
+
+    def _validate(self, f, checksum, tempfile):
+        """
+        Compares the checksums and the size of the downloaded file with the catalogue.
+
+        :raises FileConsistencyMismatch: if they differ.
+        """
+        if f.get('bytes') is not None and checksum.bytes != f['bytes']:
+            raise exception.FileConsistencyMismatch('Size mismatch : local %s vs recorded %s' % (checksum.bytes, f['bytes']))
+        if f.get('adler32') and checksum.adler32 is not None:
+            if checksum.adler32 != f['adler32']:
+                raise exception.FileConsistencyMismatch('Checksum mismatch : local %s vs recorded %s' % (checksum.adler32, f['adler32']))
+        elif f.get('md5'):
+            md5 = checksum.md5
+            if md5 is None:
+                md5 = StreamingChecksum(adler32=False)
+                with open(tempfile, 'rb') as source:
+                    for block in iter(lambda: source.read(self.chunk_size), ''):
+                        md5.update(block)
+                md5 = md5.md5
+            if md5 != f['md5']:
+                raise exception.FileConsistencyMismatch('Checksum mismatch : local %s vs recorded %s' % (md5, f['md5']))
@@ -0,0 +1,153 @@
+'''
+ Copyright European Organization for Nuclear Research (CERN)
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+
+ Pool of connected RSE protocols.
+
+ Connecting a protocol can cost a TLS, SSH or authentication handshake. The pool keeps the
+ connected protocols once released, per endpoint, i.e. per (rse, scheme, hostname, port,
+ prefix, operation, credentials), so that the next operation on the same endpoint with the
+ same credentials reuses the connection. The connections idle for too long are closed, the
+ connections idle for a while are checked with RSEProtocol.is_alive before being reused, and
+ the number of connections per endpoint is limited.
+'''
+
+import logging
+import threading
+import time
+
+from rucio.common import exception
+
+
+class ProtocolPool(object):
+    """
+    Keeps connected protocols per endpoint.
+    """
+
+    def __init__(self, max_per_endpoint=4, idle_timeout=300, check_after=30, wait_timeout=600):
+        """
+        :param max_per_endpoint: The maximum number of connections, in use or idle, per endpoint.
+        :param idle_timeout: The number of seconds after which an idle connection is closed.
+        :param check_after: The number of seconds of idleness after which a connection is checked before being reused.
+        :param wait_timeout: The number of seconds to wait for a free connection when the endpoint is full, before raising ResourceTemporaryUnavailable.
+        """
+        self.max_per_endpoint = max_per_endpoint
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.wait_timeout = wait_timeout
+        self._condition = threading.Condition()
+        self._idle = {}   # endpoint -> list of (protocol, release time), the most recently released last
+        self._count = {}  # endpoint -> number of connections, in use or idle
+        self._endpoints = {}  # id of the protocol in use -> endpoint
+
+    def acquire(self, endpoint, factory):
+        """
+        Returns a connected protocol for the endpoint, reusing an idle one if possible.
+
+        :param endpoint: The endpoint tuple, e.g. (rse, scheme, hostname, port, prefix, operation, credentials).
+        :param factory: The function creating and connecting a new protocol.
+
+        :returns: The connected protocol, to be given back with release.
+
+        :raises ResourceTemporaryUnavailable: if no connection became free within wait_timeout.
+        """
+        deadline = time.time() + self.wait_timeout if self.wait_timeout is not None else None
+        with self._condition:
+            self._evict()
+            while True:
+                idle = self._idle.get(endpoint)
+                while idle:
+                    protocol, released = idle.pop()
+                    if time.time() - released < self.check_after or self._is_alive(protocol):
+                        self._endpoints[id(protocol)] = endpoint
+                        return protocol
+                    self._close(endpoint, protocol)
+                if self._count.get(endpoint, 0) < self.max_per_endpoint:
+                    self._count[endpoint] = self._count.get(endpoint, 0) + 1
+                    break
+                timeout = deadline - time.time() if deadline is not None else None
+                if timeout is not None and timeout <= 0:
+                    raise exception.ResourceTemporaryUnavailable('No free connection to %s within %s seconds' % (str(endpoint), self.wait_timeout))
+                self._condition.wait(timeout)
+
+        try:
+            protocol = factory()
+        except:
+            with self._condition:
+                self._count[endpoint] -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._endpoints[id(protocol)] = endpoint
+        return protocol
+
+    def release(self, protocol, discard=False):
+        """
+        Gives back a protocol returned by acquire.
+
+        :param protocol: The protocol.
+        :param discard: Close the connection instead of keeping it, e.g. after a connection error.
+        """
+        with self._condition:
+            endpoint = self._endpoints.pop(id(protocol), None)
+            if endpoint is None:
+                return
+            if discard or not self.idle_timeout:
+                self._close(endpoint, protocol)
+            else:
+                self._idle.setdefault(endpoint, []).append((protocol, time.time()))
+            self._condition.notify()
+
+    def close(self):
+        """
+        Closes all the idle connections.
+        """
+        with self._condition:
+            for endpoint in self._idle.keys():
+                for protocol, _ in self._idle.pop(endpoint):
+                    self._close(endpoint, protocol)
+            self._condition.notify_all()
+
+    def stats(self):
+        """
+        Returns the number of connections per endpoint.
+
+        :returns: Dictionary {endpoint: (connections in use, idle connections)}.
+        """
+        with self._condition:
+            return dict((endpoint, (count - len(self._idle.get(endpoint, [])), len(self._idle.get(endpoint, []))))
+                        for endpoint, count in self._count.items() if count)
+
+    def _evict(self):
+        """
+        Closes the connections idle for more than idle_timeout. Called with the lock held.
+        """
+        limit = time.time() - self.idle_timeout
+        for endpoint, idle in self._idle.items():
+            while idle and idle[0][1] < limit:
+                protocol, _ = idle.pop(0)
+                self._close(endpoint, protocol)
+
+    def _is_alive(self, protocol):
+        """
+        Checks a connection before its reuse.
+        """
+        try:
+            return protocol.is_alive()
+        except Exception, error:
+            logging.debug('Health check of %s failed: %s' % (protocol.attributes.get('hostname'), error))
+            return False
+
+    def _close(self, endpoint, protocol):
+        """
+        Closes a connection and forgets it. Called with the lock held.
+        """
+        self._count[endpoint] -= 1
+        try:
+            protocol.close()
+        except Exception, error:
+            logging.debug('Cannot close the connection to %s: %s' % (str(endpoint), error))
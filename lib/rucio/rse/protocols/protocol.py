@@ -26,6 +26,20 @@ if rsemanager.SERVER_MODE:
     from rucio.core import replica
 
 
+def deterministic_path(scope, name):
+    """ Path of a file on the RSEs implementing the RUCIO naming convention.
+
+        :param scope: scope
+        :param name: filename
+
+        :returns: the path of the file, relative to the prefix of the RSE
+    """
+    hstr = hashlib.md5('%s:%s' % (scope, name)).hexdigest()
+    if scope.startswith('user') or scope.startswith('group'):
+        scope = scope.replace('.', '/')
+    return '%s/%s/%s/%s' % (scope, hstr[0:2], hstr[2:4], name)
+
+
 class RSEProtocol(object):
     """ This class is virtual and acts as a base to inherit new protocols from. It further provides some common functionality which applies for the amjority of the protocols."""
 
@@ -37,6 +51,8 @@ class RSEProtocol(object):
         self.attributes = protocol_attr
         self.renaming = True
         self.overwrite = False
+        self.streaming_checksum = False  # True if put accepts a StreamingChecksum computed while sending the file
+        self.streaming_checksum_read = False  # True if get accepts a StreamingChecksum computed while receiving the file
         self.rse = rse_settings
         if not self.rse['deterministic']:
             if rsemanager.CLIENT_MODE:
@@ -92,7 +108,9 @@ class RSEProtocol(object):
 
             :returns: dict with scope:name as keys and PFN as value (in case of errors the Rucio exception si assigned to the key)
         """
-        client = ReplicaClient()
+        if getattr(self, '_replica_client', None) is None:  # Kept with the protocol, to authenticate only once
+            self._replica_client = ReplicaClient()
+        client = self._replica_client
         pfns = {}
 
         lfns = [lfns] if type(lfns) == dict else lfns
@@ -116,10 +134,7 @@ class RSEProtocol(object):
 
             :returns: RSE specific URI of the physical file
         """
-        hstr = hashlib.md5('%s:%s' % (scope, name)).hexdigest()
-        if scope.startswith('user') or scope.startswith('group'):
-            scope = scope.replace('.', '/')
-        return '%s/%s/%s/%s' % (scope, hstr[0:2], hstr[2:4], name)
+        return deterministic_path(scope, name)
 
     def _get_path_nondeterministic_server(self, scope, name):
         """ Provides the path of a replica for non-deterministic sites. Will be assigned to get path by the __init__ method if neccessary. """
@@ -198,6 +213,27 @@ class RSEProtocol(object):
         """
         raise NotImplementedError
 
+    def exists_bulk(self, paths):
+        """
+            Checks if the requested files are known by the referred RSE.
+            Protocols able to check several files with one request override it.
+
+            :param paths: list of physical file names
+
+            :returns: a dict with the physical file names as keys and True/False as values
+        """
+        return dict((path, self.exists(path)) for path in set(paths))
+
+    def prepare(self, paths, operation):
+        """
+            Prepares an operation on several files, e.g. to get their signed URLs with one request.
+            Does nothing by default.
+
+            :param paths: list of physical file names
+            :param operation: the operation to come, read or write
+        """
+        pass
+
     def connect(self):
         """
             Establishes the actual connection to the referred RSE.
@@ -210,6 +246,15 @@ class RSEProtocol(object):
         """ Closes the connection to RSE."""
         raise NotImplementedError
 
+    def is_alive(self):
+        """
+            Checks if the connection to the RSE can still be used, e.g. before reusing a pooled connection.
+            Protocols keeping a connection open override it.
+
+            :returns: True if the connection can be used, False if a new connection must be established.
+        """
+        return True
+
     def get(self, path, dest):
         """
             Provides access to files stored inside connected the RSE.
@@ -248,6 +293,24 @@ class RSEProtocol(object):
         """
         raise NotImplementedError
 
+    def delete_bulk(self, paths):
+        """
+            Deletes several files from the connected RSE.
+            Protocols able to delete several files with one request override it.
+
+            :param paths: list of physical file names
+
+            :returns: a dict with the physical file names as keys and True or the exception as values.
+        """
+        ret = {}
+        for path in set(paths):
+            try:
+                self.delete(path)
+                ret[path] = True
+            except Exception as error:
+                ret[path] = error
+        return ret
+
     def rename(self, path, new_path):
         """ Allows to rename a file stored inside the connected RSE.
 
@@ -282,3 +345,20 @@ class RSEProtocol(object):
             :returns: a dict with two keys, filesize and adler32 of the file provided in path.
         """
         raise NotImplementedError
+
+    def stat_bulk(self, paths):
+        """
+            Returns the stats of several files.
+            Protocols able to stat several files concurrently or with one request override it.
+
+            :param paths: list of physical file names
+
+            :returns: a dict with the physical file names as keys and the stats or the exception as values.
+        """
+        ret = {}
+        for path in set(paths):
+            try:
+                ret[path] = self.stat(path)
+            except Exception as error:
+                ret[path] = error
+        return ret
@@ -18,7 +18,7 @@ from boto import connect_s3
 from boto.s3.connection import OrdinaryCallingFormat
 from boto.s3.key import Key
 
-from rucio.common import exception
+from rucio.common import exception, objectstore
 from rucio.common.config import get_rse_credentials
 
 from rucio.rse.protocols import protocol
@@ -36,6 +36,10 @@ class Default(protocol.RSEProtocol):
         self.__conn = None
         self.renaming = False
         self.overwrite = True
+        self.streaming_checksum = True
+        self.streaming_checksum_read = True
+        # Size threshold, part size and number of threads of the multipart transfers of the RSE
+        self.transfer_settings = objectstore.get_transfer_settings(self.attributes)
 
     def _get_path(self, scope, name):
         """ Transforms the physical file name into the local URI in the referred RSE.
@@ -163,12 +167,14 @@ class Default(protocol.RSEProtocol):
         """ Closes the connection to RSE."""
         pass
 
-    def get(self, pfn, dest):
+    def get(self, pfn, dest, checksum=None):
         """
             Provides access to files stored inside connected the RSE.
+            Large files are downloaded by ranges in parallel.
 
             :param path: Physical file name of requested file
             :param dest: Name and path of the files when stored at the client
+            :param checksum: StreamingChecksum, without MD5, updated with the data received
 
             :raises DestinationNotAccessible: if the destination storage was not accessible.
             :raises ServiceUnavailable: if some generic error occured in the library.
@@ -178,7 +184,7 @@ class Default(protocol.RSEProtocol):
             bucket, key = self.get_bucket_key(pfn)
             if key is None:
                 raise exception.SourceNotFound('Cannot get the source key from S3')
-            key.get_contents_to_filename(dest)
+            objectstore.download_file(key, dest, self.transfer_settings, checksum=checksum)
         except IOError as e:
             if e.errno == 2:
                 raise exception.DestinationNotAccessible(e)
@@ -191,13 +197,15 @@ class Default(protocol.RSEProtocol):
                 os.remove(dest)
             raise exception.ServiceUnavailable(e)
 
-    def put(self, source, target, source_dir=None):
+    def put(self, source, target, source_dir=None, checksum=None):
         """
             Allows to store files inside the referred RSE.
+            Large files are uploaded by parts in parallel.
 
             :param source: path to the source file on the client file system
             :param target: path to the destination file on the storage
             :param source_dir: Path where the to be transferred files are stored in the local file system
+            :param checksum: StreamingChecksum updated with the data sent
 
             :raises DestinationNotAccessible: if the destination storage was not accessible.
             :raises ServiceUnavailable: if some generic error occured in the library.
@@ -208,7 +216,7 @@ class Default(protocol.RSEProtocol):
             bucket, key = self.get_bucket_key(target, create=True)
             if key is None:
                 raise exception.DestinationNotAccessible('Cannot get the destionation key from S3')
-            key.set_contents_from_filename(full_name)
+            objectstore.upload_file(bucket, key.name, full_name, self.transfer_settings, checksum=checksum)
         except exception.SourceNotFound as e:
             raise exception.SourceNotFound(e)
         except Exception as e:
@@ -236,6 +244,36 @@ class Default(protocol.RSEProtocol):
         except Exception as e:
             raise exception.ServiceUnavailable(e)
 
+    def delete_bulk(self, pfns):
+        """
+            Deletes files from the connected RSE, with one multi-object delete request per bucket and batch of keys.
+            As S3 reports the missing keys as deleted, the keys are looked up first.
+
+            :param pfns: list of physical file names
+
+            :returns: a dict with the physical file names as keys and True, or SourceNotFound if the file was not found
+                      on the referred storage, or ServiceUnavailable if some generic error occured, as values
+        """
+        ret, buckets = {}, {}
+        for pfn in pfns:
+            try:
+                bucket_name, key_name = self.get_bucket_key_name(pfn)
+                buckets.setdefault(bucket_name, {})[key_name] = pfn
+            except Exception as e:
+                ret[pfn] = e
+        for bucket_name, keys in buckets.items():
+            try:
+                bucket = self.__conn.get_bucket(bucket_name, validate=False)
+                existing = objectstore.existing_keys(bucket, keys.keys(), threads=self.transfer_settings['threads'])
+                for key_name in set(keys) - existing:
+                    ret[keys[key_name]] = exception.SourceNotFound('Cannot get the key from S3')
+                for key_name, result in objectstore.delete_keys(bucket, existing).items():
+                    ret[keys[key_name]] = True if result['status'] == 0 else exception.ServiceUnavailable(result['output'])
+            except Exception as e:
+                for pfn in keys.values():
+                    ret[pfn] = exception.ServiceUnavailable(e)
+        return ret
+
     def rename(self, pfn, new_pfn):
         """ Allows to rename a file stored inside the connected RSE.
 
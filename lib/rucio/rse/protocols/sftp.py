@@ -60,6 +60,10 @@ class Default(protocol.RSEProtocol):
         """ Closes the connection to RSE."""
         self.__connection.close()
 
+    def is_alive(self):
+        """ Checks if the SSH transport of the connection is still active."""
+        return self.__connection.sftp_client.get_channel().get_transport().is_active()
+
     def get(self, pfn, dest):
         """
             Provides access to files stored inside connected the RSE.
@@ -9,8 +9,11 @@
 # - Wen Guan, <wen.guan@cern.ch>, 2016-2017
 # - Mario Lassnig, <mario.lassnig@cern.ch>, 2017
 
+import calendar
 import os
 import requests
+import threading
+import time
 import urlparse
 
 from progressbar import ProgressBar
@@ -19,6 +22,72 @@ from sys import stdout
 from rucio.client.objectstoreclient import ObjectStoreClient
 from rucio.common import exception
 from rucio.rse.protocols import protocol
+from rucio.rse.sessions import get_session, release_session
+
+# Lifetime of the signed URLs whose expiration time is not readable, as signed by rucio.common.objectstore
+SIGNED_URL_LIFETIME = 3600
+
+# Number of seconds before their expiration time after which the signed URLs are not used anymore
+SIGNED_URL_MARGIN = 300
+
+
+def signed_url_expiration(signed_url, lifetime=SIGNED_URL_LIFETIME):
+    """
+    Returns the expiration time of a signed URL, from its S3 query string authentication parameters.
+
+    :param signed_url: The signed URL.
+    :param lifetime: The lifetime assumed if the URL does not tell.
+
+    :returns: The expiration time in seconds since the epoch.
+    """
+    query = urlparse.parse_qs(urlparse.urlparse(signed_url).query)
+    try:
+        if 'Expires' in query:
+            return int(query['Expires'][0])
+        if 'X-Amz-Date' in query and 'X-Amz-Expires' in query:
+            return calendar.timegm(time.strptime(query['X-Amz-Date'][0], '%Y%m%dT%H%M%SZ')) + int(query['X-Amz-Expires'][0])
+    except ValueError:
+        pass
+    return time.time() + lifetime
+
+
+class SignedURLCache(object):
+    """
+    Keeps the signed URLs until shortly before they expire.
+    """
+
+    def __init__(self, margin=SIGNED_URL_MARGIN):
+        """
+        :param margin: Number of seconds before their expiration time after which the signed URLs are dropped.
+        """
+        self.margin = margin
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    def get(self, rse, operation, url):
+        """
+        Returns the signed URL of an URL, None if not cached or about to expire.
+        """
+        with self._lock:
+            signed_url, expiration = self._urls.get((rse, operation, url), (None, 0))
+            if expiration - self.margin > time.time():
+                return signed_url
+            self._urls.pop((rse, operation, url), None)
+            return None
+
+    def set(self, rse, operation, url, signed_url):
+        """
+        Caches the signed URL of an URL.
+        """
+        with self._lock:
+            now = time.time()
+            for key in [key for key, (_, expiration) in self._urls.items() if expiration - self.margin <= now]:
+                del self._urls[key]
+            self._urls[(rse, operation, url)] = (signed_url, signed_url_expiration(signed_url))
+
+
+# Signed URLs shared by the protocol instances of the process
+SIGNED_URLS = SignedURLCache()
 
 
 class UploadInChunks(object):
@@ -74,9 +143,10 @@ class Default(protocol.RSEProtocol):
 
     def __init__(self, protocol_attr, rse_settings):
         super(Default, self).__init__(protocol_attr, rse_settings)
-        self.session = requests.session()
+        self._client = None
         self.timeout = 300
         self.cert = None
+        self.session = None
         self.renaming = False
         self.overwrite = True
 
@@ -185,26 +255,51 @@ class Default(protocol.RSEProtocol):
 
         return ret
 
+    def _get_client(self):
+        if self._client is None:  # Kept with the protocol, to authenticate only once
+            self._client = ObjectStoreClient()
+        return self._client
+
     def _connect(self):
         url = self.path2pfn('')
-        client = ObjectStoreClient()
-        return client.connect(self.rse['rse'], url)
+        return self._get_client().connect(self.rse['rse'], url)
 
     def _get_signed_urls(self, urls, operation='read'):
-        client = ObjectStoreClient()
-        return client.get_signed_urls(urls, rse=self.rse['rse'], operation=operation)
+        """ Returns the signed URLs of several URLs, asking the server with one request for the ones not cached. """
+        result, missing = {}, []
+        for url in urls:
+            result[url] = SIGNED_URLS.get(self.rse['rse'], operation, url)
+            if result[url] is None:
+                missing.append(url)
+        if missing:
+            signed_urls = self._get_client().get_signed_urls(missing, rse=self.rse['rse'], operation=operation)
+            for url in missing:
+                signed_url = signed_urls.get(url, exception.RucioException('No signed URL returned for %s' % url))
+                if not isinstance(signed_url, Exception):
+                    SIGNED_URLS.set(self.rse['rse'], operation, url, signed_url)
+                result[url] = signed_url
+        return result
 
     def _get_signed_url(self, url, operation='read'):
-        client = ObjectStoreClient()
-        return client.get_signed_url(url, rse=self.rse['rse'], operation=operation)
+        return self._get_signed_urls([url], operation=operation)[url]
 
     def _get_metadata(self, urls):
-        client = ObjectStoreClient()
-        return client.get_metadata(urls, rse=self.rse['rse'])
+        return self._get_client().get_metadata(urls, rse=self.rse['rse'])
 
     def _rename(self, url, new_url):
-        client = ObjectStoreClient()
-        return client.rename(url, new_url, rse=self.rse['rse'])
+        return self._get_client().rename(url, new_url, rse=self.rse['rse'])
+
+    def prepare(self, paths, operation):
+        """
+            Gets the signed URLs of several files with one request.
+
+            :param paths: list of physical file names
+            :param operation: the operation to come, read or write
+        """
+        try:
+            self._get_signed_urls(paths, operation=operation)
+        except Exception:
+            pass  # The server fails the whole request if one of the files is missing, each operation then reports its own error
 
     def connect(self):
         """
@@ -214,11 +309,15 @@ class Default(protocol.RSEProtocol):
 
             :raises RSEAccessDenied: if no connection could be established.
         """
-        pass
+        # The session, and its connections kept alive, are shared with the other protocols of the endpoint using the same certificate
+        self.close()
+        self.session = get_session((self.attributes['scheme'], self.attributes['hostname'], self.attributes['port']), cert=self.cert)
 
     def close(self):
-        """ Closes the connection to RSE."""
-        pass
+        """ Releases the connection to the RSE. The shared session keeps its connections alive for the next protocols of the endpoint."""
+        if self.session is not None:
+            release_session(self.session)
+            self.session = None
 
     def get(self, path, dest):
         """
@@ -283,7 +382,8 @@ class Default(protocol.RSEProtocol):
         """
         full_name = source_dir + '/' + source if source_dir else source
         path = self._get_signed_url(target, operation='write')
-        full_name = source_dir + '/' + source if source_dir else source
+        if isinstance(path, Exception):
+            raise path
         try:
             if not os.path.exists(full_name):
                 raise exception.SourceNotFound()
@@ -362,6 +462,29 @@ class Default(protocol.RSEProtocol):
         except Exception as e:
             raise exception.RucioException(e)
 
+    def exists_bulk(self, pfns):
+        """
+            Checks if the requested files are known by the referred RSE, with one request.
+
+            :param pfns: list of physical file names
+
+            :returns: a dict with the physical file names as keys and True/False as values
+        """
+        pfns = list(set(pfns))
+        try:
+            metadata = self._get_metadata(pfns)
+        except exception.SourceNotFound:
+            # The server fails the whole request if one of the files is missing
+            return dict((pfn, self.exists(pfn)) for pfn in pfns)
+        except Exception as e:
+            raise exception.RucioException(e)
+        ret = {}
+        for pfn in pfns:
+            if not metadata.get(pfn):
+                raise exception.RucioException('Failed to check file %s state: %s' % (pfn, metadata))
+            ret[pfn] = True
+        return ret
+
     def rename(self, pfn, new_pfn):
         """ Allows to rename a file stored inside the connected RSE.
 
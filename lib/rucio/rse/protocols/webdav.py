@@ -18,6 +18,7 @@ import ssl
 
 import xml.etree.ElementTree as ET
 
+from multiprocessing.pool import ThreadPool
 from progressbar import ProgressBar
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.poolmanager import PoolManager
@@ -26,6 +27,10 @@ from xml.parsers import expat
 
 from rucio.common import exception
 from rucio.rse.protocols import protocol
+from rucio.rse.sessions import get_session, release_session
+
+# Number of concurrent requests of the bulk operations
+BULK_THREADS = 8
 
 
 class TLSv1HttpAdapter(HTTPAdapter):
@@ -44,12 +49,13 @@ class UploadInChunks(object):
     Class to upload by chunks.
     '''
 
-    def __init__(self, filename, chunksize, progressbar=False):
+    def __init__(self, filename, chunksize, progressbar=False, checksum=None):
         self.__totalsize = os.path.getsize(filename)
         self.__readsofar = 0
         self.__filename = filename
         self.__chunksize = chunksize
         self.__progressbar = progressbar
+        self.__checksum = checksum
 
     def __iter__(self):
         try:
@@ -61,6 +67,8 @@ class UploadInChunks(object):
                             stdout.write("\n")
                         break
                     self.__readsofar += len(data)
+                    if self.__checksum is not None:
+                        self.__checksum.update(data)
                     if self.__progressbar:
                         percent = self.__readsofar * 100 / self.__totalsize
                         stdout.write("\r{percent:3.0f}%".format(percent=percent))
@@ -144,6 +152,14 @@ class Default(protocol.RSEProtocol):
 
     """ Implementing access to RSEs using the webDAV protocol."""
 
+    def __init__(self, protocol_attr, rse_settings):
+        """ Initializes the object with information about the referred RSE.
+
+            :param props Properties derived from the RSE Repository
+        """
+        super(Default, self).__init__(protocol_attr, rse_settings)
+        self.streaming_checksum = True
+
     def connect(self, credentials={}):
         """ Establishes the actual connection to the referred RSE.
 
@@ -185,8 +201,9 @@ class Default(protocol.RSEProtocol):
             self.timeout = credentials['timeout']
         except KeyError:
             self.timeout = 300
-        self.session = requests.session()
-        self.session.mount('https://', TLSv1HttpAdapter())
+        # The session, and its connections kept alive, are shared with the other protocols of the endpoint using the same certificate
+        self.close()
+        self.session = get_session((self.attributes['scheme'], self.attributes['hostname'], self.attributes['port']), cert=self.cert, adapter=TLSv1HttpAdapter)
 
         # "ping" to see if the server is available
         try:
@@ -194,10 +211,17 @@ class Default(protocol.RSEProtocol):
             if res.status_code != 200:
                 raise exception.ServiceUnavailable('Problem to connect %s : %s' % (self.path2pfn(''), res.text))
         except requests.exceptions.ConnectionError as error:
+            self.close()
             raise exception.ServiceUnavailable('Problem to connect %s : %s' % (self.path2pfn(''), error))
+        except exception.ServiceUnavailable:
+            self.close()
+            raise
 
     def close(self):
-        self.session.close()
+        """ Releases the connection to the RSE. The shared session keeps its connections alive for the next protocols of the endpoint."""
+        if getattr(self, 'session', None) is not None:
+            release_session(self.session)
+            self.session = None
 
     def path2pfn(self, path):
         """
@@ -237,6 +261,17 @@ class Default(protocol.RSEProtocol):
         except requests.exceptions.ConnectionError as error:
             raise exception.ServiceUnavailable(error)
 
+    def exists_bulk(self, pfns):
+        """ Checks if the requested files are known by the referred RSE, with concurrent HEAD requests.
+
+            :param pfns List of physical file names
+
+            :returns: a dict with the physical file names as keys and True/False as values
+
+            :raise  ServiceUnavailable, RSEAccessDenied
+        """
+        return self._bulk(self.exists, pfns)
+
     def get(self, pfn, dest='.'):
         """ Provides access to files stored inside connected the RSE.
 
@@ -280,12 +315,13 @@ class Default(protocol.RSEProtocol):
         except requests.exceptions.ConnectionError as error:
             raise exception.ServiceUnavailable(error)
 
-    def put(self, source, target, source_dir=None, progressbar=False):
+    def put(self, source, target, source_dir=None, progressbar=False, checksum=None):
         """ Allows to store files inside the referred RSE.
 
             :param source Physical file name
             :param target Name of the file on the storage system e.g. with prefixed scope
             :param source_dir Path where the to be transferred files are stored in the local file system
+            :param checksum StreamingChecksum updated with the data sent, reset if the upload is retried
 
             :raises DestinationNotAccessible, ServiceUnavailable, SourceNotFound, RSEAccessDenied
         """
@@ -296,13 +332,15 @@ class Default(protocol.RSEProtocol):
         try:
             if not os.path.exists(full_name):
                 raise exception.SourceNotFound()
-            it = UploadInChunks(full_name, 10000000, progressbar)
+            it = UploadInChunks(full_name, 10000000, progressbar, checksum)
             result = self.session.put(path, data=IterableToFileAdapter(it), verify=False, allow_redirects=True, timeout=self.timeout, cert=self.cert)
             if result.status_code in [200, 201]:
                 return
             if result.status_code in [409, ]:
                 raise exception.FileReplicaAlreadyExists()
             else:
+                if checksum is not None:
+                    checksum.reset()
                 # Create the directories before issuing the PUT
                 for directory_level in reversed(xrange(1, 4)):
                     upper_directory = "/".join(directories[:-directory_level])
@@ -310,7 +348,7 @@ class Default(protocol.RSEProtocol):
                 try:
                     if not os.path.exists(full_name):
                         raise exception.SourceNotFound()
-                    it = UploadInChunks(full_name, 10000000, progressbar)
+                    it = UploadInChunks(full_name, 10000000, progressbar, checksum)
                     result = self.session.put(path, data=IterableToFileAdapter(it), verify=False, allow_redirects=True, timeout=self.timeout, cert=self.cert)
                     if result.status_code in [200, 201]:
                         return
@@ -451,39 +489,69 @@ class Default(protocol.RSEProtocol):
         except requests.exceptions.ConnectionError, error:
             raise exception.ServiceUnavailable(error)
 
-    def stat(self, path):
+    def stat(self, pfn):
         """
             Returns the stats of a file.
 
-            :param path: path to file
+            :param pfn: Physical file name
 
             :raises ServiceUnavailable: if some generic error occured in the library.
             :raises SourceNotFound: if the source file was not found on the referred storage.
             :raises RSEAccessDenied: in case of permission issue.
 
-            :returns: a dict with two keys, filesize and adler32 of the file provided in path.
+            :returns: a dict with the key filesize of the file provided in pfn.
         """
-        raise NotImplementedError
-        headers = {'Depth': '1'}
-        dict = {}
+        path = self.path2pfn(pfn)
+        headers = {'Depth': '0'}
         try:
             result = self.session.request('PROPFIND', path, verify=False, headers=headers, timeout=self.timeout, cert=self.cert)
             if result.status_code in [404, ]:
                 raise exception.SourceNotFound()
-            elif result.status_code in [401, ]:
+            elif result.status_code in [401, 403]:
                 raise exception.RSEAccessDenied()
-            if result.status_code in [400, ]:
+            elif result.status_code not in [200, 207]:
                 raise NotImplementedError
             p = Parser()
             p.feed(result.text)
-            for f in p.sizes:
-                if '%s%s' % (self.server, f) == path:
-                    dict['size'] = p.sizes['f']
             p.close()
-            return dict
+            if len(p.sizes) != 1:  # With Depth 0, the only response is the one of the file
+                raise NotImplementedError
+            return {'filesize': int(p.sizes.values()[0])}
         except requests.exceptions.ConnectionError, error:
             raise exception.ServiceUnavailable(error)
 
+    def stat_bulk(self, pfns):
+        """
+            Returns the stats of several files, with concurrent PROPFIND requests.
+
+            :param pfns: List of physical file names
+
+            :returns: a dict with the physical file names as keys and the stats or the exception as values.
+        """
+        def stat(pfn):
+            try:
+                return self.stat(pfn)
+            except Exception, error:
+                return error
+        return self._bulk(stat, pfns)
+
+    def _bulk(self, function, pfns):
+        """ Calls a function on several PFNs with a pool of threads sharing the session.
+
+            :param function Function taking one PFN
+            :param pfns List of physical file names
+
+            :returns: a dict with the physical file names as keys and the results as values
+        """
+        pfns = list(set(pfns))
+        if len(pfns) <= 1:
+            return dict((pfn, function(pfn)) for pfn in pfns)
+        pool = ThreadPool(min(len(pfns), BULK_THREADS))
+        try:
+            return dict(zip(pfns, pool.map(function, pfns)))
+        finally:
+            pool.close()
+
     def get_space_usage(self):
         """
         Get RSE space usage information.
@@ -14,15 +14,26 @@
  - Wen Guan, <wen.guan@cern.ch>, 2014-2015
 '''
 
+import atexit
 import copy
+import hashlib
+import math
 import os
+import threading
 
+from contextlib import contextmanager
+from Queue import Queue, Empty
 from urlparse import urlparse
 
 from rucio.common import exception, utils
+from rucio.rse.pool import ProtocolPool
 
 DEFAULT_PROTOCOL = 1
 
+# Connected protocols kept between the operations on the same endpoint, closed at exit
+PROTOCOL_POOL = ProtocolPool(max_per_endpoint=8)
+atexit.register(PROTOCOL_POOL.close)
+
 
 def get_rse_info(rse, session=None):
     """ Returns all protocol related RSE attributes.
@@ -112,7 +123,18 @@ def create_protocol(rse_settings, operation, scheme=None):
 
         :returns: an instance of the requested protocol
     """
+    return _instanciate_protocol(_get_protocol_attr(rse_settings, operation, scheme), rse_settings)
+
+
+def _get_protocol_attr(rse_settings, operation, scheme=None):
+    """ Verifies the feasibility of the operation and returns the attributes of the protocol defined for it.
+
+        :param rse_attr: RSE attributes
+        :param operation: the intended operation for this protocol
+        :param scheme: optional filter if no specific protocol is defined in rse_setting for the provided operation
 
+        :returns: the attributes of the protocol
+    """
     # Verify feasibility of Protocol
     operation = operation.lower()
     if operation not in utils.rse_supported_protocol_operations():
@@ -129,8 +151,17 @@ def create_protocol(rse_settings, operation, scheme=None):
         for d in rse_settings['domain']:
             if protocol_attr['domains'][d][operation] == 0:
                 raise exception.RSEOperationNotSupported('Operation %s for domain %s not supported by %s' % (operation, rse_settings['domain'], protocol_attr['scheme']))
+    return protocol_attr
+
+
+def _instanciate_protocol(protocol_attr, rse_settings):
+    """ Instanciates the implementation of a protocol.
 
-    # Instanciate protocol
+        :param protocol_attr: the attributes of the protocol
+        :param rse_settings: RSE attributes
+
+        :returns: an instance of the protocol
+    """
     comp = protocol_attr['impl'].split('.')
     mod = __import__('.'.join(comp[:-1]))
     for n in comp[1:]:
@@ -143,6 +174,75 @@ def create_protocol(rse_settings, operation, scheme=None):
     return protocol
 
 
+def _credentials_key(credentials):
+    """ Returns a digest of the credentials a protocol connects with, so that they are part of its pool endpoint without being logged.
+        Without credentials, the protocols authenticate with the X509 proxy of the environment.
+
+        :param credentials: the credentials given to connect, if any
+
+        :returns: the hexadecimal SHA1 digest of the credentials
+    """
+    return hashlib.sha1(repr((sorted(credentials.items()) if credentials else None, os.environ.get('X509_USER_PROXY')))).hexdigest()
+
+
+def acquire_protocol(rse_settings, operation, scheme=None, credentials=None):
+    """ Returns a connected protocol for the given operation, reusing a connection of the protocol pool if possible.
+        The protocol must be given back with release_protocol instead of being closed.
+
+        :param rse_settings: RSE attributes
+        :param operation: the intended operation for this protocol
+        :param scheme: optional filter if no specific protocol is defined in rse_setting for the provided operation
+        :param credentials: the credentials given to connect, if any
+
+        :returns: a connected instance of the requested protocol
+    """
+    operation = operation.lower()
+    protocol_attr = _get_protocol_attr(rse_settings, operation, scheme)
+    # The prefix is part of the endpoint as the PFNs built by the protocol depend on it, the credentials as the connection is authenticated with them
+    endpoint = (rse_settings['rse'], protocol_attr['scheme'], protocol_attr['hostname'], protocol_attr.get('port'), protocol_attr.get('prefix'), operation,
+                _credentials_key(credentials))
+
+    def connect():
+        protocol = _instanciate_protocol(protocol_attr, rse_settings)
+        if credentials is None:
+            protocol.connect()
+        else:
+            protocol.connect(credentials=credentials)
+        return protocol
+
+    return PROTOCOL_POOL.acquire(endpoint, connect)
+
+
+def release_protocol(protocol, discard=False):
+    """ Gives back a protocol returned by acquire_protocol to the protocol pool.
+
+        :param protocol: the protocol
+        :param discard: close the connection instead of keeping it for reuse, e.g. after a connection error
+    """
+    PROTOCOL_POOL.release(protocol, discard=discard)
+
+
+@contextmanager
+def pooled_protocol(rse_settings, operation, scheme=None, credentials=None):
+    """ Context manager acquiring a connected protocol from the protocol pool and releasing it.
+        The connection is discarded if the storage became unavailable.
+
+        :param rse_settings: RSE attributes
+        :param operation: the intended operation for this protocol
+        :param scheme: optional filter if no specific protocol is defined in rse_setting for the provided operation
+        :param credentials: the credentials given to connect, if any
+    """
+    protocol = acquire_protocol(rse_settings, operation, scheme=scheme, credentials=credentials)
+    discard = False
+    try:
+        yield protocol
+    except (exception.ServiceUnavailable, exception.RSEAccessDenied):
+        discard = True
+        raise
+    finally:
+        release_protocol(protocol, discard=discard)
+
+
 def lfns2pfns(rse_settings, lfns, operation='write', scheme=None):
     """
         Convert the lfn to a pfn
@@ -201,48 +301,49 @@ def download(rse_settings, files, dest_dir=None, force_scheme=None, ignore_check
     ret = {}
     gs = True  # gs represents the global status which inidcates if every operation workd in bulk mode
 
-    protocol = create_protocol(rse_settings, 'read', scheme=force_scheme)
-    protocol.connect()
-
-    files = [files] if not type(files) is list else files
-    for f in files:
-        pfn = f['pfn'] if 'pfn' in f else protocol.lfns2pfns(f).values()[0]
-        target_dir = "./%s" % f['scope'] if dest_dir is None else dest_dir
-        try:
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir)
-            # Each scope is stored into a separate folder
-            finalfile = '%s/%s' % (target_dir, f['name'])
-            # Check if the file already exists, if not download and validate it
-            if not os.path.isfile(finalfile):
-                if 'adler32' in f:
-                    tempfile = '%s/%s.part' % (target_dir, f['name'])
-                    if os.path.isfile(tempfile):
-                        if printstatements:
-                            print '%s already exists, probably from a failed attempt. Will remove it' % (tempfile)
-                        os.unlink(tempfile)
-                    protocol.get(pfn, tempfile)
-                    if printstatements:
-                        print 'File downloaded. Will be validated'
-
-                    localchecksum = f['adler32'] if ignore_checksum else utils.adler32(tempfile)
-                    if localchecksum == f['adler32']:
+    with pooled_protocol(rse_settings, 'read', scheme=force_scheme) as protocol:
+        files = [files] if not type(files) is list else files
+        pfns = [f['pfn'] if 'pfn' in f else protocol.lfns2pfns(f).values()[0] for f in files]
+        protocol.prepare(pfns, 'read')
+        for f, pfn in zip(files, pfns):
+            target_dir = "./%s" % f['scope'] if dest_dir is None else dest_dir
+            try:
+                if not os.path.exists(target_dir):
+                    os.makedirs(target_dir)
+                # Each scope is stored into a separate folder
+                finalfile = '%s/%s' % (target_dir, f['name'])
+                # Check if the file already exists, if not download and validate it
+                if not os.path.isfile(finalfile):
+                    if 'adler32' in f:
+                        tempfile = '%s/%s.part' % (target_dir, f['name'])
+                        if os.path.isfile(tempfile):
+                            if printstatements:
+                                print '%s already exists, probably from a failed attempt. Will remove it' % (tempfile)
+                            os.unlink(tempfile)
+                        streamed = _get(protocol, pfn, tempfile)
                         if printstatements:
-                            print 'File validated'
-                        os.rename(tempfile, finalfile)
+                            print 'File downloaded. Will be validated'
+
+                        if ignore_checksum:
+                            localchecksum = f['adler32']
+                        else:
+                            localchecksum = streamed.adler32 if streamed is not None else utils.adler32(tempfile)
+                        if localchecksum == f['adler32']:
+                            if printstatements:
+                                print 'File validated'
+                            os.rename(tempfile, finalfile)
+                        else:
+                            os.unlink(tempfile)
+                            raise exception.FileConsistencyMismatch('Checksum mismatch : local %s vs recorded %s' % (str(localchecksum), str(f['adler32'])))
                     else:
-                        os.unlink(tempfile)
-                        raise exception.FileConsistencyMismatch('Checksum mismatch : local %s vs recorded %s' % (str(localchecksum), str(f['adler32'])))
+                        protocol.get(pfn, '%s/%s' % (target_dir, f['name']))
+                    ret['%s:%s' % (f['scope'], f['name'])] = True
                 else:
-                    protocol.get(pfn, '%s/%s' % (target_dir, f['name']))
-                ret['%s:%s' % (f['scope'], f['name'])] = True
-            else:
-                ret['%s:%s' % (f['scope'], f['name'])] = True
-        except Exception as e:
-            gs = False
-            ret['%s:%s' % (f['scope'], f['name'])] = e
+                    ret['%s:%s' % (f['scope'], f['name'])] = True
+            except Exception as e:
+                gs = False
+                ret['%s:%s' % (f['scope'], f['name'])] = e
 
-    protocol.close()
     if len(ret) == 1:
         for x in ret:
             if isinstance(ret[x], Exception):
@@ -268,40 +369,45 @@ def exists(rse_settings, files):
     ret = {}
     gs = True  # gs represents the global status which inidcates if every operation workd in bulk mode
 
-    protocol = create_protocol(rse_settings, 'read')
-    protocol.connect()
-
-    files = [files] if not type(files) is list else files
-    for f in files:
-        exists = None
-        if (type(f) is str) or (type(f) is unicode):
-            exists = protocol.exists(f)
-            ret[f] = exists
-        elif 'scope' in f:  # a LFN is provided
-            exists = protocol.exists(protocol.lfns2pfns(f).values()[0])
-            ret[f['scope'] + ':' + f['name']] = exists
-        else:
-            exists = protocol.exists(f['name'])
-            ret[f['name']] = exists
-        if not exists:
-            gs = False
+    with pooled_protocol(rse_settings, 'read') as protocol:
+        files = [files] if not type(files) is list else files
+        for f in files:
+            exists = None
+            if (type(f) is str) or (type(f) is unicode):
+                exists = protocol.exists(f)
+                ret[f] = exists
+            elif 'scope' in f:  # a LFN is provided
+                exists = protocol.exists(protocol.lfns2pfns(f).values()[0])
+                ret[f['scope'] + ':' + f['name']] = exists
+            else:
+                exists = protocol.exists(f['name'])
+                ret[f['name']] = exists
+            if not exists:
+                gs = False
 
-    protocol.close()
     if len(ret) == 1:
         for x in ret:
             return ret[x]
     return [gs, ret]
 
 
-def upload(rse_settings, lfns, source_dir=None, force_pfn=None):
+def upload(rse_settings, lfns, source_dir=None, force_pfn=None, threads=1, bulk=100):
     """
         Uploads a file to the connected storage.
         Providing a list indicates the bulk mode.
 
+        The files are uploaded by batches. The existence of the files of a batch, and of the left
+        overs of previous attempts, is checked at once, then each file is uploaded, verified and
+        renamed. With several threads, each thread has its own connections to the storage and
+        uploads its own batches, so that the steps of different files overlap. The connections
+        to the storage are taken from the protocol pool for each batch.
+
         :param lfns:        a single dict or a list with dicts containing 'scope' and 'name'. E.g. [{'name': '1_rse_local_put.raw', 'scope': 'user.jdoe', 'filesize': 42, 'adler32': '87HS3J968JSNWID'},
                                                                                                     {'name': '2_rse_local_put.raw', 'scope': 'user.jdoe', 'filesize': 4711, 'adler32': 'RSSMICETHMISBA837464F'}]
         :param source_dir:  path to the local directory including the source files
         :param force_pfn: use the given PFN -- can lead to dark data, use sparingly
+        :param threads:     number of threads uploading files in parallel
+        :param bulk:        maximum number of files in a batch
 
         :returns: True/False for a single file or a dict object with 'scope:name' as keys and True or the exception as value for each file in bulk mode
 
@@ -311,117 +417,195 @@ def upload(rse_settings, lfns, source_dir=None, force_pfn=None):
         :raises ServiceUnavailable: for any other reason
     """
     ret = {}
-    gs = True  # gs represents the global status which indicates if every operation worked in bulk mode
-
-    protocol = create_protocol(rse_settings, 'write')
-    protocol.connect()
-    protocol_delete = create_protocol(rse_settings, 'delete')
-    protocol_delete.connect()
+    pfns = {}
 
+    batch = []
+    batches = Queue()
     lfns = [lfns] if not type(lfns) is list else lfns
     for lfn in lfns:
-        name = lfn['name']
-        scope = lfn['scope']
         if 'adler32' not in lfn:
-            gs = False
-            ret['%s:%s' % (scope, name)] = exception.RucioException('Missing checksum for file %s:%s' % (lfn['scope'], lfn['name']))
-            continue
-        if 'filesize' not in lfn:
-            gs = False
-            ret['%s:%s' % (scope, name)] = exception.RucioException('Missing filesize for file %s:%s' % (lfn['scope'], lfn['name']))
-            continue
-
-        if force_pfn:
-            pfn = force_pfn
-        else:
-            pfn = protocol.lfns2pfns(lfn).values()[0]
-
-        # First check if renaming operation is supported
-        if protocol.renaming:
-
-            # Check if file replica is already on the storage system
-            if protocol.overwrite is False and protocol.exists(pfn):
-                ret['%s:%s' % (scope, name)] = exception.FileReplicaAlreadyExists('File %s in scope %s already exists on storage' % (name, scope))
-                gs = False
-            else:
-                if protocol.exists('%s.rucio.upload' % pfn):  # Check for left over of previous unsuccessful attempts
-                    try:
-                        protocol_delete.delete('%s.rucio.upload', protocol_delete.lfns2pfns(lfn).values()[0])
-                    except Exception as e:
-                        ret['%s:%s' % (scope, name)] = exception.RSEOperationNotSupported('Unable to remove temporary file %s.rucio.upload: %s' % (pfn, str(e)))
-                try:  # Try uploading file
-                    protocol.put(name, '%s.rucio.upload' % pfn, source_dir)
-                except Exception as e:
-                    gs = False
-                    ret['%s:%s' % (scope, name)] = e
-                    continue
-
-                valid = None
-                try:  # Get metadata of file to verify if upload was successful
-                    stats = protocol.stat('%s.rucio.upload' % pfn)
-                    if ('adler32' in stats) and ('adler32' in lfn):
-                        valid = stats['adler32'] == lfn['adler32']
-                    if (valid is None) and ('filesize' in stats) and ('filesize' in lfn):
-                        valid = stats['filesize'] == lfn['filesize']
-                except NotImplementedError:
-                    valid = True  # If the protocol doesn't support stat of a file, we agreed on assuming that the file was uploaded without error
-                except Exception as e:
-                    gs = False
-                    ret['%s:%s' % (scope, name)] = e
-                    continue
-
-                if valid:  # The upload finished successful and the file can be renamed
-                    try:
-                        protocol.rename('%s.rucio.upload' % pfn, pfn)
-                        ret['%s:%s' % (scope, name)] = True
-                    except Exception as e:
-                        gs = False
-                        ret['%s:%s' % (scope, name)] = e
-                else:
-                    gs = False
-                    ret['%s:%s' % (scope, name)] = exception.RucioException('Replica %s is corrupted.' % pfn)
+            ret['%s:%s' % (lfn['scope'], lfn['name'])] = exception.RucioException('Missing checksum for file %s:%s' % (lfn['scope'], lfn['name']))
+        elif 'filesize' not in lfn:
+            ret['%s:%s' % (lfn['scope'], lfn['name'])] = exception.RucioException('Missing filesize for file %s:%s' % (lfn['scope'], lfn['name']))
         else:
+            batch.append(lfn)
+    threads = max(1, min(threads, len(batch)))
+    size = max(1, min(bulk, int(math.ceil(float(len(batch)) / threads))))
+    for i in xrange(0, len(batch), size):
+        batches.put(batch[i:i + size])
+
+    def worker():
+        while True:
+            try:
+                batch = batches.get_nowait()
+            except Empty:
+                return
+            try:
+                with pooled_protocol(rse_settings, 'write') as protocol:
+                    with pooled_protocol(rse_settings, 'delete') as protocol_delete:
+                        _upload_batch(protocol, protocol_delete, batch, source_dir, force_pfn, ret, pfns)
+            except Exception as e:
+                for lfn in batch:
+                    ret.setdefault('%s:%s' % (lfn['scope'], lfn['name']), e)
 
-            # Check if file replica is already on the storage system
-            if protocol.overwrite is False and protocol.exists(pfn):
-                ret['%s:%s' % (scope, name)] = exception.FileReplicaAlreadyExists('File %s in scope %s already exists on storage' % (name, scope))
-                gs = False
-            else:
-                try:  # Try uploading file
-                    protocol.put(name, pfn, source_dir)
-                except Exception as e:
-                    gs = False
-                    ret['%s:%s' % (scope, name)] = e
-                    continue
-
-                valid = None
-                try:  # Get metadata of file to verify if upload was successful
-                    stats = protocol.stat(pfn)
-                    if ('adler32' in stats) and ('adler32' in lfn):
-                        valid = stats['adler32'] == lfn['adler32']
-                    if (valid is None) and ('filesize' in stats) and ('filesize' in lfn):
-                        valid = stats['filesize'] == lfn['filesize']
-                except NotImplementedError:
-                    valid = True  # If the protocol doesn't support stat of a file, we agreed on assuming that the file was uploaded without error
-                except Exception as e:
-                    gs = False
-                    ret['%s:%s' % (scope, name)] = e
-                    continue
-
-                if not valid:
-                    gs = False
-                    ret['%s:%s' % (scope, name)] = exception.RucioException('Replica %s is corrupted.' % pfn)
+    if threads == 1:
+        worker()
+    else:
+        workers = [threading.Thread(target=worker) for _ in xrange(threads)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        # Interruptible joins require a timeout.
+        while any(thread.is_alive() for thread in workers):
+            [thread.join(timeout=3.14) for thread in workers]
 
-    protocol.close()
-    protocol_delete.close()
     if len(ret) == 1:
         for x in ret:
             if isinstance(ret[x], Exception):
                 raise ret[x]
             else:
                 return {'success': ret[x],
-                        'pfn': pfn}
-    return [gs, ret]
+                        'pfn': pfns[x]}
+    return [all(result is True for result in ret.values()), ret]
+
+
+def _upload_batch(protocol, protocol_delete, lfns, source_dir, force_pfn, ret, pfns):
+    """
+        Uploads a batch of files, checking the existence of the files and of the left overs at once.
+
+        :param protocol:        the connected write protocol
+        :param protocol_delete: the connected delete protocol
+        :param lfns:            list of dicts containing 'scope', 'name', 'adler32' and 'filesize'
+        :param source_dir:      path to the local directory including the source files
+        :param force_pfn:       use the given PFN
+        :param ret:             dict filled with 'scope:name' as keys and True or the exception as value
+        :param pfns:            dict filled with 'scope:name' as keys and the PFN as value
+    """
+    if force_pfn:
+        batch_pfns = dict(('%s:%s' % (lfn['scope'], lfn['name']), force_pfn) for lfn in lfns)
+    else:
+        batch_pfns = protocol.lfns2pfns(lfns)
+    pfns.update(batch_pfns)
+
+    protocol.prepare(['%s.rucio.upload' % pfn if protocol.renaming else pfn for pfn in batch_pfns.values()], 'write')
+    paths = []
+    if protocol.overwrite is False:
+        paths.extend(batch_pfns.values())
+    if protocol.renaming:
+        paths.extend(['%s.rucio.upload' % pfn for pfn in batch_pfns.values()])
+    exists = protocol.exists_bulk(paths) if paths else {}
+
+    for lfn in lfns:
+        did = '%s:%s' % (lfn['scope'], lfn['name'])
+        ret[did] = _upload_file(protocol, protocol_delete, lfn, batch_pfns[did], source_dir, exists)
+
+
+def _upload_file(protocol, protocol_delete, lfn, pfn, source_dir, exists):
+    """
+        Uploads a file, verifies it and, if the protocol supports renaming, renames it to its final PFN.
+
+        :param protocol:        the connected write protocol
+        :param protocol_delete: the connected delete protocol
+        :param lfn:             dict containing 'scope', 'name', 'adler32' and 'filesize'
+        :param pfn:             the PFN of the file
+        :param source_dir:      path to the local directory including the source file
+        :param exists:          dict with the paths as keys and their existence on the storage as value
+
+        :returns: True or the exception
+    """
+    # Check if file replica is already on the storage system
+    if protocol.overwrite is False and exists[pfn]:
+        return exception.FileReplicaAlreadyExists('File %s in scope %s already exists on storage' % (lfn['name'], lfn['scope']))
+
+    target = pfn
+    if protocol.renaming:
+        target = '%s.rucio.upload' % pfn
+        if exists[target]:  # Check for left over of previous unsuccessful attempts
+            try:
+                protocol_delete.delete('%s.rucio.upload' % protocol_delete.lfns2pfns(lfn).values()[0])
+            except Exception:
+                pass  # If the left over is still there, the upload below reports the failure
+
+    try:  # Try uploading file
+        streamed = _put(protocol, lfn['name'], target, source_dir)
+    except Exception as e:
+        return e
+
+    valid = None
+    try:  # Get metadata of file to verify if upload was successful
+        stats = protocol.stat(target)
+        if ('adler32' in stats) and ('adler32' in lfn):
+            valid = stats['adler32'] == lfn['adler32']
+        if (valid is None) and ('filesize' in stats) and ('filesize' in lfn):
+            # The size does not tell if the content was corrupted, the checksum of the data sent does if available
+            valid = stats['filesize'] == lfn['filesize'] and _verify_streamed(streamed, lfn)
+    except NotImplementedError:
+        # If the protocol doesn't support stat of a file, the checksum of the data sent is used if available,
+        # otherwise we agreed on assuming that the file was uploaded without error
+        valid = _verify_streamed(streamed, lfn)
+    except Exception as e:
+        return e
+
+    if not valid:
+        return exception.RucioException('Replica %s is corrupted.' % pfn)
+
+    if protocol.renaming:  # The upload finished successful and the file can be renamed
+        try:
+            protocol.rename(target, pfn)
+        except Exception as e:
+            return e
+    return True
+
+
+def _get(protocol, pfn, dest):
+    """
+        Downloads a file, computing its Adler-32 checksum while it is received if the protocol supports it.
+
+        :param protocol:    the connected protocol
+        :param pfn:         the PFN to download
+        :param dest:        the path of the local file
+
+        :returns: the StreamingChecksum of the data received, or None
+    """
+    if getattr(protocol, 'streaming_checksum_read', False):
+        checksum = utils.StreamingChecksum(md5=False)
+        protocol.get(pfn, dest, checksum=checksum)
+        return checksum
+    protocol.get(pfn, dest)
+    return None
+
+
+def _put(protocol, name, target, source_dir):
+    """
+        Uploads a file, computing its checksum while it is sent if the protocol supports it.
+
+        :param protocol:    the connected protocol
+        :param name:        the name of the local file
+        :param target:      the PFN to upload to
+        :param source_dir:  path to the local directory including the source file
+
+        :returns: the StreamingChecksum of the data sent, or None
+    """
+    if getattr(protocol, 'streaming_checksum', False):
+        checksum = utils.StreamingChecksum(md5=False)
+        protocol.put(name, target, source_dir, checksum=checksum)
+        return checksum
+    protocol.put(name, target, source_dir)
+    return None
+
+
+def _verify_streamed(checksum, lfn):
+    """
+        Compares the checksum and the size of the data sent with the ones of the LFN.
+
+        :param checksum:    the StreamingChecksum returned by _put, or None
+        :param lfn:         the LFN dict with 'adler32' and 'filesize'
+
+        :returns: True if they match or if nothing was computed, False otherwise
+    """
+    if checksum is None:
+        return True
+    return checksum.adler32 == lfn['adler32'] and checksum.bytes == lfn['filesize']
 
 
 def delete(rse_settings, lfns):
@@ -441,20 +625,22 @@ def delete(rse_settings, lfns):
     ret = {}
     gs = True  # gs represents the global status which inidcates if every operation workd in bulk mode
 
-    protocol = create_protocol(rse_settings, 'delete')
-    protocol.connect()
-
-    lfns = [lfns] if not type(lfns) is list else lfns
-    for lfn in lfns:
-        pfn = protocol.lfns2pfns(lfn).values()[0]
-        try:
-            protocol.delete(pfn)
-            ret['%s:%s' % (lfn['scope'], lfn['name'])] = True
-        except Exception as e:
-            ret['%s:%s' % (lfn['scope'], lfn['name'])] = e
-            gs = False
+    with pooled_protocol(rse_settings, 'delete') as protocol:
+        lfns = [lfns] if not type(lfns) is list else lfns
+        pfns = dict(('%s:%s' % (lfn['scope'], lfn['name']), protocol.lfns2pfns(lfn).values()[0]) for lfn in lfns)
+        if len(pfns) == 1:
+            for did, pfn in pfns.items():
+                try:
+                    protocol.delete(pfn)
+                    ret[did] = True
+                except Exception as e:
+                    ret[did] = e
+        else:
+            deleted = protocol.delete_bulk(pfns.values())
+            for did, pfn in pfns.items():
+                ret[did] = deleted[pfn]
+        gs = not any(isinstance(result, Exception) for result in ret.values())
 
-    protocol.close()
     if len(ret) == 1:
         for x in ret:
             if isinstance(ret[x], Exception):
@@ -485,45 +671,42 @@ def rename(rse_settings, files):
     ret = {}
     gs = True  # gs represents the global status which inidcates if every operation workd in bulk mode
 
-    protocol = create_protocol(rse_settings, 'write')
-    protocol.connect()
-
-    files = [files] if not type(files) is list else files
-    for f in files:
-        pfn = None
-        new_pfn = None
-        key = None
-        if 'scope' in f:  # LFN is provided
-            key = '%s:%s' % (f['scope'], f['name'])
-            # Check if new name is provided
-            if 'new_name' not in f:
-                f['new_name'] = f['name']
-            # Check if new scope is provided
-            if 'new_scope' not in f:
-                f['new_scope'] = f['scope']
-            pfn = protocol.lfns2pfns({'name': f['name'], 'scope': f['scope']}).values()[0]
-            new_pfn = protocol.lfns2pfns({'name': f['new_name'], 'scope': f['new_scope']}).values()[0]
-        else:
-            pfn = f['name']
-            new_pfn = f['new_name']
-            key = pfn
-        # Check if target is not on storage
-        if protocol.exists(new_pfn):
-            ret[key] = exception.FileReplicaAlreadyExists('File %s already exists on storage' % (new_pfn))
-            gs = False
-        # Check if source is on storage
-        elif not protocol.exists(pfn):
-            ret[key] = exception.SourceNotFound('File %s not found on storage' % (pfn))
-            gs = False
-        else:
-            try:
-                protocol.rename(pfn, new_pfn)
-                ret[key] = True
-            except Exception as e:
-                ret[key] = e
+    with pooled_protocol(rse_settings, 'write') as protocol:
+        files = [files] if not type(files) is list else files
+        for f in files:
+            pfn = None
+            new_pfn = None
+            key = None
+            if 'scope' in f:  # LFN is provided
+                key = '%s:%s' % (f['scope'], f['name'])
+                # Check if new name is provided
+                if 'new_name' not in f:
+                    f['new_name'] = f['name']
+                # Check if new scope is provided
+                if 'new_scope' not in f:
+                    f['new_scope'] = f['scope']
+                pfn = protocol.lfns2pfns({'name': f['name'], 'scope': f['scope']}).values()[0]
+                new_pfn = protocol.lfns2pfns({'name': f['new_name'], 'scope': f['new_scope']}).values()[0]
+            else:
+                pfn = f['name']
+                new_pfn = f['new_name']
+                key = pfn
+            # Check if target is not on storage
+            if protocol.exists(new_pfn):
+                ret[key] = exception.FileReplicaAlreadyExists('File %s already exists on storage' % (new_pfn))
+                gs = False
+            # Check if source is on storage
+            elif not protocol.exists(pfn):
+                ret[key] = exception.SourceNotFound('File %s not found on storage' % (pfn))
                 gs = False
+            else:
+                try:
+                    protocol.rename(pfn, new_pfn)
+                    ret[key] = True
+                except Exception as e:
+                    ret[key] = e
+                    gs = False
 
-    protocol.close()
     if len(ret) == 1:
         for x in ret:
             if isinstance(ret[x], Exception):
@@ -546,16 +729,13 @@ def get_space_usage(rse_settings, scheme=None):
     gs = True
     ret = {}
 
-    protocol = create_protocol(rse_settings, 'read', scheme)
-    protocol.connect()
-
-    try:
-        totalsize, unusedsize = protocol.get_space_usage()
-        ret["totalsize"] = totalsize
-        ret["unusedsize"] = unusedsize
-    except Exception as e:
-        ret = e
-        gs = False
+    with pooled_protocol(rse_settings, 'read', scheme) as protocol:
+        try:
+            totalsize, unusedsize = protocol.get_space_usage()
+            ret["totalsize"] = totalsize
+            ret["unusedsize"] = unusedsize
+        except Exception as e:
+            ret = e
+            gs = False
 
-    protocol.close()
     return [gs, ret]
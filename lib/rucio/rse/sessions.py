@@ -0,0 +1,95 @@
+'''
+ Copyright European Organization for Nuclear Research (CERN)
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at
+  http://www.apache.org/licenses/LICENSE-2.0
+
+ HTTP sessions shared by the protocols talking to the same endpoint with the same credentials.
+
+ A requests.Session keeps its connections alive in a urllib3 pool. Sharing one session per
+ endpoint and client certificate between the protocol instances, and between the threads,
+ saves a TCP connection and a TLS handshake per operation. The sessions released by all their
+ protocols keep their connections for the next protocols, and are closed once idle for too long.
+'''
+
+import atexit
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+# Maximum number of connections kept alive per host
+POOL_MAXSIZE = 16
+
+# Number of seconds after which a session released by all its protocols is closed
+IDLE_TIMEOUT = 300
+
+__SESSIONS = {}  # (endpoint, cert) -> [session, number of protocols using it, last release time]
+__LOCK = threading.Lock()
+
+
+def get_session(endpoint, cert=None, adapter=HTTPAdapter, pool_maxsize=POOL_MAXSIZE):
+    """
+    Returns the session shared by the protocols of an endpoint using the same client certificate, creating it if needed.
+    The session must be given back with release_session when the protocol is closed.
+
+    :param endpoint: The endpoint, e.g. the tuple (scheme, hostname, port).
+    :param cert: The client certificate the requests are sent with, as given to requests, None if there is none.
+    :param adapter: The HTTPAdapter class mounted for http and https when the session is created.
+    :param pool_maxsize: The maximum number of connections kept alive per host.
+
+    :returns: The requests.Session.
+    """
+    with __LOCK:
+        __close_idle()
+        key = (endpoint, cert)
+        if key not in __SESSIONS:
+            session = requests.Session()
+            session.cert = cert
+            for prefix in ('http://', 'https://'):
+                session.mount(prefix, adapter(pool_connections=1, pool_maxsize=pool_maxsize))
+            __SESSIONS[key] = [session, 0, None]
+        __SESSIONS[key][1] += 1
+        return __SESSIONS[key][0]
+
+
+def release_session(session):
+    """
+    Gives back a session returned by get_session. Its connections are kept alive for IDLE_TIMEOUT seconds once no protocol uses it.
+
+    :param session: The requests.Session.
+    """
+    with __LOCK:
+        for entry in __SESSIONS.values():
+            if entry[0] is session:
+                entry[1] -= 1
+                entry[2] = time.time()
+        __close_idle()
+
+
+def close_sessions():
+    """
+    Closes all the shared sessions and their connections.
+    """
+    with __LOCK:
+        for session, _, _ in __SESSIONS.values():
+            session.close()
+        __SESSIONS.clear()
+
+
+def __close_idle():
+    """
+    Closes the sessions released by all their protocols for more than IDLE_TIMEOUT seconds. Called with the lock held.
+    """
+    limit = time.time() - IDLE_TIMEOUT
+    for key, (session, users, released) in __SESSIONS.items():
+        if users <= 0 and released < limit:
+            session.close()
+            del __SESSIONS[key]
+
+
+atexit.register(close_sessions)
@@ -0,0 +1,81 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from nose.tools import assert_equal, assert_in, assert_not_in
+
+from rucio.common.utils import generate_uuid
+from rucio.core.did import add_did, attach_dids
+from rucio.core.replica import add_replicas, delete_replicas, get_updated_collection_replicas, list_dataset_replicas
+from rucio.core.rse import get_rse_id
+from rucio.daemons.abacus.collection_replica import collection_replica_update
+from rucio.db.sqla import models
+from rucio.db.sqla.constants import DIDType, ReplicaState
+from rucio.db.sqla.session import get_session
+
+
+class TestAbacusCollectionReplica():
+
+    def setup(self):
+        self.scope = 'mock'
+        self.dataset = 'dataset_%s' % generate_uuid()
+        self.files = [{'scope': self.scope, 'name': 'file_%s' % generate_uuid(), 'bytes': 10L, 'adler32': '0cc737eb'} for i in xrange(4)]
+        self.rse_ids = dict((rse, get_rse_id(rse)) for rse in ('MOCK', 'MOCK3', 'MOCK4'))
+        add_did(scope=self.scope, name=self.dataset, type=DIDType.DATASET, account='root')
+        attach_dids(scope=self.scope, name=self.dataset, dids=self.files, account='root', rse='MOCK')
+        add_replicas(rse='MOCK3', files=self.files[:2], account='root')
+
+        # Collection replicas not up to date, and their pending updates
+        session = get_session()
+        for rse_id in self.rse_ids.values():
+            models.CollectionReplica(scope=self.scope, name=self.dataset, did_type=DIDType.DATASET, rse_id=rse_id, bytes=0, length=0,
+                                     available_bytes=0, available_replicas_cnt=0, state=ReplicaState.UNAVAILABLE).save(session=session)
+        for rse_id in (self.rse_ids['MOCK'], self.rse_ids['MOCK'], None):
+            models.UpdatedCollectionReplica(scope=self.scope, name=self.dataset, did_type=DIDType.DATASET, rse_id=rse_id).save(session=session)
+        session.commit()
+
+    def _pending(self):
+        return [(scope, name, rse_id) for scope, name, rse_id in get_updated_collection_replicas(total_workers=0, worker_number=0)
+                if (scope, name) == (self.scope, self.dataset)]
+
+    def _update(self):
+        # The oldest updates are drained first, including the ones left by the other tests
+        while self._pending():
+            collection_replica_update(once=True)
+
+    def _replicas(self, deep=False):
+        return dict((replica['rse_id'], replica) for replica in list_dataset_replicas(scope=self.scope, name=self.dataset, deep=deep))
+
+    def test_collection_replica_update(self):
+        """ ABACUS (COLLECTION REPLICA): The collection replicas are updated from their pending updates """
+        # The updates are coalesced per collection replica
+        assert_equal(sorted(self._pending()), sorted([(self.scope, self.dataset, self.rse_ids['MOCK']), (self.scope, self.dataset, None)]))
+
+        self._update()
+
+        replicas, deep_replicas = self._replicas(), self._replicas(deep=True)
+        for rse, available_length in (('MOCK', 4), ('MOCK3', 2)):
+            replica, deep_replica = replicas[self.rse_ids[rse]], deep_replicas[self.rse_ids[rse]]
+            assert_equal(replica['available_length'], available_length)
+            for key in ('length', 'bytes', 'available_length', 'available_bytes', 'state'):
+                assert_equal(replica[key], deep_replica[key])
+        assert_equal(replicas[self.rse_ids['MOCK']]['state'], ReplicaState.AVAILABLE)
+        assert_equal(replicas[self.rse_ids['MOCK3']]['state'], ReplicaState.UNAVAILABLE)
+        # Nothing available yet, the collection replica is kept
+        assert_equal(replicas[self.rse_ids['MOCK4']]['available_length'], 0)
+        assert_equal(replicas[self.rse_ids['MOCK4']]['length'], 4)
+
+    def test_collection_replica_removed(self):
+        """ ABACUS (COLLECTION REPLICA): A collection replica without any available file replica left is removed """
+        self._update()
+        assert_in(self.rse_ids['MOCK3'], self._replicas())
+
+        delete_replicas(rse='MOCK3', files=self.files[:2])
+        assert_equal(self._pending(), [(self.scope, self.dataset, self.rse_ids['MOCK3'])])
+        self._update()
+
+        assert_not_in(self.rse_ids['MOCK3'], self._replicas())
+        assert_equal(self._replicas()[self.rse_ids['MOCK']]['available_length'], 4)
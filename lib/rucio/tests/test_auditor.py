@@ -15,12 +15,16 @@ from nose.tools import eq_
 from nose.tools import ok_
 from rucio.common.dumper import consistency
 from rucio.daemons import auditor
+from rucio.daemons.auditor import cache
 from rucio.daemons.auditor import srmdumps
 from rucio.daemons.auditor import hdfs
 from rucio.tests.common import stubbed
 import collections
 import multiprocessing
+import os
+import shutil
 import tempfile
+import time
 
 
 def test_total_seconds():
@@ -44,15 +48,17 @@ def test_auditor_download_dumps_with_expected_dates():
 
     date = datetime.strptime('01-01-2015', '%d-%m-%Y')
 
-    fake_srm_download, fake_srm_download_calls = mock_fn_wrapper(('', date))
+    fake_srm_url, fake_srm_url_calls = mock_fn_wrapper(('', date))
+    fake_srm_download, fake_srm_download_calls = mock_fn_wrapper('')
     fake_rrd_download, fake_rrd_download_calls = mock_fn_wrapper('')
     fake_consistency_dump, fake_consistency_dump_calls = mock_fn_wrapper('')
     tmp_dir = tempfile.mkdtemp()
 
-    with stubbed(srmdumps.download_rse_dump, fake_srm_download):
-        with stubbed(hdfs.ReplicaFromHDFS.download, fake_rrd_download):
-            with stubbed(consistency.Consistency.dump, fake_consistency_dump):
-                auditor.consistency('RSENAME', timedelta(days=3), None, cache_dir=tmp_dir, results_dir=tmp_dir)
+    with stubbed(srmdumps.get_dump_url, fake_srm_url):
+        with stubbed(srmdumps.download_dump, fake_srm_download):
+            with stubbed(hdfs.ReplicaFromHDFS.download, fake_rrd_download):
+                with stubbed(consistency.Consistency.dump, fake_consistency_dump):
+                    auditor.consistency('RSENAME', timedelta(days=3), None, cache_dir=tmp_dir, results_dir=tmp_dir)
 
     eq_(
         fake_rrd_download_calls[0]['args'][2],
@@ -76,7 +82,10 @@ def test_auditor_check_survives_failures_and_queues_failed_rses():
         lambda: None,
     )
 
-    def fake_consistency(rse, delta, configuration, cache_dir, results_dir):
+    checked = []
+
+    def fake_consistency(rse, delta, configuration, cache_dir, results_dir, timings=None):
+        checked.append(rse)
         if rse == 'RSE_WITH_EXCEPTION':
             raise Exception
         elif rse == 'RSE_SHOULD_WORK':
@@ -86,10 +95,76 @@ def test_auditor_check_survives_failures_and_queues_failed_rses():
 
     terminate = multiprocessing.Event()
     with stubbed(auditor.consistency, fake_consistency):
-        with stubbed(terminate.is_set, lambda slf: queue.empty()):
+        with stubbed(terminate.is_set, lambda slf: len(checked) == 3):
             auditor.check(queue, retry, terminate, wr_pipe, None, None, 3, False)
 
     ok_(queue.empty())
     eq_(retry.get(), ('RSE_WITH_EXCEPTION', 0))
     eq_(retry.get(), ('RSE_WITH_ERROR', 0))
     ok_(retry.empty())
+
+
+def test_auditor_check_prefetches_the_dumps_of_the_next_rse():
+    queue = multiprocessing.Queue()
+    retry = multiprocessing.Queue()
+    for rse in ('RSE_1', 'RSE_2', 'RSE_3'):
+        queue.put((rse, 1))
+    time.sleep(0.1)  # Let the feeder thread fill the queue
+    wr_pipe = collections.namedtuple('FakePipe', ('send', 'close'))(
+        lambda _: None,
+        lambda: None,
+    )
+    downloads, checks = [], []
+
+    def fake_download_dumps(rse, delta, configuration, cache_dir, results_dir):
+        downloads.append(rse)
+
+    def fake_consistency(rse, delta, configuration, cache_dir, results_dir, timings=None):
+        timings['compare'] = 1
+        checks.append((rse, rse in downloads))
+
+    tmp_dir = tempfile.mkdtemp()
+    terminate = multiprocessing.Event()
+    try:
+        with stubbed(srmdumps.parse_configuration, lambda: None):
+            with stubbed(auditor.download_dumps, fake_download_dumps):
+                with stubbed(auditor.consistency, fake_consistency):
+                    with stubbed(terminate.is_set, lambda slf: len(checks) == 3):
+                        auditor.check(queue, retry, terminate, wr_pipe, tmp_dir, tmp_dir, False, 3, cache_size=0)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    # The dumps of the next RSEs are downloaded before they are checked
+    eq_(checks, [('RSE_1', False), ('RSE_2', True), ('RSE_3', True)])
+    eq_(downloads, ['RSE_2', 'RSE_3'])
+    ok_(queue.empty())
+    ok_(retry.empty())
+
+
+def test_auditor_cache_evicts_the_least_recently_used_dumps():
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        names = ['ddmendpoint_RSE_1_dump', 'ddmendpoint_RSE_1_dump_paths_compact', 'replicafromhdfs_RSE_2_dump',
+                 'replicafromhdfs_RSE_3_dump', 'tmpXXXXXX']
+        for age, name in enumerate(reversed(names)):
+            path = os.path.join(tmp_dir, name)
+            with open(path, 'w') as dump:
+                dump.write('x' * 100)
+            os.utime(path, (time.time() - 100 * age, time.time() - 100 * age))
+
+        # RSE_1 is now the most recently used
+        cache.touch(tmp_dir, auditor.dump_prefixes('RSE_1'))
+        eq_([os.path.basename(entry) for _, _, entry in cache.usage(tmp_dir)][-2:], names[:2])
+
+        removed = cache.evict(tmp_dir, 400, keep=auditor.dump_prefixes('RSE_2'))
+        eq_([os.path.basename(entry) for entry in removed], ['replicafromhdfs_RSE_3_dump'])
+        eq_(cache.evict(tmp_dir, 400), [])
+        # The dumps in use by a process are not evicted, the markers of the dead processes are removed
+        with cache.in_use(tmp_dir, auditor.dump_prefixes('RSE_1')):
+            open(os.path.join(tmp_dir, cache.IN_USE + '999999999_replicafromhdfs_RSE_2_'), 'w').close()
+            eq_(cache.evict(tmp_dir, 0), [os.path.join(tmp_dir, 'replicafromhdfs_RSE_2_dump')])
+        removed = cache.evict(tmp_dir, 0)
+        eq_(sorted(os.listdir(tmp_dir)), ['tmpXXXXXX'])
+        eq_(len(removed), 2)
+    finally:
+        shutil.rmtree(tmp_dir)
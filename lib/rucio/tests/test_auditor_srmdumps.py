@@ -1,9 +1,21 @@
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 from ConfigParser import ConfigParser
+from StringIO import StringIO
 from datetime import datetime
+from nose.tools import assert_raises
 from nose.tools import eq_
+from nose.tools import ok_
 from nose.tools import raises
+from rucio.common.dumper import HTTPDownloadFailed
+from rucio.common.dumper import smart_open
 from rucio.daemons.auditor import srmdumps
 from rucio.tests.common import stubbed
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import threading
 
 
 def test_patterns_on_file_names():
@@ -99,3 +111,110 @@ def test_with_configuration_file():
     base_url, pattern = srmdumps.generate_url('SITE_DATADISK', config)
     eq_(base_url, 'http://example.com')
     eq_(pattern, 'pattern-%Y-%m-%d/dumps')
+
+
+class DumpsRequestHandler(BaseHTTPRequestHandler):
+    """ Serves a directory of dumps with ETags, the ranges of the dumps and can interrupt their download """
+
+    dumps = {}
+    etag = '"1"'
+    interrupt = False
+    requests = []
+
+    def do_GET(self):
+        DumpsRequestHandler.requests.append((self.path, dict(self.headers)))
+        if self.path == '/dumps':
+            if self.headers.get('If-None-Match') == self.etag:
+                return self._reply(304, '', {'ETag': self.etag})
+            body = '<html><body>%s</body></html>' % ''.join("<a href='%s'>%s</a>" % (name, name) for name in sorted(self.dumps))
+            return self._reply(200, body, {'ETag': self.etag, 'Content-Type': 'text/html'})
+
+        name = self.path.split('/')[-1]
+        if name not in self.dumps:
+            return self._reply(404, '', {})
+        dump = self.dumps[name]
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range') == self.etag:
+            start = int(match.group(1))
+            return self._reply(206, dump[start:], {'ETag': self.etag, 'Content-Range': 'bytes %d-%d/%d' % (start, len(dump) - 1, len(dump))})
+        if DumpsRequestHandler.interrupt:
+            DumpsRequestHandler.interrupt = False
+            return self._reply(200, dump, {'ETag': self.etag}, length=len(dump) / 2)
+        self._reply(200, dump, {'ETag': self.etag})
+
+    def _reply(self, status, body, headers, length=None):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[:length])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPDumps(object):
+    """ Listing and download of the dumps from an HTTP server """
+
+    def setup(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        lines = ''.join('/pnfs/example.com/atlas/atlasdatadisk/rucio/mc16/aa/bb/file_%05d\n' % i for i in xrange(5000))
+        compressed = StringIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as dump:
+            dump.write(lines)
+        self.lines = lines
+        DumpsRequestHandler.dumps = {'dump_20170101': 'old', 'dump_20170301': compressed.getvalue()}
+        DumpsRequestHandler.etag, DumpsRequestHandler.interrupt, DumpsRequestHandler.requests = '"1"', False, []
+        self.server = HTTPServer(('localhost', 0), DumpsRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.config = ConfigParser()
+        self.config.add_section('SITE')
+        self.config.set('SITE', 'SITE_DATADISK', 'http://localhost:%i/dumps/dump_%%Y%%m%%d' % self.server.server_address[1])
+
+    def teardown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_listing_not_modified(self):
+        """ test_get_dump_url_lists_the_dumps_again_only_if_modified """
+        url, date = srmdumps.get_dump_url('SITE_DATADISK', self.config, destdir=self.tmp_dir)
+        eq_(srmdumps.get_dump_url('SITE_DATADISK', self.config, destdir=self.tmp_dir), (url, date))
+        ok_(url.endswith('/dumps/dump_20170301'))
+        eq_(date, datetime(2017, 3, 1))
+        eq_([headers.get('if-none-match') for _, headers in DumpsRequestHandler.requests], [None, '"1"'])
+
+        DumpsRequestHandler.etag = '"2"'
+        DumpsRequestHandler.dumps['dump_20170401'] = 'new'
+        eq_(srmdumps.get_dump_url('SITE_DATADISK', self.config, destdir=self.tmp_dir)[1], datetime(2017, 4, 1))
+
+    def test_interrupted_download_resumed(self):
+        """ test_download_rse_dump_resumes_interrupted_downloads """
+        DumpsRequestHandler.interrupt = True
+        assert_raises(HTTPDownloadFailed, srmdumps.download_rse_dump, 'SITE_DATADISK', self.config, destdir=self.tmp_dir)
+        path, date = srmdumps.download_rse_dump('SITE_DATADISK', self.config, destdir=self.tmp_dir)
+
+        size = len(DumpsRequestHandler.dumps['dump_20170301'])
+        ranges = [headers.get('range') for name, headers in DumpsRequestHandler.requests if name.endswith('dump_20170301')]
+        eq_(ranges, [None, 'bytes=%d-' % (size / 2)])
+        eq_(os.path.getsize(path), size)
+        # The dump is decompressed while it is read
+        with smart_open(path) as dump:
+            eq_(dump.read(), self.lines)
+
+        # Already downloaded
+        DumpsRequestHandler.requests = []
+        eq_(srmdumps.download_rse_dump('SITE_DATADISK', self.config, destdir=self.tmp_dir), (path, date))
+        eq_([name for name, _ in DumpsRequestHandler.requests], ['/dumps'])
+
+    def test_changed_dump_downloaded_again(self):
+        """ test_download_rse_dump_downloads_the_whole_dump_if_it_changed """
+        DumpsRequestHandler.interrupt = True
+        assert_raises(HTTPDownloadFailed, srmdumps.download_rse_dump, 'SITE_DATADISK', self.config, destdir=self.tmp_dir)
+        DumpsRequestHandler.etag = '"2"'
+        path, _ = srmdumps.download_rse_dump('SITE_DATADISK', self.config, destdir=self.tmp_dir)
+        eq_(os.path.getsize(path), len(DumpsRequestHandler.dumps['dump_20170301']))
+        eq_(sorted(os.listdir(self.tmp_dir)), sorted([os.path.basename(path), 'srmdumps_SITE_DATADISK.index']))
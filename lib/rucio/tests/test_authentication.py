@@ -10,10 +10,13 @@
  - Vincent Garonne,  <vincent.garonne@cern.ch> , 2011-2017
 '''
 
-from nose.tools import assert_equal, assert_is_not_none, assert_greater
+import time
+
+from nose.tools import assert_equal, assert_is_not_none, assert_is_none, assert_greater
 from paste.fixture import TestApp
 
 from rucio.api.authentication import get_auth_token_user_pass
+from rucio.core import authentication
 from rucio.web.rest.authentication import APP
 
 
@@ -27,6 +30,52 @@ class TestAuthCoreApi(object):
         assert_is_not_none(result)
 
 
+class TestSignedTokens(object):
+    '''
+    TestSignedTokens
+    '''
+    def setUp(self):  # pylint: disable=invalid-name
+        ''' SetUp '''
+        self.signing_key = authentication.TOKEN_SIGNING_KEY
+        authentication.TOKEN_SIGNING_KEY = 'test-signing-key'
+        authentication.DENY_LIST['refreshed_at'] = None
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        ''' TearDown '''
+        authentication.TOKEN_SIGNING_KEY = self.signing_key
+        authentication.DENY_LIST['refreshed_at'] = None
+
+    def test_signed_token(self):
+        """AUTHENTICATION (CORE): Signed tokens are validated by their signature."""
+        token = get_auth_token_user_pass(account='root', username='ddmlab', password='secret', appid='test', ip='127.0.0.1')
+        assert token.startswith('S1:root:')
+        assert_equal(authentication.validate_auth_token(token), authentication.query_token(token))
+        version, account, expiry, tuid, signature = token.split(':')
+        assert_is_none(authentication.validate_auth_token(':'.join((version, 'jdoe', expiry, tuid, signature))))
+        assert_is_none(authentication.validate_auth_token(':'.join((version, account, str(int(expiry) + 3600), tuid, signature))))
+        assert_is_none(authentication.validate_auth_token(token[:-1]))
+        assert_is_none(authentication.validate_auth_token('S1:root'))
+
+    def test_signed_token_expired(self):
+        """AUTHENTICATION (CORE): Expired signed tokens are refused."""
+        expiry = int(time.time()) - 1
+        token = 'S1:root:%d:tuid:%s' % (expiry, authentication.sign_token('root', expiry, 'tuid'))
+        assert_is_none(authentication.validate_auth_token(token))
+
+    def test_signed_token_revoked(self):
+        """AUTHENTICATION (CORE): Revoked signed tokens are refused once the deny list is refreshed."""
+        token = get_auth_token_user_pass(account='root', username='ddmlab', password='secret', appid='test', ip='127.0.0.1')
+        assert_is_not_none(authentication.validate_auth_token(token))
+        authentication.revoke_token(token)
+        assert_is_not_none(authentication.validate_auth_token(token))
+        authentication.DENY_LIST['refreshed_at'] = None
+        assert_is_none(authentication.validate_auth_token(token))
+        assert_is_none(authentication.query_token(token))
+        # Kept as long as needed in the deny list
+        authentication.delete_expired_tokens('root')
+        assert token in authentication.list_revoked_tokens()
+
+
 class TestAuthRestApi(object):
     '''
     TestAuthRestApi
@@ -0,0 +1,112 @@
+'''
+ Copyright European Organization for Nuclear Research (CERN)
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ You may not use this file except in compliance with the License.
+ You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+
+import datetime
+import json
+import shutil
+import tempfile
+import threading
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from nose.tools import assert_equal, assert_true
+
+from rucio.client.baseclient import BaseClient
+from rucio.common.utils import build_url
+
+
+class RucioRequestHandler(BaseHTTPRequestHandler):
+    """ Serves tokens and a JSON stream, keeping the connections alive. """
+
+    protocol_version = 'HTTP/1.1'
+    token = 'token1'
+    authentications = 0
+    clients = set()
+
+    def do_GET(self):
+        RucioRequestHandler.clients.add(self.client_address)
+        if self.path.startswith('/auth/userpass'):
+            RucioRequestHandler.authentications += 1
+            return self._reply(200, '', {'X-Rucio-Auth-Token': RucioRequestHandler.token})
+        if self.headers.get('X-Rucio-Auth-Token') != RucioRequestHandler.token:
+            return self._reply(401, '', {})
+        body = ''.join('%s\n' % json.dumps({'name': 'file_%i' % i, 'created_at': 'Mon, 02 Jan 2017 00:00:00 UTC'}) for i in xrange(10000))
+        self._reply(200, body, {'Content-Type': 'application/x-json-stream'})
+
+    def _reply(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # The connections kept alive by the clients are dropped when the server shuts down
+
+
+class TestBaseClientSession():
+
+    def setup(self):
+        self.token_dir = tempfile.mkdtemp()
+        self.token_path_prefix = BaseClient.TOKEN_PATH_PREFIX
+        BaseClient.TOKEN_PATH_PREFIX = self.token_dir + '/.rucio_'
+        BaseClient.TOKENS.clear()
+        RucioRequestHandler.token, RucioRequestHandler.authentications, RucioRequestHandler.clients = 'token1', 0, set()
+        self.server = ThreadingHTTPServer(('localhost', 0), RucioRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.host = 'http://localhost:%i' % self.server.server_address[1]
+
+    def teardown(self):
+        BaseClient.TOKEN_PATH_PREFIX = self.token_path_prefix
+        BaseClient.TOKENS.clear()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.token_dir)
+
+    def _client(self):
+        return BaseClient(rucio_host=self.host, auth_host=self.host, account='root', auth_type='userpass',
+                          creds={'username': 'ddmlab', 'password': 'secret'})
+
+    def _list(self, client):
+        return list(client._load_json_data(client._send_request(build_url(self.host, path='dids/mock'))))
+
+    def test_shared_session_and_token(self):
+        """ CLIENTS (BASECLIENT): The clients of the process share their connections and their token """
+        clients = [self._client() for _ in xrange(5)]
+        for client in clients:
+            assert_equal(len(self._list(client)), 10000)
+        assert_equal(RucioRequestHandler.authentications, 1)
+        assert_equal(len(RucioRequestHandler.clients), 1)
+
+    def test_shared_token_refresh(self):
+        """ CLIENTS (BASECLIENT): An expired token is refreshed once for all the clients """
+        first, second = self._client(), self._client()
+        RucioRequestHandler.token = 'token2'
+        self._list(first)
+        self._list(second)
+        assert_equal(RucioRequestHandler.authentications, 2)
+        assert_equal(second.auth_token, 'token2')
+
+    def test_json_stream(self):
+        """ CLIENTS (BASECLIENT): The JSON streams are decoded line by line """
+        dids = self._client()._load_json_data(self._client()._send_request(build_url(self.host, path='dids/mock')))
+        did = dids.next()
+        assert_equal(did['name'], 'file_0')
+        assert_true(isinstance(did['created_at'], datetime.datetime))
+        assert_equal(sum(1 for _ in dids), 9999)
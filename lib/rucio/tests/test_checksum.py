@@ -0,0 +1,60 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import hashlib
+import os
+import tempfile
+import zlib
+
+from nose.tools import assert_equal, assert_raises
+
+from rucio.common.utils import StreamingChecksum, adler32, checksum_file, md5
+
+
+class TestChecksum:
+
+    def setup(self):
+        self.data = os.urandom(100000) + '\n' * 1000
+        handle, self.path = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.data)
+        self.adler32 = '%08x' % (zlib.adler32(self.data) & 0xffffffff)
+        self.md5 = hashlib.md5(self.data).hexdigest()
+
+    def teardown(self):
+        os.unlink(self.path)
+
+    def test_checksum_file(self):
+        """ CHECKSUM (COMMON): Adler-32 and MD5 are computed in one pass, by blocks or through a memory map """
+        for use_mmap in (False, True):
+            assert_equal(checksum_file(self.path, block_size=4096, use_mmap=use_mmap),
+                         {'adler32': self.adler32, 'md5': self.md5, 'bytes': len(self.data)})
+        assert_equal(checksum_file(self.path, md5=False)['md5'], None)
+        assert_equal(adler32(self.path), self.adler32)
+        assert_equal(md5(self.path), self.md5)
+
+    def test_checksum_empty_file(self):
+        """ CHECKSUM (COMMON): The checksums of an empty file """
+        with open(self.path, 'wb'):
+            pass
+        for use_mmap in (False, True):
+            assert_equal(checksum_file(self.path, use_mmap=use_mmap),
+                         {'adler32': '00000001', 'md5': hashlib.md5().hexdigest(), 'bytes': 0})
+
+    def test_checksum_missing_file(self):
+        """ CHECKSUM (COMMON): The checksum of a missing file raises an exception """
+        assert_raises(Exception, adler32, self.path + '.missing')
+
+    def test_streaming_checksum(self):
+        """ CHECKSUM (COMMON): The streaming checksum can be reset and combined """
+        checksum = StreamingChecksum(md5=False)
+        checksum.update('garbage')
+        checksum.reset()
+        checksum.update(self.data[:5000])
+        checksum.combine(zlib.adler32(self.data[5000:]) & 0xffffffff, len(self.data) - 5000)
+        assert_equal(checksum.adler32, self.adler32)
+        assert_equal(checksum.bytes, len(self.data))
+        assert_raises(ValueError, StreamingChecksum().combine, 1, 0)
@@ -0,0 +1,181 @@
+'''
+ Copyright European Organization for Nuclear Research (CERN)
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ You may not use this file except in compliance with the License.
+ You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+
+import json
+import shutil
+import tempfile
+import threading
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from nose.tools import assert_equal, assert_true, raises
+
+from rucio.client.baseclient import BaseClient
+from rucio.client.didclient import DIDClient, chunk_attachments
+from rucio.client.replicaclient import ReplicaClient
+from rucio.common.exception import BulkOperationFailure, DataIdentifierNotFound
+
+
+class RucioRequestHandler(BaseHTTPRequestHandler):
+    """ Serves the ping and the bulk methods, recording the size of the requests. Requests with a 'missing' DID fail. """
+
+    protocol_version = 'HTTP/1.1'
+    bulk_limit = 10
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.startswith('/auth/'):
+            return self._reply(200, '', {'X-Rucio-Auth-Token': 'token'})
+        if self.path.startswith('/ping'):
+            return self._reply(200, json.dumps({'version': '1.0', 'bulk_limit': RucioRequestHandler.bulk_limit}), {'Content-Type': 'application/json'})
+        self._reply(404, '', {})
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        path = self.path.split('?')[0]
+        if path == '/dids/attachments':
+            items = [did['name'] for attachment in data['attachments'] for did in attachment['dids']]
+        elif path == '/replicas/bad':
+            items = data['pfns']
+        else:
+            items = [did['name'] for did in data.get('files', data.get('dids'))]
+        with RucioRequestHandler.lock:
+            RucioRequestHandler.requests.append((path, items))
+        if [item for item in items if 'missing' in item]:
+            body = json.dumps({'ExceptionClass': 'DataIdentifierNotFound', 'ExceptionMessage': 'Data identifier not found.'})
+            return self._reply(404, body, {'Content-Type': 'application/json', 'ExceptionClass': 'DataIdentifierNotFound'})
+        if path == '/replicas/list':
+            body = ''.join('%s\n' % json.dumps({'scope': 'mock', 'name': name, 'rses': {}}) for name in items)
+            return self._reply(200, body, {'Content-Type': 'application/x-json-stream'})
+        if path == '/replicas/bad':
+            return self._reply(201, json.dumps({'MOCK': [pfn for pfn in items if 'unknown' in pfn]}), {'Content-Type': 'application/json'})
+        self._reply(201, 'Created', {})
+
+    def _reply(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # The connections kept alive by the clients are dropped when the server shuts down
+
+
+def test_chunk_attachments():
+    """ CLIENTS (DIDCLIENT): The attachments are split by number of DIDs """
+    attachments = [{'scope': 'mock', 'name': 'dataset_1', 'dids': [{'scope': 'mock', 'name': 'file_%i' % i} for i in xrange(25)]},
+                   {'scope': 'mock', 'name': 'dataset_2', 'dids': []},
+                   {'scope': 'mock', 'name': 'dataset_3', 'dids': [{'scope': 'mock', 'name': 'file_%i' % i} for i in xrange(3)]}]
+    chunks = list(chunk_attachments(attachments, 10))
+    assert_equal([[(attachment['name'], len(attachment['dids'])) for attachment in chunk] for chunk in chunks],
+                 [[('dataset_1', 10)], [('dataset_1', 10)], [('dataset_1', 5), ('dataset_2', 0), ('dataset_3', 3)]])
+    assert_equal([did['name'] for chunk in chunks for attachment in chunk for did in attachment['dids']],
+                 ['file_%i' % i for i in xrange(25)] + ['file_%i' % i for i in xrange(3)])
+
+
+class TestClientBulk():
+
+    def setup(self):
+        self.token_dir = tempfile.mkdtemp()
+        self.token_path_prefix = BaseClient.TOKEN_PATH_PREFIX
+        BaseClient.TOKEN_PATH_PREFIX = self.token_dir + '/.rucio_'
+        BaseClient.TOKENS.clear()
+        BaseClient.BULK_LIMITS.clear()
+        RucioRequestHandler.bulk_limit, RucioRequestHandler.requests = 10, []
+        self.server = ThreadingHTTPServer(('localhost', 0), RucioRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        host = 'http://localhost:%i' % self.server.server_address[1]
+        kwargs = {'rucio_host': host, 'auth_host': host, 'account': 'root', 'auth_type': 'userpass', 'creds': {'username': 'ddmlab', 'password': 'secret'}}
+        self.did_client, self.replica_client = DIDClient(**kwargs), ReplicaClient(**kwargs)
+
+    def teardown(self):
+        BaseClient.TOKEN_PATH_PREFIX = self.token_path_prefix
+        BaseClient.TOKENS.clear()
+        BaseClient.BULK_LIMITS.clear()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.token_dir)
+
+    def _files(self, number, missing=()):
+        return [{'scope': 'mock', 'name': 'missing_%i' % i if i in missing else 'file_%i' % i, 'bytes': 1, 'adler32': '01000001'} for i in xrange(number)]
+
+    def test_add_replicas(self):
+        """ CLIENTS (REPLICACLIENT): The replicas are added by chunks of the size advertised by the server """
+        assert_true(self.replica_client.add_replicas('MOCK', self._files(95)))
+        sizes = sorted(len(items) for _, items in RucioRequestHandler.requests)
+        assert_equal(sizes, [5] + [10] * 9)
+        assert_equal(sorted(item for _, items in RucioRequestHandler.requests for item in items), sorted('file_%i' % i for i in xrange(95)))
+
+    def test_configured_chunk_size(self):
+        """ CLIENTS (REPLICACLIENT): A chunk size smaller than the limit of the server is kept """
+        RucioRequestHandler.bulk_limit = 1000
+        self.replica_client.bulk_chunk_size = 30
+        self.replica_client.add_replicas('MOCK', self._files(95))
+        assert_equal(sorted(len(items) for _, items in RucioRequestHandler.requests), [5, 30, 30, 30])
+
+    def test_partial_failure(self):
+        """ CLIENTS (REPLICACLIENT): The failed chunks are reported """
+        try:
+            self.replica_client.add_replicas('MOCK', self._files(50, missing=(12, 47)))
+        except BulkOperationFailure as error:
+            assert_equal([index for index, _, _ in error.failures], [1, 4])
+            assert_equal([chunk[2]['name'] for _, chunk, _ in error.failures], ['missing_12', 'file_42'])
+            assert_true(isinstance(error.failures[0][2], DataIdentifierNotFound))
+            assert_equal(error.results, [True, None, True, True, None])
+        else:
+            raise AssertionError('BulkOperationFailure not raised')
+
+    @raises(DataIdentifierNotFound)
+    def test_single_chunk_failure(self):
+        """ CLIENTS (REPLICACLIENT): A request sent in one chunk raises its own exception """
+        self.replica_client.add_replicas('MOCK', self._files(5, missing=(3,)))
+
+    def test_attach_dids_to_dids(self):
+        """ CLIENTS (DIDCLIENT): The attachments are sent by chunks of DIDs """
+        attachments = [{'scope': 'mock', 'name': 'dataset_%i' % i, 'dids': self._files(12)} for i in xrange(3)]
+        assert_true(self.did_client.add_files_to_datasets(attachments))
+        assert_equal(sorted(len(items) for _, items in RucioRequestHandler.requests), [6, 10, 10, 10])
+
+    def test_list_replicas(self):
+        """ CLIENTS (REPLICACLIENT): The replicas of long lists of DIDs are listed by chunks, in order """
+        replicas = list(self.replica_client.list_replicas([{'scope': 'mock', 'name': 'file_%i' % i} for i in xrange(55)]))
+        assert_equal([replica['name'] for replica in replicas], ['file_%i' % i for i in xrange(55)])
+        assert_equal(len(RucioRequestHandler.requests), 6)
+
+    def test_list_replicas_failure(self):
+        """ CLIENTS (REPLICACLIENT): The replicas of the other chunks are listed before the failure is raised """
+        dids = [{'scope': 'mock', 'name': 'missing_%i' % i if i == 15 else 'file_%i' % i} for i in xrange(30)]
+        replicas = []
+        try:
+            for replica in self.replica_client.list_replicas(dids):
+                replicas.append(replica['name'])
+        except BulkOperationFailure as error:
+            assert_equal([index for index, _, _ in error.failures], [1])
+        else:
+            raise AssertionError('BulkOperationFailure not raised')
+        assert_equal(replicas, ['file_%i' % i for i in xrange(10)] + ['file_%i' % i for i in xrange(20, 30)])
+
+    def test_declare_bad_file_replicas(self):
+        """ CLIENTS (REPLICACLIENT): The PFNs not declared are merged across the chunks """
+        pfns = ['srm://mock/file_%i' % i if i % 7 else 'srm://mock/unknown_%i' % i for i in xrange(25)]
+        not_declared = self.replica_client.declare_bad_file_replicas(pfns, 'test')
+        assert_equal(not_declared, {'MOCK': ['srm://mock/unknown_%i' % i for i in xrange(0, 25, 7)]})
+        assert_equal(len(RucioRequestHandler.requests), 3)
@@ -0,0 +1,134 @@
+'''
+ Copyright European Organization for Nuclear Research (CERN)
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ You may not use this file except in compliance with the License.
+ You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from nose.tools import assert_equal, assert_true, raises
+
+from rucio.client.baseclient import BaseClient
+from rucio.client.concurrentclient import ConcurrentClient
+from rucio.common.exception import DataIdentifierNotFound
+
+
+class RucioRequestHandler(BaseHTTPRequestHandler):
+    """ Serves tokens, the metadata and the files of mock DIDs, counting the concurrent requests. """
+
+    protocol_version = 'HTTP/1.1'
+    token = 'token1'
+    authentications = 0
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.startswith('/auth/userpass'):
+            with RucioRequestHandler.lock:
+                RucioRequestHandler.authentications += 1
+            return self._reply(200, '', {'X-Rucio-Auth-Token': RucioRequestHandler.token})
+        if self.headers.get('X-Rucio-Auth-Token') != RucioRequestHandler.token:
+            return self._reply(401, '', {})
+        with RucioRequestHandler.lock:
+            RucioRequestHandler.running += 1
+            RucioRequestHandler.max_running = max(RucioRequestHandler.max_running, RucioRequestHandler.running)
+        try:
+            time.sleep(0.05)
+            _, _, scope, name, what = self.path.split('?')[0].split('/')
+            if name.startswith('missing'):
+                body = json.dumps({'ExceptionClass': 'DataIdentifierNotFound', 'ExceptionMessage': 'Data identifier not found.'})
+                return self._reply(404, body, {'Content-Type': 'application/json', 'ExceptionClass': 'DataIdentifierNotFound'})
+            if what == 'meta':
+                return self._reply(200, json.dumps({'scope': scope, 'name': name}), {'Content-Type': 'application/json'})
+            body = ''.join('%s\n' % json.dumps({'scope': scope, 'name': '%s.file_%i' % (name, i)}) for i in xrange(100))
+            self._reply(200, body, {'Content-Type': 'application/x-json-stream'})
+        finally:
+            with RucioRequestHandler.lock:
+                RucioRequestHandler.running -= 1
+
+    def _reply(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # The connections kept alive by the clients are dropped when the server shuts down
+
+
+class TestConcurrentClient():
+
+    def setup(self):
+        self.token_dir = tempfile.mkdtemp()
+        self.token_path_prefix = BaseClient.TOKEN_PATH_PREFIX
+        BaseClient.TOKEN_PATH_PREFIX = self.token_dir + '/.rucio_'
+        BaseClient.TOKENS.clear()
+        RucioRequestHandler.token, RucioRequestHandler.authentications, RucioRequestHandler.max_running = 'token1', 0, 0
+        self.server = ThreadingHTTPServer(('localhost', 0), RucioRequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        host = 'http://localhost:%i' % self.server.server_address[1]
+        self.client = ConcurrentClient(concurrency=4, rucio_host=host, auth_host=host, account='root', auth_type='userpass',
+                                       creds={'username': 'ddmlab', 'password': 'secret'})
+
+    def teardown(self):
+        self.client.close()
+        BaseClient.TOKEN_PATH_PREFIX = self.token_path_prefix
+        BaseClient.TOKENS.clear()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.token_dir)
+
+    def test_futures(self):
+        """ CLIENTS (CONCURRENTCLIENT): The mirrored methods return futures """
+        future = self.client.get_metadata('mock', 'dataset')
+        assert_equal(future.result(), {'scope': 'mock', 'name': 'dataset'})
+        assert_true(isinstance(self.client.get_metadata('mock', 'missing').exception(), DataIdentifierNotFound))
+
+    @raises(AttributeError)
+    def test_not_mirrored(self):
+        """ CLIENTS (CONCURRENTCLIENT): Only the methods of the DID, replica, rule and RSE clients are mirrored """
+        self.client.whoami()
+
+    def test_map(self):
+        """ CLIENTS (CONCURRENTCLIENT): Bounded concurrency and a single token refresh """
+        RucioRequestHandler.token = 'token2'
+        calls = [('mock', 'dataset_%i' % i) for i in xrange(100)] + [{'scope': 'mock', 'name': 'missing'}]
+        results = dict((str(arguments), result) for arguments, result in self.client.map('get_metadata', calls))
+        assert_equal(len(results), 101)
+        assert_equal(results[str(('mock', 'dataset_42'))], {'scope': 'mock', 'name': 'dataset_42'})
+        assert_true(isinstance(results[str({'scope': 'mock', 'name': 'missing'})], DataIdentifierNotFound))
+        assert_true(1 < RucioRequestHandler.max_running <= 4)
+        assert_equal(RucioRequestHandler.authentications, 2)
+
+    def test_stream(self):
+        """ CLIENTS (CONCURRENTCLIENT): The items of many streams """
+        files = list(self.client.stream('list_files', [('mock', 'dataset_%i' % i) for i in xrange(20)]))
+        assert_equal(len(files), 2000)
+        assert_equal(len(set(f['name'] for f in files)), 2000)
+        assert_true(RucioRequestHandler.max_running <= 4)
+
+    @raises(DataIdentifierNotFound)
+    def test_stream_failure(self):
+        """ CLIENTS (CONCURRENTCLIENT): A failed stream is raised once the others are read """
+        list(self.client.stream('list_files', [('mock', 'dataset'), ('mock', 'missing')]))
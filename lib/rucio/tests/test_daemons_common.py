@@ -0,0 +1,72 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import threading
+
+from nose.tools import assert_equal, assert_false, assert_true
+
+from rucio.common.exception import DatabaseException
+from rucio.core.heartbeat import cardiac_arrest, list_heartbeats
+from rucio.daemons.common import AdaptiveSleep, get_executor, is_locks_detected, is_transient_database_error, run_daemon
+
+
+class TestDaemonsCommon:
+
+    def setup(self):
+        cardiac_arrest()
+
+    def test_adaptive_sleep(self):
+        """ DAEMONS (COMMON): The sleep depends on the size of the last fetch """
+        sleep = AdaptiveSleep(min_sleep=1, max_sleep=8, factor=2)
+        assert_equal([sleep.next_interval(0, 100) for _ in xrange(5)], [1, 2, 4, 8, 8])
+        assert_equal(sleep.next_interval(100, 100), 0)
+        assert_equal(sleep.next_interval(0, 100), 1)
+        assert_equal(sleep.next_interval(50, 100), 0.5)
+        assert_equal(sleep.next_interval(10, None), 0)
+
+    def test_database_errors(self):
+        """ DAEMONS (COMMON): Database errors are classified """
+        assert_true(is_transient_database_error(DatabaseException('QueuePool limit of size 5 overflow 10 reached')))
+        assert_false(is_transient_database_error(DatabaseException('ORA-00054: resource busy')))
+        assert_true(is_locks_detected(DatabaseException('ORA-00054: resource busy')))
+        assert_false(is_locks_detected(ValueError('ORA-00054: resource busy')))
+
+    def test_run_daemon(self):
+        """ DAEMONS (COMMON): The items fetched by the worker are all processed, failures included """
+        processed = []
+        partitions = []
+
+        def fetch(worker_number, total_workers, bulk):
+            partitions.append((worker_number, total_workers, bulk))
+            return range(10)
+
+        def process(item):
+            if item == 5:
+                raise ValueError('failure')
+            processed.append(item)
+
+        for executor in (None, get_executor('thread', 4)):
+            del processed[:]
+            run_daemon('rucio-test-daemon', fetch=fetch, process=process, graceful_stop=threading.Event(), once=True, bulk=10, executor=executor)
+            assert_equal(sorted(processed), [0, 1, 2, 3, 4, 6, 7, 8, 9])
+            if executor is not None:
+                executor.close()
+        assert_equal(partitions, [(0, 0, 10), (0, 0, 10)])
+        assert_equal([hb for hb in list_heartbeats() if hb[0] == 'rucio-test-daemon'], [])
+
+    def test_run_daemon_stop(self):
+        """ DAEMONS (COMMON): The worker loops until it is stopped """
+        graceful_stop = threading.Event()
+        fetches = []
+
+        def fetch(worker_number, total_workers, bulk):
+            fetches.append(bulk)
+            if len(fetches) == 3:
+                graceful_stop.set()
+            return range(bulk)
+
+        run_daemon('rucio-test-daemon', fetch=fetch, process=lambda item: None, graceful_stop=graceful_stop, bulk=2)
+        assert_equal(len(fetches), 3)
@@ -27,12 +27,12 @@ from rucio.client.rseclient import RSEClient
 from rucio.client.scopeclient import ScopeClient
 from rucio.common.exception import (DataIdentifierNotFound, DataIdentifierAlreadyExists,
                                     FileAlreadyExists, FileConsistencyMismatch,
-                                    InvalidPath, KeyNotFound, UnsupportedOperation,
+                                    InvalidObject, InvalidPath, KeyNotFound, UnsupportedOperation,
                                     UnsupportedStatus, ScopeNotFound)
 from rucio.common.utils import generate_uuid
 from rucio.core.account_limit import set_account_limit
 from rucio.core.did import (list_dids, add_did, delete_dids, get_did_atime, touch_dids, attach_dids,
-                            get_metadata, set_metadata, get_did)
+                            get_metadata, get_metadata_bulk, set_metadata, get_did)
 from rucio.core.rse import get_rse_id
 from rucio.core.replica import add_replica
 from rucio.db.sqla.constants import DIDType
@@ -116,6 +116,19 @@ class TestDIDCore:
         assert_equal(get_did(scope=tmp_scope, name=tmp_dsn1, dynamic=True)['bytes'], 20)
         assert_equal(get_did(scope=tmp_scope, name=tmp_dsn4, dynamic=True)['bytes'], 20)
 
+    def test_get_metadata_bulk(self):
+        """ DATA IDENTIFIERS (CORE): Get metadata of multiple dids """
+        tmp_scope = 'mock'
+        dsns = ['dsn_%s' % generate_uuid() for _ in xrange(5)]
+        for dsn in dsns:
+            add_did(scope=tmp_scope, name=dsn, type=DIDType.DATASET, account='root')
+        dids = [{'scope': tmp_scope, 'name': dsn} for dsn in dsns]
+        dids.append({'scope': tmp_scope, 'name': 'dsn_%s' % generate_uuid()})
+
+        metadata = [meta for meta in get_metadata_bulk(dids, chunk_size=2)]
+        assert_equal(sorted([meta['name'] for meta in metadata]), sorted(dsns))
+        assert_equal(metadata[0], get_metadata(scope=tmp_scope, name=metadata[0]['name']))
+
 
 class TestDIDApi:
 
@@ -149,6 +162,18 @@ class TestDIDApi:
         with assert_raises(DataIdentifierNotFound):
             did.set_new_dids([{'scope': 'dummyscope', 'name': 'dummyname', 'did_type': DIDType.DATASET}], None)
 
+    def test_get_metadata_bulk(self):
+        """ DATA IDENTIFIERS (API): Get metadata of multiple dids """
+        tmp_scope = scope_name_generator()
+        scope.add_scope(tmp_scope, 'jdoe', 'jdoe')
+        dsns = ['dsn_%s' % generate_uuid() for _ in xrange(5)]
+        for dsn in dsns:
+            did.add_did(scope=tmp_scope, name=dsn, type='DATASET', issuer='root')
+        metadata = [meta for meta in did.get_metadata_bulk([{'scope': tmp_scope, 'name': dsn} for dsn in dsns])]
+        assert_equal(sorted([meta['name'] for meta in metadata]), sorted(dsns))
+        with assert_raises(InvalidObject):
+            [meta for meta in did.get_metadata_bulk([])]
+
 
 class TestDIDClients:
 
@@ -625,6 +650,21 @@ class TestDIDClients:
         did2 = self.did_client.get_did(scope, dsn)
         assert_equal(type(did2['expired_at']), datetime)
 
+    def test_get_metadata_bulk(self):
+        """ DATA IDENTIFIERS (CLIENT): Get metadata of multiple dids, by chunks """
+        scope = 'mock'
+        files = [generate_uuid() for _ in xrange(25)]
+        self.replica_client.add_replicas('MOCK', [{'scope': scope, 'name': file, 'bytes': 1L, 'adler32': '0cc737eb'} for file in files])
+        dids = [{'scope': scope, 'name': file} for file in files] + [{'scope': scope, 'name': generate_uuid()}]
+
+        metadata = [meta for meta in self.did_client.get_metadata_bulk(dids)]
+        assert_equal(sorted([meta['name'] for meta in metadata]), sorted(files))
+        assert_equal(type(metadata[0]['created_at']), datetime)
+
+        self.did_client.bulk_chunk_size = 10
+        metadata = [meta for meta in self.did_client.get_metadata_bulk(dids)]
+        assert_equal(sorted([meta['name'] for meta in metadata]), sorted(files))
+
     def test_get_meta(self):
         """ DATA IDENTIFIERS (CLIENT): add a new meta data for an identifier and try to retrieve it back"""
         rse = 'MOCK'
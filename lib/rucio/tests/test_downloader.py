@@ -0,0 +1,138 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zlib
+
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from nose.tools import assert_equal, assert_true
+
+from rucio.rse.downloader import Downloader, parse_metalink
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """ Serves the files of the current directory, with range requests. """
+
+    ranges = []
+
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if not match or not os.path.isfile(self.translate_path(self.path)):
+            return SimpleHTTPRequestHandler.do_GET(self)
+        first, last = int(match.group(1)), int(match.group(2))
+        RangeRequestHandler.ranges.append((first, last))
+        with open(self.translate_path(self.path), 'rb') as f:
+            f.seek(first)
+            data = f.read(last - first + 1)
+        self.send_response(206)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Content-Range', 'bytes %d-%d/*' % (first, last))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _rse_settings(rse, port):
+    domains = {'read': 1, 'write': 1, 'delete': 1}
+    return {'rse': rse, 'deterministic': True, 'domain': ['wan'], 'read_protocol': 1,
+            'protocols': [{'scheme': 'http', 'hostname': 'localhost', 'port': port, 'prefix': '/',
+                           'impl': 'rucio.rse.protocols.webdav.Default', 'extended_attributes': None,
+                           'domains': {'lan': domains, 'wan': domains}}]}
+
+
+class TestDownloader:
+
+    def setup(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.dest_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.source_dir)
+        self.server = ThreadingHTTPServer(('localhost', 0), RangeRequestHandler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever).start()
+        RangeRequestHandler.ranges = []
+
+        self.data = os.urandom(300000)
+        with open(os.path.join(self.source_dir, 'file1'), 'wb') as f:
+            f.write(self.data)
+        with open(os.path.join(self.source_dir, 'corrupted'), 'wb') as f:
+            f.write(self.data[:-1] + 'x')
+        self.adler32 = '%08x' % (zlib.adler32(self.data) & 0xffffffff)
+        self.downloader = Downloader(threads=2, range_threshold=100000, range_parts=4, chunk_size=4096, retries=1,
+                                     credentials={'cert': None}, rse_settings={'MOCK_HTTP': _rse_settings('MOCK_HTTP', self.port)})
+
+    def teardown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.dest_dir)
+
+    def _file(self, name, sources, **kwargs):
+        f = {'scope': 'mock', 'name': name, 'dest_dir': self.dest_dir, 'bytes': len(self.data), 'adler32': self.adler32,
+             'sources': [('MOCK_HTTP', 'http://localhost:%s/%s' % (self.port, source)) for source in sources]}
+        f.update(kwargs)
+        return f
+
+    def test_download_stream(self):
+        """ DOWNLOADER (CLIENTS): Download a file with one request, checksum computed on the fly """
+        self.downloader.range_threshold = len(self.data) + 1
+        result = self.downloader.download([self._file('file1', ['file1'])])['mock:file1']
+        assert_equal(result['clientState'], 'DONE')
+        assert_equal(open(os.path.join(self.dest_dir, 'file1'), 'rb').read(), self.data)
+        assert_equal(RangeRequestHandler.ranges, [])
+
+    def test_download_ranges(self):
+        """ DOWNLOADER (CLIENTS): Download a large file with parallel range requests """
+        result = self.downloader.download([self._file('file1', ['file1'])])['mock:file1']
+        assert_equal(result['clientState'], 'DONE')
+        assert_equal(open(os.path.join(self.dest_dir, 'file1'), 'rb').read(), self.data)
+        assert_equal(sorted(RangeRequestHandler.ranges), [(0, 74999), (75000, 149999), (150000, 224999), (225000, 299999)])
+
+    def test_download_corrupted_source(self):
+        """ DOWNLOADER (CLIENTS): A corrupted source is reported and the next source is used """
+        result = self.downloader.download([self._file('file1', ['corrupted', 'file1'])])['mock:file1']
+        assert_equal(result['clientState'], 'DONE')
+        assert_true(result['pfn'].endswith('/file1'))
+        assert_equal(len(result['corrupted']), 1)
+        assert_true(result['corrupted'][0].endswith('/corrupted'))
+        assert_true(not os.path.exists(os.path.join(self.dest_dir, 'file1.part')))
+
+    def test_download_missing(self):
+        """ DOWNLOADER (CLIENTS): A file without valid source is reported as failed """
+        results = self.downloader.download([self._file('file1', ['missing']), self._file('file2', [])])
+        assert_equal(results['mock:file1']['clientState'], 'FAILED')
+        assert_equal(results['mock:file2']['clientState'], 'FILE_NOT_FOUND')
+        assert_true(not os.path.exists(os.path.join(self.dest_dir, 'file1')))
+
+    def test_parse_metalink(self):
+        """ DOWNLOADER (CLIENTS): The sources are ordered like the metalink """
+        metalink = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+ <file name="file1">
+  <identity>mock:file1</identity>
+  <hash type="adler32">0cc737eb</hash>
+  <size>300000</size>
+   <url location="MOCK2" priority="2">http://mock2/file1</url>
+   <url location="MOCK" priority="1">http://mock/file1</url>
+ </file>
+</metalink>
+'''
+        assert_equal(parse_metalink(metalink), [{'scope': 'mock', 'name': 'file1', 'bytes': 300000, 'adler32': '0cc737eb', 'md5': None,
+                                                 'sources': [('MOCK', 'http://mock/file1'), ('MOCK2', 'http://mock2/file1')]}])
@@ -0,0 +1,126 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+import datetime
+import os
+import shutil
+import tempfile
+
+from nose.tools import eq_, raises
+
+from rucio.common import dumper
+from rucio.common.dumper import compact
+from rucio.common.dumper.consistency import Consistency
+from rucio.tests.common import make_temp_file
+from rucio.tests.common import stubbed
+
+
+class TestCompact(object):
+    '''
+    TestCompact
+    '''
+    def setUp(self):  # pylint: disable=invalid-name
+        ''' SetUp '''
+        self.tmp_dir = tempfile.mkdtemp()
+        self.records = sorted(('user/someuser/{0:02x}/{1:02x}/file_{2:04d}'.format(i % 7, i % 5, i), 'AU'[i % 2]) for i in xrange(2000))
+
+    def teardown(self):  # pylint: disable=invalid-name
+        ''' teardown '''
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, records, block_records=compact.BLOCK_RECORDS):
+        path = os.path.join(self.tmp_dir, 'dump_compact')
+        with open(path, 'wb') as output:
+            eq_(compact.write(output, records, block_records=block_records), len(records))
+        return path
+
+    def test_round_trip(self):
+        ''' DUMPER '''
+        path = self._write(self.records, block_records=64)
+        with compact.CompactDump(path) as dump:
+            eq_(len(dump), len(self.records))
+            eq_(list(dump), self.records)
+            eq_(list(dump.lines())[:2], ['\t'.join(record) for record in self.records[:2]])
+        assert os.path.getsize(path) < sum(len(p) + 2 for p, _ in self.records)
+
+    def test_no_status_and_empty(self):
+        ''' DUMPER '''
+        with compact.CompactDump(self._write([('a', None), ('ab', None), ('b', None)])) as dump:
+            eq_(list(dump.lines()), ['a', 'ab', 'b'])
+            eq_(dump.lookup('ab'), (True, None))
+        with compact.CompactDump(self._write([])) as dump:
+            eq_(list(dump), [])
+            eq_(dump.lookup('a'), (False, None))
+
+    def test_lookup(self):
+        ''' DUMPER '''
+        with compact.CompactDump(self._write(self.records, block_records=64)) as dump:
+            for path, status in self.records[::97] + self.records[-1:]:
+                eq_(dump.lookup(path), (True, status))
+            eq_(dump.lookup(''), (False, None))
+            eq_(dump.lookup(self.records[10][0] + 'x'), (False, None))
+            eq_(dump.lookup('zzz'), (False, None))
+
+    def test_prefix_query(self):
+        ''' DUMPER '''
+        with compact.CompactDump(self._write(self.records, block_records=16)) as dump:
+            prefix = 'user/someuser/03/02/'
+            eq_(list(dump.iter_prefix(prefix)), [record for record in self.records if record[0].startswith(prefix)])
+            eq_(list(dump.iter_from(self.records[-3][0])), self.records[-3:])
+
+    @raises(ValueError)
+    def test_status_is_one_character(self):
+        ''' DUMPER '''
+        self._write([('a', 'AA')])
+
+    @raises(ValueError)
+    def test_not_a_compact_dump(self):
+        ''' DUMPER '''
+        compact.CompactDump(make_temp_file(self.tmp_dir, 'a' * 64))
+
+    def test_cached_written_once(self):
+        ''' DUMPER '''
+        calls = []
+
+        def records():
+            calls.append(True)
+            return iter(self.records)
+
+        path = make_temp_file(self.tmp_dir, 'path\tA\n')
+        for _ in xrange(2):
+            with compact.cached(path, records, cache_dir=self.tmp_dir) as dump:
+                eq_(list(dump), self.records)
+        eq_(len(calls), 1)
+        eq_(sorted(os.listdir(self.tmp_dir)), sorted([os.path.basename(path), os.path.basename(path) + '_compact']))
+
+    def test_cached_compact_dump_used_as_is(self):
+        ''' DUMPER '''
+        path = self._write(self.records)
+        with compact.cached(path, lambda: 1 / 0, cache_dir=self.tmp_dir) as dump:
+            eq_(dump.filepath, path)
+            eq_(len(dump), len(self.records))
+
+    def test_consistency_reuses_the_compact_dumps(self):
+        ''' DUMPER '''
+        line = 'MOCK_SCRATCHDISK\tuser.someuser\t{0}\t19028d77\t189468\t2015-09-20 21:22:04\tuser/someuser/aa/bb/{0}\t2015-09-20 21:22:17\tA\n'
+        rrdf = make_temp_file(self.tmp_dir, line.format('file') + line.format('lost'))
+        sdf = make_temp_file(self.tmp_dir, '/pnfs/example.com/atlas/atlasdatadisk/rucio/user/someuser/aa/bb/file\n')
+
+        def agis_data():
+            return [{'name': 'MOCK_SCRATCHDISK', 'se': 'srm://example.com:8446/', 'endpoint': '/pnfs/example.com/atlas/atlasdatadisk/'}]
+
+        with stubbed(dumper.agis_endpoints_data, agis_data):
+            for _ in xrange(2):
+                consistency = list(Consistency.dump('consistency-manual', 'MOCK_SCRATCHDISK', sdf, prev_date_fname=rrdf, next_date_fname=rrdf,
+                                                    sort_rucio_replica_dumps=True, date=datetime.datetime(2015, 9, 29), cache_dir=self.tmp_dir))
+                eq_([(entry.apparent_status, entry.path) for entry in consistency], [('LOST', 'user/someuser/aa/bb/lost')])
+                if os.path.exists(sdf):
+                    # The second comparison only reads the compact dumps
+                    os.remove(sdf)
+                    os.remove(rrdf)
+        # The storage dump is cached under the name of its RSE and date
+        eq_(sorted(os.listdir(self.tmp_dir)), sorted([os.path.basename(rrdf) + '_compact', 'ddmendpoint_MOCK_SCRATCHDISK_29-09-2015_paths_compact']))
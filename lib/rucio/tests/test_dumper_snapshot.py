@@ -0,0 +1,101 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+import os
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from nose.tools import eq_, assert_raises
+
+from rucio.common.dumper import compact
+from rucio.common.dumper import snapshot
+from rucio.common.utils import generate_uuid
+from rucio.core.replica import add_replicas, list_rse_replicas_page
+from rucio.core.rse import get_rse_id
+
+
+@contextmanager
+def replaced_page_query(replacement):
+    ''' Replaces the page query used by the snapshot, the replacement can call the original one '''
+    snapshot.list_rse_replicas_page = replacement
+    try:
+        yield
+    finally:
+        snapshot.list_rse_replicas_page = list_rse_replicas_page
+
+
+class TestReplicaSnapshot(object):
+    '''
+    TestReplicaSnapshot
+    '''
+    def setUp(self):  # pylint: disable=invalid-name
+        ''' SetUp '''
+        self.tmp_dir = tempfile.mkdtemp()
+        self.prefix = 'snapshot_%s_' % generate_uuid()
+        self.files = [{'scope': 'mock', 'name': '%s%03d' % (self.prefix, i), 'bytes': 1L, 'adler32': '0cc737eb'} for i in xrange(50)]
+        add_replicas(rse='MOCK', files=self.files, account='root')
+
+    def teardown(self):  # pylint: disable=invalid-name
+        ''' teardown '''
+        shutil.rmtree(self.tmp_dir)
+
+    def _expected(self):
+        return sorted((snapshot.deterministic_path(f['scope'], f['name']), 'A') for f in self.files)
+
+    def _snapshot_records(self, path):
+        with compact.CompactDump(path) as dump:
+            records = list(dump)
+        eq_(records, sorted(records))
+        return [record for record in records if record[0].endswith(tuple(f['name'] for f in self.files))]
+
+    def test_list_rse_replicas_page(self):
+        ''' DUMPER (SNAPSHOT): The replicas of an RSE are paginated by scope and name '''
+        rse_id = get_rse_id('MOCK')
+        after = ('mock', self.prefix)
+        first = list_rse_replicas_page(rse_id, after=after, limit=20)
+        second = list_rse_replicas_page(rse_id, after=first[-1][0:2], limit=40)
+        eq_([row[1] for row in first + second][:50], [f['name'] for f in self.files])
+
+    def test_replica_snapshot(self):
+        ''' DUMPER (SNAPSHOT): The snapshot of the replicas is sorted by path '''
+        date = datetime(2017, 5, 1)
+        path = snapshot.replica_snapshot('MOCK', date=date, cache_dir=self.tmp_dir, page_size=7, run_records=15)
+        eq_(os.path.basename(path), 'replicasnapshot_MOCK_01-05-2017')
+        eq_(os.listdir(self.tmp_dir), ['replicasnapshot_MOCK_01-05-2017'])
+        eq_(self._snapshot_records(path), self._expected())
+        # Taken only once
+        with replaced_page_query(lambda *args, **kwargs: 1 / 0):
+            eq_(snapshot.replica_snapshot('MOCK', date=date, cache_dir=self.tmp_dir), path)
+
+    def test_replica_snapshot_resumed(self):
+        ''' DUMPER (SNAPSHOT): An interrupted snapshot is resumed from the last run written '''
+        pages = []
+
+        def interrupted(rse_id, after=None, limit=None):
+            if len(pages) == 10:
+                raise KeyboardInterrupt
+            pages.append(after)
+            return list_rse_replicas_page(rse_id, after=after, limit=limit)
+
+        with replaced_page_query(interrupted):
+            assert_raises(KeyboardInterrupt, snapshot.replica_snapshot, 'MOCK', cache_dir=self.tmp_dir, page_size=5, run_records=20)
+
+        resumed = []
+
+        def recorded(rse_id, after=None, limit=None):
+            resumed.append(after)
+            return list_rse_replicas_page(rse_id, after=after, limit=limit)
+
+        with replaced_page_query(recorded):
+            path = snapshot.replica_snapshot('MOCK', cache_dir=self.tmp_dir, page_size=5, run_records=20)
+        # Resumed after the last page of the last run written (each run is 4 pages of 5 replicas)
+        eq_(resumed[0], tuple(pages[8]))
+        eq_(os.listdir(self.tmp_dir), [os.path.basename(path)])
+        eq_(self._snapshot_records(path), self._expected())
@@ -0,0 +1,115 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+import gzip
+import os
+import random
+import shutil
+import tempfile
+
+from nose.tools import eq_
+
+from rucio.common import dumper
+from rucio.common.dumper import sorting
+from rucio.common.dumper.consistency import Consistency
+from rucio.common.dumper.consistency import compare3
+from rucio.common.dumper.consistency import parse_replica_line
+from rucio.tests.common import make_temp_file
+from rucio.tests.common import stubbed
+
+
+def first_field(line):
+    return line.split(',')[0]
+
+
+class TestSorting(object):
+    '''
+    TestSorting
+    '''
+    def setUp(self):  # pylint: disable=invalid-name
+        ''' SetUp '''
+        self.tmp_dir = tempfile.mkdtemp()
+        self.lines = ['path{0:05d},{1}'.format(i, random.choice('AU')) for i in xrange(5000)]
+        random.shuffle(self.lines)
+
+    def teardown(self):  # pylint: disable=invalid-name
+        ''' teardown '''
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse_lines_parser_and_filter(self):
+        ''' DUMPER '''
+        path = make_temp_file(self.tmp_dir, '\n'.join(self.lines) + '\n')
+        parsed = list(sorting.parse_lines(path, parser=first_field, filter_=lambda s: s.endswith('A'), block_size=1000))
+        eq_(parsed, [line.split(',')[0] for line in self.lines if line.endswith('A')])
+
+    def test_parse_lines_gzip(self):
+        ''' DUMPER '''
+        path = os.path.join(self.tmp_dir, 'dump.gz')
+        with gzip.open(path, 'wb') as dump:
+            dump.write('\n'.join(self.lines))
+        eq_(list(sorting.parse_lines(path, block_size=1000)), self.lines)
+
+    def test_sort_lines_in_memory(self):
+        ''' DUMPER '''
+        path = make_temp_file(self.tmp_dir, '\n'.join(self.lines) + '\n')
+        eq_(list(sorting.sort_lines(path, cache_dir=self.tmp_dir)), sorted(self.lines))
+        eq_(os.listdir(self.tmp_dir), [os.path.basename(path)])
+
+    def test_sort_lines_external_parallel(self):
+        ''' DUMPER '''
+        path = make_temp_file(self.tmp_dir, '\n'.join(self.lines) + '\n')
+        sorted_lines = list(sorting.sort_lines(path, parser=first_field, run_size=4096, processes=3, cache_dir=self.tmp_dir))
+        eq_(sorted_lines, sorted(line.split(',')[0] for line in self.lines))
+        eq_(os.listdir(self.tmp_dir), [os.path.basename(path)])
+
+    def test_sort_lines_external_one_process(self):
+        ''' DUMPER '''
+        path = make_temp_file(self.tmp_dir, '\n'.join(self.lines))
+        eq_(list(sorting.sort_lines(path, filter_=lambda s: s.endswith('U'), run_size=4096, processes=1, cache_dir=self.tmp_dir)),
+            sorted(line for line in self.lines if line.endswith('U')))
+
+    def test_sort_lines_byte_value(self):
+        ''' DUMPER '''
+        lines = ['a', 'A', 'b', 'B', '.', '_', '1', 'a+b', 'a,b', 'a-b']
+        path = make_temp_file(self.tmp_dir, '\n'.join(lines) + '\n')
+        eq_(list(sorting.sort_lines(path, run_size=4, processes=2, cache_dir=self.tmp_dir)), sorted(lines))
+
+    def test_sort_lines_closed_early_removes_the_runs(self):
+        ''' DUMPER '''
+        path = make_temp_file(self.tmp_dir, '\n'.join(self.lines) + '\n')
+        lines = sorting.sort_lines(path, run_size=4096, processes=2, cache_dir=self.tmp_dir)
+        eq_(lines.next(), min(self.lines))
+        lines.close()
+        eq_(os.listdir(self.tmp_dir), [os.path.basename(path)])
+
+    def test_compare3_separator(self):
+        ''' DUMPER '''
+        results = list(compare3(['a\tA', 'a+b\tA'], ['a', 'a,b'], ['a+b\tU'], sep='\t'))
+        eq_(results, [
+            ('a', (True, True, False), ('A', None)),
+            ('a+b', (True, False, True), ('A', 'U')),
+            ('a,b', (False, True, False), (None, None)),
+        ])
+
+    def test_consistency_sorted_by_path(self):
+        ''' DUMPER '''
+        line = 'MOCK_SCRATCHDISK\tuser.someuser\t{0}\t19028d77\t189468\t2015-09-20 21:22:04\tuser/someuser/aa/bb/{0}\t2015-09-20 21:22:17\tA\n'
+        rucio_dump = line.format('file') + line.format('file+1') + line.format('file-1')
+        storage_dump = ''.join('/pnfs/example.com/atlas/atlasdatadisk/rucio/user/someuser/aa/bb/{0}\n'.format(name) for name in ('file-1', 'file', 'dark'))
+        eq_(parse_replica_line(line.format('file')), 'user/someuser/aa/bb/file\tA')
+
+        rrdf = make_temp_file(self.tmp_dir, rucio_dump)
+        sdf = make_temp_file(self.tmp_dir, storage_dump)
+
+        def agis_data():
+            return [{'name': 'MOCK_SCRATCHDISK', 'se': 'srm://example.com:8446/', 'endpoint': '/pnfs/example.com/atlas/atlasdatadisk/'}]
+
+        with stubbed(dumper.agis_endpoints_data, agis_data):
+            consistency = list(Consistency.dump('consistency-manual', 'MOCK_SCRATCHDISK', sdf, prev_date_fname=rrdf, next_date_fname=rrdf,
+                                                sort_rucio_replica_dumps=True, cache_dir=self.tmp_dir, sort_run_size=64, sort_processes=2))
+        eq_(sorted((entry.apparent_status, entry.path) for entry in consistency),
+            [('DARK', 'user/someuser/aa/bb/dark'), ('LOST', 'user/someuser/aa/bb/file+1')])
@@ -11,9 +11,9 @@
 import random
 import threading
 
-from nose.tools import assert_equal
+from nose.tools import assert_equal, assert_true
 
-from rucio.core.heartbeat import live, die, cardiac_arrest
+from rucio.core.heartbeat import live, die, cardiac_arrest, live_partition, get_partition_clause, PartitionRing, PARTITION_SLOTS
 
 
 class TestHeartbeat:
@@ -72,3 +72,54 @@ class TestHeartbeat:
 
     def tearDown(self):
         cardiac_arrest()
+
+
+def _slots(ranges):
+    return set(slot for first, last in ranges for slot in xrange(first, last + 1))
+
+
+class TestPartitionRing:
+
+    def test_partition_ring_coverage(self):
+        """ HEARTBEAT (CORE): The partition ring assigns every slot to exactly one member """
+        members = ['host%d/1234/%d' % (i, i) for i in xrange(5)]
+        ring = PartitionRing(members)
+        slots = [_slots(ring.ranges(member)) for member in members]
+        assert_equal(sum(len(s) for s in slots), PARTITION_SLOTS)
+        assert_equal(set.union(*slots), set(xrange(PARTITION_SLOTS)))
+        assert_true(all(s for s in slots))
+
+    def test_partition_ring_membership_change(self):
+        """ HEARTBEAT (CORE): Adding a member to the partition ring only moves its own slots """
+        members = ['host%d/1234/%d' % (i, i) for i in xrange(8)]
+        before, after = PartitionRing(members), PartitionRing(members + ['host8/1234/8'])
+        moved = [slot for slot in xrange(PARTITION_SLOTS) if before.owner(slot) != after.owner(slot)]
+        assert_true(all(after.owner(slot) == 'host8/1234/8' for slot in moved))
+        assert_true(len(moved) < 2 * PARTITION_SLOTS / 9)
+
+    def test_live_partition(self):
+        """ HEARTBEAT (CORE): The partitions of the live threads cover the keyspace """
+        cardiac_arrest()
+        pids = [random.randint(0, 2**16) for _ in xrange(3)]
+        threads = [threading.current_thread() for _ in xrange(3)]
+        for i in xrange(3):
+            live_partition('test1', 'host%d' % i, pids[i], threads[i])
+        partitions = [live_partition('test1', 'host%d' % i, pids[i], threads[i]) for i in xrange(3)]
+        assert_equal([p['assign_thread'] for p in partitions], [0, 1, 2])
+        assert_equal([p['nr_threads'] for p in partitions], [3, 3, 3])
+        assert_equal(sum(len(_slots(p['ranges'])) for p in partitions), PARTITION_SLOTS)
+        cardiac_arrest()
+
+    def test_partition_clause(self):
+        """ HEARTBEAT (CORE): The partition clause looks up the hashed key in the slot ranges """
+        partition = {'slots': 1024, 'ranges': [(0, 10), (500, 600)]}
+        clause = get_partition_clause('name', partition, 'oracle')
+        assert_equal(str(clause), "SUBSTR(:partition_map, ORA_HASH(name, 1023) + 1, 1) = '1'")
+        slot_map = clause.compile().params['partition_map']
+        assert_equal(len(slot_map), 1024)
+        assert_equal([slot for slot in xrange(1024) if slot_map[slot] == '1'], range(0, 11) + range(500, 601))
+        assert_equal(str(get_partition_clause('name', {'slots': 1024, 'ranges': [(500, 600)]}, 'oracle')), 'ORA_HASH(name, 1023) BETWEEN 500 AND 600')
+        assert_true('md5(name)' in str(get_partition_clause('name', partition, 'postgresql')))
+        assert_equal(get_partition_clause('name', partition, 'sqlite'), None)
+        assert_equal(get_partition_clause('name', {'slots': 1024, 'ranges': [(0, 1023)]}, 'oracle'), None)
+        assert_equal(str(get_partition_clause('name', {'slots': 1024, 'ranges': []}, 'mysql')), '1 = 0')
@@ -0,0 +1,57 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+import datetime
+
+from json import dumps, loads
+
+from nose.tools import eq_
+
+from rucio.common.utils import APIEncoder, DATE_FORMAT, date_to_str, RowEncoder
+from rucio.db.sqla.constants import DIDType, RuleState
+from rucio.web.rest.common import json_stream
+
+
+def rule(i, expires_at=None):
+    ''' A rule like row '''
+    return {'id': '%032x' % i, 'scope': 'mock', 'name': 'dataset_%d' % i, 'did_type': DIDType.DATASET, 'state': RuleState.OK,
+            'copies': 1, 'locked': False, 'weight': None, 'expires_at': expires_at, 'bytes': 10L ** 12 + i, 'ratio': 0.5,
+            'created_at': datetime.datetime(2017, 1, 1) + datetime.timedelta(hours=7 * i, microseconds=i),
+            'meta': {'key': 'value'}}
+
+
+class TestJsonStream(object):
+    '''
+    TestJsonStream
+    '''
+    def test_date_to_str(self):
+        ''' JSON STREAM: Dates are formatted as with strftime '''
+        date = datetime.datetime(2017, 1, 1, 23, 59, 59, 999999)
+        for hours in xrange(0, 24 * 800, 13):
+            value = date + datetime.timedelta(hours=hours)
+            eq_(date_to_str(value), value.strftime(DATE_FORMAT))
+        eq_(date_to_str(None), None)
+
+    def test_row_encoder(self):
+        ''' JSON STREAM: The rows are encoded as by APIEncoder (up to the order of the keys), whatever their shape '''
+        expires_at = datetime.datetime(2017, 6, 1, 12)
+        rows = [rule(0), rule(1, expires_at), rule(2, 'not a date'), {'created_at': RuleState.STUCK}, {}, 'name', [1, 2], None]
+        encoder = RowEncoder()
+        for row in rows:
+            eq_(loads(encoder.encode(row)), loads(dumps(row, cls=APIEncoder)))
+        # Rows are not modified
+        eq_(rows[1]['expires_at'], expires_at)
+
+    def test_json_stream(self):
+        ''' JSON STREAM: The JSON lines are gathered in chunks '''
+        rows = [rule(i) for i in xrange(1000)]
+        expected = [loads(dumps(row, cls=APIEncoder)) for row in rows]
+        chunks = list(json_stream(rows, chunk_size=4096))
+        eq_([loads(line) for line in ''.join(chunks).splitlines()], expected)
+        assert all(len(chunk) >= 4096 for chunk in chunks[:-1])
+        assert all(chunk.endswith('\n') for chunk in chunks)
+        eq_(list(json_stream([])), [])
@@ -0,0 +1,343 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+import random
+
+from contextlib import contextmanager
+from json import dumps
+
+from nose.tools import eq_
+from paste.fixture import TestApp
+
+from rucio.common import replicas_selector
+from rucio.rse.downloader import parse_metalink
+from rucio.web.rest import redirect, replica
+from rucio.web.rest.authentication import APP as auth_app
+from rucio.web.rest.common import metalink_stream
+
+LOCATIONS = {'gold-a.example.org': (46.2, 6.1), 'gold-b.example.org': (51.5, -0.1), 'gold-c.example.org': (40.7, -74.0),
+             'gold-d.example.org': (None, None), '192.0.2.10': (47.4, 8.5)}
+
+
+def pfn(host, port, name):
+    ''' A PFN of a file on a host '''
+    return 'root://%s:%d//atlas/rucio/mock/%s' % (host, port, name)
+
+
+FILES = [
+    {'scope': 'mock', 'name': 'file_a', 'bytes': 1234L, 'md5': None, 'adler32': '0cc737eb',
+     'rses': {'GOLD_A': [pfn('gold-a.example.org', 1094, 'file_a')], 'GOLD_B': [pfn('gold-b.example.org', 1094, 'file_a'), pfn('gold-b.example.org', 1095, 'file_a')],
+              'GOLD_C': [pfn('gold-c.example.org', 1094, 'file_a')]}},
+    {'scope': 'mock', 'name': u'file_b', 'bytes': 10L ** 12, 'md5': 'b026324c6904b2a9cb4b88d6d61c81d1', 'adler32': '01230004',
+     'rses': {'GOLD_C': [pfn('gold-c.example.org', 1094, 'file_b')], 'GOLD_D': [pfn('gold-d.example.org', 1094, 'file_b')],
+              'GOLD_A': [pfn('gold-a.example.org', 1094, 'file_b')]}},
+    {'scope': 'mock', 'name': 'file_c', 'bytes': 0L, 'md5': None, 'adler32': None, 'rses': {}},
+    {'scope': 'mock', 'name': 'file_d', 'bytes': 42L, 'md5': None, 'adler32': 'ffffffff',
+     'rses': {'GOLD_D': [pfn('gold-d.example.org', 1094, 'file_d')], 'GOLD_B': [pfn('gold-b.example.org', 1094, 'file_d')]}},
+]
+
+# The metalinks of FILES written by the REST handlers before metalink_stream,
+# with the random order seeded with 7 and the client at 192.0.2.10
+
+GET_METALINK3 = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink version="3.0" xmlns="http://www.metalinker.org/">
+<files>
+ <file name="file_a">
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_a"></glfn>
+  <resources>
+   <url type="http" preference="0">root://gold-b.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url type="http" preference="1">root://gold-b.example.org:1095//atlas/rucio/mock/file_a</url>
+   <url type="http" preference="2">root://gold-c.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url type="http" preference="3">root://gold-a.example.org:1094//atlas/rucio/mock/file_a</url>
+  </resources>
+ </file>
+ <file name="file_b">
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_b"></glfn>
+  <resources>
+   <url type="http" preference="0">root://gold-c.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url type="http" preference="1">root://gold-d.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url type="http" preference="2">root://gold-a.example.org:1094//atlas/rucio/mock/file_b</url>
+  </resources>
+ </file>
+ <file name="file_c">
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_c"></glfn>
+  <resources>
+  </resources>
+ </file>
+ <file name="file_d">
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_d"></glfn>
+  <resources>
+   <url type="http" preference="0">root://gold-d.example.org:1094//atlas/rucio/mock/file_d</url>
+   <url type="http" preference="1">root://gold-b.example.org:1094//atlas/rucio/mock/file_d</url>
+  </resources>
+ </file>
+</files>
+</metalink>
+'''
+
+
+GET_METALINK4 = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+ <file name="file_a">
+  <identity>mock:file_a</identity>
+  <hash type="adler32">0cc737eb</hash>
+  <size>1234</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_a"></glfn>
+   <url location="GOLD_B" priority="1">root://gold-b.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_B" priority="2">root://gold-b.example.org:1095//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_C" priority="3">root://gold-c.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_A" priority="4">root://gold-a.example.org:1094//atlas/rucio/mock/file_a</url>
+ </file>
+ <file name="file_b">
+  <identity>mock:file_b</identity>
+  <hash type="adler32">01230004</hash>
+  <hash type="md5">b026324c6904b2a9cb4b88d6d61c81d1</hash>
+  <size>1000000000000</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_b"></glfn>
+   <url location="GOLD_C" priority="1">root://gold-c.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url location="GOLD_D" priority="2">root://gold-d.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url location="GOLD_A" priority="3">root://gold-a.example.org:1094//atlas/rucio/mock/file_b</url>
+ </file>
+ <file name="file_c">
+  <identity>mock:file_c</identity>
+  <size>0</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_c"></glfn>
+ </file>
+ <file name="file_d">
+  <identity>mock:file_d</identity>
+  <hash type="adler32">ffffffff</hash>
+  <size>42</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_d"></glfn>
+   <url location="GOLD_D" priority="1">root://gold-d.example.org:1094//atlas/rucio/mock/file_d</url>
+   <url location="GOLD_B" priority="2">root://gold-b.example.org:1094//atlas/rucio/mock/file_d</url>
+ </file>
+</metalink>
+'''
+
+
+GET_METALINK4_GEOIP_LIMIT = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+ <file name="file_a">
+  <identity>mock:file_a</identity>
+  <hash type="adler32">0cc737eb</hash>
+  <size>1234</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_a"></glfn>
+   <url location="GOLD_A" priority="1">root://gold-a.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_B" priority="2">root://gold-b.example.org:1094//atlas/rucio/mock/file_a</url>
+ </file>
+ <file name="file_b">
+  <identity>mock:file_b</identity>
+  <hash type="adler32">01230004</hash>
+  <hash type="md5">b026324c6904b2a9cb4b88d6d61c81d1</hash>
+  <size>1000000000000</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_b"></glfn>
+   <url location="GOLD_A" priority="1">root://gold-a.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url location="GOLD_C" priority="2">root://gold-c.example.org:1094//atlas/rucio/mock/file_b</url>
+ </file>
+ <file name="file_c">
+  <identity>mock:file_c</identity>
+  <size>0</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_c"></glfn>
+ </file>
+ <file name="file_d">
+  <identity>mock:file_d</identity>
+  <hash type="adler32">ffffffff</hash>
+  <size>42</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_d"></glfn>
+   <url location="GOLD_B" priority="1">root://gold-b.example.org:1094//atlas/rucio/mock/file_d</url>
+   <url location="GOLD_D" priority="2">root://gold-d.example.org:1094//atlas/rucio/mock/file_d</url>
+ </file>
+</metalink>
+'''
+
+
+POST_METALINK3 = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink version="3.0" xmlns="http://www.metalinker.org/">
+<files>
+ <file name="file_a">
+  <resources>
+   <url type="http" preference="0">root://gold-b.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url type="http" preference="1">root://gold-b.example.org:1095//atlas/rucio/mock/file_a</url>
+   <url type="http" preference="2">root://gold-c.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url type="http" preference="3">root://gold-a.example.org:1094//atlas/rucio/mock/file_a</url>
+  </resources>
+ </file>
+ <file name="file_b">
+  <resources>
+   <url type="http" preference="0">root://gold-c.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url type="http" preference="1">root://gold-d.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url type="http" preference="2">root://gold-a.example.org:1094//atlas/rucio/mock/file_b</url>
+  </resources>
+ </file>
+ <file name="file_c">
+  <resources>
+  </resources>
+ </file>
+ <file name="file_d">
+  <resources>
+   <url type="http" preference="0">root://gold-d.example.org:1094//atlas/rucio/mock/file_d</url>
+   <url type="http" preference="1">root://gold-b.example.org:1094//atlas/rucio/mock/file_d</url>
+  </resources>
+ </file>
+</files>
+</metalink>
+'''
+
+
+POST_METALINK4_GEOIP = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+ <file name="file_a">
+  <identity>mock:file_a</identity>
+  <hash type="adler32">0cc737eb</hash>
+  <size>1234</size>
+   <url location="GOLD_A" priority="1">root://gold-a.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_B" priority="2">root://gold-b.example.org:1094//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_B" priority="3">root://gold-b.example.org:1095//atlas/rucio/mock/file_a</url>
+   <url location="GOLD_C" priority="4">root://gold-c.example.org:1094//atlas/rucio/mock/file_a</url>
+ </file>
+ <file name="file_b">
+  <identity>mock:file_b</identity>
+  <hash type="adler32">01230004</hash>
+  <hash type="md5">b026324c6904b2a9cb4b88d6d61c81d1</hash>
+  <size>1000000000000</size>
+   <url location="GOLD_A" priority="1">root://gold-a.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url location="GOLD_C" priority="2">root://gold-c.example.org:1094//atlas/rucio/mock/file_b</url>
+   <url location="GOLD_D" priority="3">root://gold-d.example.org:1094//atlas/rucio/mock/file_b</url>
+ </file>
+ <file name="file_c">
+  <identity>mock:file_c</identity>
+  <size>0</size>
+ </file>
+ <file name="file_d">
+  <identity>mock:file_d</identity>
+  <hash type="adler32">ffffffff</hash>
+  <size>42</size>
+   <url location="GOLD_B" priority="1">root://gold-b.example.org:1094//atlas/rucio/mock/file_d</url>
+   <url location="GOLD_D" priority="2">root://gold-d.example.org:1094//atlas/rucio/mock/file_d</url>
+ </file>
+</metalink>
+'''
+
+
+REDIRECT_METALINK_GEOIP = '''<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+ <file name="file_a">
+  <identity>mock:file_a</identity>
+  <hash type="adler32">0cc737eb</hash>
+  <size>1234</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_a"></glfn>
+  <url location="GOLD_A" priority="1">root://gold-a.example.org:1094//atlas/rucio/mock/file_a</url>
+  <url location="GOLD_B" priority="2">root://gold-b.example.org:1094//atlas/rucio/mock/file_a</url>
+  <url location="GOLD_B" priority="3">root://gold-b.example.org:1095//atlas/rucio/mock/file_a</url>
+  <url location="GOLD_C" priority="4">root://gold-c.example.org:1094//atlas/rucio/mock/file_a</url>
+ </file>
+ <file name="file_b">
+  <identity>mock:file_b</identity>
+  <hash type="adler32">01230004</hash>
+  <hash type="md5">b026324c6904b2a9cb4b88d6d61c81d1</hash>
+  <size>1000000000000</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_b"></glfn>
+  <url location="GOLD_A" priority="1">root://gold-a.example.org:1094//atlas/rucio/mock/file_b</url>
+  <url location="GOLD_C" priority="2">root://gold-c.example.org:1094//atlas/rucio/mock/file_b</url>
+  <url location="GOLD_D" priority="3">root://gold-d.example.org:1094//atlas/rucio/mock/file_b</url>
+ </file>
+ <file name="file_c">
+  <identity>mock:file_c</identity>
+  <size>0</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_c"></glfn>
+ </file>
+ <file name="file_d">
+  <identity>mock:file_d</identity>
+  <hash type="adler32">ffffffff</hash>
+  <size>42</size>
+  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/mock:file_d"></glfn>
+  <url location="GOLD_B" priority="1">root://gold-b.example.org:1094//atlas/rucio/mock/file_d</url>
+  <url location="GOLD_D" priority="2">root://gold-d.example.org:1094//atlas/rucio/mock/file_d</url>
+ </file>
+</metalink>
+'''
+
+
+@contextmanager
+def replaced_lookups():
+    ''' Lists FILES as replicas, and locates the hosts with LOCATIONS '''
+    list_replicas, get_location = replica.list_replicas, replicas_selector.get_location
+    replica.list_replicas = redirect.list_replicas = lambda *args, **kwargs: iter(FILES)
+    replicas_selector.get_location = lambda se: LOCATIONS[se]
+    try:
+        yield
+    finally:
+        replica.list_replicas = redirect.list_replicas = list_replicas
+        replicas_selector.get_location = get_location
+
+
+class TestMetalink(object):
+    '''
+    TestMetalink
+    '''
+    def setUp(self):  # pylint: disable=invalid-name
+        ''' SetUp '''
+        headers = {'X-Rucio-Account': 'root', 'X-Rucio-Username': 'ddmlab', 'X-Rucio-Password': 'secret'}
+        token = str(TestApp(auth_app.wsgifunc()).get('/userpass', headers=headers).header('X-Rucio-Auth-Token'))
+        self.headers = {'X-Rucio-Auth-Token': token, 'X-Forwarded-For': '192.0.2.10', 'Accept-Encoding': 'identity'}
+
+    def _get(self, app, url, accept=None):
+        headers = dict(self.headers, Accept=accept) if accept else self.headers
+        random.seed(7)
+        with replaced_lookups():
+            return TestApp(app.wsgifunc()).get(url, headers=headers).body
+
+    def _post(self, url, accept):
+        random.seed(7)
+        with replaced_lookups():
+            return TestApp(replica.APP.wsgifunc()).post(url, headers=dict(self.headers, Accept=accept),
+                                                        params=dumps({'dids': [{'scope': 'mock', 'name': 'file_a'}]})).body
+
+    def test_list_replicas_metalink(self):
+        ''' METALINK: The metalinks of the replicas are unchanged '''
+        eq_(self._get(replica.APP, '/mock/file_a', 'application/metalink+xml'), GET_METALINK3)
+        eq_(self._get(replica.APP, '/mock/file_a', 'application/metalink4+xml'), GET_METALINK4)
+        eq_(self._get(replica.APP, '/mock/file_a?select=geoip&limit=2', 'application/metalink+xml,application/metalink4+xml'), GET_METALINK4_GEOIP_LIMIT)
+        eq_(self._post('/list', 'application/metalink+xml'), POST_METALINK3)
+        eq_(self._post('/list?select=geoip', 'application/metalink4+xml'), POST_METALINK4_GEOIP)
+
+    def test_redirect_metalink(self):
+        ''' METALINK: The metalink of the redirector is unchanged '''
+        eq_(self._get(redirect.APP, '/mock/file_a/metalink?select=geoip'), REDIRECT_METALINK_GEOIP)
+
+    def test_geoip_sorter(self):
+        ''' METALINK: The replicas are sorted as by geoIP_order, with each host located once '''
+        located = []
+
+        def get_location(se):
+            located.append(se)
+            return LOCATIONS[se]
+
+        order = replicas_selector.geoIP_sorter('192.0.2.10')
+        with replaced_lookups():
+            replicas_selector.get_location = get_location
+            sorted_replicas = [order(dict((pfn, rse) for rse in rfile['rses'] for pfn in rfile['rses'][rse])) for rfile in FILES]
+        eq_(sorted_replicas[0], [pfn('gold-a.example.org', 1094, 'file_a'), pfn('gold-b.example.org', 1094, 'file_a'),
+                                 pfn('gold-b.example.org', 1095, 'file_a'), pfn('gold-c.example.org', 1094, 'file_a')])
+        eq_(sorted(located), sorted(LOCATIONS))
+
+    def test_metalink_chunks(self):
+        ''' METALINK: The metalink is gathered in chunks '''
+        files = FILES * 100
+        chunks = list(metalink_stream(files, 4, lambda replicas, dictreplica: replicas, chunk_size=4096))
+        assert all(len(chunk) >= 4096 for chunk in chunks[:-1])
+        body = ''.join(chunks)
+        eq_(body.count('<file '), len(files))
+        assert body.endswith('</metalink>\n')
+
+    def test_metalink_escaped_pfns(self):
+        ''' METALINK: The PFNs are escaped and parsed back by the download clients '''
+        signed = 'https://s3.example.org/mock/file_a?AWSAccessKeyId=key&Expires=1500000000&Signature=a%2Fb<c>'
+        files = [dict(FILES[0], rses={'GOLD_A': [signed]})]
+        metalink = ''.join(metalink_stream(files, 4, lambda replicas, dictreplica: replicas))
+        assert '&amp;Expires' in metalink
+        eq_(parse_metalink(metalink)[0]['sources'], [('GOLD_A', signed)])
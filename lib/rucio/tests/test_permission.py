@@ -13,12 +13,17 @@
 Test the Permission Core and API
 """
 
-from nose.tools import assert_true, assert_false
+from nose.tools import assert_true, assert_false, assert_equal, assert_raises
 
 from rucio.api.permission import has_permission
 from rucio.common.config import config_get
+from rucio.common.exception import AccountNotFound
+from rucio.core.account import add_account, add_account_attribute, del_account_attribute, set_account_status
+from rucio.core.permission import context
 from rucio.core.scope import add_scope
-from rucio.tests.common import scope_name_generator
+from rucio.db.sqla.constants import AccountStatus, AccountType
+from rucio.db.sqla.session import get_session
+from rucio.tests.common import account_name_generator, scope_name_generator
 
 
 class TestPermissionCoreApi(object):
@@ -68,3 +73,68 @@ class TestPermissionCoreApi(object):
         gsscred = 'ddmlab@CERN.CH'
         assert_true(has_permission(issuer='root', action='get_auth_token_gss', kwargs={'account': 'root', 'gsscred': gsscred}))
         assert_false(has_permission(issuer='root', action='get_auth_token_gss', kwargs={'account': self.usr, 'gsscred': gsscred}))
+
+
+class TestPermissionContext(object):
+    """
+    Test the permission context of the issuers
+    """
+
+    def setup(self):
+        """ Setup Test Case """
+        self.account = account_name_generator()
+        add_account(self.account, AccountType.USER, 'rucio@email.com')
+        self.loads = []
+        self.load_context = context.load_context
+
+        def counted_load_context(issuer):
+            self.loads.append(issuer)
+            return self.load_context(issuer)
+        context.load_context = counted_load_context
+
+    def tearDown(self):
+        """ Tear down Test Case """
+        context.load_context = self.load_context
+
+    def test_context_loaded_once(self):
+        """ PERMISSION(CORE): The permission context of an issuer is loaded once and dropped when its attributes change """
+        assert_false(has_permission(issuer=self.account, action='add_rse', kwargs={}))
+        assert_false(has_permission(issuer=self.account, action='set_account_status', kwargs={}))
+        assert_equal(self.loads, [self.account])
+        add_account_attribute(self.account, 'admin', 'true')
+        assert_true(has_permission(issuer=self.account, action='add_rse', kwargs={}))
+        del_account_attribute(self.account, 'admin')
+        assert_false(has_permission(issuer=self.account, action='add_rse', kwargs={}))
+        assert_equal(self.loads, [self.account] * 3)
+
+    def test_context_dropped_after_commit(self):
+        """ PERMISSION(CORE): The permission context of an issuer is dropped once the change of its attributes is committed """
+        assert_false(has_permission(issuer=self.account, action='add_rse', kwargs={}))
+        session = get_session()
+        add_account_attribute(self.account, 'admin', 'true', session=session)
+        assert_false(has_permission(issuer=self.account, action='add_rse', kwargs={}))
+        session.commit()
+        assert_true(has_permission(issuer=self.account, action='add_rse', kwargs={}))
+        assert_equal(self.loads, [self.account] * 2)
+
+    def test_context_of_inactive_account(self):
+        """ PERMISSION(CORE): The attributes of an account which is not active are not found """
+        add_account_attribute(self.account, 'country-xx', 'admin')
+        assert_equal(context.account_attributes(self.account), [{'key': 'country-xx', 'value': 'admin'}])
+        set_account_status(self.account, AccountStatus.SUSPENDED)
+        assert_raises(AccountNotFound, context.account_attributes, self.account)
+        set_account_status(self.account, AccountStatus.ACTIVE)
+        assert_equal(context.account_attributes(self.account), [{'key': 'country-xx', 'value': 'admin'}])
+        assert_equal(self.loads, [self.account] * 3)
+
+    def test_attach_dids_to_dids_new_scope(self):
+        """ PERMISSION(CORE): The scopes of the attachments are checked in one pass, new scopes included """
+        scopes = [scope_name_generator() for _ in xrange(3)]
+        add_scope(scope=scopes[0], account=self.account)
+        attachments = [{'scope': scope, 'name': 'dataset', 'dids': []} for scope in scopes]
+        assert_true(has_permission(issuer=self.account, action='attach_dids_to_dids', kwargs={'attachments': attachments[:1]}))
+        assert_false(has_permission(issuer=self.account, action='attach_dids_to_dids', kwargs={'attachments': attachments}))
+        for scope in scopes[1:]:
+            add_scope(scope=scope, account=self.account)
+        assert_true(has_permission(issuer=self.account, action='attach_dids_to_dids', kwargs={'attachments': attachments}))
+        assert_equal(self.loads, [self.account])
@@ -0,0 +1,126 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import threading
+import time
+
+from nose.tools import assert_equal, assert_false, assert_raises, assert_true
+
+from rucio.common.exception import ResourceTemporaryUnavailable, ServiceUnavailable
+from rucio.rse import rsemanager as mgr
+from rucio.rse.pool import ProtocolPool
+
+
+class FakeProtocol(object):
+    """ Counts the connections and tells if they are alive. """
+
+    connections = 0
+
+    def __init__(self):
+        FakeProtocol.connections += 1
+        self.attributes = {'hostname': 'localhost'}
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+ENDPOINT = ('MOCK', 'https', 'localhost', 443, '/prefix/', 'read')
+
+
+class TestProtocolPool:
+
+    def setup(self):
+        FakeProtocol.connections = 0
+
+    def test_reuse(self):
+        """ PROTOCOL POOL (RSE): A released connection is reused for the same endpoint only """
+        pool = ProtocolPool()
+        protocol = pool.acquire(ENDPOINT, FakeProtocol)
+        pool.release(protocol)
+        assert_true(pool.acquire(ENDPOINT, FakeProtocol) is protocol)
+        other = pool.acquire(ENDPOINT[:-1] + ('delete', ), FakeProtocol)
+        assert_true(other is not protocol)
+        assert_equal(FakeProtocol.connections, 2)
+        pool.release(protocol, discard=True)
+        assert_true(protocol.closed)
+        assert_equal(pool.stats(), {ENDPOINT[:-1] + ('delete', ): (1, 0)})
+
+    def test_idle_eviction_and_health_check(self):
+        """ PROTOCOL POOL (RSE): Idle connections are closed, or checked before their reuse """
+        pool = ProtocolPool(idle_timeout=0.2, check_after=0)
+        protocol = pool.acquire(ENDPOINT, FakeProtocol)
+        pool.release(protocol)
+        protocol.alive = False
+        assert_true(pool.acquire(ENDPOINT, FakeProtocol) is not protocol)
+        assert_true(protocol.closed)
+
+        pool = ProtocolPool(idle_timeout=0.1)
+        protocol = pool.acquire(ENDPOINT, FakeProtocol)
+        pool.release(protocol)
+        time.sleep(0.2)
+        assert_true(pool.acquire(ENDPOINT, FakeProtocol) is not protocol)
+        assert_true(protocol.closed)
+
+    def test_max_per_endpoint(self):
+        """ PROTOCOL POOL (RSE): The connections per endpoint are limited """
+        pool = ProtocolPool(max_per_endpoint=2, wait_timeout=0.1)
+        first = pool.acquire(ENDPOINT, FakeProtocol)
+        pool.acquire(ENDPOINT, FakeProtocol)
+        assert_raises(ResourceTemporaryUnavailable, pool.acquire, ENDPOINT, FakeProtocol)
+
+        pool.wait_timeout = 5
+        threading.Timer(0.1, pool.release, [first]).start()
+        assert_true(pool.acquire(ENDPOINT, FakeProtocol) is first)
+        assert_equal(FakeProtocol.connections, 2)
+
+    def test_failed_connection(self):
+        """ PROTOCOL POOL (RSE): A failed connection does not count """
+        def factory():
+            raise ServiceUnavailable('down')
+        pool = ProtocolPool(max_per_endpoint=1, wait_timeout=0.1)
+        assert_raises(ServiceUnavailable, pool.acquire, ENDPOINT, factory)
+        pool.release(pool.acquire(ENDPOINT, FakeProtocol))
+
+    def test_pooled_protocol(self):
+        """ PROTOCOL POOL (RSE): The rsemanager functions reuse the connections """
+        domains = {'read': 1, 'write': 1, 'delete': 1}
+        rse_settings = {'rse': 'MOCK_POSIX_POOL', 'deterministic': True, 'domain': ['wan'],
+                        'read_protocol': 1, 'write_protocol': 1, 'delete_protocol': 1,
+                        'protocols': [{'scheme': 'file', 'hostname': 'localhost', 'port': 0, 'prefix': '/tmp/',
+                                       'impl': 'rucio.rse.protocols.posix.Default', 'extended_attributes': None,
+                                       'domains': {'lan': domains, 'wan': domains}}]}
+        with mgr.pooled_protocol(rse_settings, 'read') as protocol:
+            pass
+        with mgr.pooled_protocol(rse_settings, 'read') as other:
+            assert_true(other is protocol)
+        try:
+            with mgr.pooled_protocol(rse_settings, 'read') as other:
+                raise ServiceUnavailable('down')
+        except ServiceUnavailable:
+            pass
+        with mgr.pooled_protocol(rse_settings, 'read') as other:
+            assert_false(other is protocol)
+        protocol = other
+
+        # The connections are not shared between credentials
+        proxy = os.environ.get('X509_USER_PROXY')
+        os.environ['X509_USER_PROXY'] = '/tmp/x509up_pool'
+        try:
+            with mgr.pooled_protocol(rse_settings, 'read') as other:
+                assert_false(other is protocol)
+        finally:
+            if proxy is None:
+                del os.environ['X509_USER_PROXY']
+            else:
+                os.environ['X509_USER_PROXY'] = proxy
+        with mgr.pooled_protocol(rse_settings, 'read') as other:
+            assert_true(other is protocol)
@@ -0,0 +1,129 @@
+'''
+  Copyright European Organization for Nuclear Research (CERN)
+
+  Licensed under the Apache License, Version 2.0 (the "License");
+  You may not use this file except in compliance with the License.
+  You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+'''
+import zlib
+
+from json import loads
+
+from nose.tools import eq_
+from paste.fixture import TestApp
+from web import application, ctx, header, notfound
+
+from rucio.common.utils import generate_uuid
+from rucio.core.did import add_did, attach_dids
+from rucio.db.sqla.constants import DIDType
+from rucio.web.rest.authentication import APP as auth_app
+from rucio.web.rest.common import coalesce, compress, compression_processor, negotiate_encoding
+from rucio.web.rest.did import APP as did_app
+
+LINES = ['{"scope": "mock", "name": "file_%06d", "bytes": %d}\n' % (i, i) for i in xrange(5000)]
+
+
+class Lines(object):
+    ''' Streams LINES, or a 404 before the first line '''
+    def GET(self, missing):
+        header('Content-Type', 'application/x-json-stream')
+        if missing:
+            raise notfound('Not there')
+        for line in LINES:
+            yield line
+
+
+class Single(object):
+    ''' Answers a plain string '''
+    def GET(self):
+        header('Content-Type', 'text/plain')
+        return 'single'
+
+
+def compressed_app():
+    ''' The application of the tests, with the compression processor '''
+    app = application(('/lines(/missing)?', 'Lines', '/single', 'Single'), {'Lines': Lines, 'Single': Single})
+    app.add_processor(compression_processor)
+    return TestApp(app.wsgifunc())
+
+
+def decompress(body, coding):
+    ''' Decompresses a response body '''
+    return zlib.decompress(body, {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}[coding])
+
+
+class TestRestCompression(object):
+    '''
+    TestRestCompression
+    '''
+    def test_negotiate_encoding(self):
+        ''' REST COMPRESSION: The content coding is chosen from the Accept-Encoding header '''
+        eq_(negotiate_encoding(None), None)
+        eq_(negotiate_encoding(''), None)
+        eq_(negotiate_encoding('identity'), None)
+        eq_(negotiate_encoding('gzip, deflate'), 'gzip')
+        eq_(negotiate_encoding('deflate, gzip'), 'gzip')
+        eq_(negotiate_encoding('DEFLATE'), 'deflate')
+        eq_(negotiate_encoding('gzip;q=0.5, deflate'), 'deflate')
+        eq_(negotiate_encoding('gzip;q=0, deflate;q=0'), None)
+        eq_(negotiate_encoding('*'), 'gzip')
+        eq_(negotiate_encoding('gzip;q=0, *;q=0.1'), 'deflate')
+        eq_(negotiate_encoding('br, gzip;q=bad'), None)
+
+    def test_coalesce(self):
+        ''' REST COMPRESSION: The chunks are gathered in chunks of at least chunk_size bytes '''
+        chunks = list(coalesce(LINES, chunk_size=4096))
+        eq_(''.join(chunks), ''.join(LINES))
+        assert all(len(chunk) >= 4096 for chunk in chunks[:-1])
+        eq_(list(coalesce([u'\xe9'])), ['\xc3\xa9'])
+        eq_(list(coalesce([])), [])
+
+    def test_compress(self):
+        ''' REST COMPRESSION: The compressed chunks decompress to the response '''
+        app = compressed_app()
+        for coding in ('gzip', 'deflate'):
+            response = app.get('/lines', headers={'Accept-Encoding': coding})
+            eq_(response.header('Content-Encoding'), coding)
+            eq_(response.header('Vary'), 'Accept-Encoding')
+            eq_(decompress(response.body, coding), ''.join(LINES))
+            assert len(response.body) < len(''.join(LINES)) / 5
+        # Compressed chunks of at least chunk_size bytes, outside of the application as well
+        ctx.headers = []
+        chunks = list(compress(iter(LINES), 'gzip', chunk_size=1024, level=1))
+        assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+        eq_(decompress(''.join(chunks), 'gzip'), ''.join(LINES))
+        eq_(ctx.headers, [('Content-Encoding', 'gzip'), ('Vary', 'Accept-Encoding')])
+        eq_(list(compress(iter([]), 'gzip')), [])
+
+    def test_not_compressed(self):
+        ''' REST COMPRESSION: The responses are sent as is when no coding is accepted, and the errors and plain responses are untouched '''
+        app = compressed_app()
+        response = app.get('/lines', headers={'Accept-Encoding': 'identity'})
+        eq_(response.header('Content-Encoding', None), None)
+        eq_(response.body, ''.join(LINES))
+        response = app.get('/lines/missing', headers={'Accept-Encoding': 'gzip'}, expect_errors=True)
+        eq_(response.status, 404)
+        eq_(response.header('Content-Encoding', None), None)
+        eq_(response.body, 'Not there')
+        response = app.get('/single', headers={'Accept-Encoding': 'gzip'})
+        eq_(response.header('Content-Encoding', None), None)
+        eq_(response.body, 'single')
+
+    def test_did_listing(self):
+        ''' REST COMPRESSION: A DID listing is the same compressed or not '''
+        name = 'compressed_%s' % generate_uuid()
+        files = [{'scope': 'mock', 'name': '%s_%04d' % (name, i), 'bytes': 1L, 'adler32': '0cc737eb'} for i in xrange(200)]
+        add_did(scope='mock', name=name, type=DIDType.DATASET, account='root')
+        attach_dids(scope='mock', name=name, dids=files, account='root', rse='MOCK')
+        headers = {'X-Rucio-Account': 'root', 'X-Rucio-Username': 'ddmlab', 'X-Rucio-Password': 'secret'}
+        response = TestApp(auth_app.wsgifunc()).get('/userpass', headers=headers, expect_errors=True)
+        eq_(response.status, 200)
+        headers = {'X-Rucio-Auth-Token': str(response.header('X-Rucio-Auth-Token'))}
+
+        app = TestApp(did_app.wsgifunc())
+        plain = app.get('/mock/', headers=dict(headers, **{'Accept-Encoding': 'identity'}), params={'name': name})
+        eq_([loads(line)['name'] for line in plain.body.splitlines()], [f['name'] for f in files])
+        compressed = app.get('/mock/', headers=dict(headers, **{'Accept-Encoding': 'gzip'}), params={'name': name})
+        eq_(compressed.header('Content-Encoding'), 'gzip')
+        eq_(decompress(compressed.body, 'gzip'), plain.body)
+        assert len(compressed.body) < len(plain.body) / 5
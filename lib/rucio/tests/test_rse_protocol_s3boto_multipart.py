@@ -0,0 +1,254 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import urlparse
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from nose.tools import assert_equal, assert_false, assert_raises, assert_true
+
+from rucio.common import objectstore
+from rucio.common.exception import SourceNotFound
+from rucio.common.utils import adler32, StreamingChecksum
+from rucio.rse import rsemanager as mgr
+
+
+class S3RequestHandler(BaseHTTPRequestHandler):
+    """ Implements the part of the S3 REST API used by boto for path-style buckets and keys, in memory. """
+
+    protocol_version = 'HTTP/1.1'
+    objects = {}
+    uploads = {}
+    requests = []
+    lock = threading.Lock()
+
+    def _parse(self):
+        parsed = urlparse.urlparse(self.path)
+        bucket, _, key = parsed.path[1:].partition('/')
+        query = urlparse.parse_qs(parsed.query, keep_blank_values=True)
+        with S3RequestHandler.lock:
+            S3RequestHandler.requests.append((self.command, key, sorted(query.keys()), self.headers.get('Range')))
+        return bucket, key, query
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _reply(self, status, body='', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        bucket, key, _ = self._parse()
+        if not key:
+            return self._reply(200)
+        if (bucket, key) not in S3RequestHandler.objects:
+            return self._reply(404)
+        data = S3RequestHandler.objects[(bucket, key)]
+        self._reply(200, data, {'ETag': '"%s"' % hashlib.md5(data).hexdigest(), 'Last-Modified': 'Mon, 02 Jan 2017 00:00:00 GMT'})
+
+    def do_GET(self):
+        bucket, key, _ = self._parse()
+        if (bucket, key) not in S3RequestHandler.objects:
+            return self._reply(404)
+        data = S3RequestHandler.objects[(bucket, key)]
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            return self._reply(206, data[start:end + 1], {'Content-Range': 'bytes %i-%i/%i' % (start, end, len(data))})
+        self._reply(200, data, {'ETag': '"%s"' % hashlib.md5(data).hexdigest()})
+
+    def do_PUT(self):
+        bucket, key, query = self._parse()
+        data = self._body()
+        if 'uploadId' in query:
+            S3RequestHandler.uploads[query['uploadId'][0]][int(query['partNumber'][0])] = data
+        elif key:
+            S3RequestHandler.objects[(bucket, key)] = data
+        self._reply(200, '', {'ETag': '"%s"' % hashlib.md5(data).hexdigest()})
+
+    def do_POST(self):
+        bucket, key, query = self._parse()
+        body = self._body()
+        if 'uploads' in query:
+            upload_id = 'upload%i' % len(S3RequestHandler.uploads)
+            S3RequestHandler.uploads[upload_id] = {}
+            return self._reply(200, '<InitiateMultipartUploadResult><Bucket>%s</Bucket><Key>%s</Key><UploadId>%s</UploadId></InitiateMultipartUploadResult>' % (bucket, key, upload_id))
+        if 'uploadId' in query:
+            parts = S3RequestHandler.uploads.pop(query['uploadId'][0])
+            S3RequestHandler.objects[(bucket, key)] = ''.join(parts[number] for number in sorted(parts))
+            return self._reply(200, '<CompleteMultipartUploadResult><Bucket>%s</Bucket><Key>%s</Key><ETag>"x-%i"</ETag></CompleteMultipartUploadResult>' % (bucket, key, len(parts)))
+        if 'delete' in query:
+            for name in re.findall(r'<Key>(.*?)</Key>', body):
+                S3RequestHandler.objects.pop((bucket, name), None)
+            return self._reply(200, '<DeleteResult></DeleteResult>')
+        self._reply(400)
+
+    def do_DELETE(self):
+        bucket, key, query = self._parse()
+        if 'uploadId' in query:
+            S3RequestHandler.uploads.pop(query['uploadId'][0], None)
+        else:
+            S3RequestHandler.objects.pop((bucket, key), None)
+        self._reply(204)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # The connections kept alive by boto are dropped when the server shuts down
+
+
+class TestS3BotoMultipart:
+
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.server = ThreadingHTTPServer(('localhost', 0), S3RequestHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        S3RequestHandler.objects, S3RequestHandler.uploads, S3RequestHandler.requests = {}, {}, []
+        self.environ = dict(os.environ)
+        os.environ.update({'S3_ACCESS_KEY': 'access', 'S3_SECRET_KEY': 'secret', 'S3_IS_SECURE': 'false'})
+        domains = {'read': 1, 'write': 1, 'delete': 1}
+        extended_attributes = {'multipart_threshold': 6 * 1024 * 1024, 'multipart_chunksize': 5 * 1024 * 1024, 'multipart_threads': 3}
+        rse_settings = {'rse': 'MOCK_S3', 'deterministic': True, 'domain': ['wan'],
+                        'read_protocol': 1, 'write_protocol': 1, 'delete_protocol': 1,
+                        'protocols': [{'scheme': 'http', 'hostname': 'localhost', 'port': self.server.server_address[1], 'prefix': '/',
+                                       'impl': 'rucio.rse.protocols.s3boto.Default', 'extended_attributes': extended_attributes,
+                                       'domains': {'lan': domains, 'wan': domains}}]}
+        self.protocol = mgr.create_protocol(rse_settings, 'write')
+        self.protocol.connect()
+        self.url = 'http://localhost:%i/bucket/' % self.server.server_address[1]
+
+    def teardown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def _file(self, name, size):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        return path
+
+    def _requests(self, command, query):
+        return [request for request in S3RequestHandler.requests if request[0] == command and query in request[2]]
+
+    def test_transfer_settings(self):
+        """ S3BOTO (RSE/PROTOCOLS): Per-RSE multipart settings """
+        assert_equal(self.protocol.transfer_settings, {'threshold': 6 * 1024 * 1024, 'chunksize': 5 * 1024 * 1024, 'threads': 3})
+        assert_equal(objectstore.get_transfer_settings({'extended_attributes': {'multipart_chunksize': 1}})['chunksize'], objectstore.MULTIPART_MIN_CHUNKSIZE)
+
+    def test_small_file(self):
+        """ S3BOTO (RSE/PROTOCOLS): Single request transfers below the threshold """
+        path = self._file('small', 1024 * 1024)
+        checksum = StreamingChecksum(md5=False)
+        self.protocol.put('small', self.url + 'small', self.tmpdir, checksum=checksum)
+        assert_equal((checksum.adler32, checksum.bytes), (adler32(path), 1024 * 1024))
+        assert_equal(self._requests('POST', 'uploads'), [])
+
+        checksum = StreamingChecksum(md5=False)
+        self.protocol.get(self.url + 'small', os.path.join(self.tmpdir, 'small.copy'), checksum=checksum)
+        assert_equal(checksum.adler32, adler32(path))
+        assert_equal(adler32(os.path.join(self.tmpdir, 'small.copy')), adler32(path))
+
+    def test_multipart(self):
+        """ S3BOTO (RSE/PROTOCOLS): Multipart upload and ranged download above the threshold """
+        size = 12 * 1024 * 1024 + 123
+        path = self._file('large', size)
+        checksum = StreamingChecksum(md5=False)
+        self.protocol.put('large', self.url + 'large', self.tmpdir, checksum=checksum)
+        assert_equal((checksum.adler32, checksum.bytes), (adler32(path), size))
+        assert_equal(len(self._requests('PUT', 'partNumber')), 3)
+        assert_equal(S3RequestHandler.objects[('bucket', 'large')], open(path, 'rb').read())
+
+        checksum = StreamingChecksum(md5=False)
+        self.protocol.get(self.url + 'large', os.path.join(self.tmpdir, 'large.copy'), checksum=checksum)
+        assert_equal((checksum.adler32, checksum.bytes), (adler32(path), size))
+        assert_equal(adler32(os.path.join(self.tmpdir, 'large.copy')), adler32(path))
+        assert_equal(sorted(request[3] for request in S3RequestHandler.requests if request[0] == 'GET'),
+                     ['bytes=0-5242879', 'bytes=10485760-12583034', 'bytes=5242880-10485759'])
+
+    def test_multipart_failure(self):
+        """ S3BOTO (RSE/PROTOCOLS): A failed multipart upload is aborted """
+        self._file('large', 12 * 1024 * 1024)
+        original = S3RequestHandler.do_PUT
+
+        def do_PUT(handler):
+            if 'partNumber=2' not in handler.path:
+                return original(handler)
+            handler._parse(), handler._body()
+            handler._reply(403)
+
+        S3RequestHandler.do_PUT = do_PUT
+        try:
+            try:
+                self.protocol.put('large', self.url + 'large', self.tmpdir)
+                assert_true(False)
+            except Exception:
+                pass
+        finally:
+            S3RequestHandler.do_PUT = original
+        assert_equal(len(self._requests('DELETE', 'uploadId')), 1)
+        assert_equal(S3RequestHandler.uploads, {})
+        assert_false(('bucket', 'large') in S3RequestHandler.objects)
+
+    def test_multipart_read_failure(self):
+        """ S3BOTO (RSE/PROTOCOLS): A multipart upload failing while reading the file is aborted """
+        path = self._file('large', 12 * 1024 * 1024)
+
+        class FailingChecksum(StreamingChecksum):
+            def update(self, data):
+                raise IOError('Read failure')
+
+        bucket = self.protocol._Default__conn.get_bucket('bucket', validate=False)
+        assert_raises(IOError, objectstore.upload_file, bucket, 'large', path, self.protocol.transfer_settings, checksum=FailingChecksum(md5=False))
+        assert_equal(len(self._requests('POST', 'uploads')), 1)
+        assert_equal(len(self._requests('DELETE', 'uploadId')), 1)
+        assert_equal(S3RequestHandler.uploads, {})
+        assert_false(('bucket', 'large') in S3RequestHandler.objects)
+
+    def test_delete_bulk(self):
+        """ S3BOTO (RSE/PROTOCOLS): Bulk deletion with multi-object delete requests """
+        pfns = [self.url + 'file_%i' % i for i in xrange(5)]
+        for i in xrange(5):
+            S3RequestHandler.objects[('bucket', 'file_%i' % i)] = 'x'
+        assert_equal(self.protocol.delete_bulk(pfns), dict((pfn, True) for pfn in pfns))
+        assert_equal(S3RequestHandler.objects, {})
+        assert_equal(len(self._requests('POST', 'delete')), 1)
+
+        # The missing files are not reported as deleted
+        S3RequestHandler.objects[('bucket', 'file_0')] = 'x'
+        result = self.protocol.delete_bulk(pfns[:2])
+        assert_equal(result[pfns[0]], True)
+        assert_true(isinstance(result[pfns[1]], SourceNotFound))
+        assert_equal(S3RequestHandler.objects, {})
+        assert_equal(len(self._requests('POST', 'delete')), 2)
+
+        for i in xrange(5):
+            S3RequestHandler.objects[('bucket', 'file_%i' % i)] = 'x'
+        bucket = self.protocol._Default__conn.get_bucket('bucket', validate=False)
+        result = objectstore.delete_keys(bucket, ['file_%i' % i for i in xrange(5)], batch_size=2)
+        assert_equal(set(r['status'] for r in result.values()), set([0]))
+        assert_equal(len(self._requests('POST', 'delete')), 5)
@@ -0,0 +1,98 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import time
+
+from nose.tools import assert_equal, assert_false, assert_true
+
+from rucio.common.exception import SourceNotFound
+from rucio.rse import rsemanager as mgr
+from rucio.rse import sessions
+from rucio.rse.protocols import signeds3
+
+
+class FakeObjectStoreClient(object):
+    """ Stands in for the object store REST API, counting the requests. """
+
+    def __init__(self, expires):
+        self.expires = expires
+        self.requests = []
+
+    def get_signed_urls(self, urls, rse, operation='read'):
+        self.requests.append(('sign', sorted(urls)))
+        return dict((url, '%s?Signature=x&Expires=%i' % (url.replace('s3://', 'https://'), self.expires)) for url in urls)
+
+    def get_metadata(self, urls, rse):
+        self.requests.append(('metadata', sorted(urls)))
+        if any('missing' in url for url in urls):
+            raise SourceNotFound('missing')
+        return dict((url, {'filesize': 1}) for url in urls)
+
+
+class TestSignedS3Cache:
+
+    def setup(self):
+        signeds3.SIGNED_URLS = signeds3.SignedURLCache()
+        domains = {'read': 1, 'write': 1, 'delete': 1}
+        rse_settings = {'rse': 'MOCK_SIGNEDS3', 'deterministic': True, 'domain': ['wan'], 'read_protocol': 1,
+                        'protocols': [{'scheme': 's3', 'hostname': 'objectstore', 'port': 443, 'prefix': '/bucket/',
+                                       'impl': 'rucio.rse.protocols.signeds3.Default', 'extended_attributes': None,
+                                       'domains': {'lan': domains, 'wan': domains}}]}
+        self.protocol = mgr.create_protocol(rse_settings, 'read')
+        self.rse_settings = rse_settings
+        self.pfns = ['s3://objectstore:443/bucket/file_%i' % i for i in xrange(5)]
+
+    def teardown(self):
+        sessions.close_sessions()
+
+    def test_signed_urls_batched_and_cached(self):
+        """ SIGNEDS3 (RSE/PROTOCOLS): The signed URLs are asked in one request and cached """
+        self.protocol._client = FakeObjectStoreClient(time.time() + 3600)
+        self.protocol.prepare(self.pfns, 'read')
+        for pfn in self.pfns:
+            assert_true(self.protocol._get_signed_url(pfn, 'read').startswith(pfn.replace('s3://', 'https://')))
+        self.protocol._get_signed_url(self.pfns[0], 'write')
+        assert_equal(self.protocol._client.requests, [('sign', sorted(self.pfns)), ('sign', [self.pfns[0]])])
+
+    def test_signed_urls_expire(self):
+        """ SIGNEDS3 (RSE/PROTOCOLS): The signed URLs about to expire are asked again """
+        self.protocol._client = FakeObjectStoreClient(time.time() + signeds3.SIGNED_URL_MARGIN - 1)
+        self.protocol._get_signed_url(self.pfns[0])
+        self.protocol._get_signed_url(self.pfns[0])
+        assert_equal(len(self.protocol._client.requests), 2)
+        assert_equal(signeds3.signed_url_expiration('https://h/k?X-Amz-Date=20170101T000000Z&X-Amz-Expires=60'), 1483228860)
+
+    def test_exists_bulk(self):
+        """ SIGNEDS3 (RSE/PROTOCOLS): Bulk exists with one metadata request """
+        self.protocol._client = FakeObjectStoreClient(time.time() + 3600)
+        assert_equal(self.protocol.exists_bulk(self.pfns), dict((pfn, True) for pfn in self.pfns))
+        assert_equal(len(self.protocol._client.requests), 1)
+        missing = 's3://objectstore:443/bucket/missing'
+        assert_equal(self.protocol.exists_bulk(self.pfns[:1] + [missing]), {self.pfns[0]: True, missing: False})
+
+    def test_session_released_on_close(self):
+        """ SIGNEDS3 (RSE/PROTOCOLS): The shared session is taken by connect and released once by close """
+        other = mgr.create_protocol(self.rse_settings, 'read')
+        self.protocol.connect()
+        other.connect()
+        session = self.protocol.session
+        assert_true(other.session is session)
+        self.protocol.close()
+        self.protocol.close()
+        assert_true(self.protocol.session is None)
+        timeout, sessions.IDLE_TIMEOUT = sessions.IDLE_TIMEOUT, -1
+        try:
+            # Still used by the other protocol
+            self.protocol.connect()
+            assert_true(self.protocol.session is session)
+            self.protocol.close()
+            other.close()
+            # Closed once released by all its protocols
+            self.protocol.connect()
+            assert_false(self.protocol.session is session)
+            self.protocol.close()
+        finally:
+            sessions.IDLE_TIMEOUT = timeout
@@ -0,0 +1,129 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import shutil
+import tempfile
+import threading
+
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from nose.tools import assert_equal, assert_true
+
+from rucio.common.exception import SourceNotFound
+from rucio.rse import rsemanager as mgr
+from rucio.rse.sessions import close_sessions
+
+PROPFIND_RESPONSE = '''<?xml version="1.0" encoding="utf-8"?>
+<d:multistatus xmlns:d="DAV:">
+ <d:response>
+  <d:href>%s</d:href>
+  <d:propstat><d:prop><d:getcontentlength>%i</d:getcontentlength></d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat>
+ </d:response>
+</d:multistatus>
+'''
+
+
+class WebDAVRequestHandler(SimpleHTTPRequestHandler):
+    """ Serves the files of the current directory with keep-alive, HEAD and PROPFIND requests. """
+
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+
+    def handle_one_request(self):
+        WebDAVRequestHandler.clients.add(self.client_address)
+        return SimpleHTTPRequestHandler.handle_one_request(self)
+
+    def do_HEAD(self):
+        if not os.path.exists(self.translate_path(self.path)):
+            return self._reply(404, '')
+        return SimpleHTTPRequestHandler.do_HEAD(self)
+
+    def do_PROPFIND(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return self._reply(404, '')
+        return self._reply(207, PROPFIND_RESPONSE % (self.path, os.path.getsize(path)))
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestWebDAVBulk:
+
+    def setup(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.source_dir)
+        self.server = ThreadingHTTPServer(('localhost', 0), WebDAVRequestHandler)
+        threading.Thread(target=self.server.serve_forever).start()
+        WebDAVRequestHandler.clients = set()
+        for i in xrange(20):
+            with open('file_%02i' % i, 'wb') as f:
+                f.write('x' * i)
+        domains = {'read': 1, 'write': 1, 'delete': 1}
+        self.rse_settings = {'rse': 'MOCK_WEBDAV', 'deterministic': True, 'domain': ['wan'], 'read_protocol': 1,
+                             'protocols': [{'scheme': 'http', 'hostname': 'localhost', 'port': self.server.server_address[1], 'prefix': '/',
+                                            'impl': 'rucio.rse.protocols.webdav.Default', 'extended_attributes': None,
+                                            'domains': {'lan': domains, 'wan': domains}}]}
+
+    def teardown(self):
+        close_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.source_dir)
+
+    def _protocol(self):
+        protocol = mgr.create_protocol(self.rse_settings, 'read')
+        protocol.connect(credentials={'cert': None})
+        return protocol
+
+    def test_exists_bulk(self):
+        """ WEBDAV (RSE/PROTOCOLS): Bulk exists with concurrent HEAD requests """
+        names = ['file_%02i' % i for i in xrange(20)] + ['missing']
+        result = self._protocol().exists_bulk(names)
+        assert_equal(result, dict((name, name != 'missing') for name in names))
+
+    def test_stat_bulk(self):
+        """ WEBDAV (RSE/PROTOCOLS): Bulk stat with concurrent PROPFIND requests """
+        result = self._protocol().stat_bulk(['file_03', 'file_12', 'missing'])
+        assert_equal(result['file_03'], {'filesize': 3})
+        assert_equal(result['file_12'], {'filesize': 12})
+        assert_true(isinstance(result['missing'], SourceNotFound))
+
+    def test_shared_session(self):
+        """ WEBDAV (RSE/PROTOCOLS): The protocols of an endpoint share their connections """
+        for _ in xrange(5):
+            protocol = self._protocol()
+            for i in xrange(4):
+                assert_true(protocol.exists('file_%02i' % i))
+            protocol.close()
+        assert_equal(len(WebDAVRequestHandler.clients), 1)
+
+    def test_session_per_certificate(self):
+        """ WEBDAV (RSE/PROTOCOLS): The sessions are shared per certificate and released by close """
+        protocol = self._protocol()
+        session = protocol.session
+        other = mgr.create_protocol(self.rse_settings, 'read')
+        other.connect(credentials={'cert': ('/tmp/usercert.pem', '/tmp/userkey.pem')})
+        assert_true(other.session is not session)
+        protocol.close()
+        assert_true(protocol.session is None)
+        # The released session keeps its connections for the next protocols
+        assert_true(self._protocol().session is session)
@@ -0,0 +1,72 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_true
+
+from rucio.common import exception
+from rucio.common.utils import adler32
+from rucio.rse import rsemanager as mgr
+
+
+def _rse_settings(prefix):
+    domains = {'read': 1, 'write': 1, 'delete': 1}
+    return {'rse': 'MOCK_POSIX_UPLOAD', 'deterministic': True, 'domain': ['wan'],
+            'read_protocol': 1, 'write_protocol': 1, 'delete_protocol': 1,
+            'protocols': [{'scheme': 'file', 'hostname': 'localhost', 'port': 0, 'prefix': prefix,
+                           'impl': 'rucio.rse.protocols.posix.Default', 'extended_attributes': None,
+                           'domains': {'lan': domains, 'wan': domains}}]}
+
+
+class TestUpload:
+
+    def setup(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.rse_dir = tempfile.mkdtemp()
+        self.rse_settings = _rse_settings(self.rse_dir)
+        self.lfns = []
+        for i in xrange(20):
+            name = 'file_%02i' % i
+            with open(os.path.join(self.source_dir, name), 'wb') as f:
+                f.write(os.urandom(1000 + i))
+            self.lfns.append({'scope': 'mock', 'name': name, 'filesize': 1000 + i,
+                              'adler32': adler32(os.path.join(self.source_dir, name))})
+
+    def teardown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.rse_dir)
+
+    def test_upload_threads(self):
+        """ RSEMGR (UPLOAD): Files are uploaded by several threads, with batched existence checks """
+        for threads, bulk in ((1, 100), (4, 3)):
+            status, results = mgr.upload(self.rse_settings, self.lfns[:10], self.source_dir, threads=threads, bulk=bulk)
+            assert_true(status)
+            assert_equal(results, dict(('mock:%s' % lfn['name'], True) for lfn in self.lfns[:10]))
+            self.lfns = self.lfns[10:]
+        protocol = mgr.create_protocol(self.rse_settings, 'read')
+        for lfn in self.lfns:
+            assert_true(protocol.exists(protocol.lfns2pfns({'scope': 'mock', 'name': lfn['name']}).values()[0]))
+
+    def test_upload_failures(self):
+        """ RSEMGR (UPLOAD): Failures are reported per file in the same format """
+        mgr.upload(self.rse_settings, self.lfns[0], self.source_dir)
+        corrupted = dict(self.lfns[1], adler32='deadbeef')
+        missing = dict(self.lfns[2], name='missing')
+        status, results = mgr.upload(self.rse_settings, [self.lfns[0], corrupted, missing, self.lfns[3]], self.source_dir, threads=2, bulk=1)
+        assert_true(not status)
+        assert_true(isinstance(results['mock:file_00'], exception.FileReplicaAlreadyExists))
+        assert_true(isinstance(results['mock:file_01'], exception.RucioException))
+        assert_true(isinstance(results['mock:missing'], exception.SourceNotFound))
+        assert_equal(results['mock:file_03'], True)
+
+    def test_upload_single(self):
+        """ RSEMGR (UPLOAD): A single file returns its PFN """
+        result = mgr.upload(self.rse_settings, self.lfns[0], self.source_dir, threads=4)
+        assert_equal(result['success'], True)
+        assert_equal(result['pfn'], mgr.lfns2pfns(self.rse_settings, {'scope': 'mock', 'name': 'file_00'}).values()[0])
@@ -0,0 +1,82 @@
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+
+from json import dumps
+
+from nose.tools import assert_equal, assert_false, assert_true
+
+from rucio.daemons.transmogrifier import SubscriptionIndex, is_matching_subscription
+
+
+def _subscription(name, filter, rules=None):
+    return {'id': name, 'name': name, 'account': 'root', 'comments': None, 'filter': dumps(filter),
+            'replication_rules': dumps(rules or [{'rse_expression': 'MOCK', 'copies': 1}])}
+
+
+def _metadata(scope, name, **kwargs):
+    metadata = {'scope': scope, 'name': name, 'hidden': False, 'project': None, 'datatype': None, 'account': 'root'}
+    metadata.update(kwargs)
+    return metadata
+
+
+class TestSubscriptionIndex:
+
+    def setup(self):
+        self.subscriptions = [_subscription('by_scope', {'scope': ['data16'], 'datatype': ['AOD']}),
+                              _subscription('by_scope_regex', {'scope': ['mc1[56]_13TeV']}),
+                              _subscription('by_project', {'project': ['data16_13TeV', 'data15_13TeV'], 'pattern': '.*physics_Main.*'}),
+                              _subscription('excluded', {'account': 'root', 'excluded_pattern': '.*_tid.*', 'split_rule': True}),
+                              _subscription('invalid', {'pattern': '(unbalanced'})]
+        self.index = SubscriptionIndex(self.subscriptions)
+
+    def test_candidates(self):
+        """ SUBSCRIPTION (DAEMON): Candidates are restricted to the matching buckets """
+        did = {'scope': 'user.jdoe', 'name': 'user.jdoe.test'}
+        candidates = [compiled.subscription['name'] for compiled in self.index.candidates(did, _metadata(**did))]
+        assert_equal(candidates, ['by_scope_regex', 'excluded'])
+
+        did = {'scope': 'data16_13TeV', 'name': 'data16_13TeV.00300000.physics_Main.AOD'}
+        candidates = [compiled.subscription['name'] for compiled in self.index.candidates(did, _metadata(project='data16_13TeV', **did))]
+        assert_equal(candidates, ['by_scope', 'by_scope_regex', 'by_project', 'excluded'])
+
+    def test_match(self):
+        """ SUBSCRIPTION (DAEMON): Compiled subscriptions match like the subscription filters """
+        dids = [{'scope': 'data16_13TeV', 'name': 'data16_13TeV.00300000.physics_Main.AOD'},
+                {'scope': 'data16_13TeV', 'name': 'data16_13TeV.00300000.physics_Main.AOD_tid01'},
+                {'scope': 'mc16_13TeV', 'name': 'mc16_13TeV.123456.evgen.EVNT'},
+                {'scope': 'data15_13TeV', 'name': 'data15_13TeV.00270000.express_express.RAW'}]
+        metadatas = [_metadata(project='data16_13TeV', datatype='AOD', **dids[0]),
+                     _metadata(project='data16_13TeV', datatype='AODSLIM', **dids[1]),
+                     _metadata(project='mc16_13TeV', datatype='EVNT', **dids[2]),
+                     _metadata(project='data15_13TeV', datatype='RAW', account='tier0', **dids[3])]
+
+        for did, metadata in zip(dids, metadatas):
+            matching = [compiled.subscription['name'] for compiled in self.index.match(did, metadata)]
+            expected = [subscription['name'] for subscription in self.subscriptions if is_matching_subscription(subscription, did, metadata)]
+            assert_equal(matching, expected)
+
+        assert_equal([compiled.subscription['name'] for compiled in self.index.match(dids[0], metadatas[0])], ['by_scope', 'by_project', 'excluded'])
+        assert_equal([compiled.subscription['name'] for compiled in self.index.match(dids[3], metadatas[3])], [])
+
+    def test_hidden_and_split_rule(self):
+        """ SUBSCRIPTION (DAEMON): Hidden DIDs never match and split_rule is parsed once """
+        did = {'scope': 'data16_13TeV', 'name': 'data16_13TeV.00300000.physics_Main.AOD'}
+        assert_equal(self.index.match(did, _metadata(hidden=True, project='data16_13TeV', **did)), [])
+        split_rules = dict((compiled.subscription['name'], compiled.split_rule) for compiled in self.index.subscriptions)
+        assert_true(split_rules['excluded'])
+        assert_false(split_rules['by_scope'])
+        assert_false('invalid' in split_rules)
+
+    def test_rule_parameters(self):
+        """ SUBSCRIPTION (DAEMON): Replication rules are translated once into add_rule parameters """
+        subscription = _subscription('rules', {'scope': ['data16']}, [{'rse_expression': 'MOCK|MOCK2', 'copies': '2', 'lifetime': '3600', 'locked': 'True', 'activity': 'noactivity'}])
+        rule = SubscriptionIndex([subscription]).subscriptions[0].rules[0]
+        assert_equal(rule['copies'], 2)
+        assert_equal(rule['lifetime'], 3600)
+        assert_true(rule['locked'])
+        assert_equal(rule['activity'], 'User Subscriptions')
+        assert_equal(rule['subscription_id'], 'rules')
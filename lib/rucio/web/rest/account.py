@@ -26,8 +26,8 @@ from rucio.api.account_limit import get_account_limits, get_account_limit, get_a
 from rucio.api.rule import list_replication_rules
 from rucio.api.scope import add_scope, get_scopes
 from rucio.common.exception import AccountNotFound, Duplicate, AccessDenied, RucioException, RuleNotFound, RSENotFound, IdentityError
-from rucio.common.utils import generate_http_error, APIEncoder, render_json
-from rucio.web.rest.common import rucio_loadhook, RucioController
+from rucio.common.utils import generate_http_error, render_json
+from rucio.web.rest.common import compression_processor, json_stream, rucio_loadhook, RucioController
 
 
 LOGGER = getLogger("rucio.account")
@@ -394,8 +394,8 @@ class Account(RucioController):
         if ctx.query:
             filter = dict(parse_qsl(ctx.query[1:]))
 
-        for account in list_accounts(filter=filter):
-            yield render_json(**account) + "\n"
+        for chunk in json_stream(list_accounts(filter=filter)):
+            yield chunk
 
 
 class AccountLimits(RucioController):
@@ -488,8 +488,8 @@ class Identities(RucioController):
     def GET(self, account):
         header('Content-Type', 'application/x-json-stream')
         try:
-            for identity in list_identities(account):
-                yield render_json(**identity) + "\n"
+            for chunk in json_stream(list_identities(account)):
+                yield chunk
         except AccountNotFound, e:
             raise generate_http_error(404, 'AccountNotFound', e.args[0][0])
         except Exception, e:
@@ -565,8 +565,8 @@ class Rules(RucioController):
             filters.update(params)
 
         try:
-            for rule in list_replication_rules(filters=filters):
-                yield dumps(rule, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_replication_rules(filters=filters)):
+                yield chunk
         except RuleNotFound, e:
             raise generate_http_error(404, 'RuleNotFound', e.args[0][0])
         except Exception, e:
@@ -600,8 +600,8 @@ class Usage1(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for usage in get_account_usage(account=account, rse=None, issuer=ctx.env.get('issuer')):
-                yield dumps(usage, cls=APIEncoder) + '\n'
+            for chunk in json_stream(get_account_usage(account=account, rse=None, issuer=ctx.env.get('issuer'))):
+                yield chunk
         except AccountNotFound, e:
             raise generate_http_error(404, 'AccountNotFound', e.args[0][0])
         except AccessDenied, e:
@@ -638,8 +638,8 @@ class Usage2(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for usage in get_account_usage(account=account, rse=rse, issuer=ctx.env.get('issuer')):
-                yield dumps(usage, cls=APIEncoder) + '\n'
+            for chunk in json_stream(get_account_usage(account=account, rse=rse, issuer=ctx.env.get('issuer'))):
+                yield chunk
         except AccountNotFound, e:
             raise generate_http_error(404, 'AccountNotFound', e.args[0][0])
         except RSENotFound, e:
@@ -666,4 +666,5 @@ class Usage2(RucioController):
 
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
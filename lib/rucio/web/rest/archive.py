@@ -8,13 +8,12 @@
 # Authors:
 # - Vincent Garonne, <vincent.garonne@cern.ch>, 2017
 
-from json import dumps
 from logging import getLogger, StreamHandler, DEBUG
 from traceback import format_exc
 from web import application, loadhook, header, InternalError
 
 from rucio.api.did import list_archive_content
-from rucio.web.rest.common import rucio_loadhook, RucioController
+from rucio.web.rest.common import compression_processor, json_stream, rucio_loadhook, RucioController
 
 LOGGER, SH = getLogger("rucio.meta"), StreamHandler()
 SH.setLevel(DEBUG)
@@ -35,8 +34,8 @@ class Archive(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for file in list_archive_content(scope=scope, name=name):
-                yield dumps(file) + '\n'
+            for chunk in json_stream(list_archive_content(scope=scope, name=name)):
+                yield chunk
         except Exception, e:
             print format_exc()
             raise InternalError(e)
@@ -48,4 +47,5 @@ class Archive(RucioController):
 
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
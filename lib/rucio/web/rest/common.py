@@ -12,17 +12,44 @@
 REST utilities
 """
 
+import zlib
+
+from itertools import chain
 from json import loads
 from time import time
 from traceback import format_exc
-from web import BadRequest, ctx, data, header, InternalError
+from xml.sax.saxutils import escape
+
+from web import BadRequest, ctx, data, header, InternalError, safestr
 from web.webapi import Created, HTTPError, OK, seeother
 
 from rucio.api.authentication import validate_auth_token
 from rucio.common.exception import RucioException
-from rucio.common.utils import generate_http_error, generate_uuid
+from rucio.common.utils import generate_http_error, generate_uuid, RowEncoder
 from rucio.core.monitor import record_timer
 
+# Size of the chunks of the streamed responses
+CHUNK_SIZE = 65536
+
+# zlib compression level of the streamed responses
+COMPRESSION_LEVEL = 6
+
+# Window bits of the zlib compressor for each supported content coding
+CONTENT_CODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+# Templates of the metalink descriptions of the replicas, for each metalink version
+METALINK_HEADERS = {3: '<?xml version="1.0" encoding="UTF-8"?>\n<metalink version="3.0" xmlns="http://www.metalinker.org/">\n<files>\n',
+                    4: '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n'}
+METALINK_FOOTERS = {3: '</files>\n</metalink>\n', 4: '</metalink>\n'}
+METALINK3_FILE = ' <file name="%s">\n%s  <resources>\n%s  </resources>\n </file>\n'
+METALINK3_URL = '   <url type="http" preference="%d">%s</url>\n'
+METALINK4_FILE = ' <file name="%s">\n  <identity>%s:%s</identity>\n%s  <size>%s</size>\n%s%s </file>\n'
+METALINK4_HASH = '  <hash type="%s">%s</hash>\n'
+METALINK4_URL = '<url location="%s" priority="%d">%s</url>\n'
+# To help support the FAX transition period, the glfn is added to the metalink:
+# AGIS does not expose specific FAX redirectors per DDM Endpoint, so go through top-level redirector
+METALINK_GLFN = '  <glfn name="root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/%s:%s"></glfn>\n'
+
 
 def rucio_loadhook():
     """ Rucio load Hook to authenticate, timing, etc. """
@@ -102,6 +129,166 @@ def exception_wrAPPer(f):
     return decorated
 
 
+def json_stream(rows, chunk_size=CHUNK_SIZE):
+    """ Generator of the rows encoded as JSON lines (application/x-json-stream),
+    gathered in chunks of about `chunk_size` bytes for the WSGI server.
+
+    :param rows: iterable of the rows.
+    :param chunk_size: the minimal size of the chunks, the last one excepted.
+    """
+    encode = RowEncoder().encode
+    lines, size = [], 0
+    for row in rows:
+        line = encode(row)
+        lines.append(line)
+        lines.append('\n')
+        size += len(line) + 1
+        if size >= chunk_size:
+            yield ''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
+
+
+def metalink_stream(files, version, order, limit=None, glfn=False, url_indent='   ', chunk_size=CHUNK_SIZE):
+    """ Generator of the metalink description of the replicas of files,
+    gathered in chunks of about `chunk_size` bytes for the WSGI server.
+
+    :param files: iterable of the files, as returned by list_replicas.
+    :param version: the metalink version, 3 or 4.
+    :param order: function sorting the replicas of a file, as returned by replica_sorter.
+    :param limit: the maximal number of replicas per file, or None.
+    :param glfn: True to add the global logical file name of the files.
+    :param url_indent: the indentation of the url elements of metalink 4.
+    :param chunk_size: the minimal size of the chunks, the last one excepted.
+    """
+    url_template = url_indent + METALINK4_URL
+    parts, size = [METALINK_HEADERS[version]], 0
+    for rfile in files:
+        scope, name = rfile['scope'], rfile['name']
+        replicas = []
+        dictreplica = {}
+        for rse in rfile['rses']:
+            for replica in rfile['rses'][rse]:
+                replicas.append(replica)
+                dictreplica[replica] = rse
+        replicas = order(replicas, dictreplica)
+        if limit > 0:
+            replicas = replicas[:limit]
+        glfn_element = METALINK_GLFN % (scope, name) if glfn else ''
+
+        if version == 3:
+            urls = ''.join([METALINK3_URL % (idx, escape(replica)) for idx, replica in enumerate(replicas)])
+            part = METALINK3_FILE % (name, glfn_element, urls)
+        else:
+            hashes = ''
+            if rfile['adler32'] is not None:
+                hashes += METALINK4_HASH % ('adler32', rfile['adler32'])
+            if rfile['md5'] is not None:
+                hashes += METALINK4_HASH % ('md5', rfile['md5'])
+            urls = ''.join([url_template % (dictreplica[replica], idx, escape(replica)) for idx, replica in enumerate(replicas, 1)])
+            part = METALINK4_FILE % (name, scope, name, hashes, rfile['bytes'], glfn_element, urls)
+
+        parts.append(safestr(part))
+        size += len(parts[-1])
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts, size = [], 0
+    parts.append(METALINK_FOOTERS[version])
+    yield ''.join(parts)
+
+
+def negotiate_encoding(accept_encoding):
+    """ Chooses the content coding of a response from the Accept-Encoding header of the request.
+
+    :param accept_encoding: the value of the Accept-Encoding header, or None.
+    :returns: 'gzip', 'deflate', or None to send the response as is.
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    default = qualities.get('*', 0.0)
+    chosen, best = None, 0.0
+    # gzip is preferred at equal quality
+    for coding in ('gzip', 'deflate'):
+        quality = qualities.get(coding, default)
+        if quality > best:
+            chosen, best = coding, quality
+    return chosen
+
+
+def coalesce(chunks, chunk_size=CHUNK_SIZE):
+    """ Generator gathering the chunks of a streamed response in chunks of about `chunk_size` bytes.
+
+    :param chunks: iterable of the chunks of the response.
+    :param chunk_size: the minimal size of the chunks, the last one excepted.
+    """
+    buffered, size = [], 0
+    for chunk in chunks:
+        buffered.append(safestr(chunk))
+        size += len(buffered[-1])
+        if size >= chunk_size:
+            yield ''.join(buffered)
+            buffered, size = [], 0
+    if buffered:
+        yield ''.join(buffered)
+
+
+def compress(chunks, coding, chunk_size=CHUNK_SIZE, level=COMPRESSION_LEVEL):
+    """ Generator compressing a streamed response, in chunks of about `chunk_size` compressed bytes.
+
+    The Content-Encoding header is set once the first chunk of the response
+    is produced, so that the errors raised before are sent as usual.
+
+    :param chunks: iterable of the chunks of the response.
+    :param coding: the content coding, 'gzip' or 'deflate'.
+    :param chunk_size: the minimal size of the chunks, the last one excepted.
+    :param level: the zlib compression level.
+    """
+    chunks = iter(chunks)
+    try:
+        first = chunks.next()
+    except StopIteration:
+        return
+    header('Content-Encoding', coding)
+    header('Vary', 'Accept-Encoding')
+    compressor = zlib.compressobj(level, zlib.DEFLATED, CONTENT_CODINGS[coding])
+    buffered, size = [], 0
+    for chunk in chain([first], chunks):
+        compressed = compressor.compress(safestr(chunk))
+        if compressed:
+            buffered.append(compressed)
+            size += len(compressed)
+            if size >= chunk_size:
+                yield ''.join(buffered)
+                buffered, size = [], 0
+    buffered.append(compressor.flush())
+    yield ''.join(buffered)
+
+
+def compression_processor(handler):
+    """ Processor compressing the streamed responses (generators) with the
+    content coding accepted by the client, and gathering them in larger chunks. """
+    result = handler()
+    if not hasattr(result, 'next'):
+        return result
+    coding = negotiate_encoding(ctx.env.get('HTTP_ACCEPT_ENCODING'))
+    if coding is None:
+        return coalesce(result)
+    return compress(result, coding, level=COMPRESSION_LEVEL)
+
+
 class RucioController:
     """ Default Rucio Controller class. """
 
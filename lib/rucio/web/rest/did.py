@@ -14,14 +14,14 @@
 # - Cedric Serfon, <cedric.serfon@cern.ch>, 2014-2015
 # - Martin Baristis, <martin.barisits@cern.ch>, 2014-2015
 
-from json import dumps, loads
+from json import loads
 from traceback import format_exc
 from urlparse import parse_qs
 from web import application, ctx, data, Created, header, InternalError, OK, loadhook
 
 from rucio.api.did import (add_did, add_dids, list_content, list_content_history,
                            list_dids, list_files, scope_list, get_did, set_metadata,
-                           get_metadata, set_status, attach_dids, detach_dids,
+                           get_metadata, get_metadata_bulk, set_status, attach_dids, detach_dids,
                            attach_dids_to_dids, get_dataset_by_guid, list_parent_dids,
                            create_did_sample, list_new_dids, resurrect)
 from rucio.api.rule import list_replication_rules, list_associated_replication_rules_for_file
@@ -31,9 +31,9 @@ from rucio.common.exception import (ScopeNotFound, DataIdentifierNotFound,
                                     Duplicate, InvalidValueForKey,
                                     UnsupportedStatus, UnsupportedOperation,
                                     RSENotFound, RucioException, RuleNotFound,
-                                    InvalidMetadata)
-from rucio.common.utils import generate_http_error, render_json, APIEncoder
-from rucio.web.rest.common import rucio_loadhook, RucioController
+                                    InvalidMetadata, InvalidObject)
+from rucio.common.utils import generate_http_error, render_json
+from rucio.web.rest.common import compression_processor, json_stream, rucio_loadhook, RucioController
 
 URLS = (
     '/(.*)/$', 'Scope',
@@ -54,6 +54,7 @@ URLS = (
     '/attachments', 'Attachments',
     '/new', 'NewDIDs',
     '/resurrect', 'Resurrect',
+    '/bulkmeta', 'BulkMeta',
 )
 
 
@@ -83,8 +84,8 @@ class Scope(RucioController):
                 recursive = True
 
         try:
-            for did in scope_list(scope=scope, name=name, recursive=recursive):
-                yield render_json(**did) + '\n'
+            for chunk in json_stream(scope_list(scope=scope, name=name, recursive=recursive)):
+                yield chunk
         except DataIdentifierNotFound, error:
             raise generate_http_error(404, 'DataIdentifierNotFound', error.args[0][0])
         except Exception, error:
@@ -123,8 +124,8 @@ class Search(RucioController):
                     filters[k] = v[0]
 
         try:
-            for did in list_dids(scope=scope, filters=filters, type=type, long=long):
-                yield dumps(did) + '\n'
+            for chunk in json_stream(list_dids(scope=scope, filters=filters, type=type, long=long)):
+                yield chunk
         except UnsupportedOperation, error:
             raise generate_http_error(409, 'UnsupportedOperation', error.args[0][0])
         except KeyNotFound, error:
@@ -352,8 +353,8 @@ class Attachment(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for did in list_content(scope=scope, name=name):
-                yield render_json(**did) + '\n'
+            for chunk in json_stream(list_content(scope=scope, name=name)):
+                yield chunk
         except DataIdentifierNotFound, error:
             raise generate_http_error(404, 'DataIdentifierNotFound', error.args[0][0])
         except RucioException, error:
@@ -457,8 +458,8 @@ class AttachmentHistory(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for did in list_content_history(scope=scope, name=name):
-                yield render_json(**did) + '\n'
+            for chunk in json_stream(list_content_history(scope=scope, name=name)):
+                yield chunk
         except DataIdentifierNotFound, error:
             raise generate_http_error(404, 'DataIdentifierNotFound', error.args[0][0])
         except RucioException, error:
@@ -495,8 +496,8 @@ class Files(RucioController):
             if 'long' in params:
                 long = True
         try:
-            for file in list_files(scope=scope, name=name, long=long):
-                yield dumps(file) + "\n"
+            for chunk in json_stream(list_files(scope=scope, name=name, long=long)):
+                yield chunk
         except DataIdentifierNotFound, error:
             raise generate_http_error(404, 'DataIdentifierNotFound', error.args[0][0])
         except RucioException, error:
@@ -522,8 +523,8 @@ class Parents(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for dataset in list_parent_dids(scope=scope, name=name):
-                yield render_json(**dataset) + "\n"
+            for chunk in json_stream(list_parent_dids(scope=scope, name=name)):
+                yield chunk
         except DataIdentifierNotFound, error:
             raise generate_http_error(404, 'DataIdentifierNotFound', error.args[0][0])
         except RucioException, error:
@@ -609,6 +610,41 @@ class Meta(RucioController):
         raise Created()
 
 
+class BulkMeta(RucioController):
+
+    def POST(self):
+        """
+        List the meta of a list of data identifiers.
+
+        HTTP Success:
+            200 OK
+
+        HTTP Error:
+            400 Bad request
+            401 Unauthorized
+            500 InternalError
+
+        :returns: A stream of dictionaries containing all meta, one per known data identifier.
+        """
+        header('Content-Type', 'application/x-json-stream')
+        json_data = data()
+        try:
+            dids = loads(json_data)['dids']
+        except (ValueError, KeyError, TypeError):
+            raise generate_http_error(400, 'ValueError', 'Cannot decode json parameter list')
+
+        try:
+            for chunk in json_stream(get_metadata_bulk(dids=dids)):
+                yield chunk
+        except InvalidObject, error:
+            raise generate_http_error(400, 'InvalidObject', error.args[0][0])
+        except RucioException, error:
+            raise generate_http_error(500, error.__class__.__name__, error.args[0][0])
+        except Exception, error:
+            print format_exc()
+            raise InternalError(error)
+
+
 class Rules(RucioController):
 
     def GET(self, scope, name):
@@ -626,8 +662,8 @@ class Rules(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for rule in list_replication_rules({'scope': scope, 'name': name}):
-                yield dumps(rule, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_replication_rules({'scope': scope, 'name': name})):
+                yield chunk
         except RuleNotFound, error:
             raise generate_http_error(404, 'RuleNotFound', error.args[0][0])
         except RucioException, error:
@@ -653,8 +689,8 @@ class AssociatedRules(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for rule in list_associated_replication_rules_for_file(scope=scope, name=name):
-                yield dumps(rule, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_associated_replication_rules_for_file(scope=scope, name=name)):
+                yield chunk
         except RucioException, error:
             raise generate_http_error(500, error.__class__.__name__, error.args[0])
         except Exception, error:
@@ -678,8 +714,8 @@ class GUIDLookup(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for dataset in get_dataset_by_guid(guid):
-                yield dumps(dataset, cls=APIEncoder) + '\n'
+            for chunk in json_stream(get_dataset_by_guid(guid)):
+                yield chunk
         except DataIdentifierNotFound, error:
             raise generate_http_error(404, 'DataIdentifierNotFound', error.args[0][0])
         except RucioException, error:
@@ -752,8 +788,8 @@ class NewDIDs(RucioController):
         if 'type' in params:
             type = params['type'][0]
         try:
-            for did in list_new_dids(type):
-                yield dumps(did, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_new_dids(type)):
+                yield chunk
         except RucioException, error:
             raise generate_http_error(500, error.__class__.__name__, error.args[0])
         except Exception, error:
@@ -809,4 +845,5 @@ class Resurrect(RucioController):
 
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
@@ -11,11 +11,13 @@
  - Mario Lassnig, <mario.lassnig@cern.ch>, 2014
 '''
 
+from ConfigParser import NoOptionError, NoSectionError
 from json import dumps
 from logging import getLogger, StreamHandler, DEBUG
 from web import application, ctx, header
 
 from rucio import version
+from rucio.common.config import config_get_int
 from rucio.web.rest.common import RucioController
 
 LOGGER = getLogger("rucio.rucio")
@@ -25,6 +27,12 @@ LOGGER.addHandler(SH)
 
 URLS = ('/?$', 'Ping')
 
+# Maximum number of items the clients send per request to the bulk methods
+try:
+    BULK_LIMIT = config_get_int('api', 'bulk_limit')
+except (NoOptionError, NoSectionError):
+    BULK_LIMIT = 1000
+
 
 class Ping(RucioController):
     '''
@@ -35,7 +43,8 @@ class Ping(RucioController):
         """
         .. http:get:: /ping
 
-            Get server version information.
+            Get server version information, and the maximum number of items the clients should send per request to
+            the bulk methods.
 
             **Example request**:
 
@@ -54,7 +63,8 @@ class Ping(RucioController):
               Content-Type: application/json
 
              {
-               "version": "0.2.9"
+               "version": "0.2.9",
+               "bulk_limit": 1000
               }
 
             :statuscode 200: no error
@@ -70,7 +80,7 @@ class Ping(RucioController):
         header('Cache-Control', 'post-check=0, pre-check=0', False)
         header('Pragma', 'no-cache')
 
-        return dumps({"version": version.version_string()})
+        return dumps({"version": version.version_string(), "bulk_limit": BULK_LIMIT})
 
 
 # ----------------------
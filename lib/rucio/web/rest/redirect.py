@@ -14,16 +14,14 @@ from traceback import format_exc
 from urlparse import parse_qs
 from web import application, ctx, header, seeother, InternalError
 
-from geoip2.errors import AddressNotFoundError
-
 from logging import getLogger, StreamHandler, DEBUG
 
 from rucio.api.replica import list_replicas
 from rucio.common.objectstore import connect, get_signed_urls
 from rucio.common.exception import RucioException, DataIdentifierNotFound, ReplicaNotFound
-from rucio.common.replicas_selector import random_order, geoIP_order, site_selector
+from rucio.common.replicas_selector import random_order, geoIP_order, replica_sorter, site_selector
 from rucio.common.utils import generate_http_error
-from rucio.web.rest.common import RucioController
+from rucio.web.rest.common import compression_processor, metalink_stream, RucioController
 
 
 LOGGER = getLogger("rucio.rucio")
@@ -73,58 +71,18 @@ class MetaLinkRedirector(RucioController):
             if not tmp_replicas:
                 raise ReplicaNotFound('no redirection possible - cannot find the DID')
 
-            # first, set the APPropriate content type, and stream the header
+            # first, set the APPropriate content type
             header('Content-Type', 'application/metalink4+xml')
-            yield '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n'
 
             # set the correct client IP
             client_ip = ctx.env.get('HTTP_X_FORWARDED_FOR')
             if client_ip is None:
                 client_ip = ctx.ip
 
-            # iteratively stream the XML per file
-            for rfile in tmp_replicas:
-                replicas = []
-                dictreplica = {}
-                for rse in rfile['rses']:
-                    for replica in rfile['rses'][rse]:
-                        replicas.append(replica)
-                        dictreplica[replica] = rse
-
-                # sort the actual replicas if necessary
-                if select == 'geoip':
-                    try:
-                        replicas = geoIP_order(dictreplica, client_ip)
-                    except AddressNotFoundError:
-                        pass
-                else:
-                    replicas = random_order(dictreplica, client_ip)
-
-                # stream metadata
-                yield ' <file name="' + rfile['name'] + '">\n'
-                yield '  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n'
-
-                if rfile['adler32'] is not None:
-                    yield '  <hash type="adler32">' + rfile['adler32'] + '</hash>\n'
-                if rfile['md5'] is not None:
-                    yield '  <hash type="md5">' + rfile['md5'] + '</hash>\n'
-
-                yield '  <size>' + str(rfile['bytes']) + '</size>\n'
-
-                yield '  <glfn name="%s%s">' % ('root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/',
-                                                '%s:%s' % (rfile['scope'], rfile['name']))
-                yield '</glfn>\n'
-
-                # stream URLs
-                idx = 1
-                for replica in replicas:
-                    yield '  <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx) + '">' + replica + '</url>\n'
-                    idx += 1
-
-                yield ' </file>\n'
-
-            # don't forget to send the metalink footer
-            yield '</metalink>\n'
+            # iteratively stream the XML per file, with the replicas sorted if necessary
+            order = replica_sorter(select, client_ip, ignore_unknown_client=True)
+            for chunk in metalink_stream(tmp_replicas, 4, order, glfn=True, url_indent='  '):
+                yield chunk
 
         except DataIdentifierNotFound, e:
             raise generate_http_error(404, 'DataIdentifierNotFound', e.args[0][0])
@@ -254,4 +212,5 @@ class HeaderRedirector(RucioController):
 ----------------------"""
 
 APP = application(URLS, globals())
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
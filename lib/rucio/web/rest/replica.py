@@ -18,8 +18,6 @@ from urllib import unquote
 from urlparse import parse_qs
 from web import application, ctx, Created, data, header, InternalError, loadhook, OK, unloadhook
 
-from geoip2.errors import AddressNotFoundError
-
 from rucio.api.replica import (add_replicas, list_replicas, list_dataset_replicas,
                                delete_replicas,
                                get_did_from_pfns, update_replicas_states,
@@ -31,10 +29,10 @@ from rucio.common.exception import (AccessDenied, DataIdentifierAlreadyExists,
                                     DataIdentifierNotFound, Duplicate, InvalidPath,
                                     ResourceTemporaryUnavailable, RucioException,
                                     RSENotFound, UnsupportedOperation, ReplicaNotFound)
-from rucio.common.replicas_selector import random_order, geoIP_order
+from rucio.common.replicas_selector import replica_sorter
 
 from rucio.common.utils import generate_http_error, parse_response, APIEncoder
-from rucio.web.rest.common import rucio_loadhook, rucio_unloadhook, RucioController
+from rucio.web.rest.common import compression_processor, json_stream, metalink_stream, rucio_loadhook, rucio_unloadhook, RucioController
 
 URLS = ('/list/?$', 'ListReplicas',
         '/?$', 'Replicas',
@@ -87,87 +85,25 @@ class Replicas(RucioController):
                 limit = int(params['limit'][0])
 
         try:
-            # first, set the APPropriate content type, and stream the header
+            # first, set the APPropriate content type
             if metalink is None:
                 header('Content-Type', 'application/x-json-stream')
             elif metalink == 3:
                 header('Content-Type', 'application/metalink+xml')
-                yield '<?xml version="1.0" encoding="UTF-8"?>\n<metalink version="3.0" xmlns="http://www.metalinker.org/">\n<files>\n'
             elif metalink == 4:
                 header('Content-Type', 'application/metalink4+xml')
-                yield '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n'
 
             # then, stream the replica information
-            for rfile in list_replicas(dids=dids, schemes=schemes):
+            if metalink is None:
+                for rfile in list_replicas(dids=dids, schemes=schemes):
+                    yield dumps(rfile) + '\n'
+            else:
                 client_ip = ctx.env.get('HTTP_X_FORWARDED_FOR')
                 if client_ip is None:
                     client_ip = ctx.ip
-
-                replicas = []
-                dictreplica = {}
-                for rse in rfile['rses']:
-                    for replica in rfile['rses'][rse]:
-                        replicas.append(replica)
-                        dictreplica[replica] = rse
-                if select == 'geoip':
-                    try:
-                        replicas = geoIP_order(dictreplica, client_ip)
-                    except AddressNotFoundError:
-                        pass
-                else:
-                    replicas = random_order(dictreplica, client_ip)
-                if metalink is None:
-                    yield dumps(rfile) + '\n'
-
-                elif metalink == 3:
-                    idx = 0
-                    yield ' <file name="' + rfile['name'] + '">\n'
-
-                    # To help support the FAX transition period, add the glfn to the metalink:
-                    # AGIS does not expose specific FAX redirectors per DDM Endpoint, so go through top-level redirector
-                    yield '  <glfn name="%s%s">' % ('root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/',
-                                                    '%s:%s' % (rfile['scope'], rfile['name']))
-                    yield '</glfn>\n'
-
-                    yield '  <resources>\n'
-                    for replica in replicas:
-                        yield '   <url type="http" preference="' + str(idx) + '">' + replica + '</url>\n'
-                        idx += 1
-                        if limit and limit == idx:
-                            break
-                    yield '  </resources>\n </file>\n'
-
-                elif metalink == 4:
-                    yield ' <file name="' + rfile['name'] + '">\n'
-                    yield '  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n'
-
-                    if rfile['adler32'] is not None:
-                        yield '  <hash type="adler32">' + rfile['adler32'] + '</hash>\n'
-                    if rfile['md5'] is not None:
-                        yield '  <hash type="md5">' + rfile['md5'] + '</hash>\n'
-
-                    yield '  <size>' + str(rfile['bytes']) + '</size>\n'
-
-                    # To help support the FAX transition period, add the glfn to the metalink:
-                    # AGIS does not expose specific FAX redirectors per DDM Endpoint, so go through top-level redirector
-                    yield '  <glfn name="%s%s">' % ('root://atlas-xrd-eu.cern.ch:1094//atlas/rucio/',
-                                                    '%s:%s' % (rfile['scope'], rfile['name']))
-                    yield '</glfn>\n'
-
-                    idx = 0
-                    for replica in replicas:
-                        yield '   <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx + 1) + '">' + replica + '</url>\n'
-                        idx += 1
-                        if limit and limit == idx:
-                            break
-                    yield ' </file>\n'
-
-            # don't forget to send the metalink footer
-            if metalink:
-                if metalink == 3:
-                    yield '</files>\n</metalink>\n'
-                elif metalink == 4:
-                    yield '</metalink>\n'
+                order = replica_sorter(select, client_ip, ignore_unknown_client=True)
+                for chunk in metalink_stream(list_replicas(dids=dids, schemes=schemes), metalink, order, limit=limit, glfn=True):
+                    yield chunk
 
         except DataIdentifierNotFound, e:
             raise generate_http_error(404, 'DataIdentifierNotFound', e.args[0][0])
@@ -335,72 +271,33 @@ class ListReplicas(RucioController):
             if 'select' in params:
                 select = params['select'][0]
             if 'limit' in params:
-                limit = params['limit'][0]
+                limit = int(params['limit'][0])
 
         try:
-            # first, set the APPropriate content type, and stream the header
+            # first, set the APPropriate content type
             if metalink is None:
                 header('Content-Type', 'application/x-json-stream')
             elif metalink == 3:
                 header('Content-Type', 'application/metalink+xml')
-                yield '<?xml version="1.0" encoding="UTF-8"?>\n<metalink version="3.0" xmlns="http://www.metalinker.org/">\n<files>\n'
             elif metalink == 4:
                 header('Content-Type', 'application/metalink4+xml')
-                yield '<?xml version="1.0" encoding="UTF-8"?>\n<metalink xmlns="urn:ietf:params:xml:ns:metalink">\n'
 
             # then, stream the replica information
-            for rfile in list_replicas(dids=dids, schemes=schemes,
-                                       unavailable=unavailable,
-                                       request_id=ctx.env.get('request_id'),
-                                       ignore_availability=ignore_availability,
-                                       all_states=all_states,
-                                       rse_expression=rse_expression):
+            rfiles = list_replicas(dids=dids, schemes=schemes,
+                                   unavailable=unavailable,
+                                   request_id=ctx.env.get('request_id'),
+                                   ignore_availability=ignore_availability,
+                                   all_states=all_states,
+                                   rse_expression=rse_expression)
+            if metalink is None:
+                for rfile in rfiles:
+                    yield dumps(rfile, cls=APIEncoder) + '\n'
+            else:
                 client_ip = ctx.env.get('HTTP_X_FORWARDED_FOR')
                 if client_ip is None:
                     client_ip = ctx.ip
-                replicas = []
-                dictreplica = {}
-                for rse in rfile['rses']:
-                    for replica in rfile['rses'][rse]:
-                        replicas.append(replica)
-                        dictreplica[replica] = rse
-                if select == 'geoip':
-                    replicas = geoIP_order(dictreplica, client_ip)
-                else:
-                    replicas = random_order(dictreplica, client_ip)
-                if metalink is None:
-                    yield dumps(rfile, cls=APIEncoder) + '\n'
-                elif metalink == 3:
-                    idx = 0
-                    yield ' <file name="' + rfile['name'] + '">\n  <resources>\n'
-                    for replica in replicas:
-                        yield '   <url type="http" preference="' + str(idx) + '">' + replica + '</url>\n'
-                        idx += 1
-                        if limit and limit == idx:
-                            break
-                    yield '  </resources>\n </file>\n'
-                elif metalink == 4:
-                    yield ' <file name="' + rfile['name'] + '">\n'
-                    yield '  <identity>' + rfile['scope'] + ':' + rfile['name'] + '</identity>\n'
-                    if rfile['adler32'] is not None:
-                        yield '  <hash type="adler32">' + rfile['adler32'] + '</hash>\n'
-                    if rfile['md5'] is not None:
-                        yield '  <hash type="md5">' + rfile['md5'] + '</hash>\n'
-                    yield '  <size>' + str(rfile['bytes']) + '</size>\n'
-                    idx = 0
-                    for replica in replicas:
-                        yield '   <url location="' + str(dictreplica[replica]) + '" priority="' + str(idx + 1) + '">' + replica + '</url>\n'
-                        idx += 1
-                        if limit and limit == idx:
-                            break
-                    yield ' </file>\n'
-
-            # don't forget to send the metalink footer
-            if metalink:
-                if metalink == 3:
-                    yield '</files>\n</metalink>\n'
-                elif metalink == 4:
-                    yield '</metalink>\n'
+                for chunk in metalink_stream(rfiles, metalink, replica_sorter(select, client_ip), limit=limit):
+                    yield chunk
 
         except DataIdentifierNotFound, e:
             raise generate_http_error(404, 'DataIdentifierNotFound', e.args[0][0])
@@ -440,8 +337,8 @@ class ReplicasDIDs(RucioController):
             raise generate_http_error(400, 'ValueError', 'Cannot decode json parameter list')
 
         try:
-            for pfn in get_did_from_pfns(pfns, rse):
-                yield dumps(pfn) + '\n'
+            for chunk in json_stream(get_did_from_pfns(pfns, rse)):
+                yield chunk
         except RucioException, e:
             raise generate_http_error(500, e.__class__.__name__, e.args[0][0])
         except Exception, e:
@@ -570,8 +467,8 @@ class BadReplicasStates(RucioController):
         except Exception, e:
             print format_exc()
             raise InternalError(e)
-        for row in result:
-            yield dumps(row, cls=APIEncoder) + '\n'
+        for chunk in json_stream(result):
+            yield chunk
 
 
 class BadReplicasSummary(RucioController):
@@ -610,8 +507,8 @@ class BadReplicasSummary(RucioController):
         except Exception, e:
             print format_exc()
             raise InternalError(e)
-        for row in result:
-            yield dumps(row, cls=APIEncoder) + '\n'
+        for chunk in json_stream(result):
+            yield chunk
 
 
 class DatasetReplicas(RucioController):
@@ -640,8 +537,8 @@ class DatasetReplicas(RucioController):
             if 'deep' in params:
                 deep = params['deep'][0]
         try:
-            for row in list_dataset_replicas(scope=scope, name=name, deep=deep):
-                yield dumps(row, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_dataset_replicas(scope=scope, name=name, deep=deep)):
+                yield chunk
         except RucioException, e:
             raise generate_http_error(500, e.__class__.__name__, e.args[0][0])
         except Exception, e:
@@ -666,8 +563,8 @@ class ReplicasRSE(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for row in list_datasets_per_rse(rse=rse):
-                yield dumps(row, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_datasets_per_rse(rse=rse)):
+                yield chunk
         except RucioException, e:
             raise generate_http_error(500, e.__class__.__name__, e.args[0][0])
         except Exception, e:
@@ -682,4 +579,5 @@ class ReplicasRSE(RucioController):
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
 APP.add_processor(unloadhook(rucio_unloadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
@@ -26,8 +26,8 @@ from rucio.api.rse import (add_rse, update_rse, list_rses, del_rse, add_rse_attr
                            get_rse_usage, list_rse_usage_history,
                            set_rse_limits, get_rse_limits, parse_rse_expression)
 from rucio.common.exception import Duplicate, AccessDenied, RSENotFound, RucioException, RSEOperationNotSupported, RSEProtocolNotSupported, InvalidObject, RSEProtocolDomainNotSupported, RSEProtocolPriorityError, InvalidRSEExpression
-from rucio.common.utils import generate_http_error, render_json, APIEncoder
-from rucio.web.rest.common import rucio_loadhook, RucioController
+from rucio.common.utils import generate_http_error, render_json
+from rucio.web.rest.common import compression_processor, json_stream, rucio_loadhook, RucioController
 
 URLS = (
     '/(.+)/attr/(.+)', 'Attributes',
@@ -77,8 +77,8 @@ class RSEs(RucioController):
             except RucioException, error:
                 raise generate_http_error(500, error.__class__.__name__, error.args[0][0])
         else:
-            for rse in list_rses():
-                yield render_json(**rse) + '\n'
+            for chunk in json_stream(list_rses()):
+                yield chunk
 
 
 class RSE(RucioController):
@@ -518,8 +518,8 @@ class Usage:
             print format_exc()
             raise InternalError(error)
 
-        for u in usage:
-            yield render_json(**u) + '\n'
+        for chunk in json_stream(usage):
+            yield chunk
 
     def PUT(self, rse):
         """ Update RSE usage information.
@@ -581,8 +581,8 @@ class UsageHistory:
                 source = params['source'][0]
 
         try:
-            for usage in list_rse_usage_history(rse=rse, issuer=ctx.env.get('issuer'), source=source):
-                yield render_json(**usage) + '\n'
+            for chunk in json_stream(list_rse_usage_history(rse=rse, issuer=ctx.env.get('issuer'), source=source)):
+                yield chunk
         except RSENotFound, error:
             raise generate_http_error(404, 'RSENotFound', error[0][0])
         except RucioException, error:
@@ -675,8 +675,8 @@ class RSEAccountUsageLimit:
         header('Content-Type', 'application/json')
         try:
             usage = get_rse_account_usage(rse=rse)
-            for row in usage:
-                yield dumps(row, cls=APIEncoder) + '\n'
+            for chunk in json_stream(usage):
+                yield chunk
         except RSENotFound, error:
             raise generate_http_error(404, 'RSENotFound', error[0][0])
         except RucioException, error:
@@ -692,4 +692,5 @@ class RSEAccountUsageLimit:
 
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
@@ -26,8 +26,8 @@ from rucio.common.exception import (InsufficientAccountLimit, RuleNotFound, Acce
                                     ReplicationRuleCreationTemporaryFailed, InvalidRuleWeight, StagingAreaRuleRequiresLifetime,
                                     DuplicateRule, InvalidObject, AccountNotFound, RuleReplaceFailed, ScratchDiskLifetimeConflict,
                                     ManualRuleApprovalBlocked, UnsupportedOperation)
-from rucio.common.utils import generate_http_error, render_json, APIEncoder
-from rucio.web.rest.common import rucio_loadhook
+from rucio.common.utils import generate_http_error, render_json
+from rucio.web.rest.common import compression_processor, json_stream, rucio_loadhook
 
 LOGGER = getLogger("rucio.rule")
 SH = StreamHandler()
@@ -161,8 +161,8 @@ class AllRule:
             filters.update(params)
 
         try:
-            for rule in list_replication_rules(filters=filters):
-                yield dumps(rule, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_replication_rules(filters=filters)):
+                yield chunk
         except RuleNotFound as error:
             raise generate_http_error(404, 'RuleNotFound', error.args[0][0])
         except Exception as error:
@@ -308,8 +308,8 @@ class ReplicaLocks:
         except Exception as error:
             raise InternalError(error)
 
-        for lock in locks:
-            yield dumps(lock, cls=APIEncoder) + '\n'
+        for chunk in json_stream(locks):
+            yield chunk
 
 
 class ReduceRule:
@@ -383,8 +383,8 @@ class RuleHistory:
         except Exception as error:
             raise InternalError(error)
 
-        for hist in history:
-            yield dumps(hist, cls=APIEncoder) + '\n'
+        for chunk in json_stream(history):
+            yield chunk
 
 
 class RuleHistoryFull:
@@ -410,8 +410,8 @@ class RuleHistoryFull:
         except Exception as error:
             raise InternalError(error)
 
-        for hist in history:
-            yield dumps(hist, cls=APIEncoder) + '\n'
+        for chunk in json_stream(history):
+            yield chunk
 
 
 class RuleAnalysis:
@@ -446,4 +446,5 @@ class RuleAnalysis:
 
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
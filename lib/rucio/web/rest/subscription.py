@@ -9,7 +9,7 @@
 # - Cedric Serfon, <cedric.serfon@cern.ch>, 2013-2016
 # - Thomas Beermann, <thomas.beermann@cern.ch>, 2014
 
-from json import dumps, loads
+from json import loads
 from urlparse import parse_qs
 from logging import getLogger, StreamHandler, DEBUG
 
@@ -18,8 +18,8 @@ from web import application, ctx, data, header, BadRequest, Created, InternalErr
 from rucio.api.rule import list_replication_rules
 from rucio.api.subscription import list_subscriptions, add_subscription, update_subscription, list_subscription_rule_states, get_subscription_by_id
 from rucio.common.exception import InvalidObject, RucioException, SubscriptionDuplicate, SubscriptionNotFound, RuleNotFound, AccessDenied
-from rucio.common.utils import generate_http_error, APIEncoder, render_json
-from rucio.web.rest.common import rucio_loadhook, RucioController
+from rucio.common.utils import generate_http_error, render_json
+from rucio.web.rest.common import compression_processor, json_stream, rucio_loadhook, RucioController
 
 LOGGER = getLogger("rucio.subscription")
 SH = StreamHandler()
@@ -56,8 +56,8 @@ class Subscription:
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for subscription in list_subscriptions(name=name, account=account):
-                yield dumps(subscription, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_subscriptions(name=name, account=account)):
+                yield chunk
         except SubscriptionNotFound, error:
             raise generate_http_error(404, 'SubscriptionNotFound', error[0][0])
         except Exception, error:
@@ -196,11 +196,11 @@ class Rules:
             subscriptions = [subscription['id'] for subscription in list_subscriptions(name=name, account=account)]
             if len(subscriptions) > 0:
                 if state:
-                    for rule in list_replication_rules({'subscription_id': subscriptions[0], 'state': state}):
-                        yield dumps(rule, cls=APIEncoder) + '\n'
+                    for chunk in json_stream(list_replication_rules({'subscription_id': subscriptions[0], 'state': state})):
+                        yield chunk
                 else:
-                    for rule in list_replication_rules({'subscription_id': subscriptions[0]}):
-                        yield dumps(rule, cls=APIEncoder) + '\n'
+                    for chunk in json_stream(list_replication_rules({'subscription_id': subscriptions[0]})):
+                        yield chunk
         except RuleNotFound, error:
             raise generate_http_error(404, 'RuleNotFound', error.args[0][0])
         except SubscriptionNotFound, error:
@@ -236,8 +236,8 @@ class States(RucioController):
         """
         header('Content-Type', 'application/x-json-stream')
         try:
-            for row in list_subscription_rule_states(account=account):
-                yield dumps(row, cls=APIEncoder) + '\n'
+            for chunk in json_stream(list_subscription_rule_states(account=account)):
+                yield chunk
         except RucioException, error:
             raise generate_http_error(500, error.__class__.__name__, error.args[0])
         except Exception, error:
@@ -277,4 +277,5 @@ class SubscriptionId:
 
 APP = application(URLS, globals())
 APP.add_processor(loadhook(rucio_loadhook))
+APP.add_processor(compression_processor)
 application = APP.wsgifunc()
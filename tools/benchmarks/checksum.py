@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Computes the checksums of a large file of random data in several ways and reports their throughput:
+the former line based Adler-32, the Adler-32 by fixed blocks, Adler-32 and MD5 in two passes
+like the client did, and Adler-32 and MD5 in a single pass, read by blocks or through a memory map.
+
+The file is written once; the page cache is not dropped, so use a file larger than the memory
+of the host to measure the disk bound case.
+'''
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+import zlib
+
+from rucio.common.utils import checksum_file
+
+
+def line_adler32(path):
+    '''
+    The Adler-32 as computed by rucio.common.utils.adler32 before the checksum engine.
+    '''
+    adler = 1L
+    with open(path, 'rb') as f:
+        for line in f:
+            adler = zlib.adler32(line, adler)
+    return '%08x' % (adler & 0xffffffff)
+
+
+def block_md5(path):
+    '''
+    The MD5 as computed by the clients, in a separate pass.
+    '''
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(4096), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=float, default=2, help='Size of the file in GB')
+    parser.add_argument('--dir', default=None, help='Directory of the file, the default temporary directory if not set')
+    args = parser.parse_args()
+
+    size = int(args.size * 1024)
+    handle, path = tempfile.mkstemp(dir=args.dir)
+    try:
+        block = os.urandom(1024 * 1024)
+        with os.fdopen(handle, 'wb') as f:
+            for _ in xrange(size):
+                f.write(block)
+
+        runs = [('line adler32', lambda: (line_adler32(path), None)),
+                ('block adler32', lambda: (checksum_file(path, md5=False)['adler32'], None)),
+                ('adler32 + md5, two passes', lambda: (checksum_file(path, md5=False)['adler32'], block_md5(path))),
+                ('adler32 + md5, one pass', lambda: (lambda c: (c['adler32'], c['md5']))(checksum_file(path))),
+                ('adler32 + md5, one pass, mmap', lambda: (lambda c: (c['adler32'], c['md5']))(checksum_file(path, use_mmap=True)))]
+        results = set()
+        for name, run in runs:
+            start = time.time()
+            adler, md5 = run()
+            duration = time.time() - start
+            results.add(adler)
+            if md5:
+                results.add(md5)
+            print '%-30s %7.2f seconds, %7.1f MB/s' % (name, duration, size / duration)
+        if len(results) != 2:
+            raise Exception('The checksums differ: %s' % sorted(results))
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
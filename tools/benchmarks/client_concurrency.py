@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Sends get_metadata and list_files calls to a local mock of the Rucio server, answering
+after a given latency. The calls are sent one after the other with the Client, by
+threads with a Client each, and with the ConcurrentClient. The throughput of each
+method is reported.
+'''
+
+import argparse
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+from rucio.client.baseclient import BaseClient
+from rucio.client.client import Client
+from rucio.client.concurrentclient import ConcurrentClient
+
+
+class MockRucioRequestHandler(BaseHTTPRequestHandler):
+    '''
+    Answers the authentication, get_metadata and list_files calls after latency seconds.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0
+    files = 100
+
+    def do_GET(self):
+        if self.path.startswith('/auth/'):
+            return self._reply('', {'X-Rucio-Auth-Token': 'token'})
+        time.sleep(self.latency)
+        _, _, scope, name, what = self.path.split('?')[0].split('/')
+        if what == 'meta':
+            return self._reply(json.dumps({'scope': scope, 'name': name, 'bytes': 1, 'created_at': 'Mon, 02 Jan 2017 00:00:00 UTC'}),
+                               {'Content-Type': 'application/json'})
+        body = ''.join('%s\n' % json.dumps({'scope': scope, 'name': '%s.%i' % (name, i), 'bytes': 1, 'adler32': '01000001'})
+                       for i in xrange(self.files))
+        self._reply(body, {'Content-Type': 'application/x-json-stream'})
+
+    def _reply(self, body, headers):
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def sequential(client_args, calls, method):
+    client = Client(**client_args)
+    for scope, name in calls:
+        result = getattr(client, method)(scope, name)
+        if method == 'list_files':
+            list(result)
+
+
+def threaded(client_args, calls, method, threads):
+    def worker(part):
+        sequential(client_args, part, method)
+    workers = [threading.Thread(target=worker, args=(calls[i::threads],)) for i in xrange(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+def concurrent(client_args, calls, method, threads):
+    with ConcurrentClient(concurrency=threads, **client_args) as client:
+        if method == 'list_files':
+            for _ in client.stream(method, calls):
+                pass
+        else:
+            for _, result in client.map(method, calls):
+                if isinstance(result, Exception):
+                    raise result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=2000, help='Number of calls per method')
+    parser.add_argument('--latency', type=float, default=20, help='Latency of the server in ms')
+    parser.add_argument('--threads', type=int, default=16, help='Number of threads, or of concurrent calls')
+    parser.add_argument('--files', type=int, default=100, help='Number of files listed per list_files call')
+    args = parser.parse_args()
+
+    MockRucioRequestHandler.latency = args.latency / 1000.
+    MockRucioRequestHandler.files = args.files
+    server = ThreadingHTTPServer(('localhost', 0), MockRucioRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    token_dir = tempfile.mkdtemp()
+    BaseClient.TOKEN_PATH_PREFIX = token_dir + '/.rucio_'
+    host = 'http://localhost:%i' % server.server_address[1]
+    client_args = {'rucio_host': host, 'auth_host': host, 'account': 'root', 'auth_type': 'userpass',
+                   'creds': {'username': 'bench', 'password': 'bench'}}
+
+    try:
+        for method in ('get_metadata', 'list_files'):
+            calls = [('mock', 'dataset_%i' % i) for i in xrange(args.calls)]
+            runs = [('sequential', lambda: sequential(client_args, calls[:args.calls / args.threads], method), args.calls / args.threads),
+                    ('%i threads' % args.threads, lambda: threaded(client_args, calls, method, args.threads), args.calls),
+                    ('concurrent client', lambda: concurrent(client_args, calls, method, args.threads), args.calls)]
+            for label, run, count in runs:
+                start = time.time()
+                run()
+                elapsed = time.time() - start
+                print '%-12s %-18s %6i calls %8.2f s %9.1f calls/s' % (method, label, count, elapsed, count / elapsed)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(token_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Downloads a set of files from a local HTTP server, once like rsemanager.download
+(one file after the other, checksum computed by re-reading the file) and once with
+the download engine (parallel files, range requests, checksum computed on the fly),
+and reports the throughput of both.
+
+The server can throttle each connection to mimic the per-stream bandwidth of a WAN link.
+'''
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from rucio.common.utils import adler32
+from rucio.rse import rsemanager as rsemgr
+from rucio.rse.downloader import Downloader
+
+
+class ThrottledRangeRequestHandler(SimpleHTTPRequestHandler):
+    '''
+    Serves the files of the current directory, with range requests, at rate bytes/second per connection.
+    '''
+
+    rate = None
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return SimpleHTTPRequestHandler.do_GET(self)
+        size = os.path.getsize(path)
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        first, last = (int(match.group(1)), int(match.group(2))) if match else (0, size - 1)
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Length', str(last - first + 1))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining:
+                start = time.time()
+                block = f.read(min(remaining, 256 * 1024))
+                self.wfile.write(block)
+                remaining -= len(block)
+                if self.rate:
+                    time.sleep(max(0, float(len(block)) / self.rate - (time.time() - start)))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def rse_settings(port):
+    '''
+    Returns the settings of an RSE served by the local server with the webdav protocol.
+    '''
+    domains = {'read': 1, 'write': 1, 'delete': 1}
+    return {'rse': 'BENCH_HTTP', 'deterministic': True, 'domain': ['wan'], 'read_protocol': 1,
+            'protocols': [{'scheme': 'http', 'hostname': 'localhost', 'port': port, 'prefix': '/',
+                           'impl': 'rucio.rse.protocols.webdav.Default', 'extended_attributes': None,
+                           'domains': {'lan': domains, 'wan': domains}}]}
+
+
+def sequential(files, settings, dest_dir):
+    '''
+    Downloads the files like rsemanager.download: one after the other, then checksum by re-reading.
+    '''
+    protocol = rsemgr.create_protocol(settings, 'read', scheme='http')
+    protocol.connect(credentials={'cert': None})
+    for f in files:
+        tempfile = os.path.join(dest_dir, '%s.part' % f['name'])
+        protocol.get(f['name'], tempfile)
+        if adler32(tempfile) != f['adler32']:
+            raise Exception('Checksum mismatch for %s' % f['name'])
+        os.rename(tempfile, os.path.join(dest_dir, f['name']))
+    protocol.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=8, help='Number of files')
+    parser.add_argument('--size', type=int, default=64, help='Size of each file in MB')
+    parser.add_argument('--rate', type=float, default=50, help='Bandwidth per connection in MB/s, 0 for unlimited')
+    parser.add_argument('--threads', type=int, default=3, help='Number of files downloaded in parallel')
+    parser.add_argument('--range-parts', type=int, default=4, help='Number of range requests per file')
+    parser.add_argument('--range-threshold', type=int, default=16, help='Size in MB above which range requests are used')
+    args = parser.parse_args()
+
+    source_dir, dest_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(source_dir)
+    ThrottledRangeRequestHandler.rate = args.rate * 1024 * 1024 if args.rate else None
+    server = ThreadingHTTPServer(('localhost', 0), ThrottledRangeRequestHandler)
+    threading.Thread(target=server.serve_forever).start()
+    settings = rse_settings(server.server_address[1])
+
+    try:
+        files = []
+        block = os.urandom(1024 * 1024)
+        for i in xrange(args.files):
+            name = 'bench_%03i' % i
+            adler = 1L
+            with open(os.path.join(source_dir, name), 'wb') as f:
+                for _ in xrange(args.size):
+                    f.write(block)
+                    adler = zlib.adler32(block, adler)
+            files.append({'scope': 'bench', 'name': name, 'dest_dir': dest_dir, 'bytes': args.size * 1024 * 1024,
+                          'adler32': '%08x' % (adler & 0xffffffff),
+                          'sources': [('BENCH_HTTP', 'http://localhost:%s/%s' % (server.server_address[1], name))]})
+        total = args.files * args.size
+
+        start = time.time()
+        sequential(files, settings, dest_dir)
+        duration = time.time() - start
+        print 'sequential: %.2f seconds, %.1f MB/s' % (duration, total / duration)
+
+        for name in os.listdir(dest_dir):
+            os.unlink(os.path.join(dest_dir, name))
+
+        downloader = Downloader(threads=args.threads, rse_concurrency=args.threads, range_parts=args.range_parts,
+                                range_threshold=args.range_threshold * 1024 * 1024, credentials={'cert': None},
+                                rse_settings={'BENCH_HTTP': settings})
+        start = time.time()
+        results = downloader.download(files)
+        duration = time.time() - start
+        failed = [did for did in results if results[did]['clientState'] != 'DONE']
+        print 'engine:     %.2f seconds, %.1f MB/s, %i failed' % (duration, total / duration, len(failed))
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.chdir(cwd)
+        shutil.rmtree(source_dir)
+        shutil.rmtree(dest_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Generates two synthetic Rucio replica dumps and a storage dump, in random order, and runs
+the consistency check on them twice: once as before (dumps rewritten by parse_and_filter_file,
+sorted by GNU sort, then compared from the files) and once with the streaming pipeline
+(in-process parallel external merge sort merged straight into the comparison).
+
+The wall time and the peak RSS of each run are reported. Each run is done in its own process.
+'''
+
+import argparse
+import functools
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+
+from rucio.common import dumper
+from rucio.common.dumper import consistency, path_parsing, sorting
+
+ENDPOINT = {'name': 'MOCK_DATADISK', 'se': 'srm://example.com/', 'endpoint': '/pnfs/example.com/atlas/atlasdatadisk/'}
+REPLICA_LINE = 'MOCK_DATADISK\tmc16\t{0}\t19028d77\t189468\t2017-01-02 00:00:00\t{1}\t2017-01-02 00:00:00\t{2}\n'
+
+
+def generate(directory, lines, lost_ratio, dark_ratio):
+    '''
+    Writes the dumps in `directory`, returns their paths.
+    '''
+    paths = ['prev', 'next', 'storage']
+    paths = [os.path.join(directory, name) for name in paths]
+    order = range(lines)
+    random.shuffle(order)
+    with open(paths[0], 'w') as prev, open(paths[1], 'w') as next_, open(paths[2], 'w') as storage:
+        for i in order:
+            name = 'mc16.{0:010d}.EVNT.pool.root'.format(i)
+            path = 'mc16/{0:02x}/{1:02x}/{2}'.format(i % 256, (i / 256) % 256, name)
+            draw = random.random()
+            if draw >= dark_ratio:
+                prev.write(REPLICA_LINE.format(name, path, 'A'))
+                next_.write(REPLICA_LINE.format(name, path, 'A'))
+            if draw < dark_ratio or draw >= dark_ratio + lost_ratio:
+                storage.write('{0}rucio/{1}\n'.format(ENDPOINT['endpoint'], path))
+    return paths
+
+
+def gnu_sort_check(prev, next_, storage, cache_dir, run_size, processes):
+    '''
+    The consistency check as done before the streaming pipeline.
+    '''
+    prefix_components = path_parsing.components(ENDPOINT['endpoint'])
+
+    def parser(line):
+        return ','.join(consistency.parse_replica_line(line).split('\t'))
+
+    prev = consistency.gnu_sort(consistency.parse_and_filter_file(prev, parser=parser, cache_dir=cache_dir), delimiter=',', fieldspec='1', cache_dir=cache_dir)
+    next_ = consistency.gnu_sort(consistency.parse_and_filter_file(next_, parser=parser, cache_dir=cache_dir), delimiter=',', fieldspec='1', cache_dir=cache_dir)
+    storage = consistency.gnu_sort(consistency.parse_and_filter_file(
+        storage, parser=functools.partial(consistency.strip_storage_dump_line, prefix_components), cache_dir=cache_dir), cache_dir=cache_dir)
+    results = {'LOST': 0, 'DARK': 0}
+    with open(prev) as prevf, open(storage) as sdump, open(next_) as nextf:
+        for _, where, status in consistency.compare3(prevf, sdump, nextf):
+            if where[0] and not where[1] and where[2] and status == ('A', 'A'):
+                results['LOST'] += 1
+            if not where[0] and where[1] and not where[2]:
+                results['DARK'] += 1
+    return results
+
+
+def streaming_check(prev, next_, storage, cache_dir, run_size, processes):
+    '''
+    The consistency check with the streaming pipeline.
+    '''
+    results = {'LOST': 0, 'DARK': 0}
+    for entry in consistency.Consistency.dump('consistency-manual', ENDPOINT['name'], storage, prev_date_fname=prev, next_date_fname=next_,
+                                              sort_rucio_replica_dumps=True, cache_dir=cache_dir, sort_run_size=run_size, sort_processes=processes):
+        results[entry.apparent_status] += 1
+    return results
+
+
+def run(check, paths, args, queue):
+    dumper.agis_endpoints_data = lambda: [ENDPOINT]
+    cache_dir = tempfile.mkdtemp(dir=args.directory)
+    try:
+        start = time.time()
+        results = check(*paths, cache_dir=cache_dir, run_size=args.run_size * 1024 * 1024, processes=args.processes)
+        elapsed = time.time() - start
+    finally:
+        shutil.rmtree(cache_dir)
+    queue.put((results, elapsed,
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=100000000, help='Number of lines of the dumps')
+    parser.add_argument('--lost', type=float, default=0.001, help='Ratio of lost files')
+    parser.add_argument('--dark', type=float, default=0.001, help='Ratio of dark files')
+    parser.add_argument('--run-size', type=int, default=sorting.RUN_SIZE / 1024 / 1024, help='Size of the sorted runs in MiB')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='Number of sorting processes')
+    parser.add_argument('--directory', default=None, help='Directory of the dumps, temporary if not given')
+    args = parser.parse_args()
+
+    temporary = args.directory is None
+    if temporary:
+        args.directory = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        paths = generate(args.directory, args.lines, args.lost, args.dark)
+        print 'Generated dumps of %d lines (%.1f MB) in %.1f s' % (args.lines, sum(os.path.getsize(path) for path in paths) / 1e6, time.time() - start)
+
+        for label, check in (('gnu sort', gnu_sort_check), ('streaming', streaming_check)):
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run, args=(check, paths, args, queue))
+            process.start()
+            results, elapsed, rss, children_rss = queue.get()
+            process.join()
+            print '%-10s %8.1f s   peak RSS %7.1f MB (children %7.1f MB)   %d lost, %d dark' % (
+                label, elapsed, rss / 1024., children_rss / 1024., results['LOST'], results['DARK'])
+    finally:
+        if temporary:
+            shutil.rmtree(args.directory)
+
+
+if __name__ == '__main__':
+    main()
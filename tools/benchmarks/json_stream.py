@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Encodes synthetic listings of replicas, DIDs, rules and locks as JSON lines
+(application/x-json-stream) as the REST endpoints did before, one
+json.dumps(row, cls=APIEncoder) per row, and with json_stream, and reports
+the rows per second and the number of chunks yielded to the WSGI server.
+'''
+
+import argparse
+import datetime
+import time
+
+from json import dumps
+
+from rucio.common.utils import APIEncoder
+from rucio.db.sqla.constants import DIDAvailability, DIDType, LockState, ReplicaState, RuleGrouping, RuleState
+from rucio.web.rest.common import CHUNK_SIZE, json_stream
+
+DATE = datetime.datetime(2017, 1, 1)
+
+
+def replica(i):
+    return {'scope': 'mc16_13TeV', 'name': 'EVNT.%010d._000001.pool.root.1' % i, 'rse_id': '%032x' % (i % 50), 'bytes': 1234567 + i,
+            'adler32': '%08x' % i, 'md5': None, 'path': None, 'state': ReplicaState.AVAILABLE, 'lock_cnt': 1, 'tombstone': None,
+            'accessed_at': None, 'created_at': DATE + datetime.timedelta(seconds=i), 'updated_at': DATE + datetime.timedelta(seconds=2 * i)}
+
+
+def did(i):
+    return {'scope': 'mc16_13TeV', 'name': 'mc16_13TeV.%06d.dataset' % i, 'type': DIDType.DATASET, 'account': 'prodsys',
+            'bytes': 10 ** 12 + i, 'length': 1000, 'availability': DIDAvailability.AVAILABLE, 'is_open': False, 'monotonic': False,
+            'created_at': DATE + datetime.timedelta(seconds=i), 'updated_at': DATE + datetime.timedelta(seconds=3 * i), 'expired_at': None}
+
+
+def rule(i):
+    return {'id': '%032x' % i, 'subscription_id': None, 'account': 'prodsys', 'scope': 'mc16_13TeV', 'name': 'mc16_13TeV.%06d.dataset' % i,
+            'did_type': DIDType.DATASET, 'state': RuleState.OK, 'error': None, 'rse_expression': 'CERN-PROD_DATADISK', 'copies': 1,
+            'expires_at': DATE + datetime.timedelta(days=30, seconds=i), 'weight': None, 'locked': False, 'locks_ok_cnt': 1000,
+            'locks_replicating_cnt': 0, 'locks_stuck_cnt': 0, 'source_replica_expression': None, 'activity': 'Production Output',
+            'grouping': RuleGrouping.DATASET, 'stuck_at': None, 'purge_replicas': False, 'ignore_availability': False, 'priority': 3,
+            'comments': None, 'child_rule_id': None, 'created_at': DATE + datetime.timedelta(seconds=i), 'updated_at': DATE + datetime.timedelta(seconds=i)}
+
+
+def lock(i):
+    return {'scope': 'mc16_13TeV', 'name': 'EVNT.%010d._000001.pool.root.1' % i, 'rse_id': '%032x' % (i % 50), 'rse': 'CERN-PROD_DATADISK',
+            'state': LockState.OK, 'rule_id': '%032x' % (i / 1000)}
+
+
+def per_row(rows):
+    ''' The REST endpoints before json_stream. '''
+    for row in rows:
+        yield dumps(row, cls=APIEncoder) + '\n'
+
+
+def measure(stream, rows):
+    start = time.time()
+    chunks, size = 0, 0
+    for chunk in stream(rows):
+        chunks += 1
+        size += len(chunk)
+    return time.time() - start, chunks, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000, help='Number of rows of each listing')
+    args = parser.parse_args()
+
+    print 'Chunks of %d bytes' % CHUNK_SIZE
+    for shape in (replica, did, rule, lock):
+        rows = [shape(i) for i in xrange(args.rows)]
+        results = []
+        for label, stream in (('per row', per_row), ('json_stream', json_stream)):
+            elapsed, chunks, size = measure(stream, rows)
+            results.append(elapsed)
+            print '%-8s %-12s %10.0f rows/s %9d chunks %8.1f MB' % (shape.__name__, label, len(rows) / elapsed, chunks, size / 1e6)
+        print '%-8s speedup %.2f' % (shape.__name__, results[0] / results[1])
+
+
+if __name__ == '__main__':
+    main()
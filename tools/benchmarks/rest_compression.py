@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Serves a synthetic list_replicas listing of a large dataset, as the replica
+REST endpoint streams it, from a local WSGI server with the compression
+processor, and downloads it with requests asking for each content coding.
+Reports the bytes on the wire, the time to the last byte on the loopback, and
+the time to the last byte at the given link bandwidth.
+'''
+
+import argparse
+import threading
+import time
+
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import requests
+
+from web import application, header
+
+from rucio.web.rest import common
+from rucio.web.rest.common import compression_processor, json_stream
+
+ROWS = []
+
+
+def replica(i):
+    name = 'EVNT.%08d._%06d.pool.root.1' % (i / 1000, i)
+    rses = dict(('CERN-PROD_DATADISK_%d' % j, ['root://eosatlas.cern.ch:1094//eos/atlas/atlasdatadisk/rucio/mc16_13TeV/%02x/%02x/%s' % (i % 256, j, name)])
+                for j in xrange(3))
+    pfns = dict((pfn[0], {'domain': 'wan', 'rse': rse, 'type': 'DISK', 'volatile': False}) for rse, pfn in rses.items())
+    return {'scope': 'mc16_13TeV', 'name': name, 'bytes': 1234567 + i, 'md5': None, 'adler32': '%08x' % (i * 2654435761 % 2 ** 32),
+            'pfns': pfns, 'rses': rses, 'space_token': 'ATLASDATADISK'}
+
+
+class Replicas(object):
+    ''' The list_replicas listing of the synthetic dataset '''
+    def GET(self):
+        header('Content-Type', 'application/x-json-stream')
+        for chunk in json_stream(ROWS):
+            yield chunk
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve():
+    app = application(('/replicas', 'Replicas'), {'Replicas': Replicas})
+    app.add_processor(compression_processor)
+    server = make_server('127.0.0.1', 0, app.wsgifunc(), handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%d/replicas' % server.server_port
+
+
+def download(url, coding):
+    ''' Downloads the listing as BaseClient does and returns the bytes on the wire, the rows and the time to the last byte. '''
+    start = time.time()
+    response = requests.get(url, headers={'Accept-Encoding': coding}, stream=True)
+    rows = 0
+    for line in response.iter_lines(chunk_size=64 * 1024):
+        if line:
+            rows += 1
+    wire = response.raw.tell()
+    return wire, rows, time.time() - start, response.headers.get('Content-Encoding', 'identity')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=100000, help='Number of files of the dataset')
+    parser.add_argument('--bandwidth', type=float, default=100., help='Link bandwidth in Mbit/s')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 6, 9], help='zlib compression levels')
+    args = parser.parse_args()
+
+    ROWS.extend(replica(i) for i in xrange(args.files))
+    url = serve()
+    print '%d files, %.0f Mbit/s' % (args.files, args.bandwidth)
+    identity = None
+    for coding, level in [('identity', None)] + [(coding, level) for coding in ('gzip', 'deflate') for level in args.levels]:
+        if level is not None:
+            common.COMPRESSION_LEVEL = level
+        wire, rows, elapsed, encoding = download(url, coding)
+        assert rows == args.files and encoding == coding
+        if identity is None:
+            identity = wire
+        at_bandwidth = max(elapsed, wire * 8 / (args.bandwidth * 1e6))
+        print '%-8s level %-4s %9.1f MB on the wire (%5.1f%%)  %6.2f s to last byte  %6.2f s at %.0f Mbit/s' % (
+            coding, level or '-', wire / 1e6, 100. * wire / identity, elapsed, at_bandwidth, args.bandwidth)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# Copyright European Organization for Nuclear Research (CERN)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# You may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#                       http://www.apache.org/licenses/LICENSE-2.0
+
+'''
+Replays a synthetic burst of new datasets through the transmogrifier and reports
+the throughput in DIDs/second and rules/second, for the serial rule creation
+(one add_rule per DID) and for the bulk, threaded rule creation.
+
+Meant to be run against a disposable sqlite database, e.g. one created with
+tools/reset_database.py and tools/bootstrap_tests.py, as it creates DIDs,
+subscriptions and rules and does not clean them up.
+'''
+
+import argparse
+import logging
+import time
+
+from rucio.api.subscription import add_subscription, update_subscription
+from rucio.common.utils import generate_uuid
+from rucio.core.account_limit import set_account_limit
+from rucio.core.did import add_dids
+from rucio.core.rse import get_rse_id
+from rucio.core.rule import list_rules
+from rucio.daemons import transmogrifier
+from rucio.db.sqla.constants import SubscriptionState
+
+
+def burst(scopes, nb_dids, account):
+    '''
+    Creates nb_dids new datasets spread over the scopes, all with a unique project.
+    '''
+    project = 'bench_%s' % generate_uuid()[:8]
+    dids = [{'scope': scopes[i % len(scopes)], 'name': '%s.%06i' % (project, i), 'type': 'DATASET',
+             'meta': {'project': project}} for i in xrange(nb_dids)]
+    add_dids(dids=dids, account=account)
+    return project
+
+
+def replay(scopes, nb_dids, rse, account, rule_bulk, rule_threads):
+    '''
+    Replays one burst and returns the time it took to process it and the number of rules created.
+    '''
+    project = burst(scopes, nb_dids, account)
+    name = 'bench_%s' % project
+    subscription_id = add_subscription(name=name, account=account, filter={'project': [project]},
+                                       replication_rules=[{'copies': 1, 'rse_expression': rse, 'lifetime': 3600, 'activity': 'User Subscriptions'}],
+                                       comments='Transmogrifier benchmark', lifetime=None, retroactive=False, dry_run=False, issuer='root')
+    start = time.time()
+    transmogrifier.transmogrifier(bulk=nb_dids, rule_bulk=rule_bulk, rule_threads=rule_threads, once=True)
+    duration = time.time() - start
+    update_subscription(name=name, account=account, state=SubscriptionState.INACTIVE, issuer='root')
+    return duration, len(list(list_rules(filters={'subscription_id': subscription_id})))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dids', action='store', default=500, type=int, help='Number of datasets per burst')
+    parser.add_argument('--scopes', action='store', default='mock', help='Comma separated list of existing scopes')
+    parser.add_argument('--rse', action='store', default='MOCK', help='RSE expression of the subscription rules')
+    parser.add_argument('--account', action='store', default='root', help='Account owning the DIDs and the subscriptions')
+    parser.add_argument('--rule-bulk', action='store', default=50, type=int, help='Maximum number of DIDs per bulk rule creation')
+    parser.add_argument('--rule-threads', action='store', default=4, type=int, help='Number of threads creating the rules')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    set_account_limit(args.account, get_rse_id(args.rse), 2 ** 60)
+    scopes = args.scopes.split(',')
+
+    print '%-32s %10s %12s %12s' % ('mode', 'seconds', 'DIDs/s', 'rules/s')
+    for mode, rule_bulk, rule_threads in [('serial', 1, 1), ('bulk', args.rule_bulk, 1), ('bulk+threads', args.rule_bulk, args.rule_threads)]:
+        duration, nb_rules = replay(scopes, args.dids, args.rse, args.account, rule_bulk, rule_threads)
+        print '%-32s %10.2f %12.1f %12.1f' % ('%s (bulk=%i, threads=%i)' % (mode, rule_bulk, rule_threads), duration, args.dids / duration, nb_rules / duration)